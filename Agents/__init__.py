@@ -0,0 +1,33 @@
+"""智能体包：导出的名称在首次访问时才导入对应模块
+
+`import Agents` 本身不加载 LangGraph、模型客户端与音频处理依赖，
+批量转写工作进程等只用到 utilities 的场景不会为智能体付出冷启动开销。
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    "ProcessUserInputAgent": "Agents.processUserInputAgent",
+    "get_process_user_input_agent": "Agents.processUserInputAgent",
+    "Voice2TextAgent": "Agents.voice2textAgent",
+    "get_voice2text_agent": "Agents.voice2textAgent",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from Agents.processUserInputAgent import ProcessUserInputAgent, get_process_user_input_agent
+    from Agents.voice2textAgent import Voice2TextAgent, get_voice2text_agent
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value   # 之后的访问不再经过 __getattr__
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_EXPORTS])
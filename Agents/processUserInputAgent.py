@@ -1,73 +1,154 @@
 import sys
 from pathlib import Path
+import asyncio
 import json
+import os
+import threading
+import time
 
-# Add root project directory to sys.path
-sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 作为脚本直接运行时把项目根目录加入 sys.path；作为 Agents 包导入时无需修改
+if not __package__:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 
 
-from typing import Dict, List, Optional, Any, TypedDict, Annotated, Union
+from typing import Dict, List, Optional, Any, TypedDict, Annotated, Tuple, Union
 from datetime import datetime
 
-from utilities.modelRelated import invoke_model, invoke_model_with_tools
+from utilities.modelRelated import invoke_model, invoke_model_with_tools, ainvoke_model
 from utilities.processFiles import detect_and_process_file_paths, store_uploaded_files
-
-from pathlib import Path
-# Create an interactive chatbox using gradio
-import gradio as gr
-from dotenv import load_dotenv
+from utilities.validationCache import ValidationCache, get_validation_cache, pre_classify_input
+from utilities.batchValidation import AdaptiveBatchSizer, build_batch_payload, estimate_tokens, parse_batch_labels
+from utilities.checkpointer import get_checkpointer
+from utilities.contextWindow import bounded_add_messages, get_context_window
+from utilities.metrics import trace_node
 
 
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
-# from langgraph.checkpoint.sqlite import SqliteSaver
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.types import Command, interrupt
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage, ToolMessage
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableLambda
+
+
+VALIDATION_MODEL = "Pro/deepseek-ai/DeepSeek-V3"
+# 验证调用在关键路径上且回复很短：配置了多个端点时，超过该秒数未完成就向次优端点对冲（0 表示不对冲）
+VALIDATION_HEDGE_AFTER = float(os.getenv("VALIDATION_HEDGE_AFTER", "0")) or None
+# 修改 VALIDATION_SYSTEM_PROMPT_TEMPLATE 时同步更新版本号，使旧的验证缓存失效
+VALIDATION_PROMPT_VERSION = "v1"
+
+# 单条与批量验证共用的判断标准
+VALIDATION_CRITERIA = """【有效输入 [Valid]】满足以下任一条件即可视为有效：
+- 明确提到生成表格、填写表格、Excel 处理、数据整理等相关操作
+- 提出关于表格字段、数据格式、模板结构等方面的需求或提问
+- 提供表格相关的数据内容、字段说明或规则
+- 对上一轮 AI 的回复作出有意义的延续或回应（即使未直接提到表格）
+- 即使存在错别字、语病、拼写错误，只要语义清晰合理，也视为有效
+
+【无效输入 [Invalid]】符合以下任一情况即视为无效：
+- 内容与表格/Excel 完全无关（如闲聊、情绪表达、与上下文跳脱）
+- 明显为测试文本、随机字符或系统调试输入（如 "123"、"测试一下"、"哈啊啊啊" 等）
+- 仅包含空白、表情符号、标点符号等无实际内容
+
+"""
+
+VALIDATION_SYSTEM_PROMPT_TEMPLATE = """
+你是一位专业的输入验证专家，任务是判断用户的文本输入是否与**表格生成或 Excel 处理相关**，并且是否在当前对话上下文中具有实际意义。
+
+你将获得以下两部分信息：
+- 上一轮 AI 的回复（用于判断上下文是否连贯）
+- 当前用户的输入内容
+
+请根据以下标准进行判断：
+
+""" + VALIDATION_CRITERIA + """【输出要求】
+请你根据上述标准，**仅输出以下两种结果之一**（不添加任何其他内容）：
+- [Valid]
+- [Invalid]
+
+【上一轮 AI 的回复】
+{previous_ai_content}
+"""
+
+# 批量验证：多条 (上一轮 AI 回复, 用户输入) 合并为一次请求，上下文去重后按编号引用
+BATCH_VALIDATION_SYSTEM_PROMPT = """
+你是一位专业的输入验证专家，任务是逐条判断用户的文本输入是否与**表格生成或 Excel 处理相关**，并且是否在各自的对话上下文中具有实际意义。
+
+你将收到一个 JSON 对象：
+- contexts：上一轮 AI 回复的列表（用于判断上下文是否连贯）
+- items：待判断的输入列表，每项包含 id（编号）、context（对应 contexts 中的下标）与 user_input（用户的输入内容）
+
+各条输入相互独立，请分别根据以下标准进行判断：
+
+""" + VALIDATION_CRITERIA + """【输出要求】
+只输出一个 JSON 数组，按 id 顺序给出每一项的结果，label 只能是 "[Valid]" 或 "[Invalid]"，不添加任何其他内容，例如：
+[{"id": 0, "label": "[Valid]"}, {"id": 1, "label": "[Invalid]"}]
+"""
 
 
 class ProcessUserInputState(TypedDict):
-    message: Annotated[List[BaseMessage], add_messages]
+    messages: Annotated[List[BaseMessage], bounded_add_messages]   # 各轮验证的结果说明，只保留最近的若干条
+    session_id: str
     user_input: str
     user_uploaded_files: List[str]
     text_input_validation: str
     previous_messages: List[BaseMessage]
 
 
+class SessionStep(TypedDict):
+    session_id: str
+    status: str                 # "interrupted"：等待用户输入；"completed"：流程结束
+    prompt: Optional[Any]       # interrupt 给出的提示
+    state: Dict[str, Any]       # 当前的图状态
+
+
 
 
 
 class ProcessUserInputAgent:
 
-    def __init__(self):
-        self.memory = MemorySaver()
-        self.graph = self._build_graph(self.memory)
+    def __init__(self, checkpointer: Optional[BaseCheckpointSaver] = None):
+        self.memory = checkpointer or get_checkpointer()
+        builder = self._build_state_graph()
+        # 独立运行时使用的图（带检查点存储）
+        self.graph = builder.compile(self.memory)
+        # 作为子图嵌入其他智能体时使用：不单独指定检查点存储，继承父图的存储与 thread_id
+        self.subgraph = builder.compile()
+        self.batch_sizer = AdaptiveBatchSizer()
 
 
     def _create_initial_state(self, session_id: str, previous_messages: List[BaseMessage]) -> ProcessUserInputState:
         return {
             "session_id": session_id,
-            "previous_messages": previous_messages,
+            # 长会话的历史按验证模型的 token 预算裁剪，状态与检查点的大小不随会话长度增长
+            "previous_messages": get_context_window(VALIDATION_MODEL).fit(previous_messages, session_id),
             "user_input": "",
             "user_uploaded_files": [],
             "text_input_validation": "",
         }
     
 
-    def _build_graph(self, memory):
+    async def _acreate_initial_state(self, session_id: str, previous_messages: List[BaseMessage]) -> ProcessUserInputState:
+        """_create_initial_state 的异步版本：CONTEXT_SUMMARIZE=1 时摘要调用不阻塞事件循环"""
+        return {
+            **self._create_initial_state(session_id, []),
+            "previous_messages": await get_context_window(VALIDATION_MODEL).afit(previous_messages, session_id),
+        }
+
+    def _build_state_graph(self) -> StateGraph:
         graph = StateGraph(ProcessUserInputState)
-        graph.add_node("collect_user_input", self._collect_user_input)
-        graph.add_node("analyze_user_input_text", self._analyze_user_input_text)
+        graph.add_node("collect_user_input", RunnableLambda(self._collect_user_input, afunc=self._acollect_user_input))
+        # 同时提供同步与异步实现：graph.invoke 走同步节点，graph.ainvoke 走异步节点
+        graph.add_node("analyze_user_input_text", RunnableLambda(self._analyze_user_input_text, afunc=self._aanalyze_user_input_text))
     
         graph.add_edge(START, "collect_user_input")
         graph.add_conditional_edges("collect_user_input", self._route_after_collect_user_input)
-        graph.add_edge("analyze_user_input_text", END)
+        graph.add_conditional_edges("analyze_user_input_text", self._route_after_analyze_user_input_text)
 
-        return graph.compile(memory)
+        return graph
 
+    @trace_node("collect_user_input", graph="process_user_input")
     def _collect_user_input(self, state: ProcessUserInputState) -> ProcessUserInputState:
         """收集用户信息"""
         print("\n🔍 开始执行: _collect_user_input")
@@ -76,31 +157,48 @@ class ProcessUserInputAgent:
 
 
         user_input = interrupt("请输入用户信息")
-        detcted_files = detect_and_process_file_paths(user_input)
-        if detcted_files:
-            print(f"📂 检测到用户上传的文件: {detcted_files}")
-            stored_files = store_uploaded_files(detcted_files, state["session_id"])
-            state["user_uploaded_files"] = stored_files
-
+        stored_files = self._store_detected_files(user_input, state["session_id"])
+        return self._collected_input_result(user_input, stored_files)
 
+    @trace_node("collect_user_input", graph="process_user_input")
+    async def _acollect_user_input(self, state: ProcessUserInputState) -> ProcessUserInputState:
+        """_collect_user_input 的异步版本：文件检测与存储在线程中进行，不阻塞事件循环"""
+        print("\n🔍 开始执行: _collect_user_input (异步)")
+        print("=" * 50)
+        print("⌨️ 等待用户输入...")
 
+        user_input = interrupt("请输入用户信息")
+        stored_files = await asyncio.to_thread(self._store_detected_files, user_input, state["session_id"])
+        return self._collected_input_result(user_input, stored_files)
+
+    def _store_detected_files(self, user_input: str, session_id: str) -> List[str]:
+        # 音频之外也接收会议附件（议程、报告、表格），由 voice2text 的 ingest_documents 节点提取
+        detcted_files = detect_and_process_file_paths(user_input, categories=("audio", "document"))
+        if not detcted_files:
+            return []
+        print(f"📂 检测到用户上传的文件: {detcted_files}")
+        return store_uploaded_files(detcted_files, session_id)
+
+    def _collected_input_result(self, user_input: str, stored_files: List[str]) -> ProcessUserInputState:
         print(f"📥 接收到用户输入: {user_input[:100]}{'...' if len(user_input) > 100 else ''}")
         print("✅ _collect_user_input 执行完成")
         print("=" * 50)
         
 
-        return {"user_input": user_input}
+        return {"user_input": user_input, "user_uploaded_files": stored_files}
     
 
 
     def _route_after_collect_user_input(self, state: ProcessUserInputState) -> ProcessUserInputState:
-        if state["user_uploaded_files"]:
-            return "process_uploaded_files"
+        # 上传了文件时由调用方处理文件，无需再校验文本
+        if state.get("user_uploaded_files"):
+            return END
         else:
             return "analyze_user_input_text"
 
 
 
+    @trace_node("analyze_user_input_text", graph="process_user_input")
     def _analyze_user_input_text(self, state: ProcessUserInputState) -> ProcessUserInputState:
         """This node performs a safety check on user text input when all uploaded files are irrelevant.
         It validates if the user input contains meaningful table/Excel-related content.
@@ -113,137 +211,169 @@ class ProcessUserInputAgent:
         print(f"📝 正在分析用户文本输入: {user_input[:100]}{'...' if len(user_input) > 100 else ''}")
         
         if not user_input or user_input.strip() == "":
-            print("❌ 用户输入为空")
-            print("✅ _analyze_text_input 执行完成")
-            print("=" * 50)
-            return {
-                "text_input_validation": "[Invalid]",
-                "process_user_input_messages": [SystemMessage(content="❌ 用户输入为空，验证失败")]
-            }
-        
-        # Create validation prompt for text input safety check
-        # Get the previous AI message content safely
-        previous_ai_content = ""
+            return self._empty_input_result()
+
+        previous_ai_content = self._get_previous_ai_content(state)
+        cache_key = ValidationCache.make_key(VALIDATION_PROMPT_VERSION, previous_ai_content, user_input)
+        cached_result = self._lookup_cached_validation(user_input, cache_key)
+        if cached_result is not None:
+            return cached_result
+
+        system_prompt = self._build_validation_system_prompt(previous_ai_content)
+
         try:
-            if state.get("previous_AI_messages"):
-                previous_ai_messages = state["previous_AI_messages"]
-                print(f"🔍 previous_AI_messages 类型: {type(previous_ai_messages)}")
-                
-                # Handle both single message and list of messages
-                if isinstance(previous_ai_messages, list):
-                    if len(previous_ai_messages) > 0:
-                        latest_message = previous_ai_messages[-1]
-                        if hasattr(latest_message, 'content'):
-                            previous_ai_content = latest_message.content
-                        else:
-                            previous_ai_content = str(latest_message)
-                        print(f"📝 从消息列表提取内容，长度: {len(previous_ai_content)}")
-                    else:
-                        print("⚠️ 消息列表为空")
-                else:
-                    # It's a single message object
-                    if hasattr(previous_ai_messages, 'content'):
-                        previous_ai_content = previous_ai_messages.content
-                    else:
-                        previous_ai_content = str(previous_ai_messages)
-                    print(f"📝 从单个消息提取内容，长度: {len(previous_ai_content)}")
-            else:
-                print("⚠️ 没有找到previous_AI_messages")
+            print("📤 正在调用LLM进行文本输入验证...")
+            # Get LLM validation
+            user_input = "用户输入：" + user_input
+            print("analyze_text_input时调用模型的输入: \n" + user_input)              
+            call_start = time.time()
+            validation_response = invoke_model(model_name=VALIDATION_MODEL, messages=[SystemMessage(content=system_prompt), HumanMessage(content=user_input)],
+                                              hedge_after=VALIDATION_HEDGE_AFTER)
+            # validation_response = self.llm_s.invoke([SystemMessage(content=system_prompt)])
+            self._store_cached_validation(cache_key, validation_response, time.time() - call_start)
+            return self._parse_validation_response(user_input, validation_response)
                 
         except Exception as e:
-            print(f"❌ 提取previous_AI_messages内容时出错: {e}")
-            previous_ai_content = ""
-            
-        print(f"上一轮ai输入内容：=========================================\n{previous_ai_content}")
-        system_prompt = f"""
-你是一位专业的输入验证专家，任务是判断用户的文本输入是否与**表格生成或 Excel 处理相关**，并且是否在当前对话上下文中具有实际意义。
+            return self._validation_error_result(user_input, e)
 
-你将获得以下两部分信息：
-- 上一轮 AI 的回复（用于判断上下文是否连贯）
-- 当前用户的输入内容
+    @trace_node("analyze_user_input_text", graph="process_user_input")
+    async def _aanalyze_user_input_text(self, state: ProcessUserInputState) -> ProcessUserInputState:
+        """_analyze_user_input_text 的异步版本，供 graph.ainvoke / astream 使用"""
+        print("\n🔍 开始执行: _analyze_user_input_text (异步)")
+        print("=" * 50)
 
-请根据以下标准进行判断：
+        user_input = state["user_input"]
+        print(f"📝 正在分析用户文本输入: {user_input[:100]}{'...' if len(user_input) > 100 else ''}")
 
-【有效输入 [Valid]】满足以下任一条件即可视为有效：
-- 明确提到生成表格、填写表格、Excel 处理、数据整理等相关操作
-- 提出关于表格字段、数据格式、模板结构等方面的需求或提问
-- 提供表格相关的数据内容、字段说明或规则
-- 对上一轮 AI 的回复作出有意义的延续或回应（即使未直接提到表格）
-- 即使存在错别字、语病、拼写错误，只要语义清晰合理，也视为有效
+        if not user_input or user_input.strip() == "":
+            return self._empty_input_result()
 
-【无效输入 [Invalid]】符合以下任一情况即视为无效：
-- 内容与表格/Excel 完全无关（如闲聊、情绪表达、与上下文跳脱）
-- 明显为测试文本、随机字符或系统调试输入（如 "123"、"测试一下"、"哈啊啊啊" 等）
-- 仅包含空白、表情符号、标点符号等无实际内容
+        previous_ai_content = self._get_previous_ai_content(state)
+        cache_key = ValidationCache.make_key(VALIDATION_PROMPT_VERSION, previous_ai_content, user_input)
+        cached_result = self._lookup_cached_validation(user_input, cache_key)
+        if cached_result is not None:
+            return cached_result
 
-【输出要求】
-请你根据上述标准，**仅输出以下两种结果之一**（不添加任何其他内容）：
-- [Valid]
-- [Invalid]
+        system_prompt = self._build_validation_system_prompt(previous_ai_content)
 
-【上一轮 AI 的回复】
-{previous_ai_content}
-"""
+        try:
+            print("📤 正在调用LLM进行文本输入验证...")
+            user_input = "用户输入：" + user_input
+            call_start = time.time()
+            validation_response = await ainvoke_model(model_name=VALIDATION_MODEL, messages=[SystemMessage(content=system_prompt), HumanMessage(content=user_input)],
+                                                      hedge_after=VALIDATION_HEDGE_AFTER)
+            self._store_cached_validation(cache_key, validation_response, time.time() - call_start)
+            return self._parse_validation_response(user_input, validation_response)
 
+        except Exception as e:
+            return self._validation_error_result(user_input, e)
 
+    def _empty_input_result(self) -> ProcessUserInputState:
+        print("❌ 用户输入为空")
+        print("✅ _analyze_text_input 执行完成")
+        print("=" * 50)
+        return {
+            "text_input_validation": "[Invalid]",
+            "messages": [SystemMessage(content="❌ 用户输入为空，验证失败")]
+        }
 
-        
+    def _get_previous_ai_content(self, state: ProcessUserInputState) -> str:
+        """安全地提取上一轮 AI 回复的内容（超出单条 token 上限时截断首尾）
+
+        优先读取 previous_messages 中最新的 AI 消息；旧的 previous_AI_messages 键（回放脚本使用）仍然兼容。
+        """
+        previous_ai_content = ""
         try:
-            print("📤 正在调用LLM进行文本输入验证...")
-            # Get LLM validation
-            user_input = "用户输入：" + user_input
-            print("analyze_text_input时调用模型的输入: \n" + user_input)              
-            validation_response = invoke_model(model_name="Pro/deepseek-ai/DeepSeek-V3", messages=[SystemMessage(content=system_prompt), HumanMessage(content=user_input)])
-            # validation_response = self.llm_s.invoke([SystemMessage(content=system_prompt)])
-            
-            print(f"📥 验证响应: {validation_response}")
-            
-            if "[Valid]" in validation_response:
-                validation_result = "[Valid]"
-                status_message = "用户输入验证通过 - 内容与表格相关且有意义"
-            elif "[Invalid]" in validation_response:
-                validation_result = "[Invalid]"
-                status_message = "用户输入验证失败 - 内容与表格无关或无意义"
+            previous_messages = state.get("previous_messages") or state.get("previous_AI_messages")
+            if previous_messages:
+                # Handle both single message and list of messages
+                if not isinstance(previous_messages, list):
+                    previous_messages = [previous_messages]
+                previous_ai_content = get_context_window(VALIDATION_MODEL).latest_ai_content(previous_messages)
+                print(f"📝 提取上一轮 AI 回复，长度: {len(previous_ai_content)}")
             else:
-                # Default to Invalid for safety
-                validation_result = "[Invalid]"
-                status_message = "用户输入验证失败 - 无法确定输入有效性，默认为无效"
-                print(f"⚠️ 无法解析验证结果，LLM响应: {validation_response}")
-            
-            print(f"📊 验证结果: {validation_result}")
-            print(f"📋 状态说明: {status_message}")
-            
-            # Create validation summary
-            summary_message = f"""文本输入安全检查完成:
-            
-            **用户输入**: {user_input[:100]}{'...' if len(user_input) > 100 else ''}
-            **验证结果**: {validation_result}
-            **状态**: {status_message}"""
-            
-            print("✅ _analyze_text_input 执行完成")
-            print("=" * 50)
-            
-            return {
-                "text_input_validation": validation_result,
-                "messages": [SystemMessage(content=summary_message)]
-            }
-                
+                print("⚠️ 没有找到上一轮 AI 回复")
+
         except Exception as e:
-            print(f"❌ 验证文本输入时出错: {e}")
-            
-            # Default to Invalid for safety when there's an error
-            error_message = f"""❌ 文本输入验证出错: {e}
-            
-            📄 **用户输入**: {user_input[:100]}{'...' if len(user_input) > 100 else ''}
-            🔒 **安全措施**: 默认标记为无效输入"""
-            
-            print("✅ _analyze_text_input 执行完成 (出错)")
-            print("=" * 50)
-            
-            return {
-                "text_input_validation": "[Invalid]",
-                "process_user_input_messages": [SystemMessage(content=error_message)]
-            }
+            print(f"❌ 提取上一轮 AI 回复内容时出错: {e}")
+            previous_ai_content = ""
+        return previous_ai_content
+
+    def _lookup_cached_validation(self, user_input: str, cache_key: str) -> Optional[ProcessUserInputState]:
+        """依次查询本地预分类与精确匹配缓存，命中时直接返回验证结果，不调用模型"""
+        validation_cache = get_validation_cache()
+        label = pre_classify_input(user_input)
+        if label is not None:
+            validation_cache.record_precheck_hit()
+            print(f"⚡ 本地预分类命中: {label}")
+        else:
+            label = validation_cache.get(cache_key)
+            if label is None:
+                return None
+            print(f"⚡ 验证缓存命中: {label}")
+        return self._parse_validation_response("用户输入：" + user_input, label)
+
+    def _store_cached_validation(self, cache_key: str, validation_response: str, latency: float):
+        """只缓存能明确解析出结果的模型响应"""
+        for label in ("[Valid]", "[Invalid]"):
+            if label in validation_response:
+                get_validation_cache().put(cache_key, label, latency)
+                return
+
+    def _build_validation_system_prompt(self, previous_ai_content: str) -> str:
+        # Create validation prompt for text input safety check
+        print(f"上一轮ai输入内容：=========================================\n{previous_ai_content}")
+        return VALIDATION_SYSTEM_PROMPT_TEMPLATE.format(previous_ai_content=previous_ai_content)
+
+    def _parse_validation_response(self, user_input: str, validation_response: str) -> ProcessUserInputState:
+        print(f"📥 验证响应: {validation_response}")
+        
+        if "[Valid]" in validation_response:
+            validation_result = "[Valid]"
+            status_message = "用户输入验证通过 - 内容与表格相关且有意义"
+        elif "[Invalid]" in validation_response:
+            validation_result = "[Invalid]"
+            status_message = "用户输入验证失败 - 内容与表格无关或无意义"
+        else:
+            # Default to Invalid for safety
+            validation_result = "[Invalid]"
+            status_message = "用户输入验证失败 - 无法确定输入有效性，默认为无效"
+            print(f"⚠️ 无法解析验证结果，LLM响应: {validation_response}")
+        
+        print(f"📊 验证结果: {validation_result}")
+        print(f"📋 状态说明: {status_message}")
+        
+        # Create validation summary
+        summary_message = f"""文本输入安全检查完成:
+        
+        **用户输入**: {user_input[:100]}{'...' if len(user_input) > 100 else ''}
+        **验证结果**: {validation_result}
+        **状态**: {status_message}"""
+        
+        print("✅ _analyze_text_input 执行完成")
+        print("=" * 50)
+        
+        return {
+            "text_input_validation": validation_result,
+            "messages": [SystemMessage(content=summary_message)]
+        }
+
+    def _validation_error_result(self, user_input: str, e: Exception) -> ProcessUserInputState:
+        print(f"❌ 验证文本输入时出错: {e}")
+        
+        # Default to Invalid for safety when there's an error
+        error_message = f"""❌ 文本输入验证出错: {e}
+        
+        📄 **用户输入**: {user_input[:100]}{'...' if len(user_input) > 100 else ''}
+        🔒 **安全措施**: 默认标记为无效输入"""
+        
+        print("✅ _analyze_text_input 执行完成 (出错)")
+        print("=" * 50)
+        
+        return {
+            "text_input_validation": "[Invalid]",
+            "messages": [SystemMessage(content=error_message)]
+        }
 
     def _route_after_analyze_user_input_text(self, state: ProcessUserInputState) -> ProcessUserInputState:
         if state["text_input_validation"] == "[Valid]":
@@ -251,41 +381,186 @@ class ProcessUserInputAgent:
         else:
             return "collect_user_input"
 
+    # -- 批量验证：回放或批量导入对话记录时使用，多条输入合并为一次模型调用 ----------
+    def validate_batch(self, items: List[Tuple[str, str]]) -> List[str]:
+        """批量验证 (上一轮 AI 回复, 用户输入) 列表，按输入顺序返回 [Valid]/[Invalid]
+
+        先走本地预分类与验证缓存，其余按 token 预算打包；批量结果无法解析的条目逐条重新验证。
+        """
+        labels, pending = self._prepare_batch(items)
+        pending_items = [items[i] for i in pending]
+        for batch in self.batch_sizer.pack(pending_items, estimate_tokens(BATCH_VALIDATION_SYSTEM_PROMPT)):
+            batch_items = [pending_items[i] for i in batch]
+            batch_labels = self._run_validation_batch(batch_items)
+            for i, label in zip(batch, batch_labels):
+                labels[pending[i]] = label if label is not None else self._validate_single(*pending_items[i])
+        return labels
+
+    async def avalidate_batch(self, items: List[Tuple[str, str]]) -> List[str]:
+        """validate_batch 的异步版本：各批并发发送（受每个端点的并发上限约束）"""
+        labels, pending = self._prepare_batch(items)
+        pending_items = [items[i] for i in pending]
+        batches = self.batch_sizer.pack(pending_items, estimate_tokens(BATCH_VALIDATION_SYSTEM_PROMPT))
+
+        async def _run(batch: List[int]):
+            batch_items = [pending_items[i] for i in batch]
+            batch_labels = await self._arun_validation_batch(batch_items)
+            fallbacks = [i for i, label in zip(batch, batch_labels) if label is None]
+            fallback_labels = await asyncio.gather(*[self._avalidate_single(*pending_items[i]) for i in fallbacks])
+            resolved = dict(zip(batch, batch_labels))
+            resolved.update(zip(fallbacks, fallback_labels))
+            for i, label in resolved.items():
+                labels[pending[i]] = label
+
+        await asyncio.gather(*[_run(batch) for batch in batches])
+        return labels
+
+    def _prepare_batch(self, items: List[Tuple[str, str]]) -> Tuple[List[Optional[str]], List[int]]:
+        """本地预分类与缓存命中的条目直接得到结果，返回 (结果列表, 需要调用模型的下标)"""
+        validation_cache = get_validation_cache()
+        labels: List[Optional[str]] = [None] * len(items)
+        pending = []
+        for i, (previous_ai_content, user_input) in enumerate(items):
+            label = pre_classify_input(user_input)
+            if label is not None:
+                validation_cache.record_precheck_hit()
+            else:
+                label = validation_cache.get(ValidationCache.make_key(VALIDATION_PROMPT_VERSION, previous_ai_content, user_input))
+            if label is None:
+                pending.append(i)
+            labels[i] = label
+        print(f"📦 批量验证 {len(items)} 条：本地预分类/缓存命中 {len(items) - len(pending)} 条，需要模型判断 {len(pending)} 条")
+        return labels, pending
+
+    def _batch_messages(self, batch_items: List[Tuple[str, str]]) -> List[BaseMessage]:
+        return [SystemMessage(content=BATCH_VALIDATION_SYSTEM_PROMPT), HumanMessage(content=build_batch_payload(batch_items))]
+
+    def _run_validation_batch(self, batch_items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        call_start = time.time()
+        try:
+            response = invoke_model(model_name=VALIDATION_MODEL, messages=self._batch_messages(batch_items))
+        except Exception as e:
+            print(f"❌ 批量验证调用失败，改为逐条验证: {e}")
+            response = ""
+        return self._record_batch_labels(batch_items, response, time.time() - call_start)
+
+    async def _arun_validation_batch(self, batch_items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        call_start = time.time()
+        try:
+            response = await ainvoke_model(model_name=VALIDATION_MODEL, messages=self._batch_messages(batch_items))
+        except Exception as e:
+            print(f"❌ 批量验证调用失败，改为逐条验证: {e}")
+            response = ""
+        return self._record_batch_labels(batch_items, response, time.time() - call_start)
+
+    def _record_batch_labels(self, batch_items: List[Tuple[str, str]], response: str, latency: float) -> List[Optional[str]]:
+        """解析批量结果，写入验证缓存（延迟按条均摊），并据此调整批大小"""
+        batch_labels = parse_batch_labels(response, len(batch_items))
+        parsed = [(item, label) for item, label in zip(batch_items, batch_labels) if label is not None]
+        for (previous_ai_content, user_input), label in parsed:
+            cache_key = ValidationCache.make_key(VALIDATION_PROMPT_VERSION, previous_ai_content, user_input)
+            get_validation_cache().put(cache_key, label, latency / len(batch_items))
+        self.batch_sizer.record(len(batch_items), len(parsed))
+        if len(parsed) < len(batch_items):
+            print(f"⚠️ 批量验证结果解析不完整（{len(parsed)}/{len(batch_items)}），其余条目逐条验证，"
+                  f"批大小上限调整为 {self.batch_sizer.item_limit}")
+        return batch_labels
+
+    def _single_messages(self, previous_ai_content: str, user_input: str) -> List[BaseMessage]:
+        system_prompt = VALIDATION_SYSTEM_PROMPT_TEMPLATE.format(previous_ai_content=previous_ai_content)
+        return [SystemMessage(content=system_prompt), HumanMessage(content="用户输入：" + user_input)]
+
+    def _validate_single(self, previous_ai_content: str, user_input: str) -> str:
+        """批量结果缺失时的逐条验证，出错时与 _analyze_user_input_text 一样默认判为无效"""
+        call_start = time.time()
+        try:
+            response = invoke_model(model_name=VALIDATION_MODEL, messages=self._single_messages(previous_ai_content, user_input))
+        except Exception as e:
+            print(f"❌ 验证文本输入时出错: {e}")
+            return "[Invalid]"
+        return self._single_label(previous_ai_content, user_input, response, time.time() - call_start)
+
+    async def _avalidate_single(self, previous_ai_content: str, user_input: str) -> str:
+        call_start = time.time()
+        try:
+            response = await ainvoke_model(model_name=VALIDATION_MODEL, messages=self._single_messages(previous_ai_content, user_input))
+        except Exception as e:
+            print(f"❌ 验证文本输入时出错: {e}")
+            return "[Invalid]"
+        return self._single_label(previous_ai_content, user_input, response, time.time() - call_start)
+
+    def _single_label(self, previous_ai_content: str, user_input: str, response: str, latency: float) -> str:
+        cache_key = ValidationCache.make_key(VALIDATION_PROMPT_VERSION, previous_ai_content, user_input)
+        self._store_cached_validation(cache_key, response, latency)
+        return "[Valid]" if "[Valid]" in response else "[Invalid]"
+
+    # -- 会话接口：不阻塞等待用户输入，一个进程可以同时服务任意多个会话 ---------------
+    def _session_config(self, session_id: str) -> Dict[str, Any]:
+        # 与外层 Voice2TextAgent 共用同一个检查点存储，线程 ID 加后缀避免两个图的检查点互相覆盖
+        return {"configurable": {"thread_id": f"{session_id}:process_user_input"}}
+
+    def _session_step(self, session_id: str, result: Dict[str, Any]) -> SessionStep:
+        interrupts = result.pop("__interrupt__", None)
+        if interrupts:
+            return {"session_id": session_id, "status": "interrupted", "prompt": interrupts[0].value, "state": result}
+        return {"session_id": session_id, "status": "completed", "prompt": None, "state": result}
+
+    def start(self, session_id: str, previous_messages: Optional[List[BaseMessage]] = None) -> SessionStep:
+        """开始一轮输入处理，运行到第一个 interrupt（等待用户输入）或结束后立即返回"""
+        config = self._session_config(session_id)
+        result = self.graph.invoke(self._create_initial_state(session_id, previous_messages or []), config)
+        return self._session_step(session_id, result)
+
+    def resume(self, session_id: str, user_response: str) -> SessionStep:
+        """把用户的回复交给等待中的 interrupt，运行到下一个 interrupt 或结束"""
+        config = self._session_config(session_id)
+        if not self.graph.get_state(config).interrupts:
+            raise ValueError(f"会话 {session_id} 没有等待中的用户输入，请先调用 start")
+        return self._session_step(session_id, self.graph.invoke(Command(resume=user_response), config))
+
+    async def astart(self, session_id: str, previous_messages: Optional[List[BaseMessage]] = None) -> SessionStep:
+        """start 的异步版本"""
+        config = self._session_config(session_id)
+        result = await self.graph.ainvoke(await self._acreate_initial_state(session_id, previous_messages or []), config)
+        return self._session_step(session_id, result)
+
+    async def aresume(self, session_id: str, user_response: str) -> SessionStep:
+        """resume 的异步版本"""
+        config = self._session_config(session_id)
+        if not (await self.graph.aget_state(config)).interrupts:
+            raise ValueError(f"会话 {session_id} 没有等待中的用户输入，请先调用 astart")
+        return self._session_step(session_id, await self.graph.ainvoke(Command(resume=user_response), config))
+
     def run_process_user_input(self, session_id: str, previous_messages: List[BaseMessage]) -> ProcessUserInputState:
-        """运行用户输入处理流程"""
+        """在命令行中运行用户输入处理流程（从标准输入读取回复），服务端请使用 start / resume"""
         print("\n🚀 开始运行 ProcessUserInputAgent")
         print("=" * 60)
-
-        inital_state = self._create_initial_state(session_id, previous_messages)
-        config = {"configurable": {"thread_id": session_id}}
-
         print(f"📋 会话ID: {session_id}")
-        print(f"📝 初始状态已创建")
         print("🔄 正在执行用户输入处理工作流...")
         try:
-            while True:
-                finial_state =  self.graph.invoke(inital_state, config )
-                if "__interrupted__" in finial_state:
-                    interrupt_value = finial_state["__interrupted__"][0].value
-                    print(f"💬 智能体: {interrupt_value}")
-                    user_response = input("请输入用户响应: ")
-                    inital_state = Command(resume=user_response)
-                    continue
-
-                print("🎉执行完毕")
-                return finial_state
+            step = self.start(session_id, previous_messages)
+            while step["status"] == "interrupted":
+                print(f"💬 智能体: {step['prompt']}")
+                step = self.resume(session_id, input("请输入用户响应: "))
+
+            print("🎉执行完毕")
+            return step["state"]
             
         except Exception as e:
             print(f"❌ 运行用户输入处理流程时出错: {e}")
 
             return None
-        
-    
 
-        
-        
-        
-        
-    
-    
 
+_process_user_input_agent: Optional[ProcessUserInputAgent] = None
+_process_user_input_agent_lock = threading.Lock()
+
+
+def get_process_user_input_agent() -> ProcessUserInputAgent:
+    """返回进程内共享的 ProcessUserInputAgent，图只构建与编译一次，各会话以 thread_id 隔离"""
+    global _process_user_input_agent
+    if _process_user_input_agent is None:
+        with _process_user_input_agent_lock:
+            if _process_user_input_agent is None:
+                _process_user_input_agent = ProcessUserInputAgent()
+    return _process_user_input_agent
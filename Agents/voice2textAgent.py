@@ -1,40 +1,76 @@
 import sys
 from pathlib import Path
 import json
+import asyncio
+import os
+import threading
+import time
 
-# Add root project directory to sys.path
-sys.path.append(str(Path(__file__).resolve().parent.parent))
+# 作为脚本直接运行时把项目根目录加入 sys.path；作为 Agents 包导入时无需修改
+if not __package__:
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 
 
-from typing import Dict, List, Optional, Any, TypedDict, Annotated, Union
+from typing import Dict, List, Optional, Any, Tuple, TypedDict, Annotated, Union
 from datetime import datetime
 
-from utilities.modelRelated import invoke_model, invoke_model_with_tools
-
-from pathlib import Path
-# Create an interactive chatbox using gradio
-import gradio as gr
-from dotenv import load_dotenv
+from utilities.modelRelated import ainvoke_model, invoke_model, invoke_model_with_tools
+from utilities.audioIO import PCMHandle, open_audio
+from utilities.documentIngestion import SUPPORTED_EXTENSIONS, ingest_document
+from utilities.processFiles import classify_file
+from utilities.audioTranscription import TranscriptionBackend, TranscriptSegment, format_transcript, iter_transcribe_audio_files
+from utilities.speakerDiarization import align_speakers, diarize_handles, speaker_durations
+from utilities.transcriptAnalysis import IncrementalTranscriptAnalyzer
+from utilities.meetingMinutes import MinutesGenerator
+from utilities.checkpointer import get_checkpointer
+from utilities.contextWindow import get_context_window
+from utilities.metrics import trace_node
+from utilities.workerPool import get_audio_worker_pool
+from utilities.retrievalIndex import RetrievalHit, build_context, get_retrieval_index
 
 
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
-# from langgraph.checkpoint.sqlite import SqliteSaver
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.types import Command
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.types import Command, interrupt
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage, ToolMessage
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableLambda
 
 # Import other agents
-from Agents.processUserInputAgent import ProcessUserInputAgent
+from Agents.processUserInputAgent import SessionStep, get_process_user_input_agent
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "Pro/deepseek-ai/DeepSeek-V3")
+DIARIZATION_ENABLED = os.getenv("DIARIZATION_ENABLED", "1") == "1"
+MINUTES_ENABLED = os.getenv("MINUTES_ENABLED", "1") == "1"
+CHAT_END_COMMANDS = ("", "exit", "quit", "q", "退出", "结束")
+CHAT_SYSTEM_PROMPT = (
+    "你是会议助手，根据下面检索到的会议转写片段与附件内容回答用户的问题。"
+    "回答时注明依据的时间戳或附件位置；资料中找不到答案时直接说明，不要编造。\n\n"
+    "会议摘要：\n{summary}\n\n相关内容：\n{context}"
+)
+
 
 class Voice2TextState(TypedDict):
-    audio_file_path: str
+    audio_file_path: Union[str, List[str]]
     user_input: str
+    user_uploaded_files: List[str]
     session_id: str
     previous_messages: List[BaseMessage]
+    attachments: List[Dict[str, Any]]        # 会议附件的提取摘要（分块在磁盘缓存中，按 cache_key 读取）
+    transcript_segments: List[Dict[str, Any]]
+    transcript_sources: List[Dict[str, Any]]   # 每个音频文件及其片段数，片段时间戳以各自文件的开头为 0
+    transcript: str
+    speaker_turns: List[Dict[str, Any]]
+    speaker_durations: Dict[str, float]
+    transcript_analysis: Dict[str, Any]
+    meeting_summary: str
+    meeting_minutes: Dict[str, Any]          # map-reduce 生成的结构化纪要（要点、决定、待办事项）
+    action_items: List[Dict[str, Any]]
+    analysis_metrics: Dict[str, float]
+    chat_citations: List[Dict[str, Any]]     # 最近一轮问答检索到的片段
+    chat_ended: bool
 
 
 
@@ -42,51 +78,366 @@ class Voice2TextState(TypedDict):
 
 
 class Voice2TextAgent:
-    def __init__(self):
+    def __init__(self, transcription_backend: Optional[TranscriptionBackend] = None):
+        self.transcription_backend = transcription_backend
         self.graph = self._build_graph()
 
-    def _build_graph(self, memory = MemorySaver() ):
+    def _build_graph(self, checkpointer: Optional[BaseCheckpointSaver] = None):
         graph = StateGraph(Voice2TextState)
-        graph.add_node("collect_user_input", self._collect_user_input)
-        graph.add_node("transcribe_audio", self._transcribe_audio)
-        graph.add_node("analyze_transcribed_audio", self._analyze_transcribed_audio)
-        graph.add_node("chat_with_user", self._chat_with_user)
+        # 用户输入收集直接嵌入 ProcessUserInputAgent 的子图：共享父图的检查点存储与 thread_id，
+        # 子图中的 interrupt 会直接暂停整个会话，由调用方 Command(resume=...) 恢复
+        graph.add_node("collect_user_input", get_process_user_input_agent().subgraph)
+        graph.add_node("ingest_documents", RunnableLambda(self._ingest_documents, afunc=self._aingest_documents))
+        graph.add_node("transcribe_audio", RunnableLambda(self._transcribe_audio, afunc=self._atranscribe_audio))
+        graph.add_node("diarize_speakers", RunnableLambda(self._diarize_speakers, afunc=self._adiarize_speakers))
+        graph.add_node("analyze_transcribed_audio",
+                       RunnableLambda(self._analyze_transcribed_audio, afunc=self._aanalyze_transcribed_audio))
+        graph.add_node("chat_with_user", RunnableLambda(self._chat_with_user, afunc=self._achat_with_user))
 
         graph.add_edge(START, "collect_user_input")
-        graph.add_edge("collect_user_input", "transcribe_audio")
-        graph.add_edge("transcribe_audio", "process_transcribed_audio")
-        graph.add_edge("process_transcribed_audio", "chat_with_user")
-        graph.add_edge("chat_with_user", END)
-        return graph.compile(memory)
+        graph.add_edge("collect_user_input", "ingest_documents")
+        graph.add_edge("ingest_documents", "transcribe_audio")
+        graph.add_edge("transcribe_audio", "diarize_speakers")
+        graph.add_edge("diarize_speakers", "analyze_transcribed_audio")
+        graph.add_edge("analyze_transcribed_audio", "chat_with_user")
+        graph.add_conditional_edges("chat_with_user", self._route_after_chat_with_user)
+        return graph.compile(checkpointer or get_checkpointer())
     
     def _create_initial_state(self, session_id: str, previous_messages: List[BaseMessage] = None) -> Voice2TextState:
         return {
             "session_id": session_id,
-            "previous_messages": previous_messages,
+            "previous_messages": get_context_window(CHAT_MODEL).fit(previous_messages or [], session_id),
             "user_input": "",
+            "user_uploaded_files": [],
             "audio_file_path": "",
+            "attachments": [],
+            "transcript_segments": [],
+            "transcript": "",
+        }
+
+    async def _acreate_initial_state(self, session_id: str, previous_messages: List[BaseMessage] = None) -> Voice2TextState:
+        """_create_initial_state 的异步版本：CONTEXT_SUMMARIZE=1 时摘要调用不阻塞事件循环"""
+        return {
+            **self._create_initial_state(session_id),
+            "previous_messages": await get_context_window(CHAT_MODEL).afit(previous_messages or [], session_id),
         }
 
-    def _collect_user_input(self, state: Voice2TextState) -> Voice2TextState:
-        processUserInputAgent = ProcessUserInputAgent()
-        finial_state = processUserInputAgent.run_process_user_input(state["session_id"], state["previous_messages"])
-        user_input = finial_state["user_input"]
-        user_uploaded_files = finial_state["user_uploaded_files"]
-        return {"user_input": user_input, "audio_file_path": user_uploaded_files}
+    @trace_node("ingest_documents", graph="voice2text")
+    def _ingest_documents(self, state: Voice2TextState) -> Voice2TextState:
+        """逐页/逐行提取上传的会议附件并写入分块缓存；状态中只保存摘要，不保存全文"""
+        documents = [f for f in state.get("user_uploaded_files") or [] if classify_file(f) == "document"]
+        if not documents:
+            return {"attachments": []}
+        print("\n🔍 开始执行: _ingest_documents")
+        print("=" * 50)
+
+        attachments = []
+        for document in documents:
+            if Path(document).suffix.lower().lstrip(".") not in SUPPORTED_EXTENSIONS:
+                print(f"⚠️ 暂不支持提取该附件，已跳过: {document}")
+                continue
+            try:
+                attachments.append(ingest_document(document))
+            except Exception as e:   # 损坏的附件只跳过该文件，不影响转写
+                print(f"❌ 附件提取失败，已跳过: {document}: {e}")
+        retrieval_index = get_retrieval_index(state["session_id"])
+        for attachment in attachments:
+            retrieval_index.add_document(attachment)
+
+        print("✅ _ingest_documents 执行完成")
+        print("=" * 50)
+        return {"attachments": attachments}
 
+    async def _aingest_documents(self, state: Voice2TextState) -> Voice2TextState:
+        """_ingest_documents 的异步版本：文件读取与解析在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self._ingest_documents, state)
+
+    @trace_node("transcribe_audio", graph="voice2text")
     def _transcribe_audio(self, state: Voice2TextState) -> Voice2TextState:
-        system_prompt = """"aa"""
+        """流式转写上传的音频：每个分块完成后立即把片段推送给调用方（stream_mode="custom"）并做增量分析"""
+        print("\n🔍 开始执行: _transcribe_audio")
+        print("=" * 50)
+
+        audio_files = state.get("audio_file_path") or [
+            f for f in state.get("user_uploaded_files") or [] if classify_file(f) == "audio"]
+        if isinstance(audio_files, str):
+            audio_files = [audio_files] if audio_files else []
+        if not audio_files:
+            # 纯文字或只有附件的会话：不创建转写后端，也不触碰音频工作池
+            print("⏭️ 没有需要转写的音频")
+            return {
+                "transcript_segments": [],
+                "transcript_sources": [],
+                "transcript": "",
+                "transcript_analysis": IncrementalTranscriptAnalyzer().to_state(),
+            }
+
+        writer = get_stream_writer()
+        analyzer = IncrementalTranscriptAnalyzer()
+        transcript_segments = []
+        segment_counts = [0] * len(audio_files)
+        retrieval_index = get_retrieval_index(state["session_id"])
+        # 解码与切分在音频工作池中进行，下一个文件的解码与当前文件的转写重叠
+        for index, segment in iter_transcribe_audio_files(audio_files, backend=self.transcription_backend):
+            segment = segment.to_dict()
+            transcript_segments.append(segment)
+            segment_counts[index] += 1
+            retrieval_index.add_transcript_segment(segment, audio_files[index])   # 转写过程中即可检索
+            writer({"transcript_segment": segment})
+            self._analyze_transcript_segment(analyzer, segment, writer)
+        transcript_sources = [{"audio_file": audio_file, "segment_count": count}
+                              for audio_file, count in zip(audio_files, segment_counts)]
+
+        print("✅ _transcribe_audio 执行完成")
+        print("=" * 50)
+        return {
+            "transcript_segments": transcript_segments,
+            "transcript_sources": transcript_sources,
+            "transcript": format_transcript([TranscriptSegment(**segment) for segment in transcript_segments]),
+            "transcript_analysis": analyzer.to_state(),
+        }
+
+    async def _atranscribe_audio(self, state: Voice2TextState) -> Voice2TextState:
+        """_transcribe_audio 的异步版本：解码与转写在线程中执行，不阻塞事件循环（span 由同步版本记录）"""
+        return await asyncio.to_thread(self._transcribe_audio, state)
+
+    def _analyze_transcript_segment(self, analyzer: IncrementalTranscriptAnalyzer, segment: Dict[str, Any], writer) -> None:
+        """增量分析一个刚转写完成的片段，并把新的待办事项/滚动摘要推送给调用方"""
+        is_first_segment = "time_to_first_segment" not in analyzer.metrics
+        had_summary = bool(analyzer.rolling_summary)
+        update = analyzer.feed(segment)
+        if is_first_segment:
+            print(f"⏱️ 首个转写片段已产出，耗时: {analyzer.metrics['time_to_first_segment']:.2f}秒")
+        if update:
+            writer(update)
+        if "rolling_summary" in update and not had_summary:
+            print(f"⏱️ 首份滚动摘要已生成，耗时: {analyzer.metrics['time_to_first_summary']:.2f}秒")
+
+    @trace_node("diarize_speakers", graph="voice2text")
+    def _diarize_speakers(self, state: Voice2TextState) -> Voice2TextState:
+        """本地说话人分离：按块读取各音频文件计算说话人向量并聚类，再按时间戳为转写片段标注说话人
+
+        同一会话的多个文件共用一个聚类器，说话人编号在文件之间保持一致。特征计算与聚类作为一个任务在音频工作池中运行，
+        只传递 PCM 句柄。解码失败时跳过，不影响后续分析。
+        """
+        print("\n🔍 开始执行: _diarize_speakers")
+        print("=" * 50)
+
+        segments = state.get("transcript_segments") or []
+        sources = state.get("transcript_sources") or []
+        if not DIARIZATION_ENABLED or not segments or not sources:
+            print("⏭️ 无需说话人分离")
+            return {}
+
+        try:
+            # 转写时已解码到内存映射的临时文件，这里直接复用
+            handles = []
+            for source in sources:
+                with open_audio(source["audio_file"]) as audio:
+                    handles.append(PCMHandle.from_decoded(audio))
+            result = get_audio_worker_pool().submit(diarize_handles, handles).result()
+        except Exception as e:
+            print(f"❌ 说话人分离失败，跳过: {e}")
+            return {}
+        turns, offsets = result.turns, result.offsets
+
+        labelled_segments = []
+        position = 0
+        for source, offset in zip(sources, offsets):
+            file_segments = segments[position:position + source["segment_count"]]
+            position += source["segment_count"]
+            shifted = [{"start": s["start"] + offset, "end": s["end"] + offset} for s in file_segments]
+            for segment, speaker in zip(file_segments, align_speakers(shifted, turns)):
+                labelled_segments.append({**segment, "speaker": speaker})
+
+        durations = speaker_durations(turns)
+        print(f"🗣️ 识别出 {len(durations)} 位说话人，{len(turns)} 个发言轮次，"
+              f"耗时 {result.elapsed_seconds:.2f}秒 (实时率 {result.real_time_factor:.4f})")
+        print("✅ _diarize_speakers 执行完成")
+        print("=" * 50)
+        return {
+            "transcript_segments": labelled_segments,
+            "transcript": format_transcript([TranscriptSegment(**segment) for segment in labelled_segments]),
+            "speaker_turns": [turn.to_dict() for turn in turns],
+            "speaker_durations": durations,
+        }
 
-        invoke_model(
-            model_name="whisper-1",
-            messages=[
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=state["audio_file_path"])
-            ]
-        )
+    async def _adiarize_speakers(self, state: Voice2TextState) -> Voice2TextState:
+        """_diarize_speakers 的异步版本：在线程中等待工作池的结果，不阻塞事件循环（span 由同步版本记录）"""
+        return await asyncio.to_thread(self._diarize_speakers, state)
 
+    @trace_node("analyze_transcribed_audio", graph="voice2text")
     def _analyze_transcribed_audio(self, state: Voice2TextState) -> Voice2TextState:
-        pass
+        """生成最终的会议纪要：对完整转写做分层 map-reduce（分块结果有缓存，追加音频时只重算受影响的分支），
+        纪要生成失败或未启用时退回到增量分析的滚动摘要与规则提取的待办事项"""
+        print("\n🔍 开始执行: _analyze_transcribed_audio")
+        print("=" * 50)
+
+        segments = state.get("transcript_segments") or []
+        analyzer = IncrementalTranscriptAnalyzer.from_state(state.get("transcript_analysis") or {})
+        minutes = None
+        if MINUTES_ENABLED and segments:
+            try:
+                minutes = MinutesGenerator().generate(segments)
+            except Exception as e:
+                print(f"❌ 生成会议纪要失败，使用滚动摘要: {e}")
+        usable = minutes is not None and bool(minutes.summary)
+        if usable or (minutes is not None and minutes.metrics["failed_chunks"] == minutes.metrics["chunks"]):
+            # 纪要已给出最终摘要，或者模型此刻不可用（所有分段都失败），不再为剩余片段单独调用模型
+            analyzer.pending_segments = []
+        result = analyzer.finalize()
+        # 待办事项与转写片段一一对应，补上说话人分离得到的发言人
+        speakers = {(s["start"], s["end"], s["text"]): s.get("speaker") for s in segments}
+        for item in result["action_items"]:
+            item.setdefault("speaker", speakers.get((item["start"], item["end"], item["text"])))
+        metrics = result["metrics"]
+        if "time_to_first_segment" in metrics:
+            print(f"⏱️ 首个转写片段耗时: {metrics['time_to_first_segment']:.2f}秒")
+        if "time_to_first_summary" in metrics:
+            print(f"⏱️ 首份摘要耗时: {metrics['time_to_first_summary']:.2f}秒")
+
+        summary, action_items = result["rolling_summary"], result["action_items"]
+        if minutes is not None:
+            metrics.update({f"minutes_{name}": value for name, value in minutes.metrics.items()})
+            print(f"📝 会议纪要: {minutes.metrics['chunks']} 个分块，模型调用 map={minutes.metrics['map_calls']} "
+                  f"reduce={minutes.metrics['reduce_calls']}，缓存命中 map={minutes.metrics['map_cache_hits']} "
+                  f"reduce={minutes.metrics['reduce_cache_hits']}，耗时 {minutes.metrics['total_seconds']:.2f}秒")
+            if minutes.metrics["failed_calls"]:
+                print(f"⚠️ 会议纪要有 {minutes.metrics['failed_calls']} 次模型调用失败，"
+                      f"{minutes.metrics['failed_chunks']}/{minutes.metrics['chunks']} 个分块未包含在纪要中")
+        if usable:
+            summary = minutes.to_markdown()
+            # 纪要缺失的时段用规则提取的待办事项补上
+            backfill = [item for item in result["action_items"]
+                        if any(m["start"] <= item["start"] <= m["end"] for m in minutes.missing)]
+            action_items = (minutes.action_items + backfill) or result["action_items"]
+        elif minutes is not None:
+            print("❌ 会议纪要生成失败，使用滚动摘要与规则提取的待办事项")
+        print(f"📋 待办事项: {len(action_items)} 条")
+
+        print("✅ _analyze_transcribed_audio 执行完成")
+        print("=" * 50)
+        return {
+            "meeting_summary": summary,
+            "meeting_minutes": minutes.to_dict() if minutes is not None else {},
+            "action_items": action_items,
+            "analysis_metrics": metrics,
+        }
 
+    async def _aanalyze_transcribed_audio(self, state: Voice2TextState) -> Voice2TextState:
+        """_analyze_transcribed_audio 的异步版本：map-reduce 的线程池在线程中等待，不阻塞事件循环（span 由同步版本记录）"""
+        return await asyncio.to_thread(self._analyze_transcribed_audio, state)
+
+    @trace_node("chat_with_user", graph="voice2text")
     def _chat_with_user(self, state: Voice2TextState) -> Voice2TextState:
-        pass
+        """会议内容问答：每轮只把检索到的 top-k 转写片段与附件分块放进提示词，输入空行或“退出”结束"""
+        question = str(interrupt("请输入关于会议内容的问题（直接回车结束）") or "").strip()
+        if question.lower() in CHAT_END_COMMANDS:
+            return {"chat_ended": True}
+        messages, hits = self._chat_messages(state, question)
+        writer = get_stream_writer()
+        try:
+            answer = invoke_model(model_name=CHAT_MODEL, messages=messages, on_token=lambda token: writer({"chat_token": token}))
+        except Exception as e:
+            print(f"❌ 回答问题时出错: {e}")
+            answer = "抱歉，回答时出现错误，请稍后重试。"
+        history = get_context_window(CHAT_MODEL).fit(self._chat_history(state, question, answer), state["session_id"])
+        return self._chat_result(history, hits)
+
+    @trace_node("chat_with_user", graph="voice2text")
+    async def _achat_with_user(self, state: Voice2TextState) -> Voice2TextState:
+        """_chat_with_user 的异步版本：检索在线程中执行，模型调用不阻塞事件循环"""
+        question = str(interrupt("请输入关于会议内容的问题（直接回车结束）") or "").strip()
+        if question.lower() in CHAT_END_COMMANDS:
+            return {"chat_ended": True}
+        messages, hits = await asyncio.to_thread(self._chat_messages, state, question)
+        writer = get_stream_writer()
+        try:
+            answer = await ainvoke_model(model_name=CHAT_MODEL, messages=messages,
+                                         on_token=lambda token: writer({"chat_token": token}))
+        except Exception as e:
+            print(f"❌ 回答问题时出错: {e}")
+            answer = "抱歉，回答时出现错误，请稍后重试。"
+        history = await get_context_window(CHAT_MODEL).afit(self._chat_history(state, question, answer), state["session_id"])
+        return self._chat_result(history, hits)
+
+    def _chat_messages(self, state: Voice2TextState, question: str) -> Tuple[List[BaseMessage], List[RetrievalHit]]:
+        """检索与问题相关的片段并组装提示词；索引不完整时（进程重启、说话人分离之后）先按图状态补齐"""
+        retrieval_index = get_retrieval_index(state["session_id"])
+        segments = state.get("transcript_segments") or []
+        sources = [source["audio_file"] for source in state.get("transcript_sources") or []
+                   for _ in range(source["segment_count"])]
+        added = retrieval_index.sync(zip(segments, sources), state.get("attachments") or [])
+        if added:
+            print(f"🗂️ 检索索引补充了 {added} 条内容，共 {len(retrieval_index)} 条")
+
+        search_start = time.perf_counter()
+        hits = retrieval_index.search(question)
+        context = build_context(hits)
+        print(f"🔎 检索到 {len(hits)} 条相关内容，耗时 {(time.perf_counter() - search_start) * 1000:.1f}毫秒")
+        system_prompt = CHAT_SYSTEM_PROMPT.format(summary=state.get("meeting_summary") or "（无）",
+                                                  context=context or "（未检索到相关内容）")
+        history = get_context_window(CHAT_MODEL).fit(state.get("previous_messages") or [], state["session_id"])
+        return [SystemMessage(content=system_prompt), *history, HumanMessage(content=question)], hits
+
+    def _chat_history(self, state: Voice2TextState, question: str, answer: str) -> List[BaseMessage]:
+        return [*(state.get("previous_messages") or []), HumanMessage(content=question), AIMessage(content=answer)]
+
+    def _chat_result(self, history: List[BaseMessage], hits: List[RetrievalHit]) -> Voice2TextState:
+        # history 是按 token 预算裁剪后的问答历史，状态与检查点的大小不随问答轮数增长
+        return {
+            "previous_messages": history,
+            "chat_citations": [hit.to_dict() for hit in hits],
+            "chat_ended": False,
+        }
+
+    def _route_after_chat_with_user(self, state: Voice2TextState) -> str:
+        return END if state.get("chat_ended") else "chat_with_user"
+
+    # -- 会话接口：与 ProcessUserInputAgent 相同，运行到下一个 interrupt 或结束后立即返回 ---------------
+    def _session_config(self, session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    def _session_step(self, session_id: str, result: Dict[str, Any]) -> SessionStep:
+        interrupts = result.pop("__interrupt__", None)
+        if interrupts:
+            return {"session_id": session_id, "status": "interrupted", "prompt": interrupts[0].value, "state": result}
+        return {"session_id": session_id, "status": "completed", "prompt": None, "state": result}
+
+    def start(self, session_id: str, previous_messages: Optional[List[BaseMessage]] = None) -> SessionStep:
+        """开始一个会话，运行到第一个 interrupt（等待上传文件或输入）"""
+        result = self.graph.invoke(self._create_initial_state(session_id, previous_messages), self._session_config(session_id))
+        return self._session_step(session_id, result)
+
+    def resume(self, session_id: str, user_response: str) -> SessionStep:
+        """把用户的回复交给等待中的 interrupt（上传的文件、会议问题或空行结束），运行到下一个 interrupt 或结束"""
+        config = self._session_config(session_id)
+        if not self.graph.get_state(config).interrupts:
+            raise ValueError(f"会话 {session_id} 没有等待中的用户输入，请先调用 start")
+        return self._session_step(session_id, self.graph.invoke(Command(resume=user_response), config))
+
+    async def astart(self, session_id: str, previous_messages: Optional[List[BaseMessage]] = None) -> SessionStep:
+        """start 的异步版本"""
+        result = await self.graph.ainvoke(await self._acreate_initial_state(session_id, previous_messages),
+                                          self._session_config(session_id))
+        return self._session_step(session_id, result)
+
+    async def aresume(self, session_id: str, user_response: str) -> SessionStep:
+        """resume 的异步版本"""
+        config = self._session_config(session_id)
+        if not (await self.graph.aget_state(config)).interrupts:
+            raise ValueError(f"会话 {session_id} 没有等待中的用户输入，请先调用 astart")
+        return self._session_step(session_id, await self.graph.ainvoke(Command(resume=user_response), config))
+
+_voice2text_agent: Optional[Voice2TextAgent] = None
+_voice2text_agent_lock = threading.Lock()
+
+
+def get_voice2text_agent() -> Voice2TextAgent:
+    """返回进程内共享的 Voice2TextAgent（默认转写后端），图只构建与编译一次，各会话以 thread_id 隔离"""
+    global _voice2text_agent
+    if _voice2text_agent is None:
+        with _voice2text_agent_lock:
+            if _voice2text_agent is None:
+                _voice2text_agent = Voice2TextAgent()
+    return _voice2text_agent
@@ -0,0 +1,126 @@
+"""音频 I/O 基准：合成数小时的 WAV，比较流式解码到内存映射与整体读入内存的峰值内存和解码吞吐量
+
+合成文件默认 44.1kHz 双声道 16-bit（3 小时约 1.9GB），分块写出，不占用内存。每种方式在独立子进程中运行，
+峰值内存取子进程的 ru_maxrss：
+    memmap     open_audio 流式解码（混为单声道 + 分块重采样到 16kHz）写入临时 PCM 文件，
+               再按块顺序读取全部音频并计算切分点（plan_chunks），模拟转写与说话人分离的访问方式
+    in-memory  改造前的方式：一次读入全部采样点后整体转换、重采样（只对 --baseline-minutes 分钟的文件运行，
+               内存随时长线性增长，3 小时的文件会超出共享机器的内存）
+安装了 ffmpeg 时 open_audio 通过 ffmpeg 管道解码，否则使用内置的 WAV 解码与重采样。
+
+用法:
+    python benchmarks/benchAudioIO.py --minutes 180 --baseline-minutes 20
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import resource
+import subprocess
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+
+def write_synthetic_wav(path: Path, minutes: float, rate: int, channels: int, seed: int = 0) -> None:
+    """按 10 秒一段写出“说话-停顿”交替的合成音频"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(10 * rate) / rate
+    clip = 0.2 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)) + rng.normal(0, 0.02, len(t))
+    clip[int(8 * rate):] *= 0.02   # 每段末尾 2 秒近似静音
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        for _ in range(int(minutes * 6)):
+            pcm = (clip * rng.uniform(0.5, 1.0) * 32767).astype("<i2")
+            wav_file.writeframes(np.repeat(pcm[:, None], channels, axis=1).tobytes())
+
+
+def child_memmap(path: str, scratch_dir: str, dtype: str) -> dict:
+    from utilities.audioIO import open_audio
+    from utilities.audioTranscription import plan_chunks
+
+    start = time.perf_counter()
+    audio = open_audio(path, dtype=dtype, scratch_dir=scratch_dir)
+    decode_seconds = time.perf_counter() - start
+    rss_after_decode = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    total = 0.0
+    for block in audio.iter_blocks(60.0):
+        total += float(np.abs(block).sum())
+    chunks = plan_chunks(audio.samples) if dtype == "float32" else []
+    scan_seconds = time.perf_counter() - start
+    return {"duration": audio.duration, "decode_seconds": decode_seconds, "scan_seconds": scan_seconds,
+            "rss_after_decode_kb": rss_after_decode, "chunks": len(chunks),
+            "scratch_bytes": audio.path.stat().st_size}
+
+
+def child_in_memory(path: str) -> dict:
+    from utilities.audioIO import BlockResampler
+
+    start = time.perf_counter()
+    with wave.open(path, "rb") as wav_file:
+        channels, rate = wav_file.getnchannels(), wav_file.getframerate()
+        data = wav_file.readframes(wav_file.getnframes())
+    pcm = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768
+    mono = pcm.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    samples = BlockResampler(rate).process(mono)
+    return {"duration": len(samples) / 16000, "decode_seconds": time.perf_counter() - start, "scan_seconds": 0.0}
+
+
+def run_child(*args) -> dict:
+    result = subprocess.run([sys.executable, __file__, "--child", *args], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(name: str, result: dict) -> None:
+    speed = result["duration"] / max(result["decode_seconds"], 1e-9)
+    line = (f"📊 {name:<22} 时长={result['duration'] / 60:6.1f}分钟  解码={result['decode_seconds']:7.2f}秒"
+            f"（{speed:6.0f}× 实时）  峰值内存={result['peak_rss_kb'] / 1024:7.0f}MB")
+    if "scratch_bytes" in result:
+        line += (f"  顺序读取+切分={result['scan_seconds']:6.2f}秒  分块={result['chunks']}"
+                 f"  临时文件={result['scratch_bytes'] / 2**20:.0f}MB")
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="音频 I/O 基准")
+    parser.add_argument("--minutes", type=float, default=180.0)
+    parser.add_argument("--baseline-minutes", type=float, default=20.0, help="整体读入方式使用的文件时长，0 表示跳过")
+    parser.add_argument("--source-rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--dtype", choices=["float32", "int16"], default="float32")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, *rest = args.child
+        result = child_memmap(*rest) if mode == "memmap" else child_in_memory(*rest)
+        result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        lengths = [args.baseline_minutes, args.minutes] if args.baseline_minutes else [args.minutes]
+        for minutes in lengths:
+            path = workdir / f"meeting-{minutes:g}min.wav"
+            start = time.perf_counter()
+            write_synthetic_wav(path, minutes, args.source_rate, args.channels)
+            print(f"🎧 合成 {minutes:g} 分钟音频: {path.stat().st_size / 2**20:.0f}MB，耗时 {time.perf_counter() - start:.1f}秒")
+            report(f"memmap({args.dtype})", run_child("memmap", str(path), str(workdir / "scratch"), args.dtype))
+            if minutes == args.baseline_minutes:
+                report("in-memory（改造前）", run_child("in-memory", str(path)))
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""批量验证基准：逐条 _analyze_user_input_text 与 validate_batch / avalidate_batch 的吞吐量与每条 token 数
+
+输入为合成的会议聊天记录（每条互不相同，避免命中缓存；少量为本地预分类即可判定的无效输入）。
+桩服务器按请求内容给出确定的判断：单条请求回复 [Valid]/[Invalid]，批量请求回复 JSON 数组，
+--malformed-rate 比例的批量回复被截断，用于验证逐条回退与批大小自适应。
+token 数取自 utilities.metrics 的 llm_tokens_total（桩服务器按字符计 token）。
+
+用法:
+    python benchmarks/benchBatchValidation.py --messages 400 --latency 0.3 --malformed-rate 0.1
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+from langchain_core.messages import AIMessage
+
+CONTEXTS = ["请问您需要生成什么样的表格？", "表格需要哪些字段？", "数据从哪里来？需要按什么维度汇总？"]
+VALID_PHRASES = ["帮我把会议纪要整理成表格", "字段包括负责人、截止日期和状态", "请按部门汇总 Excel 数据",
+                 "表头加上项目编号", "数据来源是上周的销售记录"]
+INVALID_PHRASES = ["今天天气不错", "你好呀", "晚上吃什么", "随便聊聊"]
+TABLE_WORDS = ("表", "字段", "Excel", "数据", "汇总", "表头")
+
+
+def _judge(user_input: str) -> str:
+    return "[Valid]" if any(word in user_input for word in TABLE_WORDS) else "[Invalid]"
+
+
+def make_responder(malformed_rate: float, rng: random.Random):
+    def responder(body: dict) -> str:
+        content = body["messages"][-1]["content"]
+        if content.startswith("用户输入："):
+            return _judge(content[len("用户输入："):])
+        items = json.loads(content)["items"]
+        reply = json.dumps([{"id": item["id"], "label": _judge(item["user_input"])} for item in items], ensure_ascii=False)
+        if rng.random() < malformed_rate:
+            reply = reply[:len(reply) // 2]  # 模拟输出被截断
+        return reply
+    return responder
+
+
+def make_records(count: int, rng: random.Random):
+    records = []
+    for i in range(count):
+        if i % 10 == 9:
+            user_input = "123"  # 本地预分类即可判定
+        elif rng.random() < 0.7:
+            user_input = f"{rng.choice(VALID_PHRASES)}（第{i}条）"
+        else:
+            user_input = f"{rng.choice(INVALID_PHRASES)}（第{i}条）"
+        records.append((rng.choice(CONTEXTS), user_input))
+    return records
+
+
+def _tokens(metrics) -> float:
+    return metrics.counter("llm_tokens_total")
+
+
+def run_single(agent, records):
+    labels = []
+    for previous_ai_content, user_input in records:
+        state = {"user_input": user_input, "previous_AI_messages": [AIMessage(content=previous_ai_content)]}
+        labels.append(agent._analyze_user_input_text(state)["text_input_validation"])
+    return labels
+
+
+def measure(name, func, records, metrics, model_calls):
+    from utilities.validationCache import get_validation_cache
+
+    get_validation_cache().clear()
+    metrics.reset()
+    calls_before = model_calls()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        labels = func(records)
+    elapsed = time.perf_counter() - start
+    calls = model_calls() - calls_before
+    print(f"📊 {name:<22} 吞吐量={len(records) / elapsed:8.1f} 条/秒  每条 token={_tokens(metrics) / len(records):8.1f}  "
+          f"模型请求={calls:<5} 耗时={elapsed:6.2f}秒")
+    return labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量验证基准")
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务器首 token 前的延迟（秒）")
+    parser.add_argument("--malformed-rate", type=float, default=0.1, help="批量回复被截断的比例")
+    args = parser.parse_args(argv)
+
+    os.environ["METRICS_CONSOLE"] = "0"
+    from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+
+    rng = random.Random(0)
+    config = StubConfig(latency=args.latency, responder=make_responder(args.malformed_rate, rng))
+    server, base_url = start_stub_server(config)
+    os.environ["SILICONFLOW_BASE_URL"] = base_url
+    os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from Agents.processUserInputAgent import ProcessUserInputAgent
+    from utilities.metrics import get_metrics
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    agent = ProcessUserInputAgent(MemorySaver())
+    metrics = get_metrics()
+    records = make_records(args.messages, rng)
+    expected = [("[Invalid]" if user_input == "123" else _judge(user_input)) for _, user_input in records]
+    try:
+        single = measure("逐条验证（原路径）", lambda items: run_single(agent, items), records, metrics, lambda: config.requests)
+        batch = measure("validate_batch", agent.validate_batch, records, metrics, lambda: config.requests)
+        abatch = measure("avalidate_batch", lambda items: asyncio.run(agent.avalidate_batch(items)), records, metrics,
+                         lambda: config.requests)
+    finally:
+        server.shutdown()
+    for name, labels in (("逐条", single), ("批量", batch), ("异步批量", abatch)):
+        mismatches = sum(a != b for a, b in zip(labels, expected))
+        print(f"   {name}结果与预期不一致: {mismatches} 条")
+    print(f"   当前批大小上限: {agent.batch_sizer.item_limit}（最大 {agent.batch_sizer.max_items}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""检查点写入/读取延迟基准：SqliteCheckpointSaver 对比 MemorySaver
+
+模拟 N 个会话，每个会话写入若干步检查点（带不断增长的消息列表）和中间写入，
+最后读取每个会话的最新检查点。报告单次 put / get_tuple 的 p50/p99、总耗时、进程 RSS 增长与数据库大小。
+
+用法:
+    python benchmarks/benchCheckpointer.py --sessions 10000 --steps 4
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import gc
+import resource
+import statistics
+import tempfile
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+
+from utilities.checkpointer import SqliteCheckpointSaver
+
+
+def _rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(saver, sessions: int, steps: int):
+    put_latencies, get_latencies = [], []
+    start = time.perf_counter()
+    for session in range(sessions):
+        config = {"configurable": {"thread_id": f"session-{session}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        messages = []
+        for step in range(steps):
+            messages = messages + [HumanMessage(content=f"第{step}轮：请帮我整理会议纪要中的待办事项" * 3),
+                                   AIMessage(content=f"第{step}轮回复：好的，以下是整理后的待办事项列表……" * 5)]
+            checkpoint = create_checkpoint(checkpoint, None, step)
+            versions = {"messages": saver.get_next_version(checkpoint["channel_versions"].get("messages"), None),
+                        "user_input": saver.get_next_version(checkpoint["channel_versions"].get("user_input"), None)}
+            checkpoint["channel_values"] = {"messages": messages, "user_input": f"输入 {step}"}
+            checkpoint["channel_versions"] = {**checkpoint["channel_versions"], **versions}
+
+            call_start = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": step}, versions)
+            saver.put_writes(config, [("user_input", f"输入 {step}")], task_id=f"task-{step}")
+            put_latencies.append(time.perf_counter() - call_start)
+    if hasattr(saver, "flush"):
+        saver.flush()
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for session in range(sessions):
+        call_start = time.perf_counter()
+        saved = saver.get_tuple({"configurable": {"thread_id": f"session-{session}", "checkpoint_ns": ""}})
+        get_latencies.append(time.perf_counter() - call_start)
+        assert saved is not None and len(saved.checkpoint["channel_values"]["messages"]) == steps * 2
+    read_seconds = time.perf_counter() - start
+    return put_latencies, get_latencies, write_seconds, read_seconds
+
+
+def report(name, put_latencies, get_latencies, write_seconds, read_seconds, rss_delta, extra=""):
+    print(f"📊 {name}")
+    print(f"   put+put_writes  p50={_percentile(put_latencies, 0.5) * 1e6:8.1f}µs  "
+          f"p99={_percentile(put_latencies, 0.99) * 1e6:8.1f}µs  总计={write_seconds:6.2f}秒")
+    print(f"   get_tuple       p50={_percentile(get_latencies, 0.5) * 1e6:8.1f}µs  "
+          f"p99={_percentile(get_latencies, 0.99) * 1e6:8.1f}µs  总计={read_seconds:6.2f}秒  "
+          f"均值={statistics.mean(get_latencies) * 1e6:.1f}µs")
+    print(f"   RSS 增长={rss_delta:7.1f}MB {extra}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查点存储延迟基准")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=4, help="每个会话写入的检查点数")
+    parser.add_argument("--keep-last", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    # 峰值 RSS 只增不减，先测 SQLite 再测 MemorySaver，两者的增长量才可比
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "checkpoints.sqlite3"
+        saver = SqliteCheckpointSaver(str(db_path), keep_last=args.keep_last)
+        rss_before = _rss_mb()
+        results = run(saver, args.sessions, args.steps)
+        rss_delta = _rss_mb() - rss_before
+        db_mb = sum(p.stat().st_size for p in Path(tmp).glob("checkpoints.sqlite3*")) / 1e6
+        report(f"SqliteCheckpointSaver (keep_last={args.keep_last})", *results, rss_delta, f" 数据库={db_mb:.1f}MB")
+        saver.close()
+    gc.collect()
+
+    saver = MemorySaver()
+    rss_before = _rss_mb()
+    results = run(saver, args.sessions, args.steps)
+    report("MemorySaver（不持久化，保留全部历史）", *results, _rss_mb() - rss_before)
+
+
+if __name__ == "__main__":
+    main()
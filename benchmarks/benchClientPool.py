@@ -0,0 +1,107 @@
+"""对比每次新建 ChatOpenAI 与复用客户端注册表的单次调用开销
+
+用法:
+    python benchmarks/benchClientPool.py --calls 50 --handshake-delay 0.05
+
+注意：同步版 openai SDK 在流式响应读到 [DONE] 后直接关闭响应，HTTP/1.1 下该连接无法复用；
+安装 h2 并使用 HTTPS/HTTP2 端点时流式调用同样可以复用连接。非流式调用（invoke_model_with_tools）
+在 HTTP/1.1 下即可复用。
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import time
+
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+from utilities.modelRelated import get_llm_client_registry, invoke_model, invoke_model_with_tools
+
+MODEL_NAME = "Pro/deepseek-ai/DeepSeek-V3"
+MESSAGES = [SystemMessage(content="你是一位专业的输入验证专家"), HumanMessage(content="用户输入：帮我生成一个表格")]
+
+
+def _stream_with_fresh_client(base_url: str) -> str:
+    """基线：与改造前一致，每次调用都新建客户端"""
+    llm = ChatOpenAI(model=MODEL_NAME, api_key="stub", base_url=base_url, streaming=True, temperature=0.2)
+    return "".join(chunk.content for chunk in llm.stream(MESSAGES))
+
+
+def _invoke_with_fresh_client(base_url: str) -> str:
+    llm = ChatOpenAI(model=MODEL_NAME, api_key="stub", base_url=base_url, streaming=False, temperature=0.2)
+    return llm.invoke(MESSAGES).content
+
+
+def _stream_with_registry(base_url: str) -> str:
+    return invoke_model(MODEL_NAME, MESSAGES)
+
+
+def _invoke_with_registry(base_url: str) -> str:
+    return invoke_model_with_tools(MODEL_NAME, MESSAGES, tools=[]).content
+
+
+def _measure(name: str, fn, base_url: str, calls: int, config: StubConfig) -> dict:
+    connections_before = config.connections
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(base_url)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "name": name,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "connections": config.connections - connections_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 客户端连接池基准测试")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务器响应延迟（秒）")
+    parser.add_argument("--handshake-delay", type=float, default=0.05, help="模拟每个新连接的握手耗时（秒）")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency=args.latency, handshake_delay=args.handshake_delay)
+    server, base_url = start_stub_server(config)
+    os.environ["SILICONFLOW_BASE_URL"] = base_url
+    os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    try:
+        # 预热一次，排除导入和首次建连的影响
+        with contextlib.redirect_stdout(io.StringIO()):
+            _stream_with_fresh_client(base_url)
+            _stream_with_registry(base_url)
+
+        results = [
+            _measure("流式/每次新建客户端", _stream_with_fresh_client, base_url, args.calls, config),
+            _measure("流式/注册表复用", _stream_with_registry, base_url, args.calls, config),
+            _measure("非流式/每次新建客户端", _invoke_with_fresh_client, base_url, args.calls, config),
+            _measure("非流式/注册表复用", _invoke_with_registry, base_url, args.calls, config),
+        ]
+    finally:
+        get_llm_client_registry().close()
+        server.shutdown()
+
+    print(f"📊 {args.calls} 次调用，桩服务器延迟={args.latency}s，握手延迟={args.handshake_delay}s")
+    for result in results:
+        print(f"   {result['name']:<20} 平均={result['mean_ms']:.2f}ms  p50={result['p50_ms']:.2f}ms  "
+              f"p99={result['p99_ms']:.2f}ms  新建连接数={result['connections']}")
+    print(f"⏱️ 单次调用节省: 流式={results[0]['mean_ms'] - results[1]['mean_ms']:.2f}ms  "
+          f"非流式={results[2]['mean_ms'] - results[3]['mean_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
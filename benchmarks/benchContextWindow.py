@@ -0,0 +1,153 @@
+"""上下文窗口基准：会话历史增长到数千轮时，每次模型请求的大小应保持不变
+
+1. 端到端：以不同长度的历史开始 Voice2Text 会话（start → resume 通过输入验证，没有音频时直接进入问答），
+   再连续提问 --questions 轮，记录桩服务器收到的问答请求大小（该请求包含裁剪后的历史），
+   以及最后一轮后检查点中 previous_messages 的 token 数。
+2. 裁剪本身：ContextWindowManager.fit 的耗时与输出 token 数；开启摘要时（本地桩摘要函数）统计摘要调用次数，
+   历史每次追加若干轮后再次 fit，摘要调用只随新滑出窗口的消息增长。
+请求大小随历史长度增长超过 --tolerance，或历史超过预算时以非零状态退出。
+
+用法:
+    python benchmarks/benchContextWindow.py --turns 10 100 1000 5000 --budget 2000 --questions 20
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+
+def make_history(turns: int):
+    history = [SystemMessage(content="你是一个表格生成助手。")]
+    for i in range(turns):
+        history.append(HumanMessage(content=f"第{i}轮：请在表格里加上字段“负责人{i}”和“截止日期”，并按部门汇总。"))
+        history.append(AIMessage(content=f"好的，已添加负责人{i}与截止日期字段。" * 3 + "请问还需要按哪个维度汇总？"))
+    return history
+
+
+def run_end_to_end(turns_list, budget: int, questions: int) -> list:
+    from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+
+    from utilities.contextWindow import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+    chat_requests = []
+
+    def responder(body: dict) -> str:
+        messages = body["messages"]
+        if "会议助手" in str(messages[0]["content"]):
+            # (整个请求的字符数, 请求中历史部分的 token 数)：去掉开头的问答提示词与末尾的问题
+            history_tokens = sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages[1:-1])
+            chat_requests.append((sum(len(m["content"]) for m in messages), history_tokens))
+            return "根据会议记录，预算由说话人2负责，下周五前给出新方案。" * 3
+        return "[Valid]"
+
+    server, base_url = start_stub_server(StubConfig(responder=responder))
+    os.environ["SILICONFLOW_BASE_URL"] = base_url
+    os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+    os.environ["CHECKPOINT_BACKEND"] = "memory"
+    os.environ["MINUTES_ENABLED"] = "0"
+
+    from Agents.voice2textAgent import CHAT_MODEL, Voice2TextAgent
+    from utilities.contextWindow import get_context_window
+
+    agent = Voice2TextAgent()
+    window = get_context_window(CHAT_MODEL)
+    results = []
+    try:
+        for turns in turns_list:
+            session_id = f"context-{turns}"
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                agent.start(session_id, make_history(turns))
+                agent.resume(session_id, "请根据会议内容回答我的问题")
+                first = len(chat_requests)
+                for i in range(questions):
+                    step = agent.resume(session_id, f"第{i}个问题：第三季度预算由谁负责，截止日期是什么时候？")
+            elapsed = time.perf_counter() - start
+            sizes = [size for size, _ in chat_requests[first:]]
+            history_tokens = max(tokens for _, tokens in chat_requests[first:])
+            state_tokens = window.request_tokens(step["state"]["previous_messages"])
+            results.append((turns, sizes, history_tokens, state_tokens, elapsed))
+            print(f"📊 历史 {turns:>6} 轮  问答请求 首轮={sizes[0]:>6} 末轮={sizes[-1]:>6} 最大={max(sizes):>6} 字符  "
+                  f"请求中的历史≤{history_tokens:>5} token  状态中的历史={state_tokens:>5} token（预算 {budget}）  "
+                  f"{questions} 轮问答={elapsed * 1000:7.1f}ms")
+    finally:
+        server.shutdown()
+    return results
+
+
+def run_fit(turns_list, budget: int) -> list:
+    from utilities.contextWindow import ContextWindowManager
+
+    summary_calls = []
+
+    def summarize(previous_summary: str, new_content: str) -> str:
+        summary_calls.append(len(new_content))
+        return (previous_summary + "\n" + new_content[:80]).strip()
+
+    results = []
+    for summarized in (False, True):
+        manager = ContextWindowManager("bench", budget=budget, summarize=summarize if summarized else None)
+        summary_calls.clear()
+        for turns in turns_list:
+            history = make_history(turns)
+            start = time.perf_counter()
+            fitted = manager.fit(history, session_id="bench")
+            elapsed = time.perf_counter() - start
+            tokens = manager.request_tokens(fitted)
+            results.append((turns, tokens))
+            label = "丢弃+摘要" if summarized else "丢弃"
+            print(f"🧮 fit[{label}] 历史 {turns:>6} 轮  输出 {len(fitted):>4} 条 / {tokens:>6} token  "
+                  f"耗时={elapsed * 1000:7.2f}ms  累计摘要调用={len(summary_calls)}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="上下文窗口基准")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--budget", type=int, default=2000, help="CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--questions", type=int, default=20, help="每个会话连续提问的轮数")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="最大请求相对最小请求允许的增长比例（消息粒度不同，字符数会有小幅波动）")
+    args = parser.parse_args(argv)
+
+    os.environ["METRICS_CONSOLE"] = "0"
+    os.environ["CONTEXT_TOKEN_BUDGET"] = str(args.budget)
+    from utilities.contextWindow import MODEL_CONTEXT_BUDGETS
+
+    MODEL_CONTEXT_BUDGETS.clear()  # 所有模型使用 --budget
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    end_to_end = run_end_to_end(args.turns, args.budget, args.questions)
+    fitted = run_fit(args.turns, args.budget)
+
+    failures = []
+    # 只比较历史已超出预算的长度：更短的历史本来就小于预算
+    sizes = [size for turns, turn_sizes, _, _, _ in end_to_end if turns >= 100 for size in turn_sizes]
+    if sizes and max(sizes) > min(sizes) * (1 + args.tolerance):
+        failures.append(f"问答请求大小随历史增长: 最小 {min(sizes)} 字符，最大 {max(sizes)} 字符")
+    for turns, _, history_tokens, state_tokens, _ in end_to_end:
+        if history_tokens > args.budget:
+            failures.append(f"历史 {turns} 轮时问答请求中的历史超出预算: {history_tokens}")
+        if state_tokens > args.budget:
+            failures.append(f"历史 {turns} 轮时状态中的历史超出预算: {state_tokens}")
+    for turns, tokens in fitted:
+        if tokens > args.budget:
+            failures.append(f"历史 {turns} 轮时 fit 输出超出预算: {tokens}")
+    if failures:
+        print("❌ " + "\n❌ ".join(failures))
+        sys.exit(1)
+    print("✅ 请求大小与历史长度无关，且不超过预算")
+
+
+if __name__ == "__main__":
+    main()
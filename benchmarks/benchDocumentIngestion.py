@@ -0,0 +1,202 @@
+"""附件提取基准：大型 PDF / CSV / xlsx 的提取吞吐量（页/秒、行/秒）、峰值内存，以及缓存命中后的读取耗时
+
+合成的附件：
+    PDF    --pages 页，每页 --lines 行文本（FlateDecode 内容流，交叉引用表在文件末尾）
+    CSV    --rows 行 × 8 列（GB18030 编码，检验按样本检测编码）
+    xlsx   --rows 行 × 8 列，两个工作表（sharedStrings + 行内数字，zipfile 直接写入）
+每种附件在新的子进程中提取（冷缓存）一次，再从缓存读回一次，报告单元吞吐量与子进程的峰值 RSS。
+峰值 RSS 不应随附件大小线性增长：提取过程中同时只保留一页 / 一行及当前分块。
+
+用法:
+    python benchmarks/benchDocumentIngestion.py --pages 2000 --rows 200000
+    python benchmarks/benchDocumentIngestion.py --files testFiles/20250710185541906382.pdf
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from utilities.documentIngestion import pdf_backend
+
+WORDS = ("budget", "roadmap", "quarterly", "review", "migration", "latency", "hiring", "launch",
+         "customer", "incident", "owner", "deadline", "forecast", "pipeline", "risk", "vendor")
+
+
+def write_synthetic_pdf(path: Path, pages: int, lines: int, seed: int = 0) -> None:
+    """写入一个多页 PDF：Helvetica 字体（无 ToUnicode，按 WinAnsi 解码），每页一个压缩内容流"""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        offsets = {}
+
+        def write_object(number: int, body: bytes) -> None:
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        # 1: Catalog, 2: Pages, 3: Font, 之后每页两个对象（Page, Contents）
+        page_numbers = [4 + 2 * i for i in range(pages)]
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = b" ".join(b"%d 0 R" % n for n in page_numbers)
+        write_object(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d " % pages
+                     + b"/Resources << /Font << /F1 3 0 R >> >> >>")
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for page, number in enumerate(page_numbers, start=1):
+            content = [b"BT /F1 10 Tf 14 TL 50 780 Td"]
+            content.append(b"(Page %d of the quarterly report) Tj T*" % page)
+            for _ in range(lines):
+                sentence = " ".join(rng.choice(WORDS) for _ in range(12))
+                content.append(b"(" + sentence.encode("latin-1") + b") Tj T*")
+            content.append(b"ET")
+            stream = zlib.compress(b"\n".join(content))
+            write_object(number, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R >>"
+                         % (number + 1))
+            write_object(number + 1, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+                         + stream + b"\nendstream")
+        xref_offset = f.tell()
+        count = 4 + 2 * pages
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+        for number in range(1, count):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_offset))
+
+
+def _row(rng: random.Random, index: int) -> list:
+    return [str(index), f"项目{index % 97}", rng.choice(WORDS), rng.choice(("张三", "李四", "王五")),
+            f"{rng.random() * 1000:.2f}", "2025-07-%02d" % (index % 28 + 1), rng.choice(("进行中", "已完成")),
+            " ".join(rng.choice(WORDS) for _ in range(6))]
+
+
+HEADER = ["编号", "项目", "类别", "负责人", "金额", "日期", "状态", "备注"]
+
+
+def write_synthetic_csv(path: Path, rows: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", encoding="gb18030", newline="") as f:
+        f.write(",".join(HEADER) + "\r\n")
+        for index in range(1, rows + 1):
+            f.write(",".join(_row(rng, index)) + "\r\n")
+
+
+def write_synthetic_xlsx(path: Path, rows: int, sheets: int = 2, seed: int = 0) -> None:
+    """用 zipfile 写入最小的 xlsx：文本单元格放入 sharedStrings，金额写成数字"""
+    rng = random.Random(seed)
+    strings, string_index = [], {}
+
+    def shared(text: str) -> int:
+        if text not in string_index:
+            string_index[text] = len(strings)
+            strings.append(text)
+        return string_index[text]
+
+    columns = "ABCDEFGH"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for sheet in range(1, sheets + 1):
+            with archive.open(f"xl/worksheets/sheet{sheet}.xml", "w") as f:
+                f.write(b'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns='
+                        b'"http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+                for index in range(rows // sheets + 1):
+                    cells = HEADER if index == 0 else _row(rng, index)
+                    xml = [f'<row r="{index + 1}">']
+                    for column, value in zip(columns, cells):
+                        ref = f"{column}{index + 1}"
+                        if index and column == "E":
+                            xml.append(f'<c r="{ref}"><v>{value}</v></c>')
+                        else:
+                            xml.append(f'<c r="{ref}" t="s"><v>{shared(value)}</v></c>')
+                    xml.append("</row>")
+                    f.write("".join(xml).encode("utf-8"))
+                f.write(b"</sheetData></worksheet>")
+        archive.writestr("xl/sharedStrings.xml",
+                         '<?xml version="1.0" encoding="UTF-8"?><sst xmlns='
+                         '"http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                         + "".join(f"<si><t>{escape(s)}</t></si>" for s in strings) + "</sst>")
+        archive.writestr("xl/workbook.xml",
+                         '<?xml version="1.0" encoding="UTF-8"?><workbook xmlns='
+                         '"http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r='
+                         '"http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+                         + "".join(f'<sheet name="Sheet{i}" sheetId="{i}" r:id="rId{i}"/>' for i in range(1, sheets + 1))
+                         + "</sheets></workbook>")
+        archive.writestr("xl/_rels/workbook.xml.rels",
+                         '<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns='
+                         '"http://schemas.openxmlformats.org/package/2006/relationships">'
+                         + "".join(f'<Relationship Id="rId{i}" Type="worksheet" Target="worksheets/sheet{i}.xml"/>'
+                                   for i in range(1, sheets + 1))
+                         + "</Relationships>")
+
+
+def run_worker(path: str) -> None:
+    """子进程入口：提取一次附件，输出 JSON（耗时、单元数、分块数、峰值 RSS）"""
+    from utilities.documentIngestion import ingest_document
+
+    start = time.perf_counter()
+    meta = ingest_document(path)
+    elapsed = time.perf_counter() - start
+    units = meta["units"]
+    if meta["kind"] == "row":   # 行号从 1 开始且包含表头，多个工作表时按分块统计的行数更准确
+        from utilities.documentIngestion import iter_document_chunks
+
+        units = sum(chunk.end - chunk.start + 1 for chunk in iter_document_chunks(path))
+    print(json.dumps({"seconds": elapsed, "units": units, "kind": meta["kind"], "chunks": meta["chunk_count"],
+                      "tokens": meta["tokens"], "cached": meta["cached"],
+                      "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def measure(path: str, env: dict) -> dict:
+    result = subprocess.run([sys.executable, __file__, "--worker", path], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="附件提取基准")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=40, help="PDF 每页行数")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--files", nargs="*", default=[], help="额外测量的真实附件")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        paths = []
+        if args.pages:
+            write_synthetic_pdf(workdir / "report.pdf", args.pages, args.lines)
+            paths.append(workdir / "report.pdf")
+        if args.rows:
+            write_synthetic_csv(workdir / "ledger.csv", args.rows)
+            write_synthetic_xlsx(workdir / "ledger.xlsx", args.rows)
+            paths += [workdir / "ledger.csv", workdir / "ledger.xlsx"]
+        paths += [Path(p) for p in args.files]
+
+        env = {**os.environ, "DOCUMENT_CACHE_DIR": str(workdir / "cache")}
+        baseline = subprocess.run([sys.executable, "-c", "import resource, utilities.documentIngestion; "
+                                   "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)"],
+                                  cwd=Path(__file__).resolve().parent.parent, capture_output=True, text=True, check=True)
+        print(f"🧮 导入后的基线 RSS: {float(baseline.stdout):.0f}MB（PDF 后端: {pdf_backend()}）")
+        for path in paths:
+            cold = measure(str(path), env)
+            warm = measure(str(path), env)
+            unit = "页" if cold["kind"] == "page" else "行"
+            print(f"📊 {path.name:<28} {path.stat().st_size / 2**20:7.1f}MB  {cold['units']:>7} {unit}  "
+                  f"{cold['chunks']:>6} 分块  提取={cold['seconds']:6.2f}秒（{cold['units'] / cold['seconds']:9.0f} {unit}/秒）  "
+                  f"缓存={warm['seconds']:5.2f}秒  峰值RSS 冷={cold['peak_rss_mb']:5.0f}MB 缓存={warm['peak_rss_mb']:5.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""图构建开销与单会话开销基准：每次新建智能体（改造前的做法） vs 进程内共享的已编译图
+
+单会话流程：启动 → 停在 collect_user_input 的 interrupt → 以 "123" 恢复（本地预分类为 [Invalid]，
+不调用模型）→ 回到 collect_user_input 再次 interrupt。检查点存储统一用 MemorySaver，只比较图本身的开销。
+
+用法:
+    python benchmarks/benchGraphConstruction.py --sessions 500
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
+
+from Agents.processUserInputAgent import ProcessUserInputAgent, get_process_user_input_agent
+from Agents.voice2textAgent import Voice2TextAgent, get_voice2text_agent
+
+
+def _time_per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def _run_session(agent: ProcessUserInputAgent, session_id: str):
+    config = {"configurable": {"thread_id": session_id}}
+    result = agent.graph.invoke(agent._create_initial_state(session_id, []), config)
+    assert "__interrupt__" in result
+    result = agent.graph.invoke(Command(resume="123"), config)
+    assert "__interrupt__" in result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="图构建与单会话开销基准")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--construct-repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    print("🏗️ 构建开销（每次调用）")
+    for name, build, shared in [
+        ("ProcessUserInputAgent", lambda: ProcessUserInputAgent(MemorySaver()), get_process_user_input_agent),
+        ("Voice2TextAgent", Voice2TextAgent, get_voice2text_agent),
+    ]:
+        fresh = _time_per_call(build, args.construct_repeat)
+        shared()  # 首次构建不计入
+        reused = _time_per_call(shared, args.construct_repeat)
+        print(f"   {name:<22} 新建={fresh * 1000:8.3f}ms  共享={reused * 1e6:8.3f}µs")
+
+    latencies = {"每会话新建智能体": [], "共享已编译图": []}
+    shared_agent = ProcessUserInputAgent(MemorySaver())
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.sessions):
+            start = time.perf_counter()
+            _run_session(ProcessUserInputAgent(MemorySaver()), f"fresh-{i}")
+            latencies["每会话新建智能体"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _run_session(shared_agent, f"shared-{i}")
+            latencies["共享已编译图"].append(time.perf_counter() - start)
+
+    print(f"🔁 单会话开销（启动 + 一次恢复，{args.sessions} 个会话）")
+    for name, values in latencies.items():
+        values.sort()
+        print(f"   {name:<12} p50={values[len(values) // 2] * 1000:7.2f}ms  "
+              f"p99={values[int(len(values) * 0.99)] * 1000:7.2f}ms  均值={statistics.mean(values) * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
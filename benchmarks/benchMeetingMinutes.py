@@ -0,0 +1,160 @@
+"""会议纪要基准：分层 map-reduce 与单次整篇总结的端到端耗时、模型调用数与 token 成本
+
+对本地桩服务器调用（首 token 延迟 = --latency + 输入 token 数 / --prefill-tokens-per-second，输出速度 --tokens-per-second），
+桩服务器对纪要请求回复合法的纪要 JSON：分段纪要 --map-reply-tokens 字，合并与整篇纪要 --reply-tokens 字。
+合成 --hours 小时的会议转写后依次测量：
+    单次整篇       把整场转写放进一个提示词（--context-limit 大于 0 时超出上限会被桩服务器拒绝）
+    map-reduce     冷缓存，分别以 1 个并发与 --concurrency 个并发运行
+    追加音频       先对前 (1 - --append-fraction) 的转写生成纪要，再对完整转写生成（只重算新分块及其到根的路径）
+    修改片段       修改中间的一个片段后重新生成
+token 数取自桩服务器累计的 prompt / completion token（按字符计）。
+
+用法:
+    python benchmarks/benchMeetingMinutes.py --hours 2 --concurrency 8
+    python benchmarks/benchMeetingMinutes.py --hours 4 --context-limit 65536
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.benchRetrieval import synthesize_meeting
+from benchmarks.stubOpenAIServer import StubConfig, start_stub_server, stub_stats
+from utilities.batchValidation import estimate_tokens
+
+
+def minutes_responder(map_reply_tokens: int, reply_tokens: int):
+    """分段纪要请求回复较短的纪要 JSON，合并与整篇纪要请求回复较长的纪要 JSON，其余请求回复 [Valid]"""
+    def build(length: int) -> str:
+        minutes = {"summary": [], "decisions": [{"text": "第三季度预算按新方案执行", "timestamp": "00:12:30"}],
+                   "action_items": [{"task": "整理上线检查清单", "owner": "说话人2", "due": "下周五", "timestamp": "00:15:00"}]}
+        while len(json.dumps(minutes, ensure_ascii=False)) < length:
+            minutes["summary"].append("讨论了预算调整、招聘计划和上线时间，负责人会在下周同步进展")
+        return json.dumps(minutes, ensure_ascii=False)
+
+    map_reply, reply = build(map_reply_tokens), build(reply_tokens)
+
+    def respond(body: dict) -> str:
+        system = str(body.get("messages", [{}])[0].get("content", ""))
+        if "分段纪要" in system:
+            return reply
+        if "会议转写" in system:
+            # 整篇总结与分段纪要使用同一提示词，按输入长度区分
+            prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+            return reply if len(prompt) > respond.chunk_chars else map_reply
+        return "[Valid]"
+
+    respond.chunk_chars = 0
+    return respond
+
+
+def measure(name: str, func, config):
+    before = stub_stats(config)
+    start = time.perf_counter()
+    error = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = func()
+        except Exception as e:
+            result, error = None, e
+    elapsed = time.perf_counter() - start
+    after = stub_stats(config)
+    calls = after["requests"] - before["requests"]
+    input_tokens = after["prompt_tokens"] - before["prompt_tokens"]
+    output_tokens = after["completion_tokens"] - before["completion_tokens"]
+    line = (f"📊 {name:<24} 耗时={elapsed:7.2f}秒  模型请求={calls:<4} 输入={input_tokens:>9.0f} tokens  "
+            f"输出={output_tokens:>7.0f} tokens")
+    if error is not None:
+        line += f"  ❌ 失败: {str(error)[:80]}"
+    elif getattr(result, "metrics", None):
+        m = result.metrics
+        line += (f"  分块={m['chunks']} 层数={m['levels']} 缓存命中 map={m['map_cache_hits']}/{m['chunks']} "
+                 f"reduce={m['reduce_cache_hits']}")
+    print(line)
+    return {"seconds": elapsed, "calls": calls, "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "failed": error is not None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="会议纪要 map-reduce 基准")
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--segment-seconds", type=float, default=6.0)
+    parser.add_argument("--chunk-tokens", type=int, default=2000)
+    parser.add_argument("--fan-in", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--append-fraction", type=float, default=0.1, help="追加音频场景中后来追加的比例")
+    parser.add_argument("--latency", type=float, default=0.2, help="桩服务器首 token 前的固定延迟（秒）")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=4000.0)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="桩服务器的输出速度")
+    parser.add_argument("--map-reply-tokens", type=int, default=150)
+    parser.add_argument("--reply-tokens", type=int, default=400)
+    parser.add_argument("--context-limit", type=int, default=0, help="桩服务器的输入 token 上限（0 表示不限制）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.environ["METRICS_CONSOLE"] = "0"
+    responder = minutes_responder(args.map_reply_tokens, args.reply_tokens)
+    config = StubConfig(latency=args.latency, token_interval=1 / args.tokens_per_second, chunk_size=4,
+                        responder=responder, prefill_tokens_per_second=args.prefill_tokens_per_second,
+                        context_limit=args.context_limit)
+    server, base_url = start_stub_server(config)
+    os.environ["SILICONFLOW_BASE_URL"] = base_url
+    os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    from utilities.meetingMinutes import MAP_PROMPT, MinutesCache, MinutesGenerator, call_minutes_model, _segment_line
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    rng = random.Random(args.seed)
+    segments, _ = synthesize_meeting(rng, 0, args.hours, args.segment_seconds, facts=0)
+    transcript = "\n".join(_segment_line(segment) for segment in segments)
+    responder.chunk_chars = args.chunk_tokens * 4   # 比任何分块都长的输入视为整篇总结
+    print(f"🎧 {args.hours:g} 小时会议，{len(segments)} 个片段，整篇转写≈{estimate_tokens(transcript)} tokens")
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            def generator(concurrency: int, name: str) -> MinutesGenerator:
+                return MinutesGenerator(cache=MinutesCache(str(Path(workdir) / f"{name}.sqlite3")),
+                                        max_workers=concurrency, chunk_tokens=args.chunk_tokens, fan_in=args.fan_in)
+
+            naive = measure("单次整篇", lambda: call_minutes_model(MAP_PROMPT, transcript), config)
+            measure("map-reduce 冷缓存 串行", lambda: generator(1, "serial").generate(segments), config)
+            cold = measure(f"map-reduce 冷缓存 并发{args.concurrency}",
+                           lambda: generator(args.concurrency, "cold").generate(segments), config)
+
+            incremental = generator(args.concurrency, "incremental")
+            prefix = segments[:int(len(segments) * (1 - args.append_fraction))]
+            measure(f"前 {1 - args.append_fraction:.0%} 转写", lambda: incremental.generate(prefix), config)
+            appended = measure("追加音频后", lambda: incremental.generate(segments), config)
+
+            edited_segments = [dict(segment) for segment in segments]
+            middle = len(edited_segments) // 2
+            edited_segments[middle]["text"] += "（更正：预算由说话人3负责）"
+            edited = measure("修改中间一个片段后", lambda: incremental.generate(edited_segments), config)
+    finally:
+        server.shutdown()
+
+    if not naive["failed"]:
+        print(f"⚖️ 冷缓存 map-reduce / 单次整篇: 耗时 {cold['seconds'] / naive['seconds']:.2f}x，"
+              f"输入 token {cold['input_tokens'] / naive['input_tokens']:.2f}x，"
+              f"输出 token {cold['output_tokens'] / naive['output_tokens']:.2f}x")
+    else:
+        print("⚖️ 单次整篇超出上下文上限，只能使用 map-reduce")
+    reference, reference_name = (naive, "单次整篇重跑") if not naive["failed"] else (cold, "冷缓存重跑")
+    for name, result in (("追加音频", appended), ("修改片段", edited)):
+        print(f"♻️ {name}后重新生成: 耗时 {result['seconds']:.2f}秒（{reference_name} {reference['seconds']:.2f}秒），"
+              f"输入 token 为{reference_name}的 {result['input_tokens'] / reference['input_tokens']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
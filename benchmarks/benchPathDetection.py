@@ -0,0 +1,149 @@
+"""文件路径检测微基准：原实现（每次编译三个正则、最多扫描三遍、逐个 os.path.exists）vs 预编译单次扫描
+
+合成的输入是大段会议纪要式文本，其中夹杂大量类似路径的片段（Windows/相对路径/文件名，部分真实存在）。
+计时前先在只含 meeting.mp3 的临时目录中核对回退规则：完整路径都不存在时采用简单文件名，结果须与原实现一致。
+
+用法:
+    python benchmarks/benchPathDetection.py --kb 200 400 --paths 2000 --repeat 20
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import tempfile
+import time
+
+from utilities.processFiles import _stat_cache, detect_and_process_file_paths
+
+
+def legacy_detect_and_process_file_paths(user_input: str) -> list:
+    """基线：改造前的实现（去掉了打印）"""
+    file_paths = []
+    processed_paths = set()
+    audio_extensions = r'(?:mp3|wav|flac|aac|ogg|m4a|wma|opus|mp4|avi|mov|mkv|webm|3gp)'
+    windows_pattern = rf'[A-Za-z]:[\\\\/](?:[^\\\\/\s\n\r]+[\\\\/])*[^\\\\/\s\n\r]+\.{audio_extensions}'
+    relative_pattern = rf'\.{{1,2}}[\\\\/](?:[^\\\\/\s\n\r]+[\\\\/])*[^\\\\/\s\n\r]+\.{audio_extensions}'
+    filename_pattern = rf'\b[a-zA-Z0-9_\u4e00-\u9fff\-\(\)（）]+\.{audio_extensions}\b'
+    for pattern in (windows_pattern, relative_pattern):
+        for match in re.findall(pattern, user_input, re.IGNORECASE):
+            if match in processed_paths:
+                continue
+            processed_paths.add(match)
+            if os.path.exists(match):
+                file_paths.append(match)
+    if not file_paths:
+        for match in re.findall(filename_pattern, user_input, re.IGNORECASE):
+            if match in processed_paths:
+                continue
+            processed_paths.add(match)
+            if os.path.exists(match):
+                file_paths.append(match)
+    return file_paths
+
+
+def synthesize_input(kb: int, path_count: int, existing_dir: str, rng: random.Random) -> str:
+    """生成约 kb KB 的文本，随机插入 path_count 个路径样式的片段"""
+    filler = "今天的会议讨论了第三季度的预算安排，张三负责整理数据表格，下周五之前完成。"
+    tokens = []
+    for i in range(path_count):
+        kind = rng.random()
+        extension = rng.choice(["mp3", "wav", "m4a", "pdf", "txt"])
+        if kind < 0.3:
+            tokens.append(f"./{os.path.relpath(existing_dir)}/会议录音_{i % 50}.{extension}")
+        elif kind < 0.5:
+            tokens.append(f"D:\\recordings\\2025\\meeting_{i}.{extension}")
+        elif kind < 0.8:
+            tokens.append(f"meeting_{i}.{extension}")
+        else:
+            tokens.append(f"版本v{i}.{rng.randint(0, 9)}")
+    text, size, target = [], 0, kb * 1024
+    while size < target:
+        piece = filler if not tokens or rng.random() < 0.5 else f" {tokens.pop()} "
+        text.append(piece)
+        size += len(piece.encode("utf-8"))
+    return "".join(text)
+
+
+FALLBACK_CASES = [
+    "./missing.mp3 and meeting.mp3",          # 完整路径不存在 → 回退到文件名
+    "./meeting.mp3 and other.mp3",            # 完整路径存在 → 不再看文件名
+    "D:\\none\\a.wav ./missing.mp3 meeting.mp3 Meeting.MP3",
+    "meeting.mp3",
+    "./missing.mp3",
+]
+
+
+def check_fallback_cases() -> None:
+    """在只含 meeting.mp3 的目录中比较新旧实现对完整路径 / 文件名回退的处理"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        Path(workdir, "meeting.mp3").touch()
+        Path(workdir, "folder.mp3").mkdir()
+        os.chdir(workdir)
+        try:
+            for text in FALLBACK_CASES:
+                _stat_cache.clear()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = detect_and_process_file_paths(text)
+                expected = list(dict.fromkeys(legacy_detect_and_process_file_paths(text)))
+                assert result == expected, f"回退结果与原实现不一致: {text!r} -> {result}，原实现 {expected}"
+            # 与扩展名同名的目录不算文件（原实现用 os.path.exists 会误判）
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = detect_and_process_file_paths("./folder.mp3 ./folder.mp3/../meeting.mp3 x/folder.mp3")
+            assert result == ["./folder.mp3/../meeting.mp3"], f"目录被当成了文件: {result}"
+        finally:
+            os.chdir(cwd)
+            _stat_cache.clear()
+    print(f"✅ 文件名回退规则与原实现一致（{len(FALLBACK_CASES)} 个用例），目录不会被当成文件")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文件路径检测微基准")
+    parser.add_argument("--kb", type=int, nargs="+", default=[50, 200, 400])
+    parser.add_argument("--paths", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    check_fallback_cases()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory(dir=".") as existing_dir:
+        for i in range(50):
+            for extension in ("mp3", "pdf"):
+                Path(existing_dir, f"会议录音_{i}.{extension}").touch()
+
+        for kb in args.kb:
+            text = synthesize_input(kb, args.paths, existing_dir, rng)
+            legacy_result = legacy_detect_and_process_file_paths(text)
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                legacy_detect_and_process_file_paths(text)
+            legacy = (time.perf_counter() - start) / args.repeat
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                _stat_cache.clear()
+                start = time.perf_counter()
+                result = detect_and_process_file_paths(text)
+                cold = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    detect_and_process_file_paths(text)
+                warm = (time.perf_counter() - start) / args.repeat
+
+            assert sorted(result) == sorted(set(legacy_result)), "检测结果与原实现不一致"
+            print(f"📄 {kb}KB 输入，{len(result)} 个存在的文件")
+            print(f"   原实现={legacy * 1000:8.2f}ms  新实现(冷缓存)={cold * 1000:8.2f}ms  "
+                  f"新实现(热缓存)={warm * 1000:8.2f}ms  加速比={legacy / warm:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
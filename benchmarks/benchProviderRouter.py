@@ -0,0 +1,142 @@
+"""模型路由基准：多个本地桩端点（快但不稳定 / 稳定 / 慢）下比较单端点、路由与对冲的成功率与延迟
+
+三个桩端点：
+    flaky   首 token 延迟 --flaky-latency，按 --flaky-error-rate 返回 500
+    steady  首 token 延迟 --steady-latency
+    slow    首 token 延迟 --slow-latency
+依次运行：
+    1. 单端点（改造前的行为：只有 flaky，不重试）
+    2. 路由（三个端点，失败换端点重试，熔断）
+    3. 路由 + 对冲（--hedge-after 秒未完成时向次优端点再发一个请求）
+第 2、3 阶段运行到一半时把 steady 的延迟调成 --degraded-latency，观察路由把流量移走。
+
+用法:
+    python benchmarks/benchProviderRouter.py --calls 300 --concurrency 8
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import os
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+MODEL_NAME = "Pro/deepseek-ai/DeepSeek-V3"
+MESSAGES = [SystemMessage(content="你是一位专业的输入验证专家"), HumanMessage(content="用户输入：帮我生成一个表格")]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run_phase(name: str, router, calls: int, concurrency: int, hedge_after, degrade=None):
+    from utilities import providerRouter
+    from utilities.metrics import CallbackSink, get_metrics
+    from utilities.modelRelated import ainvoke_model
+
+    providerRouter._provider_router = router
+    spans = []
+    sink = get_metrics().add_sink(CallbackSink(spans.append))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], collections.Counter()
+
+    async def one(i):
+        async with semaphore:
+            if degrade is not None and i == calls // 2:
+                degrade()
+            start = time.perf_counter()
+            try:
+                await ainvoke_model(MODEL_NAME, MESSAGES, hedge_after=hedge_after)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    try:
+        await asyncio.gather(*[one(i) for i in range(calls)])
+    finally:
+        get_metrics().remove_sink(sink)
+
+    halves = [collections.Counter(), collections.Counter()]
+    llm_spans = [span for span in spans if span["kind"] == "llm"]
+    for i, span in enumerate(llm_spans):
+        if span["status"] == "ok":
+            halves[i * 2 // max(1, len(llm_spans))][span.get("provider")] += 1
+    print(f"📊 {name}")
+    print(f"   成功率={len(latencies) / calls:6.1%}  p50={_percentile(latencies, 0.5) * 1000:7.1f}ms  "
+          f"p99={_percentile(latencies, 0.99) * 1000:7.1f}ms  失败={dict(failures)}")
+    print(f"   端点分布 前半={dict(halves[0])}  后半={dict(halves[1])}")
+    print(f"   端点状态 {dict((n, s['state']) for n, s in router.snapshot().items())}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模型路由基准")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--flaky-latency", type=float, default=0.05)
+    parser.add_argument("--flaky-error-rate", type=float, default=0.3)
+    parser.add_argument("--steady-latency", type=float, default=0.12)
+    parser.add_argument("--slow-latency", type=float, default=0.5)
+    parser.add_argument("--degraded-latency", type=float, default=0.8, help="运行到一半时 steady 端点的新延迟")
+    parser.add_argument("--hedge-after", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    os.environ["METRICS_CONSOLE"] = "0"
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", "64")
+    from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+    from utilities.modelRelated import set_quiet_mode
+    from utilities.providerRouter import Endpoint, ProviderRouter
+
+    set_quiet_mode()
+    configs = {
+        "flaky": StubConfig(latency=args.flaky_latency, error_rate=args.flaky_error_rate),
+        "steady": StubConfig(latency=args.steady_latency),
+        "slow": StubConfig(latency=args.slow_latency),
+    }
+    servers, endpoints = [], {}
+    for name, config in configs.items():
+        server, base_url = start_stub_server(config)
+        servers.append(server)
+        endpoints[name] = Endpoint(name=name, base_url=base_url, model=MODEL_NAME, api_key="stub")
+
+    def degrade():
+        configs["steady"].latency = args.degraded_latency
+
+    def restore():
+        configs["steady"].latency = args.steady_latency
+
+    all_endpoints = [endpoints["flaky"], endpoints["steady"], endpoints["slow"]]
+
+    async def run_all():
+        # 异步连接池绑定事件循环，三个阶段必须在同一个事件循环中运行
+        await run_phase("单端点（仅 flaky，不重试）", ProviderRouter({MODEL_NAME: [endpoints["flaky"]]}, max_attempts=1),
+                        args.calls, args.concurrency, None)
+        await run_phase("路由（重试 + 熔断）", ProviderRouter({MODEL_NAME: all_endpoints}, cooldown=2.0),
+                        args.calls, args.concurrency, None, degrade)
+        restore()
+        await run_phase(f"路由 + 对冲（{args.hedge_after}s）", ProviderRouter({MODEL_NAME: all_endpoints}, cooldown=2.0),
+                        args.calls, args.concurrency, args.hedge_after, degrade)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            asyncio.run(run_all())
+    finally:
+        for server in servers:
+            server.shutdown()
+    # 重试与熔断日志只统计条数，结果行原样输出
+    lines = log.getvalue().splitlines()
+    print("\n".join(line for line in lines if not line.startswith(("🔁", "⚡", "✅"))))
+    print(f"   重试日志={sum(line.startswith('🔁') for line in lines)} 条  熔断={sum(line.startswith('⚡') for line in lines)} 次")
+    print(f"   注入错误数: flaky={configs['flaky'].errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""检索索引基准：多场会议语料上的索引吞吐量、检索延迟、召回率与提示词缩减
+
+合成 --meetings 场会议，每场 --hours 小时、平均每 --segment-seconds 秒一个转写片段（中英混合，带说话人），
+每场会议中埋入若干条只出现一次的“关键事实”（例如某个项目的上线日期），用改写过的问题检索：
+    索引吞吐     片段逐条流式加入索引（与转写时相同）的速度
+    检索延迟     每个问题的 search 耗时，报告 p50 / p95
+    命中率       关键事实所在片段出现在 top-k 中的比例
+    提示词缩减   build_context 的 token 数 vs 把整场会议 / 全部会议的转写放进提示词
+对 BM25、BM25+稠密向量（暴力内积）、BM25+稠密向量（IVF）分别测量；没有安装向量模型时稠密部分使用哈希向量。
+
+用法:
+    python benchmarks/benchRetrieval.py --meetings 10 --hours 2
+    RETRIEVAL_EMBEDDING_MODEL=BAAI/bge-small-zh-v1.5 python benchmarks/benchRetrieval.py --meetings 5
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+from utilities.audioTranscription import TranscriptSegment, format_transcript
+from utilities.batchValidation import estimate_tokens
+from utilities.retrievalIndex import HashingEmbedder, RetrievalIndex, SentenceTransformerEmbedder, build_context
+
+TOPICS = ["预算", "招聘", "上线", "客户反馈", "性能优化", "数据迁移", "风险评估", "市场推广", "供应商", "合规审查"]
+PHRASES = ["我们需要再确认一下", "这个问题上周已经讨论过", "下个季度的重点是", "大家对这个方案有什么意见",
+           "我觉得可以先做一个试点", "资源方面还有缺口", "这部分由我来跟进", "时间上可能有点紧张",
+           "let's sync offline", "the dashboard shows", "we should double check the numbers", "action item for next week"]
+SPEAKERS = ["说话人1", "说话人2", "说话人3", "说话人4"]
+
+
+def synthesize_meeting(rng: random.Random, meeting: int, hours: float, segment_seconds: float, facts: int):
+    """返回 (片段列表, [(问题, 关键片段下标)])"""
+    segments, position = [], 0.0
+    while position < hours * 3600:
+        length = rng.uniform(0.5, 1.5) * segment_seconds
+        text = "，".join(rng.choice(PHRASES) for _ in range(2)) + f"，关于{rng.choice(TOPICS)}" + rng.choice(PHRASES)
+        segments.append({"start": position, "end": position + length, "text": text, "speaker": rng.choice(SPEAKERS)})
+        position += length
+    questions = []
+    for fact in range(facts):
+        index = rng.randrange(len(segments))
+        project = f"星河{meeting}{fact}"
+        month, day = rng.randint(1, 12), rng.randint(1, 28)
+        segments[index]["text"] = f"{project}项目的上线日期定在{month}月{day}日，负责人是{segments[index]['speaker']}"
+        questions.append((f"{project}什么时候上线？", index))
+    return segments, questions
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(name: str, index: RetrievalIndex, meetings, k: int, repeat: int):
+    start = time.perf_counter()
+    for meeting, (segments, _) in enumerate(meetings):
+        for segment in segments:
+            index.add_transcript_segment(segment, f"meeting-{meeting}.mp3")
+    index_seconds = time.perf_counter() - start
+    if index.dense is not None:   # 向量在首次查询时批量补算，单独计时
+        start = time.perf_counter()
+        index.search("预热", k)
+        embed_seconds = time.perf_counter() - start
+    else:
+        embed_seconds = 0.0
+
+    latencies, hits, context_tokens = [], 0, []
+    total = 0
+    for meeting, (_, questions) in enumerate(meetings):
+        for question, target in questions:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results = index.search(question, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            source = f"meeting-{meeting}.mp3"
+            segment = meetings[meeting][0][target]
+            hits += any(hit.passage.source == source and hit.passage.start == segment["start"] for hit in results)
+            context_tokens.append(estimate_tokens(build_context(results)))
+            total += 1
+    print(f"📊 {name:<22} 索引={len(index) / index_seconds:9.0f} 片段/秒"
+          + (f"（向量补算 {embed_seconds:.2f}秒）" if embed_seconds else "")
+          + f"  检索 p50={percentile(latencies, 0.5):6.2f}毫秒 p95={percentile(latencies, 0.95):6.2f}毫秒"
+          f"  命中率@{k}={hits / total:6.1%}  上下文≈{statistics.mean(context_tokens):.0f} tokens")
+    return statistics.mean(context_tokens)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检索索引基准")
+    parser.add_argument("--meetings", type=int, default=10)
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--segment-seconds", type=float, default=6.0)
+    parser.add_argument("--facts", type=int, default=10, help="每场会议埋入的关键事实数")
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    meetings = [synthesize_meeting(rng, m, args.hours, args.segment_seconds, args.facts) for m in range(args.meetings)]
+    segment_count = sum(len(segments) for segments, _ in meetings)
+    transcript_tokens = [estimate_tokens(format_transcript([TranscriptSegment(**s) for s in segments]))
+                         for segments, _ in meetings]
+    print(f"🎧 {args.meetings} 场会议，共 {segment_count} 个片段，整场转写平均 {statistics.mean(transcript_tokens):.0f} tokens，"
+          f"全部会议 {sum(transcript_tokens)} tokens")
+
+    model_name = os.getenv("RETRIEVAL_EMBEDDING_MODEL", "")
+    embedder_factory = (lambda: SentenceTransformerEmbedder(model_name)) if model_name and model_name != "hashing" \
+        else HashingEmbedder
+    context = run("BM25", RetrievalIndex(), meetings, args.top_k, args.repeat)
+    brute = RetrievalIndex(embedder_factory())
+    brute.dense.ivf_threshold = segment_count + 1
+    run("BM25+稠密（暴力）", brute, meetings, args.top_k, args.repeat)
+    ivf = RetrievalIndex(embedder_factory())
+    ivf.dense.ivf_threshold = min(ivf.dense.ivf_threshold, max(1, segment_count // 2))
+    run("BM25+稠密（IVF）", ivf, meetings, args.top_k, args.repeat)
+
+    print(f"✂️ 提示词缩减: 每轮上下文≈{context:.0f} tokens，相比整场会议 {statistics.mean(transcript_tokens) / context:.0f}x，"
+          f"相比全部会议 {sum(transcript_tokens) / context:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
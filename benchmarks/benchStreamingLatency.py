@@ -0,0 +1,129 @@
+"""流式调用的首 token 延迟、token 间隔与输出速度基准，用于比较不同模型的交互体验
+
+默认对本地桩服务器调用（--latency 为首 token 前的延迟，--token-interval 为相邻 token 的间隔）；
+传入 --base-url 时直接调用该 OpenAI 兼容接口（密钥取 SILICONFLOW_API_KEY），可对多个 SiliconFlow 模型逐一测量。
+另外给出每个流式块在客户端的处理开销：旧实现（字符串 += 拼接）与新实现（span 统计 + 列表 join）。
+
+用法:
+    python benchmarks/benchStreamingLatency.py --calls 20 --latency 0.3 --token-interval 0.02
+    python benchmarks/benchStreamingLatency.py --base-url https://api.siliconflow.cn/v1 \
+        --models Pro/deepseek-ai/DeepSeek-V3 Qwen/Qwen3-32B --calls 10
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import os
+import time
+
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage
+
+
+QUESTION = "会议中提到的第三季度预算由谁负责？请用两三句话回答，并给出截止日期。"
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def measure_model(model: str, calls: int):
+    from utilities.metrics import CallbackSink, get_metrics
+    from utilities.modelRelated import invoke_model
+
+    spans = []
+    sink = get_metrics().add_sink(CallbackSink(spans.append))
+    tokens_seen = []
+    try:
+        for _ in range(calls):
+            invoke_model(model, [SystemMessage(content="你是会议助手。"), HumanMessage(content=QUESTION)],
+                         on_token=tokens_seen.append)
+    finally:
+        get_metrics().remove_sink(sink)
+
+    spans = [span for span in spans if span["kind"] == "llm" and span["status"] == "ok"]
+    ttft = [span["ttft"] for span in spans if "ttft" in span]
+    inter_token = [span["inter_token_p50"] for span in spans if "inter_token_p50" in span]
+    inter_token_p99 = [span["inter_token_p99"] for span in spans if "inter_token_p99" in span]
+    speed = [span["tokens_per_second"] for span in spans if "tokens_per_second" in span]
+    latency = [span["duration"] for span in spans]
+    print(f"🤖 {model}（{len(spans)}/{calls} 次成功，回调收到 {len(tokens_seen)} 个块）")
+    print(f"   首 token   p50={_percentile(ttft, 0.5) * 1000:8.1f}ms  p99={_percentile(ttft, 0.99) * 1000:8.1f}ms")
+    print(f"   token 间隔 p50={_percentile(inter_token, 0.5) * 1000:8.1f}ms  "
+          f"p99(每次调用 p99 的中位数)={_percentile(inter_token_p99, 0.5) * 1000:8.1f}ms")
+    print(f"   输出速度   p50={_percentile(speed, 0.5):8.1f} token/秒")
+    print(f"   总耗时     p50={_percentile(latency, 0.5) * 1000:8.1f}ms  p99={_percentile(latency, 0.99) * 1000:8.1f}ms")
+
+
+def measure_chunk_overhead(chunk_count: int):
+    """客户端处理每个流式块的开销（不含网络），安静模式下比较"""
+    from utilities.metrics import MetricsRegistry
+    from utilities.modelRelated import _consume_stream_chunk
+
+    chunks = [AIMessageChunk(content="会议纪要要点，") for _ in range(chunk_count)]
+
+    start = time.perf_counter()
+    full_response = ""
+    total_tokens_used = {"input": 0, "output": 0, "total": 0}
+    for chunk in chunks:
+        chunk_content = chunk.content
+        if hasattr(chunk, "usage_metadata") and chunk.usage_metadata:
+            total_tokens_used["total"] = chunk.usage_metadata.get("total_tokens", 0)
+        full_response += chunk_content
+    legacy = (time.perf_counter() - start) / chunk_count
+
+    registry = MetricsRegistry()
+    start = time.perf_counter()
+    with registry.span("llm", "overhead", provider="local") as span:
+        parts = []
+        for chunk in chunks:
+            chunk_content = _consume_stream_chunk(chunk, span)
+            if chunk_content:
+                parts.append(chunk_content)
+        response = "".join(parts)
+    current = (time.perf_counter() - start) / chunk_count
+    assert response == full_response
+    print(f"🧮 每块处理开销（{chunk_count} 块）: 旧实现={legacy * 1e6:6.2f}µs  新实现(含 token 间隔统计)={current * 1e6:6.2f}µs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="流式调用延迟基准")
+    parser.add_argument("--models", nargs="+", default=["Pro/deepseek-ai/DeepSeek-V3"])
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--base-url", help="直接调用该接口，不启动桩服务器")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务器首 token 前的延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="桩服务器相邻 token 的间隔（秒）")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="桩服务器回复的 token（字符）数")
+    parser.add_argument("--chunks", type=int, default=100000, help="每块处理开销测量使用的块数")
+    args = parser.parse_args(argv)
+
+    os.environ["METRICS_CONSOLE"] = "0"
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    server = None
+    if args.base_url:
+        os.environ["SILICONFLOW_BASE_URL"] = args.base_url
+    else:
+        from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+
+        reply = ("第三季度预算由张三负责，需在下周五之前完成。" * 10)[:args.reply_tokens]
+        server, base_url = start_stub_server(StubConfig(latency=args.latency, reply=reply,
+                                                        token_interval=args.token_interval))
+        os.environ["SILICONFLOW_BASE_URL"] = base_url
+        os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    try:
+        for model in args.models:
+            measure_model(model, args.calls)
+    finally:
+        if server is not None:
+            server.shutdown()
+    measure_chunk_overhead(args.chunks)
+
+
+if __name__ == "__main__":
+    main()
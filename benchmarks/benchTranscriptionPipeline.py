@@ -0,0 +1,84 @@
+"""长音频分块并发转写基准：用合成后端证明墙钟时间随并发数而不是音频时长增长
+
+合成后端按分块时长 × --backend-rtf 休眠来模拟远程转写接口的耗时。关闭 VAD，只衡量分块与并发（VAD 的收益见 benchVAD.py）。
+
+用法:
+    python benchmarks/benchTranscriptionPipeline.py --minutes 120 --workers 1 2 4 8 16
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import time
+
+import numpy as np
+
+from utilities.audioTranscription import TranscriptionBackend, plan_chunks, transcribe_samples
+
+
+class SyntheticBackend(TranscriptionBackend):
+    """模拟转写后端：每个分块返回一段文本，耗时与分块时长成正比"""
+
+    name = "synthetic"
+    model = "synthetic"
+
+    def __init__(self, rtf: float):
+        self.rtf = rtf
+
+    def transcribe(self, samples, sample_rate):
+        duration = len(samples) / sample_rate
+        time.sleep(duration * self.rtf)
+        return [{"start": 0.0, "end": duration, "text": f"合成片段 {duration:.1f}s"}]
+
+
+def synthesize_meeting(minutes: float, sample_rate: int, seed: int = 0) -> np.ndarray:
+    """生成“说话-停顿”交替的合成音频：噪声段模拟语音，低幅段模拟静音"""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * sample_rate)
+    samples = np.empty(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        speech = int(rng.uniform(5, 20) * sample_rate)
+        pause = int(rng.uniform(0.3, 2.0) * sample_rate)
+        end = min(position + speech, total)
+        samples[position:end] = rng.standard_normal(end - position, dtype=np.float32) * 0.3
+        position = end
+        end = min(position + pause, total)
+        samples[position:end] = rng.standard_normal(end - position, dtype=np.float32) * 0.001
+        position = end
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="长音频并发转写基准")
+    parser.add_argument("--minutes", type=float, default=120)
+    parser.add_argument("--sample-rate", type=int, default=8000, help="合成音频采样率（降低以节省内存）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--backend-rtf", type=float, default=0.002, help="合成后端的实时率（耗时/音频时长）")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    samples = synthesize_meeting(args.minutes, args.sample_rate)
+    print(f"🎧 合成 {args.minutes:.0f} 分钟音频，耗时 {time.perf_counter() - start:.2f}秒")
+
+    start = time.perf_counter()
+    chunk_count = len(plan_chunks(samples, args.sample_rate, max_chunk_seconds=args.chunk_seconds))
+    print(f"✂️ 静音切分为 {chunk_count} 个分块，耗时 {time.perf_counter() - start:.2f}秒")
+
+    backend = SyntheticBackend(args.backend_rtf)
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        segments = transcribe_samples(samples, backend, args.sample_rate, max_workers=workers, vad=False,
+                                      max_chunk_seconds=args.chunk_seconds)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"   workers={workers:<3} 墙钟={elapsed:7.2f}秒  加速比={baseline / elapsed:5.2f}x  片段={len(segments)}")
+
+
+if __name__ == "__main__":
+    main()
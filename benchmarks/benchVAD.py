@@ -0,0 +1,149 @@
+"""VAD 预过滤基准：合成不同静音占比的会议录音，比较转写前开启与关闭 VAD 的分块数与端到端耗时
+
+合成会议由谐波“语音”（有音节起伏）与带底噪的停顿交替组成，停顿时长按 --silence 指定的静音占比生成，
+并夹杂短促的敲击声。合成后端每次请求固定耗时 --request-overhead 秒，再按音频时长 × --backend-rtf 休眠，
+模拟远程转写接口的耗时与计费。报告：
+    跳过比例     VAD 判为静音、不送入后端的音频占比
+    语音召回     真实语音被 VAD 语音段覆盖的比例（应接近 100%，否则会漏转写）
+    分块 / 耗时  关闭与开启 VAD 时送入后端的分块数、音频时长与端到端墙钟时间（含 VAD 本身的耗时）
+另外测量两段几乎没有真正静音的录音：近场说话人连续发言后，远场说话人（幅度 --far-field-gain 倍）连续发言，
+中间没有停顿 / 有 10 秒停顿。低分位数底噪会落在语音里，远场说话人的召回率是检验重点。
+
+用法:
+    python benchmarks/benchVAD.py --minutes 60 --silence 0.2 0.4 0.6 --workers 4
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from utilities.audioTranscription import TranscriptionBackend, transcribe_samples
+from utilities.voiceActivity import detect_speech
+
+
+class SyntheticBackend(TranscriptionBackend):
+    """模拟转写后端：固定的请求开销 + 与分块时长成正比的耗时，并统计送入的音频总时长"""
+
+    name = "synthetic"
+    model = "synthetic"
+
+    def __init__(self, rtf: float, request_overhead: float):
+        self.rtf = rtf
+        self.request_overhead = request_overhead
+        self.audio_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def transcribe(self, samples, sample_rate):
+        duration = len(samples) / sample_rate
+        with self._lock:
+            self.audio_seconds += duration
+        time.sleep(self.request_overhead + duration * self.rtf)
+        return [{"start": 0.0, "end": duration, "text": f"合成片段 {duration:.1f}s"}]
+
+
+def synthesize_meeting(minutes: float, sample_rate: int, silence: float, seed: int = 0):
+    """返回 (采样点, 真实语音掩码)；语音段 2~15 秒，停顿时长按静音占比缩放"""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * sample_rate)
+    samples = rng.normal(0, 0.003, total).astype(np.float32)
+    truth = np.zeros(total, dtype=bool)
+    mean_speech = 8.5
+    mean_pause = mean_speech * silence / max(1e-6, 1 - silence)
+    position = 0
+    while position < total:
+        length = min(int(rng.uniform(2, 15) * sample_rate), total - position)
+        t = np.arange(length, dtype=np.float32) / sample_rate
+        f0 = rng.uniform(100, 250)
+        voice = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 6))
+        syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0.05, None)
+        samples[position:position + length] += (0.1 * rng.uniform(0.5, 1.5) * voice * syllables).astype(np.float32)
+        truth[position:position + length] = True
+        position += length
+        pause = int(rng.exponential(mean_pause) * sample_rate)
+        if pause > sample_rate and position + pause < total:
+            click = position + pause // 2
+            samples[click:click + sample_rate // 50] += 0.3   # 20 毫秒的敲击声
+        position += pause
+    return samples, truth
+
+
+def _steady_voice(rng, seconds: float, sample_rate: int, gain: float) -> np.ndarray:
+    """音节起伏较小、几乎没有停顿的连续发言"""
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    f0 = rng.uniform(100, 250)
+    voice = sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 6))
+    return (0.1 * gain * voice * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))).astype(np.float32)
+
+
+def synthesize_far_field(seconds: float, sample_rate: int, gain: float, pause: float, seed: int = 0):
+    """返回 (采样点, 真实语音掩码)：近场说话人 seconds 秒 + pause 秒底噪 + 远场说话人 seconds 秒"""
+    rng = np.random.default_rng(seed)
+    parts = [_steady_voice(rng, seconds, sample_rate, 1.0), np.zeros(int(pause * sample_rate), dtype=np.float32),
+             _steady_voice(rng, seconds, sample_rate, gain)]
+    truth = np.concatenate([np.full(len(part), i != 1) for i, part in enumerate(parts)])
+    samples = np.concatenate(parts)
+    samples += rng.normal(0, 0.003, len(samples)).astype(np.float32)
+    return samples, truth
+
+
+def coverage(regions, truth):
+    """返回 (语音召回, 跳过比例)"""
+    covered = np.zeros(len(truth), dtype=bool)
+    for region_start, region_end in regions:
+        covered[region_start:region_end] = True
+    return (covered & truth).sum() / max(1, truth.sum()), 1 - covered.mean()
+
+
+def run(samples, sample_rate, args, vad: bool):
+    backend = SyntheticBackend(args.backend_rtf, args.request_overhead)
+    start = time.perf_counter()
+    segments = transcribe_samples(samples, backend, sample_rate, max_workers=args.workers, vad=vad)
+    return time.perf_counter() - start, len({segment.chunk_index for segment in segments}), backend.audio_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VAD 预过滤基准")
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--silence", type=float, nargs="+", default=[0.2, 0.4, 0.6], help="静音占比")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend-rtf", type=float, default=0.005, help="合成后端的实时率（耗时/音频时长）")
+    parser.add_argument("--request-overhead", type=float, default=0.05, help="合成后端每次请求的固定耗时（秒）")
+    parser.add_argument("--far-field-gain", type=float, default=0.2, help="远场说话人相对近场说话人的幅度")
+    args = parser.parse_args(argv)
+
+    for pause in (0.0, 10.0):
+        samples, truth = synthesize_far_field(30.0, args.sample_rate, args.far_field_gain, pause)
+        regions = detect_speech(samples, args.sample_rate)
+        half = len(samples) - int(30.0 * args.sample_rate)
+        far_recall, _ = coverage([(max(start, half) - half, end - half) for start, end in regions if end > half],
+                                 truth[half:])
+        recall, skipped = coverage(regions, truth)
+        print(f"🎙️ 远近两位说话人（远场 {args.far_field_gain:g} 倍，停顿 {pause:g} 秒）  语音段={len(regions)}  "
+              f"跳过={skipped:.1%}  语音召回={recall:.2%}  远场说话人召回={far_recall:.2%}")
+
+    for silence in args.silence:
+        samples, truth = synthesize_meeting(args.minutes, args.sample_rate, silence)
+        start = time.perf_counter()
+        regions = detect_speech(samples, args.sample_rate)
+        vad_seconds = time.perf_counter() - start
+        recall, skipped = coverage(regions, truth)
+
+        plain_wall, plain_chunks, plain_audio = run(samples, args.sample_rate, args, vad=False)
+        vad_wall, vad_chunks, vad_audio = run(samples, args.sample_rate, args, vad=True)
+        print(f"📊 静音占比(真实)={1 - truth.mean():.1%}  语音段={len(regions)}  跳过={skipped:.1%}  "
+              f"语音召回={recall:.2%}  VAD 耗时={vad_seconds:.2f}秒（实时率 {vad_seconds / (args.minutes * 60):.5f}）")
+        print(f"   关闭 VAD: 分块={plain_chunks:<4} 送转写={plain_audio / 60:6.1f}分钟  墙钟={plain_wall:6.2f}秒")
+        print(f"   开启 VAD: 分块={vad_chunks:<4} 送转写={vad_audio / 60:6.1f}分钟  墙钟={vad_wall:6.2f}秒  "
+              f"端到端加速比={plain_wall / vad_wall:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""音频工作池基准：多文件批处理中 CPU 密集阶段的吞吐量随工作进程数的变化，以及共享内存与 pickle 传递 PCM 的开销
+
+批处理任务：合成 --files 个 WAV（默认 44.1kHz 双声道），每个文件在工作池中执行
+    prepare_audio_file   解码 + 重采样到 16kHz → VAD → 切分
+    diarize_handles      MFCC 特征 + 说话人聚类（只传 PCMHandle）
+对每个工作进程数分别用进程池与线程池运行（每轮使用新的临时 PCM 目录，避免复用上一轮的解码结果），
+报告音频吞吐量（分钟音频/秒）和相对 1 个工作进程的加速比。进程池的加速比上限是可用 CPU 核数，
+线程池受 GIL 限制，用来对照。
+另外比较把一段 PCM 交给子进程的两种方式：pickle 整个数组 vs SharedPCM 只传句柄。
+
+用法:
+    python benchmarks/benchWorkerPool.py --files 8 --minutes 5 --workers 1 2 4
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.benchAudioIO import write_synthetic_wav
+from utilities.audioIO import SharedPCM, attach_pcm
+from utilities.audioTranscription import prepare_audio_file
+from utilities.speakerDiarization import diarize_handles
+from utilities.workerPool import AudioWorkerPool
+
+
+def process_file(path: str) -> float:
+    """一个文件的全部 CPU 密集阶段，返回音频时长（秒）"""
+    prepared = prepare_audio_file(path, vad=True)
+    diarize_handles([prepared.pcm])
+    return prepared.pcm.duration
+
+
+def checksum_array(samples: np.ndarray) -> float:
+    return float(samples[::997].sum())
+
+
+def checksum_handle(handle) -> float:
+    with attach_pcm(handle) as samples:
+        return float(samples[::997].sum())
+
+
+def run_batch(paths, workers: int, kind: str, scratch_root: Path) -> tuple:
+    """返回 (墙钟秒数, 音频总时长秒数, 在途任务峰值, 在途任务上限)"""
+    os.environ["AUDIO_SCRATCH_DIR"] = str(scratch_root / f"{kind}-{workers}")   # 子进程启动时继承
+    in_flight = peak = 0
+    lock = threading.Lock()
+
+    def track(delta: int):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += delta
+            peak = max(peak, in_flight)
+
+    with AudioWorkerPool(max_workers=workers, kind=kind) as pool:
+        pool.submit(os.getpid).result()   # 预先启动工作进程，不计入批处理耗时
+        start = time.perf_counter()
+        futures = []
+        for path in paths:
+            future = pool.submit(process_file, path)   # 在途任务达到上限时阻塞
+            track(1)
+            future.add_done_callback(lambda _: track(-1))
+            futures.append(future)
+        duration = sum(future.result() for future in futures)
+        return time.perf_counter() - start, duration, peak, pool.max_pending
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="音频工作池基准")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--minutes", type=float, default=5.0, help="每个文件的时长")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--kinds", nargs="+", choices=["process", "thread"], default=["process", "thread"])
+    parser.add_argument("--transfer-minutes", type=float, default=60.0, help="传递开销对比使用的 PCM 时长")
+    args = parser.parse_args(argv)
+
+    print(f"🖥️ 可用 CPU 核数: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        paths = []
+        for i in range(args.files):
+            path = workdir / f"meeting-{i}.wav"
+            write_synthetic_wav(path, args.minutes, 44100, 2, seed=i)
+            paths.append(str(path))
+        print(f"🎧 合成 {args.files} 个 {args.minutes:g} 分钟的文件")
+
+        for kind in args.kinds:
+            baseline = None
+            for workers in args.workers:
+                wall, duration, peak, max_pending = run_batch(paths, workers, kind, workdir / "scratch")
+                baseline = baseline or wall
+                print(f"📊 {kind:<7} workers={workers:<2} 墙钟={wall:6.2f}秒  吞吐={duration / 60 / wall:6.2f} 分钟音频/秒  "
+                      f"加速比={baseline / wall:4.2f}x  在途任务峰值={peak}（上限 {max_pending}）")
+
+        samples = np.random.default_rng(0).standard_normal(int(args.transfer_minutes * 60 * 16000), dtype=np.float32)
+        with AudioWorkerPool(max_workers=1, kind="process") as pool:
+            pool.submit(os.getpid).result()
+            start = time.perf_counter()
+            pool.submit(checksum_array, samples).result()
+            pickled = time.perf_counter() - start
+            start = time.perf_counter()
+            with SharedPCM(samples) as shared:
+                copied = time.perf_counter() - start
+                start = time.perf_counter()
+                pool.submit(checksum_handle, shared.handle).result()
+                handle_seconds = time.perf_counter() - start
+        print(f"📦 向子进程传递 {samples.nbytes / 2**20:.0f}MB PCM: pickle={pickled * 1000:7.1f}毫秒  "
+              f"共享内存={handle_seconds * 1000:7.1f}毫秒（另需一次复制到共享内存 {copied * 1000:.1f}毫秒；"
+              f"临时 PCM 文件的句柄无需复制）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""冷启动检查：用 python -X importtime 测量各入口模块的导入耗时，超出预算或加载了禁止的依赖时以非零状态退出
+
+每个模块在全新的子进程中导入 --runs 次，取中位数：
+    导入耗时     -X importtime 报告的该模块累计耗时（不含解释器启动）
+    进程耗时     子进程从启动到退出的墙钟时间（含解释器启动，即冷启动的实际代价）
+    最重的依赖   累计耗时最高的顶层包
+禁止的依赖与机器无关（例如导入智能体模块不应加载 gradio、pandas、openai），在任何环境下都必须通过；
+耗时预算与机器相关，慢机器上可用 --scale 整体放宽。--json 输出机器可读的结果，便于与历史结果比较。
+
+用法:
+    python benchmarks/checkImportTime.py --runs 5
+    python benchmarks/checkImportTime.py --scale 2 --json
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 只在实际使用时才允许加载的重依赖
+_AGENT_FORBIDDEN = ("gradio", "dotenv", "pandas", "bs4", "chardet", "openai", "langchain_openai", "langgraph.prebuilt")
+_WORKER_FORBIDDEN = _AGENT_FORBIDDEN + ("langgraph", "langchain_core", "httpx")
+
+# 模块 -> (导入耗时预算（毫秒）, 禁止加载的模块)
+BUDGETS = {
+    "Agents": (50, _WORKER_FORBIDDEN + ("numpy",)),
+    "Agents.processUserInputAgent": (2500, _AGENT_FORBIDDEN),
+    "Agents.voice2textAgent": (2500, _AGENT_FORBIDDEN),
+    "utilities.processFiles": (150, _WORKER_FORBIDDEN + ("numpy",)),
+    "utilities.audioTranscription": (600, _WORKER_FORBIDDEN),
+    "utilities.speakerDiarization": (500, _WORKER_FORBIDDEN),
+    "utilities.workerPool": (150, _WORKER_FORBIDDEN + ("numpy",)),
+    "utilities.documentIngestion": (150, _WORKER_FORBIDDEN + ("numpy",)),
+}
+
+
+def measure(module: str) -> dict:
+    """在新进程中导入一次，返回 {"import_ms", "process_ms", "modules": {模块: 累计微秒}}"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            modules[name.strip()] = int(cumulative)
+        except ValueError:   # 表头
+            continue
+    return {"import_ms": modules.get(module, 0) / 1000, "process_ms": process_ms, "modules": modules}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="冷启动导入耗时检查")
+    parser.add_argument("--modules", nargs="+", default=list(BUDGETS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="耗时预算的放大倍数（慢机器）")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report, failures = {}, []
+    for module in args.modules:
+        budget, forbidden = BUDGETS.get(module, (float("inf"), ()))
+        runs = [measure(module) for _ in range(args.runs)]
+        import_ms = statistics.median(run["import_ms"] for run in runs)
+        process_ms = statistics.median(run["process_ms"] for run in runs)
+        loaded = runs[0]["modules"]
+        # 第三方顶层包按最大的累计耗时排序（包的首次导入行即其累计耗时）
+        packages = {}
+        for name, cumulative in loaded.items():
+            top = name.split(".")[0]
+            if top != module.split(".")[0] and top not in sys.stdlib_module_names:
+                packages[top] = max(packages.get(top, 0), cumulative)
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        violations = sorted(name for name in forbidden if name in loaded)
+        over_budget = import_ms > budget * args.scale
+        report[module] = {"import_ms": round(import_ms, 1), "process_ms": round(process_ms, 1),
+                          "budget_ms": budget * args.scale, "forbidden_loaded": violations,
+                          "heaviest": {name: round(us / 1000, 1) for name, us in heaviest}}
+        if violations:
+            failures.append(f"{module} 加载了禁止的依赖: {', '.join(violations)}")
+        if over_budget:
+            failures.append(f"{module} 导入耗时 {import_ms:.0f}毫秒，超出预算 {budget * args.scale:.0f}毫秒")
+        if not args.json:
+            status = "❌" if violations or over_budget else "✅"
+            print(f"{status} {module:<32} 导入={import_ms:7.1f}毫秒（预算 {budget * args.scale:.0f}）  "
+                  f"进程={process_ms:7.1f}毫秒  最重: "
+                  + ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest))
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "runs": args.runs, "modules": report},
+                         ensure_ascii=False, indent=2))
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
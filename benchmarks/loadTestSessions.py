@@ -0,0 +1,121 @@
+"""会话接口负载测试：大量模拟用户在同一个进程中通过 astart / aresume 并发交互
+
+每个模拟用户：astart → 若干轮（思考时间后 aresume）→ 最后一轮输入有效文本结束。
+中间轮次一部分输入会被本地预分类为无效（不调用模型），其余为各用户唯一的文本，需要调用模型验证。
+模型调用指向本地桩服务器（--latency 模拟模型首 token 延迟）。分别报告两类 aresume 的 p50/p99 与总吞吐量；
+需要模型的轮次受 LLM_MAX_CONCURRENCY（--max-concurrency）限制，延迟中包含排队时间。
+桩服务器与被测进程共用 CPU：思考时间过短时测到的是 CPU 饱和后的排队延迟，而不是会话接口本身的开销。
+
+用法:
+    python benchmarks/loadTestSessions.py --users 1000 --turns 3 --think-time 20 --latency 0.2
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def simulate_user(agent, user_id: int, turns: int, think_time: float, invalid_ratio: float,
+                        rng: random.Random, resume_latencies: dict, completed: list):
+    session_id = f"load-{user_id}"
+    step = await agent.astart(session_id)
+    for turn in range(turns):
+        await asyncio.sleep(rng.expovariate(1 / think_time) if think_time else 0)
+        last_turn = turn == turns - 1
+        if not last_turn and rng.random() < invalid_ratio:
+            user_response = "123"
+        else:
+            user_response = f"用户{user_id}第{turn}轮：请把会议纪要整理成表格，字段包括负责人和截止日期"
+        start = time.perf_counter()
+        step = await agent.aresume(session_id, user_response)
+        resume_latencies["本地判定" if user_response == "123" else "调用模型"].append(time.perf_counter() - start)
+        if step["status"] == "completed":
+            completed.append(session_id)
+            return
+
+
+async def run(args):
+    from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+
+    config = StubConfig(latency=args.latency)
+    server, base_url = start_stub_server(config)
+    os.environ["SILICONFLOW_BASE_URL"] = base_url
+    os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    from Agents.processUserInputAgent import get_process_user_input_agent
+    from utilities.metrics import get_metrics
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    agent = get_process_user_input_agent()
+    rng = random.Random(0)
+    resume_latencies, completed = {"本地判定": [], "调用模型": []}, []
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*[
+                simulate_user(agent, i, args.turns, args.think_time, args.invalid_ratio, rng, resume_latencies, completed)
+                for i in range(args.users)
+            ])
+    finally:
+        server.shutdown()
+    elapsed = time.perf_counter() - start
+
+    print(f"👥 {args.users} 个模拟用户，每人最多 {args.turns} 轮，思考时间均值 {args.think_time}s，模型延迟 {args.latency}s")
+    total = sum(len(values) for values in resume_latencies.values())
+    print(f"   完成会话={len(completed)}  resume 次数={total}  模型请求={config.requests}")
+    for name, values in resume_latencies.items():
+        if values:
+            print(f"   aresume（{name}） n={len(values):<6} p50={_percentile(values, 0.5) * 1000:8.1f}ms  "
+                  f"p99={_percentile(values, 0.99) * 1000:8.1f}ms  最大={max(values) * 1000:8.1f}ms")
+    print(f"   总耗时={elapsed:.2f}秒  吞吐量={total / elapsed:.1f} resume/秒")
+    report_latency_breakdown(get_metrics())
+
+
+def report_latency_breakdown(metrics):
+    """按节点与模型调用拆分耗时（来自 utilities.metrics 的直方图，分位数为分桶估算值）"""
+    histograms = metrics.to_json()["histograms"]
+    print("   耗时拆分（直方图估算）:")
+    for name in ("node_latency_seconds", "llm_latency_seconds", "llm_ttft_seconds"):
+        for series in histograms.get(name, []):
+            labels = series["labels"]
+            label = labels.get("node") or labels.get("model")
+            print(f"     {name:<20} {label:<28} n={series['count']:<6} p50={series['p50'] * 1000:8.1f}ms  "
+                  f"p99={series['p99'] * 1000:8.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="会话接口负载测试")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=20.0, help="用户两次输入之间的平均间隔（秒）")
+    parser.add_argument("--invalid-ratio", type=float, default=0.5, help="中间轮次输入无效文本的比例")
+    parser.add_argument("--latency", type=float, default=0.2, help="桩服务器的模型响应延迟（秒）")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="每个模型提供方的最大并发调用数")
+    parser.add_argument("--checkpoint-backend", choices=["sqlite", "memory"], default="sqlite")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHECKPOINT_BACKEND"] = args.checkpoint_backend
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.max_concurrency)
+        os.environ.setdefault("CHECKPOINT_DB_PATH", str(Path(tmp) / "checkpoints.sqlite3"))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+"""会话回放与负载测试：把录制的会话（用户输入与 interrupt 回复）并发回放到 ProcessUserInputAgent / Voice2TextAgent
+
+会话文件为 JSONL，每行一个会话：
+    {"session_id": "s1", "agent": "process_user_input" | "voice2text",
+     "turns": [{"input": "...", "think_time": 1.5, "label": "valid", "expect_prompt": "..."}, ...]}
+先调用 astart 运行到第一个 interrupt，之后每一轮的 input 作为对当前 interrupt 的回复交给 aresume。
+think_time 是上一步返回到本轮输入之间的用户思考时间（按 --time-scale 缩放，默认 0 即不等待），
+label 用于分组统计延迟，expect_prompt 不为空时校验回放时的 interrupt 提示与录制时一致。
+input 中的 {session_dir} 会被替换为会话文件所在目录（合成会话的音频与附件放在那里）。
+
+子命令：
+    record      在命令行中交互运行一个会话（从标准输入读取回复），把输入、提示与思考时间追加到会话文件
+    synthesize  生成一组合成会话，以及 voice2text 会话用到的 WAV 录音与 CSV 附件
+    run         回放：模型与转写请求发往本地桩服务器（默认独立进程，不与被测进程争抢 CPU 和 GIL），
+                同时运行 --concurrency 个会话；所有存储（检查点、缓存、上传文件）都放在临时目录中
+报告（--output 保存为 JSON）：吞吐量、各类轮次与整个会话的延迟分位数、模型请求数与 token 使用量、峰值 RSS、失败会话；
+--baseline 与之前保存的报告比较，任一指标变差超过 --tolerance 时以非零状态退出。
+
+用法:
+    python benchmarks/replaySessions.py synthesize --output /tmp/replay/sessions.jsonl --sessions 40 --voice2text 4
+    python benchmarks/replaySessions.py run /tmp/replay/sessions.jsonl --concurrency 8 --latency 0.2 --output base.json
+    python benchmarks/replaySessions.py run /tmp/replay/sessions.jsonl --concurrency 8 --latency 0.2 --baseline base.json
+    python benchmarks/replaySessions.py record --agent voice2text --output sessions.jsonl
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+ROOT = Path(__file__).resolve().parent.parent
+AGENTS = ("process_user_input", "voice2text")
+
+# 比较报告时的指标：(路径, 越大越好, 噪声下限)。变化量小于噪声下限时不算回归
+_HIGHER_IS_BETTER = [("throughput.sessions_per_second", 0.0), ("throughput.turns_per_second", 0.0)]
+_LOWER_IS_BETTER = [("memory.peak_rss_mb", 5.0), ("memory.peak_worker_rss_mb", 5.0),
+                    ("llm.requests_per_session", 0.0), ("llm.tokens_per_session", 0.0),
+                    ("errors.failed_sessions", 0.0)]
+_LATENCY_FLOOR_MS = 5.0
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值 RSS：优先读 /proc 中的 VmHWM（exec 时重置，不受 fork 时父进程内存的影响）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get_agent(name: str):
+    if name == "voice2text":
+        from Agents.voice2textAgent import get_voice2text_agent
+
+        return get_voice2text_agent()
+    from Agents.processUserInputAgent import get_process_user_input_agent
+
+    return get_process_user_input_agent()
+
+
+# -- 会话文件 -------------------------------------------------------------------
+def load_sessions(path: str) -> list:
+    session_dir = str(Path(path).resolve().parent)
+    sessions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            session = json.loads(line)
+            if session.get("agent") not in AGENTS or not isinstance(session.get("turns"), list):
+                raise ValueError(f"{path}:{number}: 会话需要 agent（{' / '.join(AGENTS)}）与 turns 列表")
+            session.setdefault("session_id", f"session-{number}")
+            for turn in session["turns"]:
+                turn["input"] = str(turn.get("input", "")).replace("{session_dir}", session_dir)
+            sessions.append(session)
+    return sessions
+
+
+def record(args):
+    """交互运行一个会话并把每轮回复追加到会话文件（模型请求发往当前环境配置的端点）"""
+    agent = _get_agent(args.agent)
+    session_id = args.session_id or f"recorded-{int(time.time())}"
+    turns = []
+    step = agent.start(session_id)
+    while step["status"] == "interrupted":
+        print(f"💬 智能体: {step['prompt']}")
+        prompt_shown = time.perf_counter()
+        user_response = input("请输入用户响应: ")
+        turns.append({"input": user_response, "think_time": round(time.perf_counter() - prompt_shown, 2),
+                      "expect_prompt": step["prompt"]})
+        step = agent.resume(session_id, user_response)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"session_id": session_id, "agent": args.agent, "turns": turns}, ensure_ascii=False) + "\n")
+    print(f"💾 已录制 {len(turns)} 轮，追加到 {args.output}")
+
+
+def synthesize(args):
+    from benchmarks.benchAudioIO import write_synthetic_wav
+    from benchmarks.benchDocumentIngestion import write_synthetic_csv
+
+    output = Path(args.output)
+    assets = output.parent / f"{output.stem}_assets"
+    assets.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(args.seed)
+    sessions = []
+    for i in range(args.sessions):
+        turns = [{"input": "123", "think_time": round(rng.expovariate(1 / args.think_time), 2), "label": "invalid"}
+                 for _ in range(rng.randint(0, 2))]
+        turns.append({"input": f"用户{i}：请把会议纪要整理成表格，字段包括负责人和截止日期",
+                      "think_time": round(rng.expovariate(1 / args.think_time), 2), "label": "valid"})
+        sessions.append({"session_id": f"input-{i}", "agent": "process_user_input", "turns": turns})
+    for i in range(args.voice2text):
+        audio = assets / f"meeting-{i}.wav"
+        write_synthetic_wav(audio, args.audio_seconds / 60, 16000, 1, seed=i)
+        upload = f"请整理这次会议 {{session_dir}}/{assets.name}/{audio.name}"
+        if i % 2 == 0:
+            agenda = assets / f"agenda-{i}.csv"
+            write_synthetic_csv(agenda, args.attachment_rows, seed=i)
+            upload += f" {{session_dir}}/{assets.name}/{agenda.name}"
+        turns = [{"input": upload, "think_time": 0, "label": "upload"}]
+        turns += [{"input": question, "think_time": round(rng.expovariate(1 / args.think_time), 2), "label": "question"}
+                  for question in ("预算最后定了多少？", "上线时间谁负责跟进？")]
+        turns.append({"input": "", "think_time": 0, "label": "end"})
+        sessions.append({"session_id": f"meeting-{i}", "agent": "voice2text", "turns": turns})
+    with open(output, "w", encoding="utf-8") as f:
+        for session in sessions:
+            f.write(json.dumps(session, ensure_ascii=False) + "\n")
+    print(f"💾 已生成 {len(sessions)} 个会话（其中 voice2text {args.voice2text} 个）: {output}")
+
+
+# -- 回放 ---------------------------------------------------------------------
+async def replay_session(agent, session: dict, session_id: str, time_scale: float) -> dict:
+    result = {"agent": session["agent"], "turns": [], "error": None, "mismatches": [], "seconds": 0.0}
+    thinking = 0.0
+    start = time.perf_counter()
+    try:
+        step_start = time.perf_counter()
+        step = await agent.astart(session_id)
+        result["turns"].append(("start", time.perf_counter() - step_start))
+        for index, turn in enumerate(session["turns"]):
+            if step["status"] != "interrupted":
+                result["mismatches"].append(f"第 {index} 轮之前会话已结束")
+                break
+            if turn.get("expect_prompt") and step["prompt"] != turn["expect_prompt"]:
+                result["mismatches"].append(f"第 {index} 轮提示不一致: {step['prompt']!r}")
+            think = float(turn.get("think_time") or 0) * time_scale
+            if think:
+                await asyncio.sleep(think)
+                thinking += think
+            step_start = time.perf_counter()
+            step = await agent.aresume(session_id, turn["input"])
+            result["turns"].append((turn.get("label") or f"turn{index}", time.perf_counter() - step_start))
+        else:
+            if step["status"] != "completed":
+                result["mismatches"].append("回放结束后会话仍在等待输入")
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start - thinking   # 不含思考时间
+    return result
+
+
+def _start_stub(args):
+    """启动桩服务器，返回 (base_url, stats 函数, 关闭函数)"""
+    stub_args = ["--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+                 "--chunk-size", str(args.chunk_size), "--stream-mode", args.stream_mode,
+                 "--error-rate", str(args.error_rate), "--error-mode", args.error_mode,
+                 "--hang-seconds", str(args.hang_seconds), "--reply-tokens", str(args.reply_tokens),
+                 "--transcription-latency", str(args.transcription_latency),
+                 "--transcription-rtf", str(args.transcription_rtf), "--seed", str(args.seed)]
+    if args.stub == "inline":
+        from benchmarks.stubOpenAIServer import StubConfig, filler_responder, start_stub_server, stub_stats
+
+        config = StubConfig(latency=args.latency,
+                            token_interval=1 / args.tokens_per_second if args.tokens_per_second else 0.0,
+                            chunk_size=args.chunk_size, stream_mode=args.stream_mode, error_rate=args.error_rate,
+                            error_mode=args.error_mode, hang_seconds=args.hang_seconds, seed=args.seed,
+                            responder=filler_responder(args.reply_tokens, args.seed) if args.reply_tokens else None,
+                            transcription_latency=args.transcription_latency, transcription_rtf=args.transcription_rtf)
+        server, base_url = start_stub_server(config)
+        return base_url, lambda: stub_stats(config), server.shutdown
+
+    process = subprocess.Popen([sys.executable, str(ROOT / "benchmarks" / "stubOpenAIServer.py"), "--port", "0", *stub_args],
+                               stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip().split(": ", 1)[-1]
+    stats_url = base_url[:-len("/v1")] + "/stats"
+
+    def stats():
+        with urllib.request.urlopen(stats_url, timeout=10) as response:
+            return json.load(response)
+
+    def stop():
+        process.terminate()
+        process.wait()
+
+    return base_url, stats, stop
+
+
+def _configure_environment(args, workdir: Path, base_url: str):
+    """在导入智能体之前设置环境变量；存储路径全部指向临时目录，每次回放都从冷缓存开始"""
+    os.environ.update({
+        "SILICONFLOW_BASE_URL": base_url, "OPENAI_BASE_URL": base_url,
+        "SILICONFLOW_API_KEY": os.getenv("SILICONFLOW_API_KEY", "stub") if args.base_url else "stub",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stub") if args.base_url else "stub",
+        "TRANSCRIPTION_BACKEND": "openai",
+        "CHECKPOINT_BACKEND": args.checkpoint_backend,
+        "CHECKPOINT_DB_PATH": str(workdir / "checkpoints.sqlite3"),
+        "TRANSCRIPT_CACHE_PATH": str(workdir / "transcripts.sqlite3"),
+        "BLOB_STORE_ROOT": str(workdir / "blobs"),
+        "DOCUMENT_CACHE_DIR": str(workdir / "documents"),
+        "AUDIO_SCRATCH_DIR": str(workdir / "scratch"),
+        "LLM_MAX_CONCURRENCY": str(args.max_concurrency),
+        "DIARIZATION_ENABLED": "1" if args.diarization else "0",
+        "METRICS_CONSOLE": "0",
+    })
+    os.chdir(workdir)   # 上传的文件保存在相对路径 conversations/<session_id>/ 下
+
+
+def _counter_total(metrics_json: dict, name: str, **labels) -> float:
+    return sum(series["value"] for series in metrics_json["counters"].get(name, [])
+               if all(series["labels"].get(k) == v for k, v in labels.items()))
+
+
+async def run_replay(args, sessions: list, stats) -> dict:
+    from utilities.metrics import get_metrics
+    from utilities.modelRelated import set_quiet_mode
+
+    set_quiet_mode()
+    agents = {name: _get_agent(name) for name in {session["agent"] for session in sessions}}
+    jobs = [(session, f"{session['session_id']}-r{r}") for r in range(args.repeat) for session in sessions]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def _bounded(session, session_id):
+        async with semaphore:
+            return await replay_session(agents[session["agent"]], session, session_id, args.time_scale)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 预热（首次导入、建立连接、加载编码表等），不计入结果：输入处理会话完整回放一个；
+        # voice2text 只运行到第一个 interrupt，避免提前写入转写缓存，使回放的转写仍是冷缓存
+        if args.warmup:
+            for name, agent in agents.items():
+                session = next(session for session in sessions if session["agent"] == name)
+                if name == "voice2text":
+                    await agent.astart(f"warmup-{session['session_id']}")
+                else:
+                    await replay_session(agent, session, f"warmup-{session['session_id']}", 0)
+        get_metrics().reset()
+        stub_before = await asyncio.to_thread(stats)
+        start = time.perf_counter()
+        results = await asyncio.gather(*[_bounded(session, session_id) for session, session_id in jobs])
+        wall = time.perf_counter() - start
+    return {"results": results, "wall": wall, "metrics": get_metrics().to_json(), "stub_before": stub_before}
+
+
+def worker_peak_rss_mb() -> float:
+    """音频工作池中各工作进程的峰值 RSS（未启动工作池时为 0）"""
+    from utilities.workerPool import get_audio_worker_pool
+
+    pool = get_audio_worker_pool()
+    if pool._executor is None:
+        return 0.0
+    futures = [pool.submit(peak_rss_mb) for _ in range(2 * pool.max_workers)]
+    return max(future.result() for future in futures)
+
+
+def build_report(args, sessions: list, replay: dict, stub: dict, memory: dict) -> dict:
+    results, wall = replay["results"], replay["wall"]
+    latencies = {}
+    for result in results:
+        for label, seconds in result["turns"]:
+            latencies.setdefault(f"{result['agent']}:{label}", []).append(seconds)
+        if result["error"] is None:
+            latencies.setdefault(f"{result['agent']}:session", []).append(result["seconds"])
+    failed = [r for r in results if r["error"] is not None]
+    mismatched = [r for r in results if r["mismatches"]]
+    turns = sum(len(r["turns"]) for r in results)
+    input_tokens = _counter_total(replay["metrics"], "llm_tokens_total", kind="input")
+    output_tokens = _counter_total(replay["metrics"], "llm_tokens_total", kind="output")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "meta": {"python": sys.version.split()[0], "cpu_count": os.cpu_count(), "git_commit": commit,
+                 "sessions_file": str(args.sessions_file), "sessions": len(results), "concurrency": args.concurrency,
+                 "time_scale": args.time_scale, "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                 "stub": None if args.base_url else {
+                     "latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                     "chunk_size": args.chunk_size, "stream_mode": args.stream_mode, "error_rate": args.error_rate,
+                     "error_mode": args.error_mode, "reply_tokens": args.reply_tokens,
+                     "transcription_latency": args.transcription_latency, "transcription_rtf": args.transcription_rtf}},
+        "throughput": {"wall_seconds": round(wall, 3), "sessions_per_second": round(len(results) / wall, 3),
+                       "turns_per_second": round(turns / wall, 3)},
+        "latency_ms": {label: {"count": len(values), "p50": round(_percentile(values, 0.5) * 1000, 1),
+                               "p90": round(_percentile(values, 0.9) * 1000, 1),
+                               "p99": round(_percentile(values, 0.99) * 1000, 1),
+                               "max": round(max(values) * 1000, 1)}
+                       for label, values in sorted(latencies.items())},
+        "llm": {"requests": stub.get("requests", 0), "injected_errors": stub.get("errors", 0),
+                "transcriptions": stub.get("transcriptions", 0), "audio_seconds": stub.get("audio_seconds", 0),
+                "input_tokens": int(input_tokens), "output_tokens": int(output_tokens),
+                "requests_per_session": round(stub.get("requests", 0) / max(1, len(results)), 3),
+                "tokens_per_session": round((input_tokens + output_tokens) / max(1, len(results)), 1)},
+        "memory": memory,
+        "errors": {"failed_sessions": len(failed), "mismatched_sessions": len(mismatched),
+                   "examples": [r["error"] for r in failed[:5]] + [r["mismatches"][0] for r in mismatched[:5]]},
+    }
+
+
+def print_report(report: dict):
+    meta, throughput, llm, memory = report["meta"], report["throughput"], report["llm"], report["memory"]
+    print(f"👥 回放 {meta['sessions']} 个会话（并发 {meta['concurrency']}），耗时 {throughput['wall_seconds']:.2f}秒，"
+          f"{throughput['sessions_per_second']:.2f} 会话/秒，{throughput['turns_per_second']:.2f} 轮/秒")
+    for label, stats in report["latency_ms"].items():
+        print(f"   {label:<32} n={stats['count']:<5} p50={stats['p50']:8.1f}ms  p90={stats['p90']:8.1f}ms  "
+              f"p99={stats['p99']:8.1f}ms  最大={stats['max']:8.1f}ms")
+    print(f"🤖 模型请求={llm['requests']}（注入错误 {llm['injected_errors']}）  转写请求={llm['transcriptions']}"
+          f"（{llm['audio_seconds']:.0f}秒音频）  Token 输入={llm['input_tokens']:,} 输出={llm['output_tokens']:,}")
+    print(f"🧮 峰值 RSS: 本进程 {memory['peak_rss_mb']:.0f}MB，音频工作进程 {memory['peak_worker_rss_mb']:.0f}MB")
+    errors = report["errors"]
+    status = "✅" if not errors["failed_sessions"] and not errors["mismatched_sessions"] else "⚠️"
+    print(f"{status} 失败会话={errors['failed_sessions']}  与录制不一致={errors['mismatched_sessions']}")
+    for example in errors["examples"]:
+        print(f"   - {example}")
+
+
+def _lookup(report: dict, path: str):
+    value = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare_reports(report: dict, baseline: dict, tolerance: float) -> list:
+    """返回回归列表；同时打印每个指标相对基线的变化"""
+    checks = [(path, True, floor) for path, floor in _HIGHER_IS_BETTER]
+    checks += [(path, False, floor) for path, floor in _LOWER_IS_BETTER]
+    for label in report["latency_ms"]:
+        checks += [(f"latency_ms.{label}.{q}", False, _LATENCY_FLOOR_MS) for q in ("p50", "p90", "p99")]
+    if report["meta"].get("stub") != baseline["meta"].get("stub") or report["meta"]["sessions"] != baseline["meta"]["sessions"]:
+        print("⚠️ 桩服务器参数或会话数与基线不同，比较结果仅供参考")
+
+    regressions = []
+    print(f"📈 与基线比较（{baseline['meta'].get('git_commit') or '?'} @ {baseline['meta'].get('created_at')}，容差 {tolerance:.0%}）")
+    for path, higher_is_better, floor in checks:
+        new, old = _lookup(report, path), _lookup(baseline, path)
+        if new is None or old is None:
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = (old - new) if higher_is_better else (new - old)
+        regressed = worse > floor and (old == 0 or worse / abs(old) > tolerance)
+        if regressed:
+            regressions.append(f"{path}: {old} → {new}")
+        print(f"   {'❌' if regressed else '✅'} {path:<48} {old:>10} → {new:>10}  ({change:+.1%})")
+    return regressions
+
+
+def run(args):
+    sessions = load_sessions(args.sessions_file)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    output = Path(args.output).resolve() if args.output else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.base_url:
+            base_url, stats, stop = args.base_url, lambda: {}, lambda: None
+        else:
+            base_url, stats, stop = _start_stub(args)
+        cwd = os.getcwd()
+        try:
+            _configure_environment(args, Path(workdir), base_url)
+            replay = asyncio.run(run_replay(args, sessions, stats))
+            memory = {"peak_rss_mb": round(peak_rss_mb(), 1), "peak_worker_rss_mb": round(worker_peak_rss_mb(), 1)}
+            stub = {key: value - replay["stub_before"].get(key, 0) for key, value in stats().items()}
+        finally:
+            stop()
+            os.chdir(cwd)
+
+    report = build_report(args, sessions, replay, stub, memory)
+    print_report(report)
+    if output:
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 报告已保存: {output}")
+    if baseline is not None:
+        regressions = compare_reports(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"❌ 回归: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="会话回放与负载测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="交互录制一个会话")
+    record_parser.add_argument("--agent", choices=AGENTS, default="process_user_input")
+    record_parser.add_argument("--output", required=True)
+    record_parser.add_argument("--session-id")
+
+    synth_parser = subparsers.add_parser("synthesize", help="生成合成会话")
+    synth_parser.add_argument("--output", required=True)
+    synth_parser.add_argument("--sessions", type=int, default=40, help="process_user_input 会话数")
+    synth_parser.add_argument("--voice2text", type=int, default=4, help="voice2text 会话数")
+    synth_parser.add_argument("--audio-seconds", type=float, default=60.0)
+    synth_parser.add_argument("--attachment-rows", type=int, default=2000)
+    synth_parser.add_argument("--think-time", type=float, default=5.0, help="录制的平均思考时间（秒）")
+    synth_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = subparsers.add_parser("run", help="并发回放会话文件")
+    run_parser.add_argument("sessions_file")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--repeat", type=int, default=1, help="每个会话回放的次数（会话 ID 加后缀区分）")
+    run_parser.add_argument("--time-scale", type=float, default=0.0, help="思考时间的缩放系数，0 表示不等待")
+    run_parser.add_argument("--stub", choices=["process", "inline"], default="process")
+    run_parser.add_argument("--base-url", help="不启动桩服务器，改为发往该地址（例如真实端点）")
+    run_parser.add_argument("--latency", type=float, default=0.2, help="首 token 延迟（秒）")
+    run_parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    run_parser.add_argument("--chunk-size", type=int, default=1)
+    run_parser.add_argument("--stream-mode", choices=["auto", "buffered"], default="auto")
+    run_parser.add_argument("--reply-tokens", type=int, default=60, help="非验证请求的回复长度")
+    run_parser.add_argument("--error-rate", type=float, default=0.0)
+    run_parser.add_argument("--error-mode", choices=["status", "disconnect", "hang"], default="status")
+    run_parser.add_argument("--hang-seconds", type=float, default=30.0)
+    run_parser.add_argument("--transcription-latency", type=float, default=0.3)
+    run_parser.add_argument("--transcription-rtf", type=float, default=0.02)
+    run_parser.add_argument("--max-concurrency", type=int, default=64, help="每个模型提供方的最大并发调用数")
+    run_parser.add_argument("--checkpoint-backend", choices=["sqlite", "memory"], default="sqlite")
+    run_parser.add_argument("--no-diarization", dest="diarization", action="store_false")
+    run_parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="把报告保存为 JSON")
+    run_parser.add_argument("--baseline", help="与之前保存的报告比较")
+    run_parser.add_argument("--tolerance", type=float, default=0.15, help="允许的相对变差")
+    args = parser.parse_args(argv)
+
+    {"record": record, "synthesize": synthesize, "run": run}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
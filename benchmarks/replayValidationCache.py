@@ -0,0 +1,90 @@
+"""回放对话记录，统计验证缓存节省的模型调用与延迟
+
+记录文件为 JSONL，每行形如 {"previous_ai_content": "...", "user_input": "..."}。
+未指定 --transcript 时使用内置的示例对话；未指定 --live 时模型请求发往本地桩服务器。
+
+用法:
+    python benchmarks/replayValidationCache.py --transcript replay.jsonl --latency 0.5
+"""
+import sys
+from pathlib import Path
+
+# Add root project directory to sys.path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+from langchain_core.messages import AIMessage
+
+from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+from Agents.processUserInputAgent import ProcessUserInputAgent
+from utilities.validationCache import get_validation_cache
+
+SAMPLE_TRANSCRIPT = [
+    {"previous_ai_content": "请问您需要生成什么样的表格？", "user_input": "帮我生成一个员工考勤表"},
+    {"previous_ai_content": "请问您需要生成什么样的表格？", "user_input": "123"},
+    {"previous_ai_content": "请问您需要生成什么样的表格？", "user_input": "测试一下"},
+    {"previous_ai_content": "请问您需要生成什么样的表格？", "user_input": "😀😀"},
+    {"previous_ai_content": "请问您需要生成什么样的表格？", "user_input": "帮我生成一个员工考勤表"},
+    {"previous_ai_content": "表格需要哪些字段？", "user_input": "姓名、日期、上班时间、下班时间"},
+    {"previous_ai_content": "表格需要哪些字段？", "user_input": "？？？"},
+    {"previous_ai_content": "表格需要哪些字段？", "user_input": "姓名、日期、上班时间、下班时间"},
+]
+
+
+def _load_transcript(path):
+    if not path:
+        return SAMPLE_TRANSCRIPT * 25
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="验证缓存回放统计")
+    parser.add_argument("--transcript", help="JSONL 对话记录")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务器响应延迟（秒）")
+    parser.add_argument("--live", action="store_true", help="直接调用真实模型接口")
+    parser.add_argument("--batch", action="store_true", help="使用 validate_batch 批量验证")
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.live:
+        server, base_url = start_stub_server(StubConfig(latency=args.latency))
+        os.environ["SILICONFLOW_BASE_URL"] = base_url
+        os.environ.setdefault("SILICONFLOW_API_KEY", "stub")
+
+    records = _load_transcript(args.transcript)
+    agent = ProcessUserInputAgent()
+    start = time.perf_counter()
+    try:
+        if args.batch:
+            with contextlib.redirect_stdout(io.StringIO()):
+                agent.validate_batch([(record.get("previous_ai_content", ""), record["user_input"]) for record in records])
+        else:
+            for record in records:
+                state = {
+                    "user_input": record["user_input"],
+                    "previous_AI_messages": [AIMessage(content=record.get("previous_ai_content", ""))],
+                }
+                with contextlib.redirect_stdout(io.StringIO()):
+                    agent._analyze_user_input_text(state)
+    finally:
+        if server is not None:
+            server.shutdown()
+    elapsed = time.perf_counter() - start
+
+    stats = get_validation_cache().get_stats()
+    print(f"📊 回放 {len(records)} 条输入，耗时 {elapsed:.2f}秒")
+    print(f"   本地预分类命中={stats['precheck_hits']}  精确缓存命中={stats['exact_hits']}  "
+          f"未命中={stats['misses']}  命中率={stats['hit_rate']:.1%}")
+    print(f"   模型调用: 实际={stats['model_calls']}  节省={stats['model_calls_avoided']}  "
+          f"节省延迟≈{stats['saved_latency_seconds']:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""本地 OpenAI 兼容桩服务器，用于基准测试（不访问真实的 OpenAI / SiliconFlow 接口）
+
+支持的接口：
+    POST /v1/chat/completions       流式与非流式；首 token 延迟、输出速度、每个事件的字符数可配置，
+                                    --stream-mode buffered 模拟把整段回复攒成一个事件的代理
+    POST /v1/audio/transcriptions   verbose_json：按上传 WAV 的时长生成片段，延迟 = 固定延迟 + 时长 × 实时率
+    GET  /stats                     请求数、错误数、token 与音频时长的累计值（供负载测试汇总）
+错误注入（--error-rate 概率）：status 返回 --error-status；disconnect 在流式输出到一半时断开连接；
+hang 在响应前挂起 --hang-seconds 秒（用于检验客户端超时）。
+--prefill-tokens-per-second 让首 token 延迟随输入长度增长，--context-limit 对超长输入返回 400 context_length_exceeded。
+
+用法:
+    python benchmarks/stubOpenAIServer.py --port 8765 --latency 0.05 --handshake-delay 0.1
+    python benchmarks/stubOpenAIServer.py --port 0 --tokens-per-second 40 --error-rate 0.05 --error-mode disconnect
+
+然后设置 SILICONFLOW_BASE_URL=http://127.0.0.1:8765/v1（或 OPENAI_BASE_URL）即可让
+utilities.modelRelated 指向该服务器。
+"""
+import argparse
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+class StubConfig:
+    """桩服务器的行为参数"""
+
+    def __init__(self, latency: float = 0.0, handshake_delay: float = 0.0, reply: str = "[Valid]",
+                 token_interval: float = 0.0, error_rate: float = 0.0, error_status: int = 500, seed: int = 0,
+                 responder: Optional[Callable[[dict], str]] = None, chunk_size: int = 1, stream_mode: str = "auto",
+                 error_mode: str = "status", hang_seconds: float = 30.0, transcription_latency: float = 0.0,
+                 transcription_rtf: float = 0.0, segment_seconds: float = 5.0, prefill_tokens_per_second: float = 0.0,
+                 context_limit: int = 0):
+        self.latency = latency                  # 每个请求在首个 token 前的等待时间
+        self.prefill_tokens_per_second = prefill_tokens_per_second   # 设置后首 token 前再按输入长度增加等待
+        self.context_limit = context_limit      # 输入 token 数超过此值时返回 400（0 表示不限制）
+        self.token_interval = token_interval    # 流式响应中相邻两个 token 的间隔
+        self.chunk_size = chunk_size            # 每个流式事件包含的 token（字符）数
+        self.stream_mode = stream_mode          # auto：逐事件输出；buffered：生成完毕后一次性作为一个事件输出
+        self.error_rate = error_rate            # 按此概率注入错误（在 latency 之后），模拟故障端点
+        self.error_mode = error_mode            # status / disconnect / hang
+        self.error_status = error_status
+        self.hang_seconds = hang_seconds
+        self.errors = 0
+        self.transcription_latency = transcription_latency
+        self.transcription_rtf = transcription_rtf   # 每秒音频额外增加的转写延迟
+        self.segment_seconds = segment_seconds       # 转写结果中每个片段的时长
+        self.transcriptions = 0
+        self.audio_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.random = random.Random(seed)
+        self.responder = responder              # 根据请求体生成回复；为空时固定回复 reply
+        self.handshake_delay = handshake_delay  # 每个新 TCP 连接的额外延迟，模拟 TLS 握手
+        self.reply = reply
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+    disable_nagle_algorithm = True
+    config: StubConfig = StubConfig()
+
+    def setup(self):
+        super().setup()
+        with self.config.lock:
+            self.config.connections += 1
+        if self.config.handshake_delay:
+            time.sleep(self.config.handshake_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端提前断开（例如对冲中被取消的请求）
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, stub_stats(self.config))
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        with self.config.lock:
+            self.config.requests += 1
+
+        if self.path.endswith("/audio/transcriptions"):
+            self._transcribe(raw)
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        body = json.loads(raw or b"{}")
+        prompt_tokens = _count_prompt_tokens(body)
+        if self.config.context_limit and prompt_tokens > self.config.context_limit:
+            self._send_json(400, {"error": {"message": f"prompt has {prompt_tokens} tokens, exceeds the context limit "
+                                                       f"of {self.config.context_limit}",
+                                            "type": "invalid_request_error", "code": "context_length_exceeded"}})
+            return
+
+        delay = self.config.latency
+        if self.config.prefill_tokens_per_second:
+            delay += prompt_tokens / self.config.prefill_tokens_per_second
+        if delay:
+            time.sleep(delay)
+
+        error_mode = self._injected_error()
+        if error_mode == "hang":
+            time.sleep(self.config.hang_seconds)
+        if error_mode in ("status", "hang"):
+            self._send_json(self.config.error_status, {"error": {"message": "injected error", "type": "server_error"}})
+            return
+
+        model = body.get("model", "stub-model")
+        reply = self.config.responder(body) if self.config.responder else self.config.reply
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply), "total_tokens": 0}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with self.config.lock:
+            self.config.prompt_tokens += usage["prompt_tokens"]
+            self.config.completion_tokens += usage["completion_tokens"]
+
+        if body.get("stream"):
+            self._send_stream(model, reply, usage, disconnect=error_mode == "disconnect")
+        else:
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    def _injected_error(self) -> Optional[str]:
+        """按 error_rate 抽样，返回本次请求注入的错误类型"""
+        with self.config.lock:
+            if not (self.config.error_rate and self.config.random.random() < self.config.error_rate):
+                return None
+            self.config.errors += 1
+        return self.config.error_mode
+
+    def _transcribe(self, raw: bytes):
+        """按上传 WAV 的时长返回 verbose_json 转写结果（文本为占位内容）"""
+        duration = _wav_duration(raw)
+        delay = self.config.transcription_latency + duration * self.config.transcription_rtf
+        if delay:
+            time.sleep(delay)
+        error_mode = self._injected_error()
+        if error_mode == "hang":
+            time.sleep(self.config.hang_seconds)
+        if error_mode is not None:
+            self._send_json(self.config.error_status, {"error": {"message": "injected error", "type": "server_error"}})
+            return
+        with self.config.lock:
+            self.config.transcriptions += 1
+            self.config.audio_seconds += duration
+            index = self.config.transcriptions
+        segments, start = [], 0.0
+        while start < duration:
+            end = min(duration, start + self.config.segment_seconds)
+            segments.append({"id": len(segments), "start": round(start, 3), "end": round(end, 3),
+                             "text": f"第{index}段录音 {start:.0f} 秒处，讨论了预算和上线时间。"})
+            start = end
+        self._send_json(200, {"task": "transcribe", "language": "zh", "duration": duration,
+                              "text": "".join(segment["text"] for segment in segments), "segments": segments})
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, reply: str, usage: dict, disconnect: bool = False):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        size = max(1, self.config.chunk_size)
+        pieces = [reply[i:i + size] for i in range(0, len(reply), size)]
+        if self.config.stream_mode == "buffered":
+            if self.config.token_interval:
+                time.sleep(self.config.token_interval * max(0, len(reply) - 1))
+            pieces = [reply]
+        for i, piece in enumerate(pieces):
+            if disconnect and i >= len(pieces) // 2:
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)   # 不发送结束块，客户端看到连接中途断开
+                return
+            if i and self.config.token_interval and self.config.stream_mode != "buffered":
+                time.sleep(self.config.token_interval * len(pieces[i - 1]))
+            self._write_event({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        self._write_event({
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+        })
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, payload: dict):
+        self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _wav_duration(raw: bytes) -> float:
+    """从 multipart 请求体中找到 WAV 头，按 data 块大小计算时长"""
+    start = raw.find(b"RIFF")
+    if start < 0 or raw[start + 8:start + 12] != b"WAVE":
+        return 0.0
+    position, byte_rate = start + 12, 0
+    while position + 8 <= len(raw):
+        chunk_id, chunk_size = raw[position:position + 4], struct.unpack("<I", raw[position + 4:position + 8])[0]
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<I", raw[position + 16:position + 20])[0]
+        elif chunk_id == b"data":
+            return chunk_size / byte_rate if byte_rate else 0.0
+        position += 8 + chunk_size + (chunk_size & 1)
+    return 0.0
+
+
+def stub_stats(config: StubConfig) -> dict:
+    with config.lock:
+        return {"connections": config.connections, "requests": config.requests, "errors": config.errors,
+                "prompt_tokens": config.prompt_tokens, "completion_tokens": config.completion_tokens,
+                "transcriptions": config.transcriptions, "audio_seconds": round(config.audio_seconds, 3)}
+
+
+def filler_responder(reply_tokens: int, seed: int = 0) -> Callable[[dict], str]:
+    """验证类请求（提示词要求回复 [Valid]/[Invalid]）回复 [Valid]，其余请求回复 reply_tokens 个字的占位文本"""
+    text = "会议讨论了预算调整、招聘计划和上线时间，负责人会在下周同步进展。"
+    filler = (text * (reply_tokens // len(text) + 1))[:reply_tokens]
+
+    def respond(body: dict) -> str:
+        prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+        return "[Valid]" if "[Valid]" in prompt else filler
+
+    return respond
+
+
+def _count_prompt_tokens(body: dict) -> int:
+    """粗略估算输入 token 数（按字符计）"""
+    return sum(len(str(message.get("content", ""))) for message in body.get("messages", []))
+
+
+def start_stub_server(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """在后台线程启动桩服务器，返回 (server, base_url)"""
+    handler = type("ConfiguredStubHandler", (StubOpenAIHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="首个 token 前的延迟（秒）")
+    parser.add_argument("--handshake-delay", type=float, default=0.0, help="每个新连接的额外延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="流式响应相邻 token 的间隔（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="输出速度，设置后覆盖 --token-interval")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=0.0,
+                        help="输入处理速度，设置后首 token 延迟额外增加 输入 token 数 / 该值")
+    parser.add_argument("--context-limit", type=int, default=0, help="输入 token 上限，超过时返回 400（0 表示不限制）")
+    parser.add_argument("--chunk-size", type=int, default=1, help="每个流式事件包含的 token 数")
+    parser.add_argument("--stream-mode", choices=["auto", "buffered"], default="auto")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument("--error-mode", choices=["status", "disconnect", "hang"], default="status")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误时的 HTTP 状态码")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--transcription-latency", type=float, default=0.0, help="每个转写请求的固定延迟（秒）")
+    parser.add_argument("--transcription-rtf", type=float, default=0.0, help="每秒音频增加的转写延迟（秒）")
+    parser.add_argument("--reply", default="[Valid]")
+    parser.add_argument("--reply-tokens", type=int, default=0,
+                        help="非验证请求回复的占位文本长度；为 0 时所有请求都回复 --reply")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency=args.latency, handshake_delay=args.handshake_delay, reply=args.reply,
+                        token_interval=1 / args.tokens_per_second if args.tokens_per_second else args.token_interval,
+                        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed,
+                        responder=filler_responder(args.reply_tokens, args.seed) if args.reply_tokens else None,
+                        chunk_size=args.chunk_size, stream_mode=args.stream_mode, error_mode=args.error_mode,
+                        hang_seconds=args.hang_seconds, transcription_latency=args.transcription_latency,
+                        transcription_rtf=args.transcription_rtf,
+                        prefill_tokens_per_second=args.prefill_tokens_per_second, context_limit=args.context_limit)
+    server, base_url = start_stub_server(config, args.host, args.port)
+    print(f"🧪 桩服务器已启动: {base_url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""上下文窗口：历史不断增长时，发给模型的请求与状态中保存的历史都不超过 token 预算"""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from utilities.contextWindow import SUMMARY_PREFIX, ContextWindowManager
+
+
+def make_history(turns: int):
+    history = [SystemMessage(content="你是一个表格生成助手。")]
+    for i in range(turns):
+        history.append(HumanMessage(content=f"第{i}轮：请在表格里加上字段“负责人{i}”和“截止日期”，并按部门汇总。"))
+        history.append(AIMessage(content=f"好的，已添加负责人{i}与截止日期字段。" * 3 + "请问还需要按哪个维度汇总？"))
+    return history
+
+
+def stub_summarize(calls):
+    def summarize(previous_summary: str, new_content: str) -> str:
+        calls.append(new_content.count("\n") + 1)
+        return (previous_summary + "\n" + new_content[:40]).strip()
+    return summarize
+
+
+@pytest.mark.parametrize("summarized", [False, True])
+def test_fit_stays_under_budget_as_history_grows(summarized):
+    manager = ContextWindowManager("test", budget=1000, summarize=stub_summarize([]) if summarized else None)
+    sizes = []
+    for turns in (10, 100, 1000, 3000):
+        fitted = manager.fit(make_history(turns), session_id="grow")
+        sizes.append(manager.request_tokens(fitted))
+        assert fitted[0].content == "你是一个表格生成助手。"
+        assert isinstance(fitted[-1], AIMessage)
+    assert max(sizes) <= 1000
+    assert max(sizes[1:]) - min(sizes[1:]) <= 100
+
+
+def test_refitting_stored_history_summarizes_each_message_once():
+    calls = []
+    manager = ContextWindowManager("test", budget=800, summarize=stub_summarize(calls))
+    history = [SystemMessage(content="系统提示")]
+    turns = 300
+    for i in range(turns):
+        history = manager.fit(history + [HumanMessage(content=f"问题{i}" * 10), AIMessage(content=f"回答{i}" * 20)],
+                              session_id="chat")
+        assert manager.request_tokens(history) <= 800
+    assert history[0].content == "系统提示"
+    assert history[1].content.startswith(SUMMARY_PREFIX)
+    kept = len(history) - 2
+    assert sum(calls) == 2 * turns - kept
+
+
+def test_process_user_input_messages_are_bounded(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CONTEXT_MAX_STATE_MESSAGES", "5")
+    from Agents.processUserInputAgent import VALIDATION_MODEL, ProcessUserInputAgent
+    from utilities.contextWindow import get_context_window
+
+    agent = ProcessUserInputAgent(MemorySaver())
+    step = agent.start("bounded", make_history(50))
+    for _ in range(12):
+        # 只有标点的输入由本地预分类判为无效，不调用模型，流程回到 collect_user_input
+        step = agent.resume("bounded", "？？？")
+        assert step["status"] == "interrupted"
+    assert len(step["state"]["messages"]) == 5
+    window = get_context_window(VALIDATION_MODEL)
+    assert window.request_tokens(step["state"]["previous_messages"]) <= window.budget
+
+
+def test_voice2text_chat_request_and_history_stay_under_budget(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CHECKPOINT_BACKEND", "memory")
+    import Agents.voice2textAgent as voice2text
+    from utilities.contextWindow import get_context_window
+
+    agent = voice2text.Voice2TextAgent()
+    window = get_context_window(voice2text.CHAT_MODEL)
+    state = {"session_id": "chat-budget", "previous_messages": make_history(20), "meeting_summary": "预算讨论"}
+    request_tokens = []
+    for i in range(400):
+        question = f"第{i}个问题：第三季度预算由谁负责，截止日期是什么时候？"
+        messages, hits = agent._chat_messages(state, question)
+        request_tokens.append(window.request_tokens(messages[1:-1]))   # 去掉问答提示词与问题本身
+        history = window.fit(agent._chat_history(state, question, "预算由说话人2负责，下周五前给出新方案。" * 10),
+                             state["session_id"])
+        state.update(agent._chat_result(history, hits))
+        assert window.request_tokens(state["previous_messages"]) <= window.budget
+    assert max(request_tokens) <= window.budget
+    assert max(request_tokens[-100:]) - min(request_tokens[-100:]) <= window.budget // 10
+
+
+def test_afit_matches_fit_and_summarizes_without_blocking_the_loop():
+    import asyncio
+    import threading
+
+    sync_calls, async_calls, summary_threads = [], [], []
+
+    async def asummarize(previous_summary: str, new_content: str) -> str:
+        async_calls.append(new_content)
+        await asyncio.sleep(0)
+        return (previous_summary + "\n" + new_content[:40]).strip()
+
+    def summarize_in_thread(previous_summary: str, new_content: str) -> str:
+        summary_threads.append(threading.get_ident())
+        return (previous_summary + "\n" + new_content[:40]).strip()
+
+    history = make_history(500)
+    expected = ContextWindowManager("test", budget=1000, summarize=stub_summarize(sync_calls)).fit(history, "s")
+    fitted = asyncio.run(ContextWindowManager("test", budget=1000, summarize=stub_summarize(sync_calls),
+                                              asummarize=asummarize).afit(history, "s"))
+    assert [m.content for m in fitted] == [m.content for m in expected]
+    assert len(async_calls) == len(sync_calls)
+
+    # 只提供同步摘要函数时在线程中调用，事件循环所在的线程不执行摘要
+    fitted = asyncio.run(ContextWindowManager("test", budget=1000, summarize=summarize_in_thread).afit(history, "s"))
+    assert [m.content for m in fitted] == [m.content for m in expected]
+    assert summary_threads and threading.get_ident() not in summary_threads
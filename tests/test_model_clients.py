@@ -0,0 +1,26 @@
+"""模型客户端注册表：多次 asyncio.run（astart / aresume）之间不复用绑定在已关闭事件循环上的异步连接池"""
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.stubOpenAIServer import StubConfig, start_stub_server
+
+
+def test_async_calls_work_across_event_loops(monkeypatch):
+    server, base_url = start_stub_server(StubConfig(reply="[Valid]"))
+    monkeypatch.setenv("SILICONFLOW_BASE_URL", base_url)
+    monkeypatch.setenv("SILICONFLOW_API_KEY", "stub")
+    from utilities.modelRelated import LLMClientRegistry, ainvoke_model, invoke_model
+    import utilities.modelRelated as model_related
+
+    registry = LLMClientRegistry()
+    monkeypatch.setattr(model_related, "_client_registry", registry)
+    try:
+        for _ in range(4):
+            assert asyncio.run(ainvoke_model("Qwen/Qwen3-32B", [HumanMessage(content="你好")])) == "[Valid]"
+        assert invoke_model("Qwen/Qwen3-32B", [HumanMessage(content="你好")]) == "[Valid]"
+        # 已关闭循环的客户端被清理，只剩同步调用的客户端
+        assert len(registry._clients) == 1
+    finally:
+        registry.close()
+        server.shutdown()
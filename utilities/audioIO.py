@@ -0,0 +1,334 @@
+"""流式解码与内存映射的音频 I/O
+
+长录音（mp3/mp4/mkv 等，数小时）不整体读入内存：
+- ffmpeg 子进程把音频解码为 16kHz 单声道 PCM，按块从管道读出，直接写入磁盘上的临时 PCM 文件；
+  没有 ffmpeg 时，WAV 文件用标准库 wave 按块读取，在进程内混为单声道并分块重采样（BlockResampler）
+- 解码结果以 np.memmap 只读映射，按时间取窗口得到的是零拷贝视图（float32）或逐块换算的副本（int16）
+- 顺序处理时用 release_pages 把已经处理过的页面交还内核，常驻内存不随录音时长增长
+临时 PCM 文件按 (文件摘要, 采样率, 数据类型) 命名，转写与说话人分离等多个步骤共用同一次解码结果；
+目录总大小超过 AUDIO_SCRATCH_MAX_BYTES 时删除最久未使用的文件。
+跨进程传递 PCM 时只传 PCMHandle（临时文件路径或共享内存名），子进程按句柄映射同一块内存，数组本身不经过 pickle。
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+import mmap
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from utilities.blobStore import get_file_digest
+
+SAMPLE_RATE = 16000
+DEFAULT_SCRATCH_DIR = Path(tempfile.gettempdir()) / "audio_scratch"
+_PAGE_SIZE = mmap.PAGESIZE
+_DTYPES = {"float32": np.float32, "int16": np.int16}
+
+
+# -- 分块重采样 ---------------------------------------------------------------
+class BlockResampler:
+    """流式重采样：低通 FIR（加窗 sinc）抗混叠后线性插值，块与块之间保留滤波器历史与插值位置
+
+    输出第 k 个采样点对应输入位置 k × src_rate / dst_rate，用整数计算，长录音也不会累积误差。
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int = SAMPLE_RATE, taps: int = 63):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self._filter = None
+        if dst_rate < src_rate:
+            cutoff = 0.45 * dst_rate / src_rate        # 以输入采样率为单位的截止频率，留出过渡带
+            n = np.arange(taps) - (taps - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self._filter = (kernel / kernel.sum()).astype(np.float32)
+        self._history = np.zeros(taps - 1 if self._filter is not None else 0, dtype=np.float32)
+        self._tail = np.zeros(0, dtype=np.float32)   # 上一块最后一个滤波后的采样点
+        self._tail_index = -1                        # 该采样点在输入流中的位置
+        self._produced = 0                           # 已输出的采样点数
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        if self.src_rate == self.dst_rate or len(block) == 0:
+            return block
+        if self._filter is not None:
+            padded = np.concatenate([self._history, block])
+            filtered = np.convolve(padded, self._filter, mode="valid").astype(np.float32)
+            self._history = padded[len(padded) - len(self._history):]
+        else:
+            filtered = block
+        buffer = np.concatenate([self._tail, filtered])
+        first_index = self._tail_index + 1 - len(self._tail)
+        last_index = first_index + len(buffer) - 1
+        # 位置不超过 last_index 的输出点：k × src / dst <= last_index
+        end = (last_index * self.dst_rate) // self.src_rate + 1
+        k = np.arange(self._produced, end, dtype=np.int64)
+        position = (k * self.src_rate) / self.dst_rate - first_index
+        index = position.astype(np.int64)
+        fraction = (position - index).astype(np.float32)
+        upper = np.minimum(index + 1, len(buffer) - 1)
+        out = buffer[index] * (1 - fraction) + buffer[upper] * fraction
+        self._produced = end
+        self._tail = buffer[-1:]
+        self._tail_index = last_index
+        return out
+
+
+# -- 解码 ------------------------------------------------------------------
+def _iter_ffmpeg_blocks(file_path: str, sample_rate: int, block_samples: int) -> Iterator[np.ndarray]:
+    command = [
+        "ffmpeg", "-nostdin", "-v", "error", "-i", str(file_path),
+        "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1",
+    ]
+    block_bytes = block_samples * 4
+    # stderr 写入临时文件而不是管道：ffmpeg 输出大量警告时不会因管道写满而阻塞
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            remainder = b""
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                data = remainder + data
+                usable = len(data) - len(data) % 4
+                remainder = data[usable:]
+                yield np.frombuffer(data[:usable], dtype=np.float32)
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise RuntimeError(f"ffmpeg 解码失败: {stderr.read().decode('utf-8', 'ignore').strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def _iter_wav_blocks(file_path: str, sample_rate: int, block_samples: int) -> Iterator[np.ndarray]:
+    """不依赖 ffmpeg 的 WAV 解码：按块读取、混为单声道并重采样"""
+    with wave.open(str(file_path), "rb") as wav_file:
+        channels, width, source_rate = wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate()
+        if width not in (1, 2, 4):
+            raise RuntimeError(f"不支持 {width * 8} 位 WAV，请安装 ffmpeg")
+        resampler = BlockResampler(source_rate, sample_rate)
+        frames_per_block = max(1, block_samples * source_rate // sample_rate)
+        while True:
+            data = wav_file.readframes(frames_per_block)
+            if not data:
+                break
+            if width == 1:
+                pcm = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+            else:
+                dtype = np.int16 if width == 2 else np.int32
+                pcm = np.frombuffer(data, dtype=dtype).astype(np.float32) / float(np.iinfo(dtype).max + 1)
+            if channels > 1:
+                pcm = pcm.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+            yield resampler.process(pcm)
+
+
+def iter_pcm_blocks(file_path: str, sample_rate: int = SAMPLE_RATE, block_seconds: float = 30.0) -> Iterator[np.ndarray]:
+    """流式解码音视频文件，逐块产出单声道 float32 PCM，内存占用与时长无关"""
+    block_samples = int(block_seconds * sample_rate)
+    if shutil.which("ffmpeg") is not None:
+        return _iter_ffmpeg_blocks(file_path, sample_rate, block_samples)
+    if Path(file_path).suffix.lower() == ".wav":
+        return _iter_wav_blocks(file_path, sample_rate, block_samples)
+    raise RuntimeError("未找到 ffmpeg，无法解码音频文件")
+
+
+# -- 内存映射 ----------------------------------------------------------------
+def release_pages(view: np.ndarray) -> None:
+    """把内存映射数组中 view 覆盖的页面交还内核（只读映射，之后再访问会从页缓存或磁盘重新读入）"""
+    mapping = getattr(view, "_mmap", None)
+    if mapping is None or not hasattr(mapping, "madvise") or not hasattr(mmap, "MADV_DONTNEED") or view.nbytes == 0:
+        return
+    base = np.frombuffer(mapping, dtype=np.uint8).__array_interface__["data"][0]
+    start = view.__array_interface__["data"][0] - base
+    page_start = start - start % _PAGE_SIZE
+    length = min(len(mapping), start + view.nbytes) - page_start
+    if length > 0:
+        mapping.madvise(mmap.MADV_DONTNEED, page_start, length)
+
+
+def as_float32(samples: np.ndarray) -> np.ndarray:
+    """float32 原样返回（零拷贝），int16 换算为 [-1, 1) 的 float32"""
+    if samples.dtype == np.float32:
+        return samples
+    return samples.astype(np.float32) / 32768.0
+
+
+class DecodedAudio:
+    """已解码到临时 PCM 文件的音频，samples 为只读内存映射"""
+
+    def __init__(self, path: Path, sample_rate: int, dtype: str):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(_DTYPES[dtype])
+        length = self.path.stat().st_size // self.dtype.itemsize
+        self.samples = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(length,)) if length else \
+            np.zeros(0, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def window(self, start_seconds: float, end_seconds: float) -> np.ndarray:
+        """按时间取一段 float32 PCM（float32 存储时为零拷贝视图）"""
+        start = max(0, int(start_seconds * self.sample_rate))
+        end = min(len(self.samples), int(end_seconds * self.sample_rate))
+        return as_float32(self.samples[start:max(start, end)])
+
+    def iter_blocks(self, block_seconds: float = 30.0, overlap_seconds: float = 0.0) -> Iterator[np.ndarray]:
+        """顺序产出 float32 块（相邻块重叠 overlap_seconds），消费方处理完一块后其页面即被释放"""
+        block = int(block_seconds * self.sample_rate)
+        step = max(1, block - int(overlap_seconds * self.sample_rate))
+        for start in range(0, len(self.samples), step):
+            view = self.samples[start:start + block]
+            yield as_float32(view)
+            release_pages(view)
+            if start + block >= len(self.samples):
+                break
+
+    def close(self) -> None:
+        """解除映射（临时文件保留，供后续步骤复用，由目录容量上限清理）"""
+        mapping = getattr(self.samples, "_mmap", None)
+        self.samples = np.zeros(0, dtype=self.dtype)
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:  # 仍有视图在使用，交给垃圾回收
+                pass
+
+    def __enter__(self) -> "DecodedAudio":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_scratch_lock = threading.Lock()
+
+
+def _evict_scratch(scratch_dir: Path, max_bytes: int, keep: Path) -> None:
+    """删除最久未使用的临时 PCM 文件，直到目录总大小不超过 max_bytes（已映射的文件删除后映射仍然有效）"""
+    files = []
+    for path in scratch_dir.glob("*.pcm"):
+        try:
+            files.append((path.stat().st_mtime, path.stat().st_size, path))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if path != keep:
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def open_audio(file_path: str, sample_rate: int = SAMPLE_RATE, dtype: Optional[str] = None,
+               scratch_dir: Optional[str] = None, block_seconds: float = 30.0) -> DecodedAudio:
+    """解码音视频文件到临时 PCM 文件并内存映射；同一文件已解码过时直接复用
+
+    dtype 为 "float32"（窗口零拷贝）或 "int16"（磁盘占用减半，取窗口时换算），默认取 AUDIO_SCRATCH_DTYPE。
+    """
+    dtype = dtype or os.getenv("AUDIO_SCRATCH_DTYPE", "float32")
+    if dtype not in _DTYPES:
+        raise ValueError(f"不支持的 PCM 数据类型: {dtype}")
+    scratch_dir = Path(scratch_dir or os.getenv("AUDIO_SCRATCH_DIR") or DEFAULT_SCRATCH_DIR)
+    scratch_dir.mkdir(parents=True, exist_ok=True)
+    target = scratch_dir / f"{get_file_digest(file_path)}-{sample_rate}-{dtype}.pcm"
+    if target.exists():
+        os.utime(target)
+        print(f"♻️ 复用已解码的音频: {file_path}")
+        return DecodedAudio(target, sample_rate, dtype)
+
+    fd, partial = tempfile.mkstemp(dir=scratch_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            for block in iter_pcm_blocks(file_path, sample_rate, block_seconds):
+                if dtype == "int16":
+                    block = (np.clip(block, -1.0, 32767 / 32768) * 32768).astype("<i2")
+                output.write(block.tobytes())
+        # 并发解码同一文件时后完成的一方覆盖，内容相同
+        os.replace(partial, target)
+    except BaseException:
+        Path(partial).unlink(missing_ok=True)
+        raise
+    with _scratch_lock:
+        _evict_scratch(scratch_dir, int(float(os.getenv("AUDIO_SCRATCH_MAX_BYTES", str(20 << 30)))), target)
+    return DecodedAudio(target, sample_rate, dtype)
+
+
+# -- 跨进程共享 ---------------------------------------------------------------
+@dataclass(frozen=True)
+class PCMHandle:
+    """可 pickle 的 PCM 句柄：kind 为 "file"（临时 PCM 文件路径）或 "shm"（共享内存名）"""
+    kind: str
+    name: str
+    length: int
+    dtype: str
+    sample_rate: int = SAMPLE_RATE
+
+    @classmethod
+    def from_decoded(cls, audio: DecodedAudio) -> "PCMHandle":
+        return cls("file", str(audio.path), len(audio), audio.dtype.name, audio.sample_rate)
+
+    @property
+    def duration(self) -> float:
+        return self.length / self.sample_rate
+
+
+class SharedPCM:
+    """把内存中的 PCM 复制一次到共享内存，子进程通过 handle 零拷贝访问；由创建方负责 close"""
+
+    def __init__(self, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+        samples = np.asarray(samples)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, samples.nbytes))
+        self.samples = np.ndarray(samples.shape, dtype=samples.dtype, buffer=self._shm.buf)
+        self.samples[:] = samples
+        self.handle = PCMHandle("shm", self._shm.name, len(samples), samples.dtype.name, sample_rate)
+
+    def close(self) -> None:
+        """释放共享内存（之后句柄失效）"""
+        if self._shm is None:
+            return
+        self.samples = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> "SharedPCM":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@contextmanager
+def attach_pcm(handle: PCMHandle) -> Iterator[np.ndarray]:
+    """按句柄映射 PCM，返回只读数组；退出时解除映射，数组不能在 with 之外继续使用"""
+    if handle.kind == "file":
+        audio = DecodedAudio(Path(handle.name), handle.sample_rate, handle.dtype)
+        try:
+            yield audio.samples
+        finally:
+            audio.close()
+        return
+    shm = shared_memory.SharedMemory(name=handle.name)
+    try:
+        samples = np.ndarray((handle.length,), dtype=handle.dtype, buffer=shm.buf)
+        samples.flags.writeable = False
+        yield samples
+        del samples
+    finally:
+        shm.close()
@@ -0,0 +1,523 @@
+"""长音频转写流水线
+
+音频只解码一次（ffmpeg → 16kHz 单声道 float32，流式写入内存映射的临时文件，见 audioIO），先用 VAD 跳过静音（见 voiceActivity），
+语音段再在静音处切分为有重叠、时长有上限的分块，
+通过可插拔的转写后端并发转写，最后按顺序拼接：重叠区以中点为界去重，并给出每段的时间戳。
+各分块完成后片段即按顺序流式产出（iter_* / aiter_*），下游无需等待整个文件转写结束。
+多个文件时，解码、VAD 与切分（prepare_audio_file）在音频工作池的子进程中进行，与转写重叠（见 workerPool）。
+文件转写的各分块结果按 (音频摘要, 后端, 模型, 分块参数) 写入转写缓存：中途失败后重跑只转写缺失的分块，
+完整命中时连解码都可以跳过。
+"""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import inspect
+import io
+import itertools
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from utilities.audioIO import PCMHandle, attach_pcm, open_audio, release_pages
+from utilities.blobStore import get_file_digest
+from utilities.transcriptCache import TranscriptCache, get_transcript_cache
+from utilities.voiceActivity import detect_speech, pack_regions, speech_fraction
+from utilities.workerPool import AudioWorkerPool, get_audio_worker_pool
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class AudioChunk:
+    index: int
+    start: float          # 在原始音频中的起始时间（秒）
+    end: float
+    samples: np.ndarray
+
+
+@dataclass
+class TranscriptSegment:
+    start: float          # 在原始音频中的时间戳（秒）
+    end: float
+    text: str
+    chunk_index: int = 0
+    speaker: Optional[str] = None   # 说话人分离后填入
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# -- 编码 ------------------------------------------------------------------
+def encode_wav(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """把 float32 PCM 编码为 16-bit WAV，供 HTTP 转写接口上传"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+# -- 分块 ------------------------------------------------------------------
+def frame_energy(samples: np.ndarray, sample_rate: int, frame_seconds: float = 0.03,
+                 block_frames: int = 2000) -> np.ndarray:
+    """按帧计算 RMS 能量（向量化，末尾不足一帧的部分丢弃）
+
+    按块计算，临时数组大小与音频时长无关；内存映射的输入在每块算完后释放其页面。
+    """
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    energy = np.empty(frame_count, dtype=np.float32)
+    for first in range(0, frame_count, block_frames):
+        last = min(frame_count, first + block_frames)
+        view = samples[first * frame_length:last * frame_length]
+        frames = np.asarray(view, dtype=np.float32).reshape(last - first, frame_length)
+        energy[first:last] = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        release_pages(view)
+    return energy
+
+
+def plan_chunks(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, max_chunk_seconds: float = 60.0,
+                overlap_seconds: float = 2.0, search_seconds: float = 10.0,
+                frame_seconds: float = 0.03) -> List[Tuple[int, int]]:
+    """在静音处切分音频，返回 [(起始采样点, 结束采样点)]
+
+    每个分块不超过 max_chunk_seconds；切点取分块末尾 search_seconds 内能量最低的帧，
+    下一个分块从切点前 overlap_seconds 开始，保证边界处的词在两个分块中都完整出现。
+    """
+    total = len(samples)
+    max_chunk = int(max_chunk_seconds * sample_rate)
+    if total <= max_chunk:
+        return [(0, total)] if total else []
+
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    energy = frame_energy(samples, sample_rate, frame_seconds)
+    overlap = int(overlap_seconds * sample_rate)
+    search = min(int(search_seconds * sample_rate), max_chunk // 2)
+
+    chunks = []
+    start = 0
+    while start < total:
+        limit = start + max_chunk
+        if limit >= total:
+            chunks.append((start, total))
+            break
+        first_frame = (limit - search) // frame_length
+        last_frame = max(first_frame + 1, limit // frame_length)
+        window = energy[first_frame:last_frame]
+        cut = (first_frame + int(np.argmin(window))) * frame_length if len(window) else limit
+        cut = min(max(cut, start + overlap + frame_length), limit)
+        chunks.append((start, cut))
+        start = cut - overlap
+    return chunks
+
+
+def vad_enabled(vad: Optional[bool] = None) -> bool:
+    """转写前是否先做语音活动检测，未指定时读取 TRANSCRIPTION_VAD（默认开启）"""
+    if vad is None:
+        return os.getenv("TRANSCRIPTION_VAD", "1") not in ("0", "false", "False")
+    return bool(vad)
+
+
+def plan_audio(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, vad: Optional[bool] = None,
+               **plan_options) -> List[Tuple[int, int]]:
+    """返回送入转写后端的分块 [(起始采样点, 结束采样点)]
+
+    开启 VAD 时只切分检测到的语音段（间隔短的相邻段先拼接，每段内部再按 plan_chunks 切分），长静音不送入转写后端；
+    分块位置仍是原始时间轴上的采样点，拼接出的时间戳无需换算。
+    """
+    if not vad_enabled(vad):
+        regions = [(0, len(samples))]
+    else:
+        max_chunk_seconds = plan_options.get("max_chunk_seconds", _PLAN_DEFAULTS["max_chunk_seconds"])
+        regions = pack_regions(detect_speech(samples, sample_rate), sample_rate, max_chunk_seconds)
+        kept = speech_fraction(regions, len(samples))
+        print(f"🔇 VAD: 检测到 {len(regions)} 个语音段，跳过 {1 - kept:.1%} 的音频")
+
+    plan = []
+    for region_start, region_end in regions:
+        for start, end in plan_chunks(samples[region_start:region_end], sample_rate, **plan_options):
+            plan.append((region_start + start, region_start + end))
+    return plan
+
+
+def split_audio(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, vad: Optional[bool] = None,
+                plan: Optional[Sequence[Tuple[int, int]]] = None, **plan_options) -> List[AudioChunk]:
+    """按 plan_audio 的结果（或预先算好的 plan）切分音频，分块是原数组的视图，不复制数据"""
+    if plan is None:
+        plan = plan_audio(samples, sample_rate, vad, **plan_options)
+    return [
+        AudioChunk(index=i, start=start / sample_rate, end=end / sample_rate, samples=samples[start:end])
+        for i, (start, end) in enumerate(plan)
+    ]
+
+
+@dataclass
+class PreparedAudio:
+    """已解码并切分好的音频文件；只含句柄与切分点，可在进程间传递"""
+    file_path: str
+    pcm: PCMHandle
+    plan: List[Tuple[int, int]]
+    prepare_seconds: float
+
+
+def prepare_audio_file(file_path: str, sample_rate: int = SAMPLE_RATE, vad: Optional[bool] = None,
+                       plan_options: Optional[Dict[str, Any]] = None) -> PreparedAudio:
+    """转写前的 CPU 密集阶段：解码到临时 PCM 文件 → VAD → 切分，可作为工作池任务在子进程中运行"""
+    start_time = time.time()
+    with open_audio(file_path, sample_rate) as audio:
+        plan = plan_audio(audio.samples, sample_rate, vad, **(plan_options or {}))
+        return PreparedAudio(file_path, PCMHandle.from_decoded(audio), plan, time.time() - start_time)
+
+
+# -- 转写后端 ---------------------------------------------------------------
+class TranscriptionBackend:
+    """转写后端基类：transcribe 返回以分块起点为 0 的 [{"start", "end", "text"}]"""
+
+    name = "base"
+    model = ""
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """OpenAI 兼容的 /audio/transcriptions 接口（OpenAI whisper-1、SiliconFlow 等）"""
+
+    name = "openai"
+
+    def __init__(self, model: str = "whisper-1", base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 language: Optional[str] = None):
+        from openai import OpenAI
+
+        from utilities.modelRelated import resolve_provider
+
+        _, default_base_url, default_api_key = resolve_provider(model)
+        self.model = model
+        self.language = language
+        self.client = OpenAI(base_url=base_url or default_base_url, api_key=api_key or default_api_key)
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> List[Dict[str, Any]]:
+        options = {"language": self.language} if self.language else {}
+        response = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=("chunk.wav", encode_wav(samples, sample_rate), "audio/wav"),
+            response_format="verbose_json",
+            **options,
+        )
+        segments = getattr(response, "segments", None)
+        if segments:
+            return [{"start": _field(s, "start"), "end": _field(s, "end"), "text": _field(s, "text").strip()}
+                    for s in segments]
+        return [{"start": 0.0, "end": len(samples) / sample_rate, "text": (response.text or "").strip()}]
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """基于 faster-whisper 的本地 CPU/GPU 转写"""
+
+    name = "local-whisper"
+
+    def __init__(self, model: str = "small", device: str = "cpu", compute_type: str = "int8",
+                 language: Optional[str] = None):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("本地转写需要安装 faster-whisper") from e
+        self.model = model
+        self.language = language
+        self._whisper = WhisperModel(model, device=device, compute_type=compute_type)
+
+    def transcribe(self, samples: np.ndarray, sample_rate: int) -> List[Dict[str, Any]]:
+        if sample_rate != SAMPLE_RATE:
+            raise ValueError(f"faster-whisper 需要 {SAMPLE_RATE}Hz 音频")
+        segments, _ = self._whisper.transcribe(np.ascontiguousarray(samples), language=self.language)
+        return [{"start": s.start, "end": s.end, "text": s.text.strip()} for s in segments]
+
+
+def get_default_backend() -> TranscriptionBackend:
+    """按 TRANSCRIPTION_BACKEND / TRANSCRIPTION_MODEL 环境变量创建转写后端"""
+    backend = os.getenv("TRANSCRIPTION_BACKEND", "openai")
+    if backend == "local":
+        return LocalWhisperBackend(model=os.getenv("TRANSCRIPTION_MODEL", "small"))
+    return OpenAITranscriptionBackend(model=os.getenv("TRANSCRIPTION_MODEL", "whisper-1"))
+
+
+def _field(item: Any, key: str) -> Any:
+    return item[key] if isinstance(item, dict) else getattr(item, key)
+
+
+# -- 并发转写与拼接 ----------------------------------------------------------
+def iter_transcribe_chunks(chunks: Sequence[AudioChunk], backend: TranscriptionBackend, sample_rate: int = SAMPLE_RATE,
+                           max_workers: Optional[int] = None) -> Iterator[Tuple[AudioChunk, List[Dict[str, Any]]]]:
+    """以有限并发转写分块，按分块顺序逐个产出 (分块, 结果)
+
+    同时在途的分块不超过 2 × max_workers，消费方处理慢时不会无限制地提前转写。
+    """
+    max_workers = max_workers or int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcribe") as executor:
+        pending = deque()
+        chunk_iter = iter(chunks)
+        for chunk in itertools.islice(chunk_iter, max_workers * 2):
+            pending.append((chunk, executor.submit(backend.transcribe, chunk.samples, sample_rate)))
+        while pending:
+            chunk, future = pending.popleft()
+            result = future.result()
+            next_chunk = next(chunk_iter, None)
+            if next_chunk is not None:
+                pending.append((next_chunk, executor.submit(backend.transcribe, next_chunk.samples, sample_rate)))
+            yield chunk, result
+
+
+def transcribe_chunks(chunks: Sequence[AudioChunk], backend: TranscriptionBackend, sample_rate: int = SAMPLE_RATE,
+                      max_workers: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """以有限并发转写所有分块，结果按分块顺序返回"""
+    return [result for _, result in iter_transcribe_chunks(chunks, backend, sample_rate, max_workers)]
+
+
+def stitch_segments(chunks: Sequence[AudioChunk], chunk_results: Sequence[List[Dict[str, Any]]]) -> List[TranscriptSegment]:
+    """把各分块结果映射回原始时间轴并去除重叠区的重复内容"""
+    stitched: List[TranscriptSegment] = []
+    for i, results in enumerate(chunk_results):
+        stitched.extend(_stitch_chunk(chunks, i, results, stitched[-1] if stitched else None))
+    return stitched
+
+
+def _stitch_chunk(chunks: Sequence[AudioChunk], i: int, results: List[Dict[str, Any]],
+                  previous: Optional[TranscriptSegment]) -> List[TranscriptSegment]:
+    """把第 i 个分块的结果映射回原始时间轴
+
+    相邻分块的重叠区以中点为界：每个分块只保留中点落在自己负责区间内的片段；
+    后端只返回整段文本（每个分块一个片段）时保留该片段，按文本首尾的最长重合部分去重。
+    """
+    chunk = chunks[i]
+    keep_from = (chunk.start + chunks[i - 1].end) / 2 if i > 0 else float("-inf")
+    keep_until = (chunks[i + 1].start + chunk.end) / 2 if i + 1 < len(chunks) else float("inf")
+    chunk_segments = []
+    for result in results:
+        start = chunk.start + float(result["start"])
+        end = min(chunk.start + float(result["end"]), chunk.end)
+        midpoint = (start + end) / 2
+        if result["text"] and (len(results) == 1 or keep_from <= midpoint < keep_until):
+            chunk_segments.append(TranscriptSegment(start, end, result["text"], chunk.index))
+
+    if previous is not None and chunk_segments and chunk_segments[0].start < previous.end:
+        chunk_segments[0].text = _dedupe_overlap_text(previous.text, chunk_segments[0].text)
+        if not chunk_segments[0].text:
+            chunk_segments.pop(0)
+    return chunk_segments
+
+
+def _dedupe_overlap_text(previous_text: str, next_text: str, min_overlap: int = 4, max_overlap: int = 200) -> str:
+    """去掉 next_text 开头与 previous_text 结尾重合的部分"""
+    limit = min(len(previous_text), len(next_text), max_overlap)
+    for size in range(limit, min_overlap - 1, -1):
+        if previous_text[-size:] == next_text[:size]:
+            return next_text[size:].lstrip()
+    return next_text
+
+
+def iter_transcribe_samples(samples: np.ndarray, backend: TranscriptionBackend, sample_rate: int = SAMPLE_RATE,
+                            max_workers: Optional[int] = None, cache: Optional[TranscriptCache] = None,
+                            cache_key: Optional[str] = None, vad: Optional[bool] = None,
+                            plan: Optional[Sequence[Tuple[int, int]]] = None,
+                            **plan_options) -> Iterator[TranscriptSegment]:
+    """对已解码的 PCM 执行 (VAD →) 分块 → 并发转写 → 拼接，每个分块完成后立即按顺序产出其片段
+
+    给出 cache 与 cache_key 时，已缓存的分块直接复用，只转写缺失的分块，新结果逐块写回缓存。
+    给出 plan（如工作池中 prepare_audio_file 的结果）时跳过 VAD 与切分。
+    """
+    chunks = split_audio(samples, sample_rate, vad, plan, **plan_options)
+    cached = {}
+    if cache is not None:
+        cache.set_total_chunks(cache_key, len(chunks))
+        cached = cache.get_chunks(cache_key)
+    if cached:
+        print(f"♻️ 转写缓存命中 {len(cached)}/{len(chunks)} 个分块")
+
+    missing = [chunk for chunk in chunks if chunk.index not in cached]
+    live = iter_transcribe_chunks(missing, backend, sample_rate, max_workers)
+    previous = None
+    for chunk in chunks:
+        if chunk.index in cached:
+            results = cached[chunk.index]["results"]
+        else:
+            _, results = next(live)
+            if cache is not None:
+                cache.put_chunk(cache_key, chunk.index, chunk.start, chunk.end, results)
+        for segment in _stitch_chunk(chunks, chunk.index, results, previous):
+            previous = segment
+            yield segment
+        release_pages(chunk.samples)
+    if cache is not None:
+        cache.mark_complete(cache_key)
+
+
+def transcribe_samples(samples: np.ndarray, backend: TranscriptionBackend, sample_rate: int = SAMPLE_RATE,
+                       max_workers: Optional[int] = None, vad: Optional[bool] = None,
+                       **plan_options) -> List[TranscriptSegment]:
+    """对已解码的 PCM 执行 (VAD →) 分块 → 并发转写 → 拼接"""
+    return list(iter_transcribe_samples(samples, backend, sample_rate, max_workers, vad=vad, **plan_options))
+
+
+_PLAN_DEFAULTS = {
+    name: parameter.default for name, parameter in inspect.signature(plan_chunks).parameters.items()
+    if parameter.default is not inspect.Parameter.empty and name != "sample_rate"
+}
+
+
+def transcript_cache_key(file_path: str, backend: TranscriptionBackend, sample_rate: int = SAMPLE_RATE,
+                         **plan_options) -> Tuple[str, str, Dict[str, Any]]:
+    """返回 (缓存键, 音频摘要, 分块参数)；分块参数补齐默认值，显式传入默认值与省略得到同一个键
+
+    是否开启 VAD 会改变分块方式，按实际生效的取值计入参数。
+    """
+    audio_digest = get_file_digest(file_path)
+    params = {**_PLAN_DEFAULTS, **plan_options, "sample_rate": sample_rate}
+    params["vad"] = vad_enabled(params.get("vad"))
+    return TranscriptCache.make_key(audio_digest, backend.name, backend.model, params), audio_digest, params
+
+
+def _iter_cached_transcript(entries: Dict[int, Dict[str, Any]]) -> Iterator[TranscriptSegment]:
+    """从完整的缓存结果重建片段，无需解码音频"""
+    chunks = [AudioChunk(index=i, start=entries[i]["start"], end=entries[i]["end"], samples=None)
+              for i in sorted(entries)]
+    previous = None
+    for chunk in chunks:
+        for segment in _stitch_chunk(chunks, chunk.index, entries[chunk.index]["results"], previous):
+            previous = segment
+            yield segment
+
+
+def iter_transcribe_audio_file(file_path: str, backend: Optional[TranscriptionBackend] = None,
+                               max_workers: Optional[int] = None, use_cache: bool = True,
+                               prepared: Optional[PreparedAudio] = None,
+                               **plan_options) -> Iterator[TranscriptSegment]:
+    """流式转写一个音视频文件，片段在所属分块完成后立即产出
+
+    prepared 为工作池中 prepare_audio_file 的结果时直接使用其解码与切分结果。
+    """
+    backend = backend or get_default_backend()
+    start_time = time.time()
+    cache, cache_key = None, None
+    if use_cache:
+        cache = get_transcript_cache()
+        cache_key, audio_digest, params = transcript_cache_key(file_path, backend, SAMPLE_RATE, **plan_options)
+        if cache.is_complete(cache_key):
+            segments = list(_iter_cached_transcript(cache.get_chunks(cache_key)))
+            print(f"♻️ 转写缓存完整命中: {file_path}，{len(segments)} 个片段，耗时 {time.time() - start_time:.2f}秒")
+            yield from segments
+            return
+
+        cache.begin(cache_key, audio_digest, backend.name, backend.model, params)
+
+    # 解码到内存映射的临时文件并切分，分块是映射上的视图；说话人分离等后续步骤复用同一份解码结果
+    if prepared is None:
+        prepared = prepare_audio_file(file_path, SAMPLE_RATE, plan_options.get("vad"),
+                                      {name: value for name, value in plan_options.items() if name != "vad"})
+    duration = prepared.pcm.duration
+    print(f"🎧 音频解码与切分完成: {file_path}，时长 {duration:.1f}秒，{len(prepared.plan)} 个分块，"
+          f"耗时 {prepared.prepare_seconds:.2f}秒")
+
+    segment_count = 0
+    with attach_pcm(prepared.pcm) as samples:
+        for segment in iter_transcribe_samples(samples, backend, SAMPLE_RATE, max_workers, cache=cache,
+                                               cache_key=cache_key, plan=prepared.plan, **plan_options):
+            segment_count += 1
+            yield segment
+    elapsed = time.time() - start_time
+    print(f"📝 转写完成: {segment_count} 个片段，耗时 {elapsed:.2f}秒 (实时率 {elapsed / max(duration, 1e-9):.3f})")
+
+
+def iter_transcribe_audio_files(file_paths: Sequence[str], backend: Optional[TranscriptionBackend] = None,
+                                max_workers: Optional[int] = None, use_cache: bool = True,
+                                pool: Optional[AudioWorkerPool] = None,
+                                **plan_options) -> Iterator[Tuple[int, TranscriptSegment]]:
+    """按顺序转写多个文件，产出 (文件序号, 片段)
+
+    解码、VAD 与切分在音频工作池中进行，与当前文件的转写重叠；工作池的背压保证解码最多领先转写 max_pending 个文件。
+    转写缓存完整命中的文件不提交解码任务。没有文件时直接返回，不创建默认转写后端。
+    """
+    if not file_paths:
+        return
+    backend = backend or get_default_backend()
+    pool = pool or get_audio_worker_pool()
+    vad = plan_options.get("vad")
+    options = {name: value for name, value in plan_options.items() if name != "vad"}
+    cache = get_transcript_cache() if use_cache else None
+    cached = [cache is not None and cache.is_complete(transcript_cache_key(path, backend, SAMPLE_RATE, **plan_options)[0])
+              for path in file_paths]
+    prepared = pool.imap(prepare_audio_file, [(path, SAMPLE_RATE, vad, options)
+                                              for path, hit in zip(file_paths, cached) if not hit])
+    try:
+        for index, (path, hit) in enumerate(zip(file_paths, cached)):
+            audio = None if hit else next(prepared)
+            for segment in iter_transcribe_audio_file(path, backend, max_workers, use_cache, audio, **plan_options):
+                yield index, segment
+    finally:
+        prepared.close()
+
+
+def transcribe_audio_file(file_path: str, backend: Optional[TranscriptionBackend] = None,
+                          max_workers: Optional[int] = None, use_cache: bool = True,
+                          **plan_options) -> List[TranscriptSegment]:
+    """转写一个音视频文件，返回带时间戳的片段列表"""
+    return list(iter_transcribe_audio_file(file_path, backend, max_workers, use_cache, **plan_options))
+
+
+async def aiter_transcribe_audio_file(file_path: str, backend: Optional[TranscriptionBackend] = None,
+                                      max_workers: Optional[int] = None, use_cache: bool = True,
+                                      **plan_options) -> AsyncIterator[TranscriptSegment]:
+    """iter_transcribe_audio_file 的异步版本：解码与转写在线程中进行，片段经队列交给事件循环
+
+    消费方提前退出或被取消时，后台线程在当前分块完成后停止。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def _produce():
+        try:
+            for segment in iter_transcribe_audio_file(file_path, backend, max_workers, use_cache, **plan_options):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, segment)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, _produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        if producer.done():
+            await producer
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_transcript(segments: Sequence[TranscriptSegment]) -> str:
+    """把片段渲染为带时间戳的纯文本"""
+    return "\n".join(f"[{format_timestamp(s.start)}] {s.speaker + '：' if s.speaker else ''}{s.text}" for s in segments)
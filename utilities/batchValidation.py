@@ -0,0 +1,104 @@
+"""批量输入验证的打包、解析与自适应批大小
+
+把多条 (上一轮 AI 回复, 用户输入) 合并为一次模型请求：相同的上下文只发送一次，按下标引用。
+每批的大小受输入 token 预算与输出 token 预算共同限制；模型输出无法解析时缩小批大小（乘性减），
+整批解析成功后逐步放大（每次约 +25%），解析失败的条目由调用方逐条重新验证。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import threading
+
+# 每条结果 {"id": 12, "label": "[Invalid]"} 大约占用的输出 token 数
+OUTPUT_TOKENS_PER_ITEM = 16
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+# 输出被截断、整体不是合法 JSON 时，逐个提取完整的 {"id": .., "label": ..} 对象
+_RESULT_OBJECT_RE = re.compile(r'\{\s*"id"\s*:\s*(\d+)\s*,\s*"label"\s*:\s*"([^"]*)"\s*\}')
+_LABELS = {"valid": "[Valid]", "invalid": "[Invalid]"}
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def build_batch_payload(items: Sequence[Tuple[str, str]]) -> str:
+    """把 (previous_ai_content, user_input) 列表编码为请求正文，上下文去重"""
+    contexts: Dict[str, int] = {}
+    payload_items = []
+    for i, (previous_ai_content, user_input) in enumerate(items):
+        context_index = contexts.setdefault(previous_ai_content or "", len(contexts))
+        payload_items.append({"id": i, "context": context_index, "user_input": user_input})
+    return json.dumps({"contexts": list(contexts), "items": payload_items}, ensure_ascii=False)
+
+
+def parse_batch_labels(response: str, count: int) -> List[Optional[str]]:
+    """解析模型返回的 JSON 数组，按 id 返回标签；缺失或无法识别的条目为 None"""
+    labels: List[Optional[str]] = [None] * count
+    match = _JSON_ARRAY_RE.search(response or "")
+    try:
+        results = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        results = None
+    if not isinstance(results, list):
+        results = [{"id": int(index), "label": label} for index, label in _RESULT_OBJECT_RE.findall(response or "")]
+    for position, result in enumerate(results):
+        if isinstance(result, dict):
+            index, label = result.get("id", position), result.get("label")
+        else:  # 模型只输出了标签数组
+            index, label = position, result
+        if not isinstance(index, int) or not 0 <= index < count or not isinstance(label, str):
+            continue
+        labels[index] = _LABELS.get(label.strip().strip("[]").lower())
+    return labels
+
+
+class AdaptiveBatchSizer:
+    """按 token 预算打包，并根据解析结果自适应调整每批的条数上限（线程安全）"""
+
+    def __init__(self, input_token_budget: Optional[int] = None, output_token_budget: Optional[int] = None,
+                 max_items: Optional[int] = None):
+        self.input_token_budget = input_token_budget or int(os.getenv("VALIDATION_BATCH_INPUT_TOKENS", "6000"))
+        self.output_token_budget = output_token_budget or int(os.getenv("VALIDATION_BATCH_OUTPUT_TOKENS", "1024"))
+        self.max_items = min(max_items or int(os.getenv("VALIDATION_BATCH_MAX_ITEMS", "48")),
+                             self.output_token_budget // OUTPUT_TOKENS_PER_ITEM)
+        self.item_limit = self.max_items
+        self._lock = threading.Lock()
+
+    def pack(self, items: Sequence[Tuple[str, str]], prompt_tokens: int = 0) -> List[List[int]]:
+        """把条目下标分成若干批；单条超过预算时独占一批"""
+        with self._lock:
+            item_limit = self.item_limit
+        batches: List[List[int]] = []
+        current: List[int] = []
+        seen_contexts: set = set()
+        used = prompt_tokens
+        for i, (previous_ai_content, user_input) in enumerate(items):
+            cost = estimate_tokens(user_input) + 12  # 每条的 JSON 结构开销
+            if previous_ai_content not in seen_contexts:
+                cost += estimate_tokens(previous_ai_content) + 4
+            if current and (len(current) >= item_limit or used + cost > self.input_token_budget):
+                batches.append(current)
+                current, seen_contexts, used = [], set(), prompt_tokens
+                cost = estimate_tokens(user_input) + estimate_tokens(previous_ai_content) + 16
+            current.append(i)
+            seen_contexts.add(previous_ai_content)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def record(self, batch_size: int, parsed: int):
+        """全部解析成功时放大上限，否则减半"""
+        with self._lock:
+            if parsed == batch_size:
+                if batch_size >= self.item_limit:
+                    self.item_limit = min(self.max_items, self.item_limit + max(1, self.item_limit // 4))
+            else:
+                self.item_limit = max(1, min(self.item_limit, batch_size) // 2)
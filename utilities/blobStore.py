@@ -0,0 +1,282 @@
+"""内容寻址的上传文件存储
+
+文件按 SHA-256 摘要只存一份（objects/ab/abcdef...），会话目录中的文件通过硬链接、reflink
+或符号链接指向它，无法链接时才复制。每个摘要记录引用它的会话路径（refs/<digest>.json），
+gc() 清理不再被引用的对象。摘要同时作为下游转写缓存的稳定键。
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有文件锁与 reflink，退化为进程内锁
+    fcntl = None
+
+HASH_CHUNK_SIZE = 1 << 20
+MANIFEST_NAME = ".manifest.json"
+_FICLONE = 0x40049409  # Linux ioctl，用于 btrfs/xfs 上的 reflink
+# 只有跨设备、无权限、链接数达到上限或文件系统不支持硬链接时才退化为 reflink / 符号链接 / 复制
+_LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP}
+
+
+class BlobStore:
+    """内容寻址存储，支持引用计数与垃圾回收"""
+
+    def __init__(self, root: Optional[str] = None, chunk_size: int = HASH_CHUNK_SIZE):
+        self.root = Path(root or os.getenv("BLOB_STORE_ROOT", "conversations/.blobs"))
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.refs_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        # (路径, inode, 大小, 修改时间) -> 摘要，避免重复哈希同一个未修改的源文件
+        self._digest_memo: Dict[Tuple[str, int, int, int], str] = {}
+
+    # -- 写入 --------------------------------------------------------------
+    def hash_file(self, path: Path) -> str:
+        """按固定大小分块流式计算 SHA-256"""
+        path = Path(path)
+        stat = path.stat()
+        memo_key = (str(path.resolve()), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        digest = self._digest_memo.get(memo_key)
+        if digest is not None:
+            return digest
+
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(self.chunk_size)
+                if not block:
+                    break
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        if len(self._digest_memo) > 4096:
+            self._digest_memo.clear()
+        self._digest_memo[memo_key] = digest
+        return digest
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def put(self, source_path: Path) -> Tuple[str, bool]:
+        """存入文件，返回 (摘要, 是否新写入)；摘要已存在时完全跳过复制"""
+        digest = self.hash_file(source_path)
+        object_path = self.object_path(digest)
+        if object_path.exists():
+            return digest, False
+
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=object_path.parent, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as out, open(source_path, "rb") as src:
+                shutil.copyfileobj(src, out, self.chunk_size)
+            os.chmod(temp_path, 0o444)  # 对象只读，防止通过硬链接被原地修改
+            os.replace(temp_path, object_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return digest, True
+
+    def link(self, digest: str, target_path: Path) -> str:
+        """把对象链接到 target_path，依次尝试硬链接、reflink、符号链接、复制，返回所用方式"""
+        object_path = self.object_path(digest)
+        target_path = Path(target_path)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # target_path 已存在时抛出 FileExistsError，由调用方换一个文件名；已有文件绝不会被覆盖或删除
+        method = None
+        try:
+            os.link(object_path, target_path)
+            method = "hardlink"
+        except OSError as e:
+            if e.errno not in _LINK_FALLBACK_ERRNOS:
+                raise
+        if method is None and _try_reflink(object_path, target_path):
+            method = "reflink"
+        if method is None:
+            try:
+                os.symlink(object_path.resolve(), target_path)
+                method = "symlink"
+            except OSError as e:
+                if e.errno not in _LINK_FALLBACK_ERRNOS:
+                    raise
+                _exclusive_copy(object_path, target_path)
+                method = "copy"
+
+        self._add_ref(digest, target_path)
+        _update_manifest(target_path, digest)
+        return method
+
+    # -- 引用计数与回收 -----------------------------------------------------
+    def _refs_path(self, digest: str) -> Path:
+        return self.refs_dir / f"{digest}.json"
+
+    def _read_refs(self, digest: str) -> List[str]:
+        try:
+            return json.loads(self._refs_path(digest).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _write_refs(self, digest: str, refs: List[str]):
+        refs_path = self._refs_path(digest)
+        if not refs:
+            refs_path.unlink(missing_ok=True)
+            return
+        _atomic_write_text(refs_path, json.dumps(sorted(set(refs)), ensure_ascii=False))
+
+    def _add_ref(self, digest: str, target_path: Path):
+        with self._locked():
+            refs = self._read_refs(digest)
+            refs.append(str(target_path.absolute()))
+            self._write_refs(digest, refs)
+
+    def ref_count(self, digest: str) -> int:
+        return len(self._read_refs(digest))
+
+    def release(self, target_path: Path):
+        """删除会话中的文件并释放它对对象的引用"""
+        target_path = Path(target_path)
+        digest = lookup_manifest_digest(target_path)
+        if target_path.exists() or target_path.is_symlink():
+            target_path.unlink()
+        if digest:
+            _update_manifest(target_path, None)
+            with self._locked():
+                refs = [ref for ref in self._read_refs(digest) if ref != str(target_path.absolute())]
+                self._write_refs(digest, refs)
+
+    def gc(self, grace_seconds: float = 600.0) -> Dict[str, int]:
+        """清理引用已失效的对象，返回删除的对象数与释放的字节数
+
+        grace_seconds 内新写入的对象不会被清理，避免与正在进行的 put → link 竞争。
+        """
+        removed, freed = 0, 0
+        now = time.time()
+        with self._locked():
+            for object_path in self.objects_dir.glob("*/*"):
+                if object_path.name.startswith(".incoming-"):
+                    continue
+                if now - object_path.stat().st_mtime < grace_seconds:
+                    continue
+                digest = object_path.name
+                live_refs = [ref for ref in self._read_refs(digest) if lookup_manifest_digest(Path(ref)) == digest
+                             and (Path(ref).exists() or Path(ref).is_symlink())]
+                self._write_refs(digest, live_refs)
+                if not live_refs:
+                    freed += object_path.stat().st_size
+                    object_path.unlink()
+                    removed += 1
+        return {"removed": removed, "freed_bytes": freed}
+
+    def _locked(self):
+        return _StoreLock(self._lock, self.root / ".lock")
+
+
+class _StoreLock:
+    """进程内线程锁 + 跨进程文件锁"""
+
+    def __init__(self, thread_lock: threading.Lock, lock_path: Path):
+        self.thread_lock = thread_lock
+        self.lock_path = lock_path
+        self._file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            self._file = open(self.lock_path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.thread_lock.release()
+
+
+# -- 会话清单 ----------------------------------------------------------------
+def lookup_manifest_digest(path: Path) -> Optional[str]:
+    """查询会话目录清单中记录的文件摘要"""
+    path = Path(path)
+    try:
+        manifest = json.loads((path.parent / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest.get(path.name)
+
+
+def _update_manifest(path: Path, digest: Optional[str]):
+    manifest_path = path.parent / MANIFEST_NAME
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+    if digest is None:
+        manifest.pop(path.name, None)
+    else:
+        manifest[path.name] = digest
+    _atomic_write_text(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+def _atomic_write_text(path: Path, text: str):
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def _try_reflink(source: Path, target: Path) -> bool:
+    """只在新建的 target 上尝试 reflink；target 已存在时抛出 FileExistsError，失败时只删除自己创建的文件"""
+    if fcntl is None:
+        return False
+    with open(source, "rb") as src, open(target, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return True
+        except OSError:
+            pass
+    target.unlink()
+    return False
+
+
+def _exclusive_copy(source: Path, target: Path):
+    """复制到新建的 target（"xb" 模式，不覆盖已有文件）"""
+    try:
+        with open(source, "rb") as src, open(target, "xb") as dst:
+            shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+    except FileExistsError:
+        raise
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    shutil.copystat(source, target)
+
+
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """返回进程内共享的内容寻址存储"""
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = BlobStore()
+    return _blob_store
+
+
+def get_file_digest(path: str) -> str:
+    """返回文件的内容摘要：会话内文件直接读取清单，其他文件流式计算"""
+    return lookup_manifest_digest(Path(path)) or get_blob_store().hash_file(Path(path))
@@ -0,0 +1,351 @@
+"""持久化的图检查点存储
+
+SqliteCheckpointSaver 把 LangGraph 检查点写入 SQLite（WAL 模式）：
+- 写入先进入内存缓冲，由后台线程按批在一个事务中提交；缓冲有上限，读操作前会先提交，保证读到自己的写入
+- 检查点与中间写入用 LangGraph 的序列化器编码，较大的负载（消息列表等）再经 zlib 压缩
+- 每个 (thread_id, checkpoint_ns) 只保留最近 keep_last 个检查点，旧检查点及其写入随提交一起清理
+
+进程重启后用同一个 thread_id 继续 graph.invoke(Command(resume=...))，即可恢复停在 interrupt 处的会话。
+get_checkpointer() 按 CHECKPOINT_BACKEND（sqlite / memory）返回进程内共享的检查点存储。
+"""
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import atexit
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+COMPRESS_MIN_BYTES = 512
+_COMPRESSED_SUFFIX = "+zlib"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """SQLite/WAL 检查点存储：批量写入、压缩序列化、按会话保留最近的检查点"""
+
+    def __init__(self, path: Optional[str] = None, keep_last: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = Path(path or os.getenv("CHECKPOINT_DB_PATH", "conversations/.checkpoints.sqlite3"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_last = keep_last or int(os.getenv("CHECKPOINT_KEEP_LAST", "5"))
+        self.batch_size = batch_size or int(os.getenv("CHECKPOINT_BATCH_SIZE", "256"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("CHECKPOINT_FLUSH_INTERVAL", "0.05"))
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+
+        # 待提交的 (sql, 参数) 以及本批涉及的 (thread_id, checkpoint_ns)，由 _buffer_lock 保护
+        self._buffer: List[Tuple[str, tuple]] = []
+        self._touched: set = set()
+        self._buffer_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="checkpoint-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # -- 序列化 --------------------------------------------------------------
+    def _dumps(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return type_ + _COMPRESSED_SUFFIX, zlib.compress(data, 1)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith(_COMPRESSED_SUFFIX):
+            return self.serde.loads_typed((type_[:-len(_COMPRESSED_SUFFIX)], zlib.decompress(data)))
+        return self.serde.loads_typed((type_, data))
+
+    # -- 批量写入 ------------------------------------------------------------
+    def _enqueue(self, statements: List[Tuple[str, tuple]], touched: Optional[Tuple[str, str]] = None) -> bool:
+        """加入写缓冲，返回缓冲是否已满（满时调用方需要同步提交，保证内存占用有上限）"""
+        with self._buffer_lock:
+            self._buffer.extend(statements)
+            if touched is not None:
+                self._touched.add(touched)
+            full = len(self._buffer) >= self.batch_size
+        self._wakeup.set()
+        return full
+
+    def flush(self):
+        """在一个事务中提交缓冲的写入，并清理超出保留数量的旧检查点"""
+        with self._db_lock:
+            with self._buffer_lock:
+                buffer, self._buffer = self._buffer, []
+                touched, self._touched = self._touched, set()
+            if not buffer:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in buffer:
+                    self._conn.execute(sql, params)
+                for thread_id, checkpoint_ns in touched:
+                    self._apply_retention(thread_id, checkpoint_ns)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _apply_retention(self, thread_id: str, checkpoint_ns: str):
+        row = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1),
+        ).fetchone()
+        if row is None:
+            return
+        oldest_kept = row[0]
+        self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                           (thread_id, checkpoint_ns, oldest_kept))
+        self._conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                           (thread_id, checkpoint_ns, oldest_kept))
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self.flush_interval:
+                threading.Event().wait(self.flush_interval)  # 攒批
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ 检查点批量写入失败: {e}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    # -- BaseCheckpointSaver ------------------------------------------------
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        next_config, full = self._put(config, checkpoint, metadata)
+        if full:
+            self.flush()
+        return next_config
+
+    def _put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> Tuple[RunnableConfig, bool]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self._dumps(checkpoint)
+        metadata_type, metadata_data = self._dumps(get_checkpoint_metadata(config, metadata))
+        full = self._enqueue([(
+            "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+             type_, data, metadata_type, metadata_data),
+        )], touched=(thread_id, checkpoint_ns))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}, full
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        if self._put_writes(config, writes, task_id, task_path):
+            self.flush()
+
+    def _put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                    task_path: str) -> bool:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        statements = []
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            # 与 MemorySaver 一致：普通写入只记录第一次，特殊通道（错误、中断等）总是覆盖
+            verb = "INSERT OR IGNORE" if write_idx >= 0 else "INSERT OR REPLACE"
+            type_, data = self._dumps(value)
+            statements.append((
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel, type_, data, task_path),
+            ))
+        return self._enqueue(statements)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        self.flush()
+        with self._db_lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            writes = self._select_writes(thread_id, checkpoint_ns, row[0])
+        return self._make_tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                f"FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if filter:
+                metadata = self._loads(row[4], row[5])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            with self._db_lock:
+                writes = self._select_writes(thread_id, checkpoint_ns, row[0])
+            yield self._make_tuple(thread_id, checkpoint_ns, row, writes)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush()
+        with self._db_lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def _select_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[tuple]:
+        return self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    def _make_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple, writes: List[tuple]) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, data, metadata_type, metadata = row
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=self._loads(type_, data),
+            metadata=self._loads(metadata_type, metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[(task_id, channel, self._loads(write_type, value))
+                            for task_id, channel, write_type, value in writes],
+        )
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # 与 MemorySaver 相同的字符串版本号，便于两种后端互换
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # -- 异步接口：SQLite 调用放到线程中执行，不阻塞事件循环 ----------------------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        # 序列化与入队在事件循环中完成（很快），只有缓冲满时才到线程中同步提交
+        next_config, full = self._put(config, checkpoint, metadata)
+        if full:
+            await asyncio.to_thread(self.flush)
+        return next_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        if self._put_writes(config, writes, task_id, task_path):
+            await asyncio.to_thread(self.flush)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """返回进程内共享的检查点存储（CHECKPOINT_BACKEND=sqlite|memory，默认 sqlite）"""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                backend = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+                _checkpointer = MemorySaver() if backend == "memory" else SqliteCheckpointSaver()
+    return _checkpointer
@@ -0,0 +1,367 @@
+"""按 token 预算裁剪对话历史
+
+会话越长，previous_messages 与 add_messages 累积的消息越多；每次调用只发送预算内的部分：
+- 从最新的消息往前保留，直到用完该模型的 token 预算（开头的 SystemMessage 固定保留）
+- 最新一条 AI 回复始终保留（验证提示词需要它），过长时截断为首尾两段
+- 超出预算的旧消息直接丢弃，或（提供 summarize 时）增量合并进一条摘要：
+  每个会话记录已摘要到的位置，新滑出窗口的消息只与上一版摘要合并一次，不会重复摘要整段历史
+  已裁剪过的历史（带摘要消息）再次 fit 时，新滑出窗口的消息并入其中的摘要，因此可以把 fit 的结果直接存回状态
+异步会话接口使用 afit：摘要通过 ainvoke_model 调用，不阻塞事件循环。
+token 数优先用 tiktoken 计算，编码不可用（未安装或无法下载）时按字符估算。
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langgraph.graph.message import add_messages
+
+from utilities.batchValidation import estimate_tokens
+
+# 每条消息的角色与分隔符开销（与 OpenAI 聊天格式的计数方式一致）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 各模型每次调用的历史消息预算，未列出的模型使用 CONTEXT_TOKEN_BUDGET
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    "Pro/deepseek-ai/DeepSeek-V3": 6000,
+    "Qwen/Qwen3-32B": 6000,
+}
+TRUNCATION_MARKER = "\n……（中间内容已省略）……\n"
+SUMMARY_PREFIX = "此前对话的摘要：\n"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(os.getenv("CONTEXT_TOKENIZER", "cl100k_base"))
+                except Exception as e:  # 未安装，或离线环境无法下载编码文件
+                    print(f"⚠️ tiktoken 不可用，token 数按字符估算: {type(e).__name__}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """计算文本的 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _content_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """超出 max_tokens 时保留开头与结尾（回复的结尾通常是向用户提出的问题）"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - count_tokens(TRUNCATION_MARKER))
+    head_tokens, tail_tokens = budget // 3, budget - budget // 3
+    # 按比例取字符后逐步收缩，避免逐 token 解码
+    ratio = len(text) / max(1, count_tokens(text))
+    head = text[:int(head_tokens * ratio)]
+    tail = text[len(text) - int(tail_tokens * ratio):] if tail_tokens else ""
+    while head and count_tokens(head) > head_tokens:
+        head = head[:int(len(head) * 0.9)]
+    while tail and count_tokens(tail) > tail_tokens:
+        tail = tail[len(tail) - int(len(tail) * 0.9):]
+    return head + TRUNCATION_MARKER + tail
+
+
+def context_budget(model: Optional[str] = None) -> int:
+    """返回模型的历史消息 token 预算"""
+    default = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+    return MODEL_CONTEXT_BUDGETS.get(model, default) if model else default
+
+
+def bounded_add_messages(left: Sequence[BaseMessage], right: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """add_messages 的有界版本：只在状态中保留最近 CONTEXT_MAX_STATE_MESSAGES 条消息"""
+    merged = add_messages(left, right)
+    max_messages = int(os.getenv("CONTEXT_MAX_STATE_MESSAGES", "200"))
+    return merged[-max_messages:] if len(merged) > max_messages else merged
+
+
+@dataclass
+class _SummaryState:
+    upto: int          # 已并入摘要的消息数（历史中的位置）
+    anchor: str        # 第 upto 条消息的摘要值，用于确认历史没有被改写
+    summary: str
+
+
+@dataclass
+class _PendingSummary:
+    key: str
+    upto: int
+    anchor: str
+    summary: str        # 合并前的摘要（上次的摘要或历史自带的摘要）
+    chunks: List[str]   # 依次并入摘要的新滑出窗口的消息，每段不超过预算
+
+
+@dataclass
+class _FitPlan:
+    pinned: List[BaseMessage]
+    kept: List[BaseMessage]
+    carried: str
+    pending: Optional[_PendingSummary]
+
+    def assemble(self, summary: str) -> List[BaseMessage]:
+        pinned = self.pinned + [SystemMessage(content=SUMMARY_PREFIX + summary)] if summary else self.pinned
+        return pinned + self.kept
+
+
+def _is_summary_message(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and _content_text(message).startswith(SUMMARY_PREFIX)
+
+
+def _message_digest(message: BaseMessage) -> str:
+    return hashlib.sha1(f"{message.type}\x00{_content_text(message)}".encode("utf-8")).hexdigest()
+
+
+class ContextWindowManager:
+    """按模型的 token 预算裁剪消息列表（线程安全）"""
+
+    def __init__(self, model: Optional[str] = None, budget: Optional[int] = None,
+                 max_message_tokens: Optional[int] = None,
+                 summarize: Optional[Callable[[str, str], str]] = None,
+                 asummarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+                 summary_tokens: Optional[int] = None, max_sessions: int = 1024):
+        self.model = model
+        self.budget = budget or context_budget(model)
+        self.max_message_tokens = max_message_tokens or int(os.getenv("CONTEXT_MAX_MESSAGE_TOKENS", str(self.budget // 2)))
+        self.summarize = summarize
+        self.asummarize = asummarize      # afit 使用的异步摘要函数，需与 summarize 同时提供
+        self.summary_tokens = summary_tokens or int(os.getenv("CONTEXT_SUMMARY_TOKENS", str(self.budget // 4)))
+        self.max_sessions = max_sessions
+        self._token_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._summaries: "OrderedDict[str, _SummaryState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def message_tokens(self, message: BaseMessage) -> int:
+        """单条消息的 token 数（按内容缓存，历史中的旧消息不重复计数）"""
+        key = (message.type, _content_text(message))
+        with self._lock:
+            tokens = self._token_cache.get(key)
+            if tokens is not None:
+                self._token_cache.move_to_end(key)
+                return tokens
+        tokens = count_tokens(key[1]) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self._token_cache[key] = tokens
+            if len(self._token_cache) > 8192:
+                self._token_cache.popitem(last=False)
+        return tokens
+
+    def fit(self, messages: Sequence[BaseMessage], session_id: Optional[str] = None) -> List[BaseMessage]:
+        """返回预算内的消息列表：固定的系统消息 + （可选的）旧消息摘要 + 最近的消息"""
+        plan = self._plan(messages, session_id)
+        if plan is None:
+            return []
+        summary = plan.carried
+        if plan.pending is not None:
+            summary = plan.pending.summary
+            for chunk in plan.pending.chunks:
+                try:
+                    summary = self.summarize(summary, chunk)
+                except Exception as e:
+                    print(f"❌ 对话摘要失败，保留上一版摘要: {e}")
+                summary = truncate_to_tokens(summary, self.summary_tokens)
+            self._store_summary(plan.pending, summary)
+        return plan.assemble(summary)
+
+    async def afit(self, messages: Sequence[BaseMessage], session_id: Optional[str] = None) -> List[BaseMessage]:
+        """fit 的异步版本：需要合并摘要时用 asummarize 调用模型，未提供 asummarize 时在线程中调用 summarize，不阻塞事件循环"""
+        plan = self._plan(messages, session_id)
+        if plan is None:
+            return []
+        summary = plan.carried
+        if plan.pending is not None:
+            summary = plan.pending.summary
+            for chunk in plan.pending.chunks:
+                try:
+                    if self.asummarize is not None:
+                        summary = await self.asummarize(summary, chunk)
+                    else:
+                        summary = await asyncio.to_thread(self.summarize, summary, chunk)
+                except Exception as e:
+                    print(f"❌ 对话摘要失败，保留上一版摘要: {e}")
+                summary = truncate_to_tokens(summary, self.summary_tokens)
+            self._store_summary(plan.pending, summary)
+        return plan.assemble(summary)
+
+    def _plan(self, messages: Sequence[BaseMessage], session_id: Optional[str]) -> Optional["_FitPlan"]:
+        """选出预算内保留的消息，并列出需要并入摘要的新滑出窗口的消息（不调用模型）"""
+        messages = list(messages or [])
+        if not messages:
+            return None
+        pinned: List[BaseMessage] = []
+        start = 0
+        if isinstance(messages[0], SystemMessage) and not _is_summary_message(messages[0]):
+            pinned, start = [messages[0]], 1
+        # 已经裁剪过的历史（例如保存在状态中的对话）带有上一次的摘要消息，新滑出窗口的消息在它的基础上继续合并
+        carried = ""
+        if start < len(messages) and _is_summary_message(messages[start]):
+            carried = _content_text(messages[start])[len(SUMMARY_PREFIX):]
+            start += 1
+
+        latest_ai = self._latest_ai_index(messages, start)
+        remaining = self.budget - sum(self.message_tokens(m) for m in pinned)
+        if self.summarize is not None:
+            remaining -= self.summary_tokens + MESSAGE_OVERHEAD_TOKENS
+        elif carried:
+            remaining -= count_tokens(SUMMARY_PREFIX + carried) + MESSAGE_OVERHEAD_TOKENS
+        latest_ai_message = self._bounded_message(messages[latest_ai]) if latest_ai >= 0 else None
+        if latest_ai_message is not None:
+            remaining -= self.message_tokens(latest_ai_message)  # 预留最新 AI 回复
+
+        kept: List[BaseMessage] = []
+        cut = len(messages)
+        for i in range(len(messages) - 1, start - 1, -1):
+            if i == latest_ai:
+                kept.append(latest_ai_message)
+            else:
+                tokens = self.message_tokens(messages[i])
+                if tokens > remaining:
+                    break
+                kept.append(messages[i])
+                remaining -= tokens
+            cut = i
+        if latest_ai_message is not None and latest_ai < cut:
+            kept.append(latest_ai_message)
+        kept.reverse()
+
+        pending = None
+        if cut > start and self.summarize is not None:
+            pending = self._pending_summary(messages, start, cut, session_id, carried)
+        return _FitPlan(pinned, kept, carried, pending)
+
+    def latest_ai_content(self, messages: Sequence[BaseMessage]) -> str:
+        """最新一条 AI 回复的内容（超出单条上限时截断）"""
+        messages = list(messages or [])
+        index = self._latest_ai_index(messages, 0)
+        if index < 0:
+            return ""
+        return truncate_to_tokens(_content_text(messages[index]), self.max_message_tokens)
+
+    def request_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(self.message_tokens(m) for m in messages)
+
+    def _latest_ai_index(self, messages: List[BaseMessage], start: int) -> int:
+        for i in range(len(messages) - 1, start - 1, -1):
+            if isinstance(messages[i], AIMessage):
+                return i
+        return -1
+
+    def _bounded_message(self, message: BaseMessage) -> BaseMessage:
+        text = _content_text(message)
+        truncated = truncate_to_tokens(text, self.max_message_tokens - MESSAGE_OVERHEAD_TOKENS)
+        if truncated is text:
+            return message
+        return message.model_copy(update={"content": truncated})
+
+    def _pending_summary(self, messages: List[BaseMessage], start: int, cut: int, session_id: Optional[str],
+                         carried: str = "") -> "_PendingSummary":
+        """增量摘要 messages[start:cut]：从该会话上次摘要到的位置继续，历史被改写时从 carried（历史自带的摘要）开始"""
+        key = session_id or _message_digest(messages[start])
+        with self._lock:
+            state = self._summaries.get(key)
+        if state is None or state.upto > cut or _message_digest(messages[state.upto - 1]) != state.anchor:
+            state = _SummaryState(upto=start, anchor="", summary=carried)
+        pending = _PendingSummary(key, cut, _message_digest(messages[cut - 1]), state.summary, [])
+        if state.upto == cut:
+            return pending
+
+        # 新滑出窗口的消息可能很多（例如首次载入长历史），按预算分段合并，每次请求的大小同样有上限
+        chunk: List[str] = []
+        chunk_tokens = 0
+        for message in messages[state.upto:cut]:
+            line = f"{message.type}: {truncate_to_tokens(_content_text(message), self.max_message_tokens)}"
+            tokens = count_tokens(line)
+            if chunk and chunk_tokens + tokens > self.budget:
+                pending.chunks.append("\n".join(chunk))
+                chunk, chunk_tokens = [], 0
+            chunk.append(line)
+            chunk_tokens += tokens
+        if chunk:
+            pending.chunks.append("\n".join(chunk))
+        return pending
+
+    def _store_summary(self, pending: "_PendingSummary", summary: str):
+        with self._lock:
+            self._summaries[pending.key] = _SummaryState(upto=pending.upto, anchor=pending.anchor, summary=summary)
+            self._summaries.move_to_end(pending.key)
+            if len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+
+
+CONVERSATION_SUMMARY_PROMPT = """
+你是一位对话记录员。下面给出此前对话的摘要，以及之后新增的对话内容。
+请在原摘要的基础上整合新内容，输出更新后的完整摘要：
+- 保留用户提出的需求、表格字段、已确认的决定和未解决的问题
+- 使用简洁的中文要点列表
+- 只输出摘要本身，不添加任何解释
+"""
+
+
+def summarize_conversation(previous_summary: str, new_content: str) -> str:
+    """调用模型把新滑出窗口的对话并入摘要"""
+    from langchain_core.messages import HumanMessage
+
+    from utilities.modelRelated import invoke_model
+
+    return invoke_model(
+        model_name=os.getenv("SUMMARY_MODEL", "Pro/deepseek-ai/DeepSeek-V3"),
+        messages=[SystemMessage(content=CONVERSATION_SUMMARY_PROMPT),
+                  HumanMessage(content=f"【此前的摘要】\n{previous_summary or '（无）'}\n\n【新增对话】\n{new_content}")],
+    )
+
+
+async def asummarize_conversation(previous_summary: str, new_content: str) -> str:
+    """summarize_conversation 的异步版本，供异步会话接口（astart / aresume）使用"""
+    from langchain_core.messages import HumanMessage
+
+    from utilities.modelRelated import ainvoke_model
+
+    return await ainvoke_model(
+        model_name=os.getenv("SUMMARY_MODEL", "Pro/deepseek-ai/DeepSeek-V3"),
+        messages=[SystemMessage(content=CONVERSATION_SUMMARY_PROMPT),
+                  HumanMessage(content=f"【此前的摘要】\n{previous_summary or '（无）'}\n\n【新增对话】\n{new_content}")],
+    )
+
+
+_context_windows: Dict[str, ContextWindowManager] = {}
+_context_windows_lock = threading.Lock()
+
+
+def get_context_window(model: Optional[str] = None) -> ContextWindowManager:
+    """返回进程内共享的按模型区分的 ContextWindowManager；CONTEXT_SUMMARIZE=1 时旧消息合并为摘要而不是丢弃"""
+    key = model or ""
+    manager = _context_windows.get(key)
+    if manager is None:
+        with _context_windows_lock:
+            manager = _context_windows.get(key)
+            if manager is None:
+                if os.getenv("CONTEXT_SUMMARIZE", "0") == "1":
+                    manager = ContextWindowManager(model, summarize=summarize_conversation,
+                                                   asummarize=asummarize_conversation)
+                else:
+                    manager = ContextWindowManager(model)
+                _context_windows[key] = manager
+    return manager
@@ -0,0 +1,407 @@
+"""会议附件（议程、报告、表格）的流式文本提取与分块
+
+附件不整体读入内存，提取与分块是一条生成器流水线：
+- PDF 逐页提取：安装了 pypdf 时使用 pypdf（传入文件对象，按需读取），否则使用内置的 pdfText（mmap + 按需解析对象）
+- CSV 用标准库 csv 逐行读取；xlsx 用 zipfile + iterparse 逐行解析工作表 XML，处理完的行立即清除
+- 文本文件（txt/md/csv）的编码只根据开头的样本检测（BOM → UTF-8 → chardet），之后按该编码流式解码
+- 提取出的单元（页、行）按 token 预算拼成分块；表格分块开头重复表头，分块不会跨越工作表
+分块结果按 (文件摘要, 提取器版本, 分块参数) 写入磁盘缓存（JSONL，完成后才生效），同一附件再次上传时直接按行读回。
+"""
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import codecs
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+from utilities.batchValidation import estimate_tokens
+from utilities.blobStore import get_file_digest
+
+# 修改提取或分块逻辑时同步更新版本号，使旧的缓存失效
+EXTRACTOR_VERSION = "1"
+ENCODING_SAMPLE_BYTES = 64 * 1024
+SUPPORTED_EXTENSIONS = ("pdf", "csv", "tsv", "xlsx", "txt", "md")
+
+
+@dataclass
+class DocumentChunk:
+    index: int
+    text: str
+    kind: str              # page / row / line
+    start: int             # 起始页码或行号（从 1 开始）
+    end: int
+    section: str = ""      # 工作表名
+    tokens: int = 0
+
+    @property
+    def location(self) -> str:
+        unit = {"page": "页", "row": "行", "line": "行"}.get(self.kind, "")
+        span = f"第 {self.start} {unit}" if self.start == self.end else f"第 {self.start}-{self.end} {unit}"
+        return f"{self.section} {span}" if self.section else span
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# (section, 位置, 文本, 表头)；表头在分块开头重复
+_Unit = Tuple[str, int, str, str]
+
+
+# -- 编码检测 -----------------------------------------------------------------
+def detect_encoding(path: str, sample_bytes: int = ENCODING_SAMPLE_BYTES) -> str:
+    """只读取文件开头 sample_bytes 字节判断编码：BOM → 能按 UTF-8 解码 → chardet → gb18030"""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # 样本末尾可能截断了一个多字节字符，用增量解码器忽略不完整的结尾
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        import chardet
+    except ImportError:
+        return "gb18030"
+    guess = chardet.detect(sample)
+    encoding = (guess.get("encoding") or "gb18030").lower()
+    # GB2312 是 GB18030 的子集，按超集解码避免生僻字报错
+    return "gb18030" if encoding in ("gb2312", "gbk") else encoding
+
+
+# -- 提取 ---------------------------------------------------------------------
+def _iter_pdf_units(path: str) -> Iterator[_Unit]:
+    if importlib.util.find_spec("pypdf") is not None:
+        from pypdf import PdfReader
+
+        with open(path, "rb") as f:
+            for number, page in enumerate(PdfReader(f).pages, start=1):
+                yield "", number, page.extract_text() or "", ""
+        return
+    from utilities.pdfText import iter_pdf_pages
+
+    for number, text in iter_pdf_pages(path):
+        yield "", number, text, ""
+
+
+def _format_row(cells: List[str]) -> str:
+    return " | ".join(cell.strip() for cell in cells)
+
+
+def _iter_csv_units(path: str, delimiter: Optional[str] = None) -> Iterator[_Unit]:
+    encoding = detect_encoding(path)
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        if delimiter is None:
+            sample = f.read(ENCODING_SAMPLE_BYTES)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",\t;|").delimiter
+            except csv.Error:
+                delimiter = ","
+        header = ""
+        for number, row in enumerate(csv.reader(f, delimiter=delimiter), start=1):
+            if not any(cell.strip() for cell in row):
+                continue
+            if not header:
+                header = _format_row(row)
+                continue
+            yield "", number, _format_row(row), header
+
+
+_XLSX_NS = {"main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+            "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+            "pkg": "http://schemas.openxmlformats.org/package/2006/relationships"}
+_CELL_REF = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _xlsx_text(element) -> str:
+    return "".join(node.text or "" for node in element.iter(f"{{{_XLSX_NS['main']}}}t"))
+
+
+def _iter_xlsx_units(path: str) -> Iterator[_Unit]:
+    """逐行读取 xlsx；不是 zip、缺少必要部件或 XML 损坏时抛出 ValueError"""
+    try:
+        yield from _read_xlsx_units(path)
+    except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError) as e:
+        raise ValueError(f"无法解析的 xlsx 文件: {path}: {e}") from e
+
+
+def _read_xlsx_units(path: str) -> Iterator[_Unit]:
+    main = f"{{{_XLSX_NS['main']}}}"
+    with zipfile.ZipFile(path) as archive:
+        names = set(archive.namelist())
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in names:
+            with archive.open("xl/sharedStrings.xml") as f:
+                for _, element in ElementTree.iterparse(f):
+                    if element.tag == f"{main}si":
+                        shared.append(_xlsx_text(element))
+                        element.clear()
+        with archive.open("xl/_rels/workbook.xml.rels") as f:
+            targets = {rel.get("Id"): rel.get("Target") for rel in ElementTree.parse(f).getroot()}
+        with archive.open("xl/workbook.xml") as f:
+            sheets = [(sheet.get("name"), targets.get(sheet.get(f"{{{_XLSX_NS['rel']}}}id")))
+                      for sheet in ElementTree.parse(f).getroot().iter(f"{main}sheet")]
+
+        for name, target in sheets:
+            if not target:
+                continue
+            member = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            header = ""
+            with archive.open(member) as f:
+                for _, element in ElementTree.iterparse(f):
+                    if element.tag != f"{main}row":
+                        continue
+                    cells: Dict[int, str] = {}
+                    for cell in element.iter(f"{main}c"):
+                        match = _CELL_REF.match(cell.get("r", ""))
+                        column = _column_index(match.group(1)) if match else len(cells)
+                        cell_type = cell.get("t")
+                        value = cell.find(f"{main}v")
+                        if cell_type == "inlineStr":
+                            text = _xlsx_text(cell)
+                        elif value is None or value.text is None:
+                            text = ""
+                        elif cell_type == "s":
+                            text = shared[int(value.text)]
+                        elif cell_type == "b":
+                            text = "TRUE" if value.text == "1" else "FALSE"
+                        else:
+                            text = value.text
+                        cells[column] = text
+                    number = int(element.get("r") or 0)
+                    element.clear()
+                    if not any(text.strip() for text in cells.values()):
+                        continue
+                    row = _format_row([cells.get(i, "") for i in range(max(cells) + 1)])
+                    if not header:
+                        header = row
+                        continue
+                    yield name, number, row, header
+
+
+def _iter_text_units(path: str) -> Iterator[_Unit]:
+    with open(path, "r", encoding=detect_encoding(path), errors="replace") as f:
+        for number, line in enumerate(f, start=1):
+            yield "", number, line.rstrip("\n"), ""
+
+
+_EXTRACTORS = {
+    "pdf": ("page", _iter_pdf_units),
+    "csv": ("row", _iter_csv_units),
+    "tsv": ("row", lambda path: _iter_csv_units(path, "\t")),
+    "xlsx": ("row", _iter_xlsx_units),
+    "txt": ("line", _iter_text_units),
+    "md": ("line", _iter_text_units),
+}
+
+
+def pdf_backend() -> str:
+    return "pypdf" if importlib.util.find_spec("pypdf") is not None else "builtin"
+
+
+# -- 分块 ---------------------------------------------------------------------
+def _split_text(text: str, max_tokens: int) -> Iterator[str]:
+    """把超过预算的单元按行、再按字符切开"""
+    if estimate_tokens(text) <= max_tokens:
+        yield text
+        return
+    buffer: List[str] = []
+    tokens = 0
+    for line in text.splitlines():
+        line_tokens = estimate_tokens(line)
+        if buffer and tokens + line_tokens > max_tokens:
+            yield "\n".join(buffer)
+            buffer, tokens = [], 0
+        if line_tokens > max_tokens:
+            step = max(1, len(line) * max_tokens // line_tokens)
+            for start in range(0, len(line), step):
+                yield line[start:start + step]
+            continue
+        buffer.append(line)
+        tokens += line_tokens
+    if buffer:
+        yield "\n".join(buffer)
+
+
+def chunk_units(units: Iterator[_Unit], kind: str, max_tokens: int) -> Iterator[DocumentChunk]:
+    """把 (section, 位置, 文本, 表头) 单元拼成不超过 max_tokens 的分块；同一时刻只保留一个分块的文本"""
+    parts: List[str] = []
+    tokens = 0
+    section, start, end = "", 0, 0
+    index = 0
+
+    def flush() -> Optional[DocumentChunk]:
+        nonlocal parts, tokens, index
+        text = "\n".join(parts).strip()
+        chunk = DocumentChunk(index, text, kind, start, end, section, tokens) if text else None
+        parts, tokens = [], 0
+        if chunk is not None:
+            index += 1
+        return chunk
+
+    for unit_section, position, text, header in units:
+        if parts and unit_section != section:
+            chunk = flush()
+            if chunk:
+                yield chunk
+        header_tokens = estimate_tokens(header)
+        for piece in _split_text(text, max(1, max_tokens - header_tokens)):
+            piece_tokens = estimate_tokens(piece)
+            if parts and tokens + piece_tokens > max_tokens:
+                chunk = flush()
+                if chunk:
+                    yield chunk
+            if not parts:
+                section, start = unit_section, position
+                if header:
+                    parts.append(header)
+                    tokens += header_tokens
+            parts.append(piece)
+            tokens += piece_tokens
+            end = position
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def _extract(path: str, max_tokens: int) -> Iterator[DocumentChunk]:
+    extension = Path(path).suffix.lower().lstrip(".")
+    if extension not in _EXTRACTORS:
+        raise ValueError(f"不支持的附件类型: .{extension}（支持 {', '.join(SUPPORTED_EXTENSIONS)}）")
+    kind, extractor = _EXTRACTORS[extension]
+    return chunk_units(extractor(path), kind, max_tokens)
+
+
+# -- 缓存 ---------------------------------------------------------------------
+class DocumentCache:
+    """按内容摘要缓存分块结果：每个键一个 JSONL 文件（分块）和一个 JSON 文件（元数据，写入即表示完成）"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or os.getenv("DOCUMENT_CACHE_DIR", "conversations/.cache/documents"))
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(digest: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([digest, EXTRACTOR_VERSION, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, cache_key: str) -> Tuple[Path, Path]:
+        return self.root / f"{cache_key}.jsonl", self.root / f"{cache_key}.json"
+
+    def metadata(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        _, meta_path = self._paths(cache_key)
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def iter_chunks(self, cache_key: str) -> Iterator[DocumentChunk]:
+        """逐行读回分块，不一次性载入"""
+        chunks_path, _ = self._paths(cache_key)
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield DocumentChunk(**json.loads(line))
+
+    def write(self, cache_key: str, chunks: Iterator[DocumentChunk], metadata: Dict[str, Any]) -> Iterator[DocumentChunk]:
+        """边产出分块边写入临时文件，全部完成后才替换为正式文件并写入元数据；中途失败不留下半成品"""
+        chunks_path, meta_path = self._paths(cache_key)
+        fd, partial = tempfile.mkstemp(dir=self.root, suffix=".part")
+        count = tokens = 0
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as output:
+                for chunk in chunks:
+                    output.write(json.dumps(chunk.to_dict(), ensure_ascii=False) + "\n")
+                    count += 1
+                    tokens += chunk.tokens
+                    yield chunk
+            os.replace(partial, chunks_path)
+        except BaseException:
+            Path(partial).unlink(missing_ok=True)
+            raise
+        meta_path.write_text(json.dumps({**metadata, "chunk_count": count, "tokens": tokens,
+                                         "created_at": time.time()}, ensure_ascii=False), encoding="utf-8")
+
+
+_document_cache: Optional[DocumentCache] = None
+_document_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DocumentCache:
+    """返回进程内共享的附件分块缓存"""
+    global _document_cache
+    if _document_cache is None:
+        with _document_cache_lock:
+            if _document_cache is None:
+                _document_cache = DocumentCache()
+    return _document_cache
+
+
+def document_cache_key(path: str, max_tokens: Optional[int] = None) -> Tuple[str, str, Dict[str, Any]]:
+    """返回 (缓存键, 文件摘要, 分块参数)"""
+    max_tokens = max_tokens or int(os.getenv("DOCUMENT_CHUNK_TOKENS", "800"))
+    digest = get_file_digest(path)
+    params = {"max_tokens": max_tokens, "pdf_backend": pdf_backend()}
+    return DocumentCache.make_key(digest, params), digest, params
+
+
+def iter_document_chunks(path: str, max_tokens: Optional[int] = None,
+                         use_cache: bool = True) -> Iterator[DocumentChunk]:
+    """流式产出附件的文本分块；缓存完整命中时直接读回，否则边提取边写入缓存"""
+    cache_key, digest, params = document_cache_key(path, max_tokens)
+    if not use_cache:
+        yield from _extract(path, params["max_tokens"])
+        return
+    cache = get_document_cache()
+    if cache.metadata(cache_key) is not None:
+        yield from cache.iter_chunks(cache_key)
+        return
+    yield from cache.write(cache_key, _extract(path, params["max_tokens"]),
+                           {"file_path": str(path), "digest": digest, **params})
+
+
+def ingest_document(path: str, max_tokens: Optional[int] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """提取并缓存一个附件，返回摘要信息（不保留分块文本）；之后用 iter_document_chunks 按需读取"""
+    start_time = time.time()
+    cache_key, digest, params = document_cache_key(path, max_tokens)
+    cached = use_cache and get_document_cache().metadata(cache_key) is not None
+    chunk_count = tokens = 0
+    first = last = None
+    for chunk in iter_document_chunks(path, max_tokens, use_cache):
+        chunk_count += 1
+        tokens += chunk.tokens
+        first = first or chunk
+        last = chunk
+    elapsed = time.time() - start_time
+    print(f"📄 附件{'缓存命中' if cached else '提取完成'}: {path}，{chunk_count} 个分块，约 {tokens} tokens，"
+          f"耗时 {elapsed:.2f}秒")
+    return {
+        "file_path": str(path),
+        "digest": digest,
+        "cache_key": cache_key,
+        "kind": first.kind if first else "",
+        "units": last.end if last else 0,
+        "chunk_count": chunk_count,
+        "tokens": tokens,
+        "cached": cached,
+    }
@@ -0,0 +1,399 @@
+"""长会议的分层 map-reduce 会议纪要
+
+转写片段按内容定义的边界切成约 MINUTES_CHUNK_TOKENS 的分块（在片段文本的哈希命中时切分，并设有上限），
+每个分块并发调用模型生成局部纪要（map），再按 MINUTES_REDUCE_FAN_IN 个一组逐层合并（reduce），
+直到得到一份包含要点、决定、待办事项（负责人、截止时间、时间戳）的结构化纪要。
+
+每个 map 结果以 (提示词版本, 模型, 分块文本哈希) 为键缓存，reduce 结果以子节点键的哈希为键缓存（类似 Merkle 树）。
+追加音频时只有最后一个分块及其到根的路径需要重新计算；修改中间某个片段时，分块边界在下一个内容边界处重新对齐，
+只影响附近一两个分块及其祖先节点。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from utilities.audioTranscription import format_timestamp
+from utilities.batchValidation import estimate_tokens
+from utilities.modelRelated import invoke_model
+from utilities.transcriptAnalysis import SUMMARY_MODEL
+
+MINUTES_MODEL = os.getenv("MINUTES_MODEL", SUMMARY_MODEL)
+# 提示词或输出格式变化时递增，使旧的缓存条目失效
+MINUTES_PROMPT_VERSION = "1"
+
+MAP_PROMPT = """
+你是一位专业的会议记录员。下面是一段会议转写，每行开头是时间戳，随后是说话人。
+请只根据这段内容输出一个 JSON 对象，不要输出任何其他文字：
+{"summary": ["要点", ...],
+ "decisions": [{"text": "决定的内容", "timestamp": "HH:MM:SS"}],
+ "action_items": [{"task": "待办内容", "owner": "负责人或 null", "due": "截止时间或 null", "timestamp": "HH:MM:SS"}]}
+- summary 使用简洁的中文，不超过 8 条
+- timestamp 取相关发言所在行的时间戳；owner 只填写转写中明确提到的人
+- 没有内容的字段输出空数组
+"""
+
+REDUCE_PROMPT = """
+你是一位专业的会议记录员。下面是同一场会议中按时间顺序排列的若干份分段纪要（JSON 数组）。
+请把它们合并为一份完整的会议纪要，输出格式与分段纪要相同的 JSON 对象，不要输出任何其他文字：
+- 合并重复或相近的要点，summary 不超过 15 条
+- 保留所有决定与待办事项，重复的只保留一条，保持原有的 timestamp、owner 与 due
+- 按时间顺序排列
+"""
+
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+# 片段文本哈希模 _BOUNDARY_DIVISOR 为 0 时作为候选分块边界
+_BOUNDARY_DIVISOR = 8
+
+
+@dataclass
+class MinutesChunk:
+    """一个 map 分块：连续的若干转写片段"""
+    index: int
+    start: float
+    end: float
+    text: str
+    tokens: int
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class MeetingMinutes:
+    """结构化会议纪要"""
+    summary: List[str] = field(default_factory=list)
+    decisions: List[Dict[str, Any]] = field(default_factory=list)
+    action_items: List[Dict[str, Any]] = field(default_factory=list)
+    start: float = 0.0
+    end: float = 0.0
+    missing: List[Dict[str, float]] = field(default_factory=list)   # 分段纪要生成失败、未包含在纪要中的时段
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def to_markdown(self) -> str:
+        lines = [f"## 会议纪要（{format_timestamp(self.start)} - {format_timestamp(self.end)}）", "", "### 要点"]
+        lines += [f"- {point}" for point in self.summary] or ["- （无）"]
+        lines += ["", "### 决定"]
+        lines += [f"- [{d.get('timestamp') or '--:--:--'}] {d['text']}" for d in self.decisions] or ["- （无）"]
+        lines += ["", "### 待办事项"]
+        for item in self.action_items:
+            details = "，".join(part for part in (item.get("owner") and f"负责人：{item['owner']}",
+                                                  item.get("due") and f"截止：{item['due']}") if part)
+            lines.append(f"- [{item.get('timestamp') or '--:--:--'}] {item['task']}" + (f"（{details}）" if details else ""))
+        if not self.action_items:
+            lines.append("- （无）")
+        if self.missing:
+            lines += ["", f"⚠️ 以下 {len(self.missing)} 个时段的分段纪要生成失败，未包含在上面的内容中："]
+            lines += [f"- {format_timestamp(m['start'])} - {format_timestamp(m['end'])}" for m in self.missing]
+        return "\n".join(lines)
+
+
+# -- 分块 --------------------------------------------------------------------
+def _segment_line(segment: Dict[str, Any]) -> str:
+    speaker = segment.get("speaker")
+    return f"[{format_timestamp(segment['start'])}] {speaker + '：' if speaker else ''}{segment['text']}"
+
+
+def _is_boundary(line: str) -> bool:
+    return int.from_bytes(hashlib.sha256(line.encode("utf-8")).digest()[:4], "big") % _BOUNDARY_DIVISOR == 0
+
+
+def chunk_transcript(segments: Sequence[Dict[str, Any]], target_tokens: Optional[int] = None) -> List[MinutesChunk]:
+    """按内容定义的边界切分转写片段
+
+    分块累计到 target_tokens 的一半之后，在第一个哈希命中的片段之后切分；达到 target_tokens 时强制切分。
+    边界只取决于片段自身的内容，因此追加或修改片段不会使后面所有分块的边界整体移动。
+    """
+    target_tokens = target_tokens or int(os.getenv("MINUTES_CHUNK_TOKENS", "2000"))
+    chunks: List[MinutesChunk] = []
+    lines: List[str] = []
+    tokens, start, end = 0, 0.0, 0.0
+
+    def flush():
+        nonlocal lines, tokens
+        if lines:
+            chunks.append(MinutesChunk(len(chunks), start, end, "\n".join(lines), tokens))
+        lines, tokens = [], 0
+
+    for segment in segments:
+        line = _segment_line(segment)
+        line_tokens = estimate_tokens(line) + 1
+        if lines and tokens + line_tokens > target_tokens:
+            flush()
+        if not lines:
+            start = segment["start"]
+        lines.append(line)
+        tokens += line_tokens
+        end = segment["end"]
+        if tokens >= target_tokens // 2 and _is_boundary(line):
+            flush()
+    flush()
+    return chunks
+
+
+# -- 模型输出解析与合并 ------------------------------------------------------
+def parse_minutes(response: str) -> Optional[Dict[str, Any]]:
+    """解析模型输出的纪要 JSON，字段缺失时补空，整体无法解析时返回 None"""
+    match = _JSON_OBJECT_RE.search(response or "")
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        return None
+    summary = data.get("summary") or []
+    if isinstance(summary, str):
+        summary = [line.strip("-• ").strip() for line in summary.splitlines()]
+    decisions = [{"text": str(d.get("text", "")).strip(), "timestamp": d.get("timestamp")}
+                 for d in data.get("decisions") or [] if isinstance(d, dict) and d.get("text")]
+    action_items = [{"task": str(a.get("task", "")).strip(), "owner": a.get("owner") or None,
+                     "due": a.get("due") or None, "timestamp": a.get("timestamp")}
+                    for a in data.get("action_items") or [] if isinstance(a, dict) and a.get("task")]
+    return {"summary": [str(s) for s in summary if str(s).strip()], "decisions": decisions, "action_items": action_items}
+
+
+def merge_minutes(parts: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """不调用模型，按顺序拼接多份纪要并去掉完全重复的条目（reduce 调用失败时的兜底）"""
+    merged = {"summary": [], "decisions": [], "action_items": []}
+    seen = set()
+    for part in parts:
+        for point in part["summary"]:
+            if ("summary", point) not in seen:
+                seen.add(("summary", point))
+                merged["summary"].append(point)
+        for decision in part["decisions"]:
+            if ("decision", decision["text"]) not in seen:
+                seen.add(("decision", decision["text"]))
+                merged["decisions"].append(decision)
+        for item in part["action_items"]:
+            if ("action", item["task"], item.get("owner")) not in seen:
+                seen.add(("action", item["task"], item.get("owner")))
+                merged["action_items"].append(item)
+    return merged
+
+
+# -- 缓存 --------------------------------------------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS minutes (
+    cache_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_minutes_last_access ON minutes(last_access);
+"""
+
+
+class MinutesCache:
+    """map / reduce 结果的持久化缓存（SQLite，线程安全），总大小超过上限时按最近访问时间淘汰"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or os.getenv("MINUTES_CACHE_PATH", "conversations/.cache/minutes.sqlite3"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.getenv("MINUTES_CACHE_MAX_BYTES", str(256 << 20)))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(kind: str, model: str, content: Any) -> str:
+        payload = json.dumps([MINUTES_PROMPT_VERSION, kind, model, content], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM minutes WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row:
+                self._conn.execute("UPDATE minutes SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, cache_key: str, kind: str, minutes: Dict[str, Any]):
+        payload = zlib.compress(json.dumps(minutes, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO minutes (cache_key, kind, payload, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, kind, payload, len(payload), now, now),
+            )
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """按最近访问时间淘汰条目，直到总大小不超过 max_bytes，返回淘汰条数"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        evicted = 0
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM minutes").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            for cache_key, size in self._conn.execute(
+                    "SELECT cache_key, size FROM minutes ORDER BY last_access").fetchall():
+                if total <= max_bytes:
+                    break
+                self._conn.execute("DELETE FROM minutes WHERE cache_key = ?", (cache_key,))
+                total -= size
+                evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM minutes GROUP BY kind").fetchall()
+        return {"path": str(self.path), "entries": {kind: count for kind, count, _ in rows},
+                "bytes": sum(size for _, _, size in rows), "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM minutes")
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_minutes_cache: Optional[MinutesCache] = None
+_minutes_cache_lock = threading.Lock()
+
+
+def get_minutes_cache() -> MinutesCache:
+    """返回进程内共享的纪要缓存"""
+    global _minutes_cache
+    if _minutes_cache is None:
+        with _minutes_cache_lock:
+            if _minutes_cache is None:
+                _minutes_cache = MinutesCache()
+    return _minutes_cache
+
+
+# -- map-reduce --------------------------------------------------------------
+def call_minutes_model(system_prompt: str, content: str, model_name: Optional[str] = None) -> str:
+    return invoke_model(model_name=model_name or MINUTES_MODEL,
+                        messages=[SystemMessage(content=system_prompt), HumanMessage(content=content)])
+
+
+class MinutesGenerator:
+    """分层 map-reduce 纪要生成器
+
+    同一层的 map / reduce 调用在大小为 max_workers 的线程池中并发执行（每个端点的总并发仍受 modelRelated 限制）。
+    调用失败或输出无法解析时，map 结果退化为空纪要、reduce 结果退化为直接拼接；退化的结果及其祖先节点不写入缓存，
+    下次生成时会重新计算。
+    """
+
+    def __init__(self, model_name: Optional[str] = None, call_model: Optional[Callable[[str, str], str]] = None,
+                 cache: Optional[MinutesCache] = None, max_workers: Optional[int] = None,
+                 chunk_tokens: Optional[int] = None, fan_in: Optional[int] = None):
+        self.model_name = model_name or MINUTES_MODEL
+        self.call_model = call_model or (lambda system_prompt, content: call_minutes_model(system_prompt, content,
+                                                                                           self.model_name))
+        self.cache = cache
+        self.max_workers = max_workers or int(os.getenv("MINUTES_MAX_CONCURRENCY", "8"))
+        self.chunk_tokens = chunk_tokens or int(os.getenv("MINUTES_CHUNK_TOKENS", "2000"))
+        self.fan_in = max(2, fan_in or int(os.getenv("MINUTES_REDUCE_FAN_IN", "6")))
+        self._metrics_lock = threading.Lock()
+
+    def generate(self, segments: Sequence[Dict[str, Any]]) -> MeetingMinutes:
+        started = time.perf_counter()
+        cache = self.cache or get_minutes_cache()
+        chunks = chunk_transcript(segments, self.chunk_tokens)
+        metrics = {"chunks": len(chunks), "map_calls": 0, "map_cache_hits": 0, "reduce_calls": 0,
+                   "reduce_cache_hits": 0, "failed_calls": 0, "failed_chunks": 0, "levels": 0}
+        if not chunks:
+            metrics["total_seconds"] = time.perf_counter() - started
+            return MeetingMinutes(metrics=metrics)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="minutes") as executor:
+            # 每个节点为 (缓存键, 纪要, 是否退化)
+            nodes = list(executor.map(lambda chunk: self._map(chunk, cache, metrics), chunks))
+            missing = [{"start": chunk.start, "end": chunk.end} for chunk, (_, _, degraded) in zip(chunks, nodes)
+                       if degraded]
+            metrics["failed_chunks"] = len(missing)
+            while len(nodes) > 1:
+                groups = [nodes[i:i + self.fan_in] for i in range(0, len(nodes), self.fan_in)]
+                nodes = list(executor.map(lambda group: self._reduce(group, cache, metrics), groups))
+                self._count(metrics, "levels")
+        cache.evict()
+
+        _, minutes, _ = nodes[0]
+        metrics["total_seconds"] = time.perf_counter() - started
+        return MeetingMinutes(summary=minutes["summary"], decisions=minutes["decisions"],
+                              action_items=minutes["action_items"], start=chunks[0].start, end=chunks[-1].end,
+                              missing=missing, metrics=metrics)
+
+    def _map(self, chunk: MinutesChunk, cache: MinutesCache, metrics: Dict[str, float]) -> Tuple[str, Dict[str, Any], bool]:
+        cache_key = cache.make_key("map", self.model_name, chunk.digest)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            self._count(metrics, "map_cache_hits")
+            return cache_key, cached, False
+        self._count(metrics, "map_calls")
+        minutes = self._call(MAP_PROMPT, chunk.text, metrics)
+        if minutes is None:
+            return cache_key, {"summary": [], "decisions": [], "action_items": []}, True
+        # 模型没有给出时间戳时取分块的起始时间
+        for entry in minutes["decisions"] + minutes["action_items"]:
+            entry["timestamp"] = entry.get("timestamp") or format_timestamp(chunk.start)
+        cache.put(cache_key, "map", minutes)
+        return cache_key, minutes, False
+
+    def _reduce(self, group: Sequence[Tuple[str, Dict[str, Any], bool]], cache: MinutesCache,
+                metrics: Dict[str, float]) -> Tuple[str, Dict[str, Any], bool]:
+        if len(group) == 1:
+            return group[0]
+        cache_key = cache.make_key("reduce", self.model_name, [key for key, _, _ in group])
+        degraded = any(child_degraded for _, _, child_degraded in group)
+        if not degraded:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self._count(metrics, "reduce_cache_hits")
+                return cache_key, cached, False
+        parts = [minutes for _, minutes, _ in group]
+        if not any(any(part.values()) for part in parts):   # 子节点全部失败，没有可合并的内容
+            return cache_key, merge_minutes(parts), True
+        self._count(metrics, "reduce_calls")
+        minutes = self._call(REDUCE_PROMPT, json.dumps(parts, ensure_ascii=False), metrics)
+        if minutes is None:
+            return cache_key, merge_minutes(parts), True
+        if not degraded:
+            cache.put(cache_key, "reduce", minutes)
+        return cache_key, minutes, degraded
+
+    def _count(self, metrics: Dict[str, float], name: str):
+        with self._metrics_lock:
+            metrics[name] += 1
+
+    def _call(self, system_prompt: str, content: str, metrics: Dict[str, float]) -> Optional[Dict[str, Any]]:
+        try:
+            minutes = parse_minutes(self.call_model(system_prompt, content))
+        except Exception as e:
+            print(f"❌ 生成分段纪要时出错: {e}")
+            minutes = None
+        if minutes is None:
+            self._count(metrics, "failed_calls")
+        return minutes
+
+
+def generate_meeting_minutes(segments: Sequence[Dict[str, Any]], **kwargs) -> MeetingMinutes:
+    """用默认参数为转写片段生成结构化会议纪要"""
+    return MinutesGenerator(**kwargs).generate(segments)
@@ -0,0 +1,509 @@
+"""结构化指标与链路追踪：模型调用与图节点的 span、计数器、直方图，以及可插拔的输出
+
+每次模型调用、每个图节点的一次执行都记录为一个 span（名称、类型、属性、耗时、状态、错误）。
+span 结束时更新进程内的计数器与直方图，再依次交给已注册的 sink（控制台、JSONL 文件或自定义回调）。
+当前节点名与 session_id 通过 contextvars 传递，节点中发起的模型调用自动带上这两个属性，
+asyncio.to_thread 与 LangGraph 的执行线程都会复制上下文。
+指标可导出为 Prometheus 文本格式或 JSON。
+"""
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import asyncio
+import bisect
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+
+# 默认的直方图分桶（秒），覆盖本地节点（毫秒级）到长时间的模型调用
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# 流式输出相邻两个 token 的间隔（秒）与输出速度（token/秒）
+INTER_TOKEN_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 30, 40, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+def _is_graph_interrupt(error: Optional[BaseException]) -> bool:
+    """是否为 LangGraph 的 interrupt/跳转信号；不主动导入 langgraph，未导入时错误不可能来自它"""
+    errors = sys.modules.get("langgraph.errors")
+    return errors is not None and isinstance(error, errors.GraphBubbleUp)
+
+
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+current_session: ContextVar[Optional[str]] = ContextVar("current_session", default=None)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+class Histogram:
+    """固定分桶的直方图（调用方需持有注册表的锁）"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """按分桶线性插值估算分位数"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Span:
+    """一次模型调用或节点执行；作为上下文管理器使用时，退出即结束并记录"""
+
+    def __init__(self, registry: "MetricsRegistry", kind: str, name: str, attributes: Dict[str, Any]):
+        self.registry = registry
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        # 流式统计：相邻 token 间隔直接计入本 span 的直方图，不为每个块保存时间戳
+        self.chunks = 0
+        self._first_token_at: Optional[float] = None
+        self._last_token_at: Optional[float] = None
+        self._inter_token: Optional[Histogram] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def mark_token(self):
+        """流式输出收到一个非空块：第一次记录首 token 延迟，之后记录与上一块的间隔"""
+        now = time.perf_counter()
+        if self._last_token_at is None:
+            self._first_token_at = now
+            self.attributes["ttft"] = now - self.start
+        else:
+            if self._inter_token is None:
+                self._inter_token = Histogram(INTER_TOKEN_BUCKETS)
+            self._inter_token.observe(now - self._last_token_at)
+        self._last_token_at = now
+        self.chunks += 1
+
+    def set_usage(self, usage: Optional[Dict[str, Any]]):
+        """从 LangChain 的 usage_metadata 中提取 Token 使用"""
+        if not usage:
+            return
+        self.attributes["input_tokens"] = usage.get("input_tokens", 0)
+        self.attributes["output_tokens"] = usage.get("output_tokens", 0)
+        self.attributes["total_tokens"] = usage.get("total_tokens", 0)
+        details = usage.get("output_token_details") or {}
+        if details.get("reasoning"):
+            self.attributes["reasoning_tokens"] = details["reasoning"]
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if isinstance(error, asyncio.CancelledError):
+            self.status = "cancelled"
+        elif _is_graph_interrupt(error):
+            self.status = "interrupted"  # interrupt() 暂停会话，不算错误
+        elif isinstance(error, TimeoutError):
+            self.status = "error"
+            self.error = str(error) or "调用超时"
+        elif error is not None:
+            self.status = "error"
+            self.error = str(error) or type(error).__name__
+        if self.chunks:
+            self._summarize_stream()
+        self.registry.record(self)
+
+    def _summarize_stream(self):
+        """输出速度按首 token 之后的解码阶段计算；没有 usage 时以块数近似 token 数"""
+        attributes = self.attributes
+        attributes["chunks"] = self.chunks
+        if self._inter_token is not None:
+            attributes["inter_token_p50"] = self._inter_token.quantile(0.5)
+            attributes["inter_token_p99"] = self._inter_token.quantile(0.99)
+        output_tokens = attributes.get("output_tokens") or self.chunks
+        decode_seconds = self._last_token_at - self._first_token_at
+        if output_tokens > 1 and decode_seconds > 0:
+            attributes["tokens_per_second"] = (output_tokens - 1) / decode_seconds
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class Sink:
+    """span 输出接口；on_start 可选，on_end 在 span 结束、指标更新之后调用"""
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+
+class CallbackSink(Sink):
+    """把结束的 span（字典形式）交给任意回调，例如推送到外部监控"""
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None]):
+        self.callback = callback
+
+    def on_end(self, span: Span):
+        self.callback(span.to_dict())
+
+
+class ConsoleSink(Sink):
+    """以原来的 emoji 格式在控制台打印模型调用的开始、耗时与 Token 使用"""
+
+    def __init__(self, kinds: Sequence[str] = ("llm",)):
+        self.kinds = set(kinds)
+
+    def on_start(self, span: Span):
+        if span.kind == "llm" and "llm" in self.kinds:
+            mode = span.attributes.get("mode")
+            suffix = {"tools": "(带工具)", "async": "(异步)", "tools_async": "(带工具, 异步)"}.get(mode, "")
+            print(f"🚀 开始调用LLM{suffix}: {span.name} (temperature={span.attributes.get('temperature')})")
+
+    def on_end(self, span: Span):
+        if span.kind not in self.kinds:
+            return
+        if span.kind == "node":
+            print(f"⏱️ 节点 {span.name} {span.status}，耗时: {span.duration:.3f}秒")
+            return
+
+        attributes = span.attributes
+        if span.status == "cancelled":
+            print(f"\n🛑 LLM调用已取消，耗时: {span.duration:.2f}秒")
+        elif span.status == "error":
+            print(f"\n❌ LLM调用失败，耗时: {span.duration:.2f}秒，错误: {span.error}")
+        else:
+            ttft = f"，首 token: {attributes['ttft']:.2f}秒" if "ttft" in attributes else ""
+            speed = f"，输出速度: {attributes['tokens_per_second']:.1f} token/秒" if "tokens_per_second" in attributes else ""
+            endpoint = f"（{attributes['provider']}）" if attributes.get("provider") else ""
+            print(f"\n⏱️ LLM调用完成{endpoint}，耗时: {span.duration:.2f}秒{ttft}{speed}")
+        if attributes.get("total_tokens"):
+            prefix = "失败前Token使用" if span.status != "ok" else "Token使用"
+            print(f"📊 {prefix}: 输入={attributes['input_tokens']:,} | 输出={attributes['output_tokens']:,} | "
+                  f"总计={attributes['total_tokens']:,}")
+            if attributes.get("reasoning_tokens"):
+                print(f"🧠 推理Token: {attributes['reasoning_tokens']:,} (内部推理过程)")
+                print(f"👀 可见输出Token: {attributes['output_tokens'] - attributes['reasoning_tokens']:,}")
+
+
+class JsonlSink(Sink):
+    """把结束的 span 逐行追加到 JSONL 文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MetricsRegistry:
+    """进程内的计数器、直方图与 sink 注册表（线程安全）"""
+
+    def __init__(self, sinks: Optional[List[Sink]] = None):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.sinks: List[Sink] = list(sinks or [])
+
+    # -- sink 管理 ---------------------------------------------------------
+    def add_sink(self, sink: Sink) -> Sink:
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink: Sink):
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    # -- 基础指标 ----------------------------------------------------------
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    def merge_histogram(self, name: str, histogram: Histogram, help: str = "", **labels):
+        """把调用方本地累计的直方图（例如一次流式调用的全部 token 间隔）一次性并入"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            target = series.get(key)
+            if target is None:
+                target = series[key] = Histogram(histogram.buckets)
+            target.merge(histogram)
+            if help:
+                self._help.setdefault(name, help)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """返回某个标签组合的直方图；不传标签时合并该指标的全部序列"""
+        with self._lock:
+            series = self._histograms.get(name, {})
+            if labels:
+                return series.get(_label_key(labels))
+            if not series:
+                return None
+            merged = Histogram(next(iter(series.values())).buckets)
+            for histogram in series.values():
+                merged.merge(histogram)
+            return merged
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(_label_key(labels), 0)
+            return sum(series.values())
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # -- span --------------------------------------------------------------
+    def span(self, kind: str, name: str, **attributes) -> Span:
+        """开始一个 span；node 与 session_id 默认取当前上下文"""
+        attributes.setdefault("node", current_node.get())
+        attributes.setdefault("session_id", current_session.get())
+        span = Span(self, kind, name, attributes)
+        for sink in self.sinks:
+            self._call_sink(sink.on_start, span)
+        return span
+
+    def record(self, span: Span):
+        """span 结束：更新指标并交给各 sink"""
+        attributes = span.attributes
+        if span.kind == "llm":
+            labels = {"model": span.name, "provider": attributes.get("provider")}
+            self.inc("llm_calls_total", help="模型调用次数", status=span.status, node=attributes.get("node"), **labels)
+            self.observe("llm_latency_seconds", span.duration, help="模型调用总耗时", **labels)
+            if "ttft" in attributes:
+                self.observe("llm_ttft_seconds", attributes["ttft"], help="模型调用首 token 延迟", **labels)
+            if span._inter_token is not None:
+                self.merge_histogram("llm_inter_token_seconds", span._inter_token, help="流式输出相邻 token 间隔", **labels)
+            if "tokens_per_second" in attributes:
+                self.observe("llm_output_tokens_per_second", attributes["tokens_per_second"], help="流式输出速度",
+                             buckets=TOKENS_PER_SECOND_BUCKETS, **labels)
+            for kind in ("input", "output", "reasoning"):
+                if attributes.get(f"{kind}_tokens"):
+                    self.inc("llm_tokens_total", attributes[f"{kind}_tokens"], help="模型 Token 使用量", kind=kind, **labels)
+        else:
+            labels = {"graph": attributes.get("graph"), "node": span.name}
+            self.inc(f"{span.kind}_calls_total", help="图节点执行次数", status=span.status, **labels)
+            self.observe(f"{span.kind}_latency_seconds", span.duration, help="图节点执行耗时", **labels)
+        for sink in self.sinks:
+            self._call_sink(sink.on_end, span)
+
+    def _call_sink(self, method: Callable[[Span], None], span: Span):
+        try:
+            method(span)
+        except Exception as e:
+            # sink 出错不能影响业务调用
+            print(f"⚠️ 指标输出失败 ({type(method.__self__).__name__}): {e}")
+
+    # -- 导出 --------------------------------------------------------------
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.to_dict()} for key, histogram in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} counter"]
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in self._histograms.items():
+                lines += [f"# HELP {name} {self._help.get(name, name)}", f"# TYPE {name} histogram"]
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+def _default_sinks() -> List[Sink]:
+    sinks: List[Sink] = []
+    if os.getenv("METRICS_CONSOLE", "1") != "0":
+        sinks.append(ConsoleSink())
+    if os.getenv("METRICS_JSONL_PATH"):
+        sinks.append(JsonlSink(os.environ["METRICS_JSONL_PATH"]))
+    return sinks
+
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """返回进程内共享的指标注册表；默认 sink 由 METRICS_CONSOLE / METRICS_JSONL_PATH 决定"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry(_default_sinks())
+    return _metrics
+
+
+def trace_node(node: str, graph: Optional[str] = None):
+    """图节点装饰器：记录节点 span，并在节点执行期间设置 current_node / current_session
+
+    同时支持同步与异步节点；state 取最后一个位置参数（兼容绑定方法）。
+    """
+    def decorator(func):
+        def _enter(args, kwargs):
+            state = kwargs.get("state", args[-1] if args else None)
+            session_id = state.get("session_id") if isinstance(state, dict) else None
+            tokens = (current_node.set(node), current_session.set(session_id or current_session.get()))
+            span = get_metrics().span("node", node, graph=graph)
+            return span, tokens
+
+        def _exit(span, tokens, error):
+            span.finish(error)
+            current_session.reset(tokens[1])
+            current_node.reset(tokens[0])
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                span, tokens = _enter(args, kwargs)
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException as e:
+                    _exit(span, tokens, e)
+                    raise
+                _exit(span, tokens, None)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            span, tokens = _enter(args, kwargs)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                _exit(span, tokens, e)
+                raise
+            _exit(span, tokens, None)
+            return result
+        return wrapper
+    return decorator
+
+
+def main(argv=None):
+    """命令行：把 JSONL 中的 span 记录汇总为指标"""
+    parser = argparse.ArgumentParser(description="把 JSONL span 记录汇总为 Prometheus / JSON 指标")
+    parser.add_argument("path", help="METRICS_JSONL_PATH 写出的文件")
+    parser.add_argument("--format", choices=["prometheus", "json"], default="prometheus")
+    args = parser.parse_args(argv)
+
+    registry = MetricsRegistry()
+    with open(args.path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            span = Span(registry, data.pop("kind"), data.pop("name"), {})
+            span.timestamp, span.duration = data.pop("timestamp"), data.pop("duration")
+            span.status, span.error = data.pop("status"), data.pop("error")
+            span.attributes = data
+            registry.record(span)
+    print(registry.to_prometheus() if args.format == "prometheus" else json.dumps(registry.to_json(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
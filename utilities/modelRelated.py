@@ -1,180 +1,418 @@
-from typing import Dict, List, Optional, Any, TypedDict, Annotated
-from langchain_openai import ChatOpenAI
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any, TypedDict, Annotated, Tuple
+from collections import OrderedDict
+import asyncio
+import importlib.util
+import inspect
+import threading
+import weakref
 from langchain_core.messages import BaseMessage
+import httpx
 import os
 import time
 
+from utilities.metrics import Span, get_metrics
+from utilities.providerRouter import Attempt, Endpoint, get_provider_router
 
-def invoke_model(model_name : str, messages : List[BaseMessage], temperature: float = 0.2) -> str:
-    """调用大模型"""
-    print(f"🚀 开始调用LLM: {model_name} (temperature={temperature})")
-    start_time = time.time()
-    if model_name.startswith("gpt-"):  # ChatGPT 系列模型
-        print("🔍 使用 OpenAI ChatGPT 模型")
-        base_url = "https://api.openai.com/v1"
-        api_key = os.getenv("OPENAI_API_KEY")
+if TYPE_CHECKING:
+    # langchain_openai 连带导入 openai 的全部类型定义，冷启动开销最大，首次创建客户端时才导入
+    from langchain_openai import ChatOpenAI
+
+
+# -- 模型客户端连接池 --------------------------------------------------------
+# 每个 provider 的默认地址与密钥环境变量；地址可通过 *_BASE_URL 覆盖（例如指向本地桩服务器）
+PROVIDERS = {
+    "openai": {
+        "label": "OpenAI ChatGPT",
+        "base_url": "https://api.openai.com/v1",
+        "base_url_env": "OPENAI_BASE_URL",
+        "api_key_env": "OPENAI_API_KEY",
+    },
+    "siliconflow": {
+        "label": "SiliconFlow",
+        "base_url": "https://api.siliconflow.cn/v1",
+        "base_url_env": "SILICONFLOW_BASE_URL",
+        "api_key_env": "SILICONFLOW_API_KEY",
+    },
+}
+
+
+def resolve_provider(model_name: str) -> Tuple[str, str, Optional[str]]:
+    """根据模型名称确定 provider，返回 (provider, base_url, api_key)"""
+    if model_name.startswith(("gpt-", "whisper-")):  # ChatGPT / Whisper 系列模型
+        provider = "openai"
     else:  # 其他模型，例如 deepseek, siliconflow...
-        print("🔍 使用 SiliconFlow 模型")
-        base_url = "https://api.siliconflow.cn/v1"
-        api_key = os.getenv("SILICONFLOW_API_KEY")
-    llm = ChatOpenAI(
-        model = model_name,
-        api_key=api_key, 
-        base_url=base_url,
-        streaming=True,
-        temperature=temperature
-    )
-
-    full_response = ""
+        provider = "siliconflow"
+    config = PROVIDERS[provider]
+    base_url = os.getenv(config["base_url_env"]) or config["base_url"]
+    return provider, base_url, os.getenv(config["api_key_env"])
+
 
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
     try:
-        total_tokens_used = {"input": 0, "output": 0, "total": 0}
-        
-        for chunk in llm.stream(messages):
-            chunk_content = chunk.content
-            print(chunk_content, end="", flush=True)
-            full_response += chunk_content
-            
-            # Extract token usage if available in chunk
-            if hasattr(chunk, 'usage_metadata') and chunk.usage_metadata:
-                usage = chunk.usage_metadata
-                total_tokens_used["input"] = usage.get('input_tokens', 0)
-                total_tokens_used["output"] = usage.get('output_tokens', 0)
-                total_tokens_used["total"] = usage.get('total_tokens', 0)
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
-        # Print timing and token usage
-        print(f"\n⏱️ LLM调用完成，耗时: {execution_time:.2f}秒")
-        if total_tokens_used["total"] > 0:
-            print(f"📊 Token使用: 输入={total_tokens_used['input']:,} | 输出={total_tokens_used['output']:,} | 总计={total_tokens_used['total']:,}")
-        
-    except Exception as e:
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"\n❌ LLM调用失败，耗时: {execution_time:.2f}秒，错误: {e}")
-        
-        # Print any token usage that was captured before failure
-        if total_tokens_used["total"] > 0:
-            print(f"📊 失败前Token使用: 输入={total_tokens_used['input']:,} | 输出={total_tokens_used['output']:,} | 总计={total_tokens_used['total']:,}")
-        
-        raise
-    
-    return full_response
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _loop_gone(loop_ref: "weakref.ref") -> bool:
+    loop = loop_ref()
+    return loop is None or loop.is_closed()
+
+
+class LLMClientRegistry:
+    """进程级的 ChatOpenAI 客户端注册表
+
+    按 (端点, 地址, model, temperature, streaming, 事件循环) 缓存客户端，同一端点的所有客户端
+    共享一个带 keep-alive 连接池的 httpx.Client（安装了 h2 时启用 HTTP/2），
+    避免每次调用都重新建立客户端、TCP 连接与 TLS 握手。异步连接池绑定创建它的事件循环，
+    因此按事件循环分别创建（多次 asyncio.run 时各用各的），循环关闭后其客户端与连接池在下次访问时被清理。
+    超过 max_size 时按 LRU 淘汰，闲置超过 idle_timeout 秒的客户端在下次访问时被清理。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, idle_timeout: Optional[float] = None,
+                 max_connections: Optional[int] = None):
+        self.max_size = max_size or int(os.getenv("LLM_CLIENT_POOL_MAX_SIZE", "32"))
+        self.idle_timeout = idle_timeout or float(os.getenv("LLM_CLIENT_IDLE_TIMEOUT", "300"))
+        self.max_connections = max_connections or int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+        self._clients: "OrderedDict[Tuple[str, str, str, float, bool, Optional[weakref.ref]], List[Any]]" = OrderedDict()
+        self._http_clients: Dict[str, httpx.Client] = {}
+        # 以事件循环对象为弱引用键（与 _provider_semaphores 相同），不依赖可能被复用的 id(loop)
+        self._async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, model_name: str, temperature: float, streaming: bool, endpoint: Optional[Endpoint] = None) -> "ChatOpenAI":
+        """获取（或创建）对应的模型客户端；不指定端点时按 resolve_provider 选择
+
+        重试由 ProviderRouter 负责换端点进行，客户端自身不再重试（max_retries=0）。
+        """
+        if endpoint is None:
+            provider, base_url, api_key = resolve_provider(model_name)
+        else:
+            provider, base_url, api_key = endpoint.name, endpoint.base_url, endpoint.resolve_api_key()
+        loop = _running_loop()
+        # 弱引用在循环存活时按循环比较，循环被回收后只等于自身，新循环即使复用了地址也不会命中旧客户端
+        key = (provider, base_url, model_name, float(temperature), streaming, weakref.ref(loop) if loop else None)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._clients.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+
+            self.stats["misses"] += 1
+            from langchain_openai import ChatOpenAI
+
+            llm = ChatOpenAI(
+                model=model_name,
+                api_key=api_key,
+                base_url=base_url,
+                streaming=streaming,
+                temperature=temperature,
+                max_retries=0,
+                http_client=self._get_http_client(provider),
+                http_async_client=self._get_async_http_client(provider, loop),
+            )
+            self._clients[key] = [llm, now]
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.stats["evictions"] += 1
+            return llm
+
+    def _get_http_client(self, provider: str) -> httpx.Client:
+        """同一端点（provider）共享的 HTTP 连接池（调用方需持有锁）"""
+        client = self._http_clients.get(provider)
+        if client is None:
+            client = httpx.Client(**self._http_client_options())
+            self._http_clients[provider] = client
+        return client
+
+    def _get_async_http_client(self, provider: str, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[httpx.AsyncClient]:
+        """当前事件循环中同一端点共享的异步 HTTP 连接池（调用方需持有锁）；不在事件循环中时返回 None，只做同步调用"""
+        if loop is None:
+            return None
+        # 连接持有所属循环的引用，循环不会自动被回收：已关闭的循环的连接池在这里显式丢弃
+        for closed in [other for other in self._async_http_clients.keys() if other.is_closed()]:
+            del self._async_http_clients[closed]
+        clients = self._async_http_clients.setdefault(loop, {})
+        client = clients.get(provider)
+        if client is None:
+            client = httpx.AsyncClient(**self._http_client_options())
+            clients[provider] = client
+        return client
+
+    def _http_client_options(self) -> Dict[str, Any]:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.idle_timeout,
+        )
+        return {
+            "http2": importlib.util.find_spec("h2") is not None,
+            "limits": limits,
+            "timeout": httpx.Timeout(600.0, connect=10.0),
+        }
+
+    def _evict_idle(self, now: float):
+        """清理闲置过久、或所属事件循环已关闭的客户端（调用方需持有锁）"""
+        expired = [key for key, (_, last_used) in self._clients.items()
+                   if now - last_used > self.idle_timeout or (key[5] is not None and _loop_gone(key[5]))]
+        for key in expired:
+            del self._clients[key]
+            self.stats["evictions"] += 1
+
+    def close(self):
+        """关闭所有连接池，主要用于进程退出或测试"""
+        with self._lock:
+            self._clients.clear()
+            for client in self._http_clients.values():
+                client.close()
+            self._http_clients.clear()
+            # 异步连接池只能在其事件循环中 aclose，这里仅丢弃引用
+            self._async_http_clients.clear()
+
+
+_client_registry: Optional[LLMClientRegistry] = None
+_client_registry_lock = threading.Lock()
+
+
+def get_llm_client_registry() -> LLMClientRegistry:
+    """返回进程内共享的客户端注册表"""
+    global _client_registry
+    if _client_registry is None:
+        with _client_registry_lock:
+            if _client_registry is None:
+                _client_registry = LLMClientRegistry()
+    return _client_registry
+
+
+def invoke_model(model_name : str, messages : List[BaseMessage], temperature: float = 0.2,
+                 on_token: Optional[Callable[[str], Any]] = None, hedge_after: Optional[float] = None) -> str:
+    """调用大模型（流式）
+
+    on_token 在每个非空的输出块到达时被调用（例如把 token 实时推送给前端），异常会中断本次调用。
+    端点选择、重试与熔断由 ProviderRouter 负责；已经输出 token 后失败不再重试，避免重复输出。
+    hedge_after 不为空时开启对冲（适合回复很短的验证调用）：改用非流式请求，
+    hedge_after 秒内未完成就向次优端点再发一个请求，on_token 在得到结果后被调用一次。
+    """
+    response_parts: List[str] = []
+
+    with _llm_span(model_name, temperature, "stream") as span:
+        def _stream(attempt: Attempt) -> str:
+            llm = _client_for(attempt, temperature, streaming=True, span=span)
+            for chunk in llm.stream(messages):
+                chunk_content = _consume_stream_chunk(chunk, span)
+                if chunk_content:
+                    attempt.mark_first_token()
+                    response_parts.append(chunk_content)
+                    if on_token is not None:
+                        on_token(chunk_content)
+            return "".join(response_parts)
+
+        def _hedged(attempt: Attempt) -> Tuple[str, Any]:
+            return attempt.endpoint.name, _client_for(attempt, temperature, streaming=False).invoke(messages)
+
+        router = get_provider_router()
+        if hedge_after is None:
+            return router.call(model_name, _stream, can_retry=lambda: not response_parts)
+        endpoint_name, response = router.call(model_name, _hedged, hedge_after=hedge_after)
+        return _deliver_hedged_response(endpoint_name, response, span, on_token)
+
+
+async def ainvoke_model(model_name: str, messages: List[BaseMessage], temperature: float = 0.2,
+                        timeout: Optional[float] = None, on_token: Optional[Callable[[str], Any]] = None,
+                        hedge_after: Optional[float] = None) -> str:
+    """异步调用大模型（流式），与 invoke_model 记录相同的耗时与 Token 指标
+
+    每个端点的并发调用数受信号量限制；timeout 为单次调用的超时时间（秒，含排队、重试与退避时间），
+    默认取 LLM_CALL_TIMEOUT。调用被取消时会向上抛出 CancelledError。
+    on_token 可以是普通函数或协程函数；hedge_after 的含义同 invoke_model，落后的请求会被取消。
+    """
+    response_parts: List[str] = []
+
+    with _llm_span(model_name, temperature, "async") as span:
+        async def _stream(attempt: Attempt) -> str:
+            llm = _client_for(attempt, temperature, streaming=True, span=span)
+            async with _get_provider_semaphore(attempt.endpoint.name):
+                span.set(queued=time.perf_counter() - span.start)
+                async for chunk in llm.astream(messages):
+                    chunk_content = _consume_stream_chunk(chunk, span)
+                    if chunk_content:
+                        attempt.mark_first_token()
+                        response_parts.append(chunk_content)
+                        if on_token is not None:
+                            result = on_token(chunk_content)
+                            if inspect.isawaitable(result):
+                                await result
+            return "".join(response_parts)
+
+        async def _hedged(attempt: Attempt) -> Tuple[str, Any]:
+            llm = _client_for(attempt, temperature, streaming=False)
+            async with _get_provider_semaphore(attempt.endpoint.name):
+                return attempt.endpoint.name, await llm.ainvoke(messages)
+
+        router = get_provider_router()
+        if hedge_after is None:
+            return await asyncio.wait_for(router.acall(model_name, _stream, can_retry=lambda: not response_parts),
+                                          timeout=_resolve_timeout(timeout))
+        endpoint_name, response = await asyncio.wait_for(router.acall(model_name, _hedged, hedge_after=hedge_after),
+                                                         timeout=_resolve_timeout(timeout))
+        text = _deliver_hedged_response(endpoint_name, response, span, None)
+        if on_token is not None and text:
+            result = on_token(text)
+            if inspect.isawaitable(result):
+                await result
+        return text
+
 
 def invoke_model_with_tools(model_name : str, messages : List[BaseMessage], tools : List[str], temperature: float = 0.2) -> Any:
     """调用大模型并使用工具"""
-    print(f"🚀 开始调用LLM(带工具): {model_name} (temperature={temperature})")
-    start_time = time.time()
-    
-    
-    
-    if model_name.startswith("gpt-"):  # ChatGPT 系列模型
-        print("🔍 使用 OpenAI ChatGPT 模型")
-        base_url = "https://api.openai.com/v1"
-        api_key = os.getenv("OPENAI_API_KEY")
-    else:  # 其他模型，例如 deepseek, siliconflow...
-        print("🔍 使用 SiliconFlow 模型")
-        base_url = "https://api.siliconflow.cn/v1"
-        api_key = os.getenv("SILICONFLOW_API_KEY")
-
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=api_key,
-        base_url=base_url,
-        streaming=False,
-        temperature=temperature
-    )
-    
-    try:
-        # 绑定工具到模型
-        llm_with_tools = llm.bind_tools(tools)
-        
-        print("📤 正在调用LLM...")
-        
-        response = llm_with_tools.invoke(messages)
-        
-        print("📥 LLM响应接收完成")
-        
-        # 打印响应内容（如果有）
-        if response.content:
-            print(f"\n💬 LLM回复内容:")
-            print(response.content)
-        
-        # Extract token usage information
-        token_usage = {"input": 0, "output": 0, "total": 0, "reasoning": 0}
-        if hasattr(response, 'usage_metadata') and response.usage_metadata:
-            usage = response.usage_metadata
-            token_usage["input"] = usage.get('input_tokens', 0)
-            token_usage["output"] = usage.get('output_tokens', 0)
-            token_usage["total"] = usage.get('total_tokens', 0)
-            
-            # Check for reasoning tokens (for reasoning models like Qwen3-32B)
-            if 'output_token_details' in usage and usage['output_token_details']:
-                token_usage["reasoning"] = usage['output_token_details'].get('reasoning', 0)
-        
-        # 检查是否有工具调用
-        if hasattr(response, 'tool_calls') and response.tool_calls:
-            print(f"\n🔧 检测到 {len(response.tool_calls)} 个工具调用:")
-            
-            # 打印每个工具调用的详细信息
-            for i, tool_call in enumerate(response.tool_calls):
-                print(f"\n📋 工具调用 {i+1}:")
-                print(f"   🔧 工具名称: {tool_call.get('name', 'unknown')}")
-                
-                # 提取工具参数
-                args = tool_call.get('args', {})
-                print(f"   📝 参数: {args}")
-                
-                # 如果是用户交互工具，特别显示问题
-                if tool_call.get('name') == 'request_user_clarification':
-                    question = args.get('question', '')
-                    context = args.get('context', '')
-                    if question:
-                        print(f"\n💬 ⭐ 用户问题: {question}")
-                        if context:
-                            print(f"📖 上下文: {context}")
-                elif tool_call.get('name') == '_collect_user_input':
-                    print(f"\n🔄 将收集用户输入信息")
-                    session_id = args.get('session_id', '')
-                    if session_id:
-                        print(f"📋 会话ID: {session_id}")
-            
-            end_time = time.time()
-            execution_time = end_time - start_time
-            print(f"\n⏱️ LLM调用完成(带工具调用)，耗时: {execution_time:.2f}秒")
-        else:
-            end_time = time.time()
-            execution_time = end_time - start_time
-            print(f"\n⏱️ LLM调用完成(无工具调用)，耗时: {execution_time:.2f}秒")
-        
-        # Print token usage information
-        if token_usage["total"] > 0:
-            print(f"📊 Token使用: 输入={token_usage['input']:,} | 输出={token_usage['output']:,} | 总计={token_usage['total']:,}")
-            if token_usage["reasoning"] > 0:
-                print(f"🧠 推理Token: {token_usage['reasoning']:,} (内部推理过程)")
-                visible_output = token_usage["output"] - token_usage["reasoning"]
-                print(f"👀 可见输出Token: {visible_output:,}")
-        else:
-            print("⚠️ 未能获取Token使用信息")
-        
-        # 返回完整响应以便调用者处理
-        return response
-        
-    except Exception as e:
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"\n❌ LLM调用失败，耗时: {execution_time:.2f}秒，错误: {e}")
-        
-        # Try to extract token usage even from failed requests
-        if 'response' in locals() and hasattr(response, 'usage_metadata') and response.usage_metadata:
-            usage = response.usage_metadata
-            input_tokens = usage.get('input_tokens', 0)
-            output_tokens = usage.get('output_tokens', 0)
-            total_tokens = usage.get('total_tokens', 0)
-            print(f"📊 失败前Token使用: 输入={input_tokens:,} | 输出={output_tokens:,} | 总计={total_tokens:,}")
-        
-        import traceback
-        traceback.print_exc()
-        raise
\ No newline at end of file
+    with _llm_span(model_name, temperature, "tools") as span:
+        def _invoke(attempt: Attempt) -> Any:
+            # 绑定工具到模型
+            llm_with_tools = _client_for(attempt, temperature, streaming=False, span=span).bind_tools(tools)
+            return llm_with_tools.invoke(messages)
+
+        response = get_provider_router().call(model_name, _invoke)
+        _record_tool_response(response, span)
+
+    # 返回完整响应以便调用者处理
+    return response
+
+
+async def ainvoke_model_with_tools(model_name: str, messages: List[BaseMessage], tools: List[str],
+                                   temperature: float = 0.2, timeout: Optional[float] = None) -> Any:
+    """异步调用大模型并使用工具，并发、重试与超时控制同 ainvoke_model"""
+    with _llm_span(model_name, temperature, "tools_async") as span:
+        async def _invoke(attempt: Attempt) -> Any:
+            llm = _client_for(attempt, temperature, streaming=False, span=span)
+            async with _get_provider_semaphore(attempt.endpoint.name):
+                span.set(queued=time.perf_counter() - span.start)
+                return await llm.bind_tools(tools).ainvoke(messages)
+
+        response = await asyncio.wait_for(get_provider_router().acall(model_name, _invoke),
+                                          timeout=_resolve_timeout(timeout))
+        _record_tool_response(response, span)
+
+    return response
+
+
+def _client_for(attempt: Attempt, temperature: float, streaming: bool, span: Optional[Span] = None) -> "ChatOpenAI":
+    """取本次尝试所选端点的客户端，并把端点与尝试次数记到 span 上"""
+    endpoint = attempt.endpoint
+    if span is not None:
+        span.set(provider=endpoint.name, attempts=attempt.number)
+    return get_llm_client_registry().get(endpoint.model, temperature, streaming, endpoint=endpoint)
+
+
+def _deliver_hedged_response(endpoint_name: str, response: Any, span: Span,
+                             on_token: Optional[Callable[[str], Any]]) -> str:
+    """对冲调用得到的非流式响应：整体回显并记录胜出的端点与 Token 使用"""
+    text = response.content or ""
+    span.set(provider=endpoint_name, hedged=True)
+    _consume_stream_chunk(response, span)
+    if text and on_token is not None:
+        on_token(text)
+    return text
+
+
+# -- 异步并发控制 ------------------------------------------------------------
+# 以事件循环对象为弱引用键：循环被回收时其信号量一并释放，新循环不会拿到绑定在旧循环上的信号量
+_provider_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _get_provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """按 (事件循环, 端点) 返回并发信号量，上限取 LLM_MAX_CONCURRENCY_<端点名> 或 LLM_MAX_CONCURRENCY"""
+    loop = asyncio.get_running_loop()
+    semaphores = _provider_semaphores.get(loop)
+    if semaphores is None:
+        semaphores = _provider_semaphores.setdefault(loop, {})
+    semaphore = semaphores.get(provider)
+    if semaphore is None:
+        limit = os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}") or os.getenv("LLM_MAX_CONCURRENCY", "16")
+        semaphore = semaphores.setdefault(provider, asyncio.Semaphore(int(limit)))
+    return semaphore
+
+
+def _resolve_timeout(timeout: Optional[float]) -> Optional[float]:
+    if timeout is not None:
+        return timeout
+    env_timeout = os.getenv("LLM_CALL_TIMEOUT")
+    return float(env_timeout) if env_timeout else None
+
+
+# -- 输出与统计 --------------------------------------------------------------
+# 安静模式：不在控制台逐块回显模型输出（服务端与压测场景下同步写 stdout 本身就是开销）
+_quiet_mode = os.getenv("LLM_QUIET", "0") == "1"
+
+
+def set_quiet_mode(quiet: bool = True):
+    """开启/关闭安静模式；耗时与 Token 统计仍通过 utilities.metrics 的 sink 输出"""
+    global _quiet_mode
+    _quiet_mode = quiet
+
+
+def _llm_span(model_name: str, temperature: float, mode: str) -> Span:
+    """开始一次模型调用的 span，节点名与 session_id 取自当前上下文，端点在选定后由 _client_for 记录"""
+    return get_metrics().span("llm", model_name, temperature=temperature, mode=mode)
+
+
+def _consume_stream_chunk(chunk: Any, span: Span) -> str:
+    """回显一个流式块并更新首 token 延迟、token 间隔与 Token 统计，返回块文本"""
+    chunk_content = chunk.content
+    if chunk_content:
+        span.mark_token()
+        if not _quiet_mode:
+            print(chunk_content, end="", flush=True)
+
+    # Extract token usage if available in chunk
+    if getattr(chunk, "usage_metadata", None):
+        span.set_usage(chunk.usage_metadata)
+    return chunk_content
+
+
+def _record_tool_response(response: Any, span: Span):
+    """记录带工具调用响应的 Token 使用，非安静模式下打印回复内容与工具调用详情"""
+    span.set_usage(getattr(response, "usage_metadata", None))
+    tool_calls = getattr(response, "tool_calls", None) or []
+    span.set(tool_calls=len(tool_calls))
+    if _quiet_mode:
+        return
+
+    # 打印响应内容（如果有）
+    if response.content:
+        print(f"\n💬 LLM回复内容:")
+        print(response.content)
+
+    # 检查是否有工具调用
+    if tool_calls:
+        print(f"\n🔧 检测到 {len(tool_calls)} 个工具调用:")
+
+        # 打印每个工具调用的详细信息
+        for i, tool_call in enumerate(tool_calls):
+            print(f"\n📋 工具调用 {i+1}:")
+            print(f"   🔧 工具名称: {tool_call.get('name', 'unknown')}")
+
+            # 提取工具参数
+            args = tool_call.get('args', {})
+            print(f"   📝 参数: {args}")
+
+            # 如果是用户交互工具，特别显示问题
+            if tool_call.get('name') == 'request_user_clarification':
+                question = args.get('question', '')
+                context = args.get('context', '')
+                if question:
+                    print(f"\n💬 ⭐ 用户问题: {question}")
+                    if context:
+                        print(f"📖 上下文: {context}")
+            elif tool_call.get('name') == '_collect_user_input':
+                print(f"\n🔄 将收集用户输入信息")
+                session_id = args.get('session_id', '')
+                if session_id:
+                    print(f"📋 会话ID: {session_id}")
@@ -0,0 +1,398 @@
+"""不依赖第三方库的 PDF 逐页文本提取（安装了 pypdf 时 documentIngestion 优先使用 pypdf）
+
+文件以只读 mmap 打开，不整体读入内存：
+- 扫描 "N G obj" 建立对象偏移表（后出现的定义覆盖先前的，兼容增量更新），对象按需解析
+- 按页面树顺序逐页解析内容流（支持 FlateDecode），只解释文本相关的运算符（BT/ET、Tf、Td/TD/T*/Tm、Tj/TJ/'/"）
+- 字体有 ToUnicode CMap 时按其映射（Type0/Identity-H 的中文 PDF 依赖它），否则按 cp1252 解码
+不支持对象流（PDF 1.5 的 /ObjStm）中的对象与加密文件，遇到时抛出 PDFUnsupportedError。
+单个内容流损坏（无法解压）时只跳过该页的文本，其余页面照常提取。
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import mmap
+import re
+import zlib
+
+
+class PDFUnsupportedError(ValueError):
+    """内置解析器无法处理的 PDF（对象流、加密等），安装 pypdf 后可以处理"""
+
+
+class _Ref:
+    __slots__ = ("num",)
+
+    def __init__(self, num: int):
+        self.num = num
+
+
+class _Name(str):
+    """PDF 名称对象（/Font），与字符串（bytes）区分"""
+
+
+class _Operator(str):
+    """内容流中的运算符或对象中的关键字"""
+
+
+class _Stream:
+    __slots__ = ("dict", "start")
+
+    def __init__(self, stream_dict: Dict[str, Any], start: int):
+        self.dict = stream_dict
+        self.start = start
+
+
+_WHITESPACE = b" \t\r\n\f\x00"
+_OBJ_HEADER = re.compile(rb"(?<![0-9])(\d+)\s+(\d+)\s+obj\b")
+_REF_TAIL = re.compile(rb"\s+(\d+)\s+R(?![A-Za-z])")
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+_REGULAR = re.compile(rb"[^\s()<>\[\]{}/%\x00]+")
+_ESCAPES = {ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b", ord("f"): b"\f",
+            ord("("): b"(", ord(")"): b")", ord("\\"): b"\\"}
+
+
+def _skip_space(data, pos: int) -> int:
+    length = len(data)
+    while pos < length:
+        byte = data[pos]
+        if byte in _WHITESPACE:
+            pos += 1
+        elif byte == 0x25:   # % 注释
+            end = data.find(b"\n", pos)
+            pos = length if end < 0 else end + 1
+        else:
+            break
+    return pos
+
+
+def _parse_literal(data, pos: int) -> Tuple[bytes, int]:
+    """pos 指向 "(" 之后；处理嵌套括号与转义"""
+    out = bytearray()
+    depth = 1
+    while pos < len(data):
+        byte = data[pos]
+        if byte == 0x5C:   # 反斜杠
+            pos += 1
+            escaped = data[pos]
+            if escaped in _ESCAPES:
+                out += _ESCAPES[escaped]
+                pos += 1
+            elif 0x30 <= escaped <= 0x37:   # 八进制
+                digits = re.match(rb"[0-7]{1,3}", data[pos:pos + 3]).group()
+                out.append(int(digits, 8) & 0xFF)
+                pos += len(digits)
+            elif escaped in b"\r\n":   # 续行
+                pos += 2 if data[pos:pos + 2] == b"\r\n" else 1
+            else:
+                out.append(escaped)
+                pos += 1
+            continue
+        if byte == 0x28:
+            depth += 1
+        elif byte == 0x29:
+            depth -= 1
+            if depth == 0:
+                return bytes(out), pos + 1
+        out.append(byte)
+        pos += 1
+    return bytes(out), pos
+
+
+def _parse(data, pos: int) -> Tuple[Any, int]:
+    """解析一个对象（或内容流中的运算符），返回 (值, 新位置)；到达末尾时返回 (None, len)"""
+    pos = _skip_space(data, pos)
+    if pos >= len(data):
+        return None, pos
+    byte = data[pos]
+    if data[pos:pos + 2] == b"<<":
+        result: Dict[str, Any] = {}
+        pos += 2
+        while True:
+            pos = _skip_space(data, pos)
+            if data[pos:pos + 2] == b">>" or pos >= len(data):
+                return result, pos + 2
+            key, pos = _parse(data, pos)
+            value, pos = _parse(data, pos)
+            result[str(key)] = value
+    if byte == 0x3C:   # <hex>
+        end = data.find(b">", pos)
+        digits = re.sub(rb"\s", b"", bytes(data[pos + 1:end]))
+        if len(digits) % 2:
+            digits += b"0"
+        return bytes.fromhex(digits.decode("ascii")), end + 1
+    if byte == 0x5B:   # [
+        items = []
+        pos += 1
+        while True:
+            pos = _skip_space(data, pos)
+            if pos >= len(data) or data[pos] == 0x5D:
+                return items, pos + 1
+            item, pos = _parse(data, pos)
+            items.append(item)
+    if byte == 0x28:
+        return _parse_literal(data, pos + 1)
+    if byte == 0x2F:   # /Name
+        match = _REGULAR.match(data, pos + 1)
+        name = match.group() if match else b""
+        return _Name(re.sub(rb"#([0-9A-Fa-f]{2})", lambda m: bytes([int(m.group(1), 16)]), name)
+                     .decode("latin-1")), pos + 1 + len(name)
+    match = _NUMBER.match(data, pos)
+    if match:
+        text = match.group()
+        if b"." not in text:
+            ref = _REF_TAIL.match(data, match.end())
+            if ref:
+                return _Ref(int(text)), ref.end()
+            return int(text), match.end()
+        return float(text), match.end()
+    match = _REGULAR.match(data, pos)
+    if match is None:   # 多余的分隔符，跳过
+        return _Operator(chr(byte)), pos + 1
+    word = match.group().decode("latin-1")
+    value = {"true": True, "false": False, "null": None}.get(word, _Operator(word))
+    return value, match.end()
+
+
+# -- ToUnicode CMap -----------------------------------------------------------
+_BFCHAR = re.compile(rb"beginbfchar(.*?)endbfchar", re.S)
+_BFRANGE = re.compile(rb"beginbfrange(.*?)endbfrange", re.S)
+_HEX = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+
+
+def _utf16(hex_digits: bytes) -> str:
+    raw = bytes.fromhex(re.sub(rb"\s", b"", hex_digits).decode("ascii"))
+    return raw.decode("utf-16-be", errors="ignore")
+
+
+class _Font:
+    def __init__(self, cmap: Optional[bytes]):
+        self.mapping: Dict[bytes, str] = {}
+        self.code_width = 1
+        if cmap:
+            self._load_cmap(cmap)
+
+    def _load_cmap(self, cmap: bytes) -> None:
+        for block in _BFCHAR.findall(cmap):
+            codes = _HEX.findall(block)
+            for source, target in zip(codes[::2], codes[1::2]):
+                self.mapping[bytes.fromhex(source.decode("ascii"))] = _utf16(target)
+        for block in _BFRANGE.findall(cmap):
+            for line in re.finditer(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])", block):
+                low, high = int(line.group(1), 16), int(line.group(2), 16)
+                width = len(line.group(1)) // 2
+                target = line.group(3)
+                if target.startswith(b"["):
+                    targets = [_utf16(t) for t in _HEX.findall(target)]
+                    for offset, text in enumerate(targets[:high - low + 1]):
+                        self.mapping[(low + offset).to_bytes(width, "big")] = text
+                else:
+                    base = bytes.fromhex(re.sub(rb"\s", b"", target[1:-1]).decode("ascii"))
+                    prefix, last = base[:-2], int.from_bytes(base[-2:], "big")
+                    for offset in range(min(high - low, 0xFFFF) + 1):
+                        self.mapping[(low + offset).to_bytes(width, "big")] = \
+                            (prefix + (last + offset).to_bytes(2, "big")).decode("utf-16-be", errors="ignore")
+        if self.mapping:
+            self.code_width = max(len(code) for code in self.mapping)
+
+    def decode(self, raw: bytes) -> str:
+        if not self.mapping:
+            return raw.decode("cp1252", errors="replace")
+        width = self.code_width
+        return "".join(self.mapping.get(raw[i:i + width], "") for i in range(0, len(raw), width))
+
+
+# -- 文档 ---------------------------------------------------------------------
+class SimplePDF:
+    """按需解析对象的只读 PDF；iter_pages 逐页产出 (页码, 文本)"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # 空文件
+            self._file.close()
+            raise PDFUnsupportedError(f"空的 PDF 文件: {path}")
+        if self._data[:4] != b"%PDF":
+            self.close()
+            raise PDFUnsupportedError(f"不是 PDF 文件: {path}")
+        self._offsets = {int(match.group(1)): match.end() for match in _OBJ_HEADER.finditer(self._data)}
+        self._fonts: Dict[int, _Font] = {}
+
+    def close(self) -> None:
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> "SimplePDF":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def resolve(self, value: Any) -> Any:
+        depth = 0
+        while isinstance(value, _Ref) and depth < 32:
+            value = self.object(value.num)
+            depth += 1
+        return value
+
+    def object(self, num: int) -> Any:
+        pos = self._offsets.get(num)
+        if pos is None:
+            return None
+        value, pos = _parse(self._data, pos)
+        if isinstance(value, dict):
+            pos = _skip_space(self._data, pos)
+            if self._data[pos:pos + 6] == b"stream":
+                pos += 6
+                pos += 2 if self._data[pos:pos + 2] == b"\r\n" else 1
+                return _Stream(value, pos)
+        return value
+
+    def stream_bytes(self, stream: _Stream) -> bytes:
+        length = self.resolve(stream.dict.get("Length"))
+        if not isinstance(length, int):
+            end = self._data.find(b"endstream", stream.start)
+            length = max(0, end - stream.start)
+        raw = self._data[stream.start:stream.start + length]
+        filters = self.resolve(stream.dict.get("Filter"))
+        for name in (filters if isinstance(filters, list) else [filters] if filters else []):
+            if name in ("FlateDecode", "Fl"):
+                try:
+                    raw = zlib.decompressobj().decompress(raw)
+                except zlib.error as e:
+                    raise PDFUnsupportedError(f"无法解压的 FlateDecode 流: {e}") from e
+            else:
+                return b""   # 图片等其他编码的流不含文本
+        return raw
+
+    def _catalog(self) -> Dict[str, Any]:
+        trailer_at = self._data.rfind(b"trailer")
+        if trailer_at >= 0:
+            trailer, _ = _parse(self._data, trailer_at + 7)
+            if isinstance(trailer, dict):
+                if "Encrypt" in trailer:
+                    raise PDFUnsupportedError("加密的 PDF")
+                root = self.resolve(trailer.get("Root"))
+                if isinstance(root, dict):
+                    return root
+        for num in self._offsets:   # 交叉引用流：直接找 /Type /Catalog
+            value = self.object(num)
+            value = value.dict if isinstance(value, _Stream) else value
+            if isinstance(value, dict) and value.get("Type") == "Catalog":
+                return value
+            if isinstance(value, dict) and value.get("Type") == "ObjStm":
+                raise PDFUnsupportedError("对象保存在对象流中（PDF 1.5+）")
+        raise PDFUnsupportedError("找不到文档目录（Catalog）")
+
+    def iter_page_dicts(self) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """按顺序产出 (页面字典, 继承后的资源字典)"""
+        stack = [(self.resolve(self._catalog().get("Pages")), None)]
+        seen = set()
+        while stack:
+            node, resources = stack.pop()
+            if not isinstance(node, dict) or id(node) in seen:
+                continue
+            seen.add(id(node))
+            resources = self.resolve(node.get("Resources")) or resources
+            kids = self.resolve(node.get("Kids"))
+            if node.get("Type") == "Pages" or kids:
+                stack.extend((self.resolve(kid), resources) for kid in reversed(kids or []))
+            else:
+                yield node, resources or {}
+
+    def _font(self, ref: Any) -> _Font:
+        key = ref.num if isinstance(ref, _Ref) else id(ref)
+        font = self._fonts.get(key)
+        if font is None:
+            font_dict = self.resolve(ref) or {}
+            to_unicode = self.resolve(font_dict.get("ToUnicode")) if isinstance(font_dict, dict) else None
+            font = _Font(self.stream_bytes(to_unicode) if isinstance(to_unicode, _Stream) else None)
+            self._fonts[key] = font
+        return font
+
+    def page_text(self, page: Dict[str, Any], resources: Dict[str, Any]) -> str:
+        contents = self.resolve(page.get("Contents"))
+        streams = contents if isinstance(contents, list) else [contents]
+        data = b"\n".join(self.stream_bytes(s) for s in (self.resolve(s) for s in streams) if isinstance(s, _Stream))
+        fonts = self.resolve(resources.get("Font")) or {}
+        return _interpret(data, lambda name: self._font(fonts.get(name)) if name in fonts else _Font(None))
+
+    def iter_pages(self) -> Iterator[Tuple[int, str]]:
+        for number, (page, resources) in enumerate(self.iter_page_dicts(), start=1):
+            try:
+                text = self.page_text(page, resources)
+            except PDFUnsupportedError as e:
+                print(f"⚠️ 第 {number} 页无法提取，已跳过: {e}")
+                text = ""
+            yield number, text
+
+
+def _text_string(raw: bytes) -> str:
+    """文本字符串（如 /ActualText）：带 BOM 的为 UTF-16，否则按 PDFDocEncoding 近似为 latin-1"""
+    if raw.startswith(b"\xfe\xff"):
+        return raw[2:].decode("utf-16-be", errors="ignore")
+    return raw.decode("latin-1")
+
+
+def _interpret(data: bytes, font_for) -> str:
+    """解释内容流中的文本运算符，换行按文本矩阵的纵向移动判断
+
+    带 /ActualText 的标记内容（BDC … EMC）以 ActualText 代替其中绘制的字形，避免重复或无法映射的字形。
+    """
+    lines: List[str] = []
+    current: List[str] = []
+    operands: List[Any] = []
+    marked: List[Optional[str]] = []   # 标记内容栈，元素为 ActualText（没有时为 None）
+    font = _Font(None)
+    pos = 0
+
+    def newline():
+        nonlocal current
+        if current:
+            lines.append("".join(current))
+            current = []
+
+    while pos < len(data):
+        value, pos = _parse(data, pos)
+        if not isinstance(value, _Operator):
+            if value is not None or pos < len(data):
+                operands.append(value)
+            continue
+        op = str(value)
+        suppressed = any(text is not None for text in marked)
+        if op == "Tf" and len(operands) >= 2:
+            font = font_for(operands[-2])
+        elif op in ("Td", "TD") and len(operands) >= 2 and operands[-1]:
+            newline()
+        elif op in ("T*", "ET", "'", '"', "Tm"):
+            newline()
+        elif op == "BDC":
+            properties = operands[-1] if operands and isinstance(operands[-1], dict) else {}
+            actual = properties.get("ActualText")
+            text = _text_string(actual) if isinstance(actual, bytes) and not suppressed else None
+            marked.append(text)
+            if text:
+                current.append(text)
+        elif op == "BMC":
+            marked.append(None)
+        elif op == "EMC" and marked:
+            marked.pop()
+        elif op == "BI":   # 内嵌图片：跳到 EI
+            end = data.find(b"EI", pos)
+            pos = len(data) if end < 0 else end + 2
+        if not suppressed:
+            if op in ("Tj", "'", '"') and operands and isinstance(operands[-1], bytes):
+                current.append(font.decode(operands[-1]))
+            elif op == "TJ" and operands and isinstance(operands[-1], list):
+                for item in operands[-1]:
+                    if isinstance(item, bytes):
+                        current.append(font.decode(item))
+                    elif isinstance(item, (int, float)) and item < -250:
+                        current.append(" ")
+        operands = []
+    newline()
+    return "\n".join(line.rstrip() for line in lines if line.strip())
+
+
+def iter_pdf_pages(path: str) -> Iterator[Tuple[int, str]]:
+    """逐页产出 (页码, 文本)"""
+    with SimplePDF(path) as pdf:
+        yield from pdf.iter_pages()
@@ -1,67 +1,205 @@
 from __future__ import annotations
-from bs4 import BeautifulSoup
 from pathlib import Path
 import re
 import os
-import json
-from pathlib import Path
-import subprocess
-import chardet
-from typing import Union, List, Dict
-import pandas as pd
+import itertools
+from collections import OrderedDict
+from typing import Union, List, Dict, Optional, Tuple
 from datetime import datetime
-import shutil
+import threading
+import time
 
-from utilities.modelRelated import invoke_model
+from utilities.blobStore import get_blob_store, lookup_manifest_digest
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+# -- 文件路径检测 --------------------------------------------------------------
+# 按类别登记可识别的扩展名，register_file_type 可扩展新的类别
+FILE_TYPES: Dict[str, Tuple[str, ...]] = {
+    "audio": ("mp3", "wav", "flac", "aac", "ogg", "m4a", "wma", "opus", "mp4", "avi", "mov", "mkv", "webm", "3gp"),
+    "document": ("pdf", "docx", "doc", "txt", "md", "csv", "xlsx", "xls", "pptx"),
+}
+_EXTENSION_CATEGORIES: Dict[str, str] = {}
+_ANCHOR_PATTERNS: Dict[Optional[Tuple[str, ...]], re.Pattern] = {}
+_PATH_PATTERN: Optional[re.Pattern] = None
+MAX_PATH_LENGTH = 1024
+
+
+def register_file_type(category: str, extensions) -> None:
+    """登记（或扩展）一个文件类别的扩展名，检测用的正则随之重新编译"""
+    FILE_TYPES[category] = tuple(dict.fromkeys((*FILE_TYPES.get(category, ()), *(e.lower().lstrip(".") for e in extensions))))
+    _compile_path_pattern()
+
+
+def classify_file(path: str) -> Optional[str]:
+    """按扩展名返回文件类别（audio / document / ...），无法识别时返回 None"""
+    return _EXTENSION_CATEGORIES.get(Path(path).suffix.lower().lstrip("."))
+
+
+def _compile_path_pattern() -> None:
+    """编译带命名分组的路径形式正则（只匹配扩展名锚点前的单个词元），并清空扩展名锚点正则的缓存"""
+    global _PATH_PATTERN
+    _ANCHOR_PATTERNS.clear()
+    _EXTENSION_CATEGORIES.clear()
+    for category, extensions in FILE_TYPES.items():
+        for extension in extensions:
+            _EXTENSION_CATEGORIES.setdefault(extension, category)
+    segment = r"[^\\/\s]+"
+    # 词元已经以扩展名结尾，各形式只需锚定在词元末尾
+    _PATH_PATTERN = re.compile(
+        # Windows 路径 (C:\path\file.ext 或 D:/path/file.ext)
+        rf"(?:(?P<windows>(?<![A-Za-z])[A-Za-z]:[\\/](?:{segment}[\\/])*{segment})"
+        # 相对路径 (./path/file.ext 或 ../path/file.ext)
+        rf"|(?P<relative>\.{{1,2}}[\\/](?:{segment}[\\/])*{segment})"
+        # POSIX 绝对路径 (/path/file.ext 或 ~/path/file.ext)
+        rf"|(?P<posix>(?<![\w.\-~/\\])~?/(?:{segment}/)*{segment})"
+        # 简单文件名 (filename.ext)，支持中文字符
+        rf"|(?P<filename>\b[a-zA-Z0-9_\u4e00-\u9fff\-\(\)（）]+))\Z",
+        re.IGNORECASE,
+    )
+
+
+_compile_path_pattern()
+
+
+class StatCache:
+    """带 TTL 的文件存在性缓存：同一路径在 ttl 秒内只查询一次文件系统，条目数有上限（LRU）"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("FILE_STAT_CACHE_MAX_SIZE", "4096"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("FILE_STAT_CACHE_TTL", "5"))
+        self._entries: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def exists_many(self, paths: List[str]) -> Dict[str, bool]:
+        """批量查询存在性：先查缓存，未命中的按所在目录分组，同一目录的多个候选只列一次目录"""
+        now = time.monotonic()
+        result: Dict[str, bool] = {}
+        missing: Dict[str, List[str]] = {}
+        with self._lock:
+            for path in paths:
+                entry = self._entries.get(path)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._entries.move_to_end(path)
+                    result[path] = entry[0]
+                else:
+                    expanded = os.path.expanduser(path)
+                    missing.setdefault(os.path.dirname(expanded) or ".", []).append(path)
+
+        for directory, candidates in missing.items():
+            # 目录列表只用来跳过肯定不存在的名字（按小写比较，兼容大小写不敏感的文件系统），
+            # 是否存在仍以 os.path.isfile 为准，与同一目录下候选的数量无关
+            names = None
+            if len(candidates) > 1:
+                try:
+                    names = {name.lower() for name in os.listdir(directory)}
+                except OSError:
+                    names = set()
+            for path in candidates:
+                expanded = os.path.expanduser(path)
+                if names is not None and os.path.basename(expanded).lower() not in names:
+                    result[path] = False
+                else:
+                    result[path] = os.path.isfile(expanded)
+
+        with self._lock:
+            for candidates in missing.values():
+                for path in candidates:
+                    self._entries[path] = (result[path], now)
+                    self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_stat_cache = StatCache()
 
-def detect_and_process_file_paths(user_input: str) -> list:
-    """检测用户输入中的音频文件路径并验证文件是否存在，返回结果为用户上传的音频文件路径组成的数列"""
-    file_paths = []
-    processed_paths = set()  # Track already processed paths to avoid duplicates
-    
-    # 音频文件扩展名
-    audio_extensions = r'(?:mp3|wav|flac|aac|ogg|m4a|wma|opus|mp4|avi|mov|mkv|webm|3gp)'
-    
-    # 改进的音频文件路径检测模式，支持中文字符
-    # Windows路径模式 (C:\path\file.ext 或 D:\path\file.ext) - 仅匹配音频文件
-    windows_pattern = rf'[A-Za-z]:[\\\\/](?:[^\\\\/\s\n\r]+[\\\\/])*[^\\\\/\s\n\r]+\.{audio_extensions}'
-    # 相对路径模式 (./path/file.ext 或 ../path/file.ext) - 仅匹配音频文件
-    relative_pattern = rf'\.{{1,2}}[\\\\/](?:[^\\\\/\s\n\r]+[\\\\/])*[^\\\\/\s\n\r]+\.{audio_extensions}'
-    # 简单文件名模式 (filename.ext) - 仅匹配音频文件
-    filename_pattern = rf'\b[a-zA-Z0-9_\u4e00-\u9fff\-\(\)（）]+\.{audio_extensions}\b'
-    
-    patterns = [windows_pattern, relative_pattern, filename_pattern]
-    
-    # Run the absolute path pattern first
-    for match in re.findall(patterns[0], user_input, re.IGNORECASE):
-        if match in processed_paths:
-            continue
-        processed_paths.add(match)
-        _log_existence(match, file_paths)
 
-    # Run the relative path pattern
-    for match in re.findall(patterns[1], user_input, re.IGNORECASE):
-        if match in processed_paths:
+def _anchor_pattern(categories: Optional[Tuple[str, ...]]) -> re.Pattern:
+    """返回匹配指定类别扩展名的锚点正则（按类别组合缓存），其他类别的扩展名在正则内部就被跳过"""
+    pattern = _ANCHOR_PATTERNS.get(categories)
+    if pattern is None:
+        extensions = [extension for extension, category in _EXTENSION_CATEGORIES.items()
+                      if categories is None or category in categories]
+        # 长扩展名在前，避免 "docx" 被 "doc" 截断；没有扩展名时使用永不匹配的正则
+        alternatives = "|".join(sorted(map(re.escape, extensions), key=len, reverse=True)) or "(?!)"
+        pattern = _ANCHOR_PATTERNS[categories] = re.compile(rf"\.(?:{alternatives})(?![A-Za-z0-9])", re.IGNORECASE)
+    return pattern
+
+
+def _token_before(text: str, end: int) -> str:
+    """返回 end 之前、最后一个空白之后的词元（最长 MAX_PATH_LENGTH 个字符）
+
+    先取较短的窗口，词元占满窗口时才放大：非 ASCII 文本的切片开销与长度成正比。
+    """
+    window_size = 64
+    while True:
+        window = text[max(0, end - window_size):end]
+        if not window or window[-1].isspace():
+            return ""
+        token = window.rsplit(None, 1)[-1]
+        if len(token) < len(window) or end <= window_size or window_size >= MAX_PATH_LENGTH:
+            return token
+        window_size *= 4
+
+
+def detect_file_paths(text: str, categories: Optional[Tuple[str, ...]] = ("audio",)) -> Tuple[List[str], List[str]]:
+    """单次扫描找出文本中属于指定类别的候选文件路径，返回 (完整路径, 简单文件名)，各自去重并保持出现顺序，不检查是否存在
+
+    先线性查找指定类别的扩展名，再只对扩展名所在的词元（路径不含空白）判断路径形式，
+    大段文本中不会在每个位置尝试所有路径形式。
+    categories 为 None 时匹配所有已登记的类别。
+    """
+    full_paths: Dict[str, None] = {}
+    file_names: Dict[str, None] = {}
+    for anchor in _anchor_pattern(categories).finditer(text):
+        token = _token_before(text, anchor.start())
+        if not token:
             continue
-        processed_paths.add(match)
-        _log_existence(match, file_paths)
-        
-    # Run the filename pattern if we didn't find any files
-    if not file_paths:
-        for match in re.findall(patterns[2], user_input, re.IGNORECASE):
-            if match in processed_paths:
-                continue
-            processed_paths.add(match)
-            _log_existence(match, file_paths)
+        match = _PATH_PATTERN.search(token)
+        if match is None:
+            continue
+        path = match.group() + anchor.group()
+        if match.lastgroup == "filename":
+            file_names[path] = None
+        else:
+            full_paths[path] = None
+    return list(full_paths), list(file_names)
+
+
+def detect_and_process_file_paths(user_input: str, categories: Optional[Tuple[str, ...]] = ("audio",)) -> list:
+    """检测用户输入中的文件路径并验证文件是否存在，返回存在的文件路径列表（默认只识别音频文件）
+
+    与原实现一致：完整路径中没有任何存在的文件时，才采用简单文件名形式的匹配。
+    """
+    full_paths, file_names = detect_file_paths(user_input, categories)
+    candidates = full_paths
+    existence = _stat_cache.exists_many(full_paths) if full_paths else {}
+    file_paths = [path for path in full_paths if existence[path]]
+    if not file_paths and file_names:
+        existence.update(_stat_cache.exists_many(file_names))
+        candidates = full_paths + file_names
+        file_paths = [path for path in file_names if existence[path]]
+    if not candidates:
+        return []
 
+    for path in file_paths:
+        print(f"✅ 检测到文件: {path}")
+    invalid_paths = [path for path in candidates if not existence[path]]
+    if invalid_paths:
+        preview = "、".join(invalid_paths[:5]) + (" 等" if len(invalid_paths) > 5 else "")
+        print(f"⚠️ {len(invalid_paths)} 个文件路径无效或文件不存在: {preview}")
     return file_paths
 
 
 def store_uploaded_files(file_paths: list, session_id: str) -> list:
     """
     将上传的文件存储到指定的会话目录中
+
+    文件内容只在内容寻址存储中保存一份，会话目录中的文件是指向它的链接；
+    相同内容的文件再次上传时不会重复复制。
     
     Args:
         file_paths: 原始文件路径列表
@@ -78,6 +216,7 @@ def store_uploaded_files(file_paths: list, session_id: str) -> list:
     target_dir.mkdir(parents=True, exist_ok=True)
     
     stored_paths = []
+    blob_store = get_blob_store()
     
     for file_path in file_paths:
         try:
@@ -85,32 +224,32 @@ def store_uploaded_files(file_paths: list, session_id: str) -> list:
             if not source_path.exists():
                 print(f"⚠️ 源文件不存在: {file_path}")
                 continue
+
+            digest, created = blob_store.put(source_path)
             
             # 生成目标文件路径
             target_path = target_dir / source_path.name
             
-            # 如果目标文件已存在，添加时间戳避免覆盖
-            if target_path.exists():
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                stem = source_path.stem
-                suffix = source_path.suffix
-                target_path = target_dir / f"{stem}_{timestamp}{suffix}"
+            # 同一会话重复上传相同内容，直接复用已有文件
+            if (target_path.exists() or target_path.is_symlink()) and lookup_manifest_digest(target_path) == digest:
+                stored_paths.append(str(target_path))
+                print(f"✅ 文件已存在于会话中: {source_path.name} -> {target_path}")
+                continue
             
-            # 复制文件
-            shutil.copy2(source_path, target_path)
+            # 链接到内容寻址存储中的对象；目标文件已存在时添加时间戳（同一秒内再加序号）避免覆盖
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            for attempt in itertools.count():
+                try:
+                    method = blob_store.link(digest, target_path)
+                    break
+                except FileExistsError:
+                    counter = f"_{attempt}" if attempt else ""
+                    target_path = target_dir / f"{source_path.stem}_{timestamp}{counter}{source_path.suffix}"
             stored_paths.append(str(target_path))
-            print(f"✅ 文件已存储: {source_path.name} -> {target_path}")
+            reused = "" if created else "，内容已存在，跳过复制"
+            print(f"✅ 文件已存储: {source_path.name} -> {target_path} ({method}{reused})")
             
         except Exception as e:
             print(f"❌ 存储文件失败 {file_path}: {e}")
     
     return stored_paths
-
-
-# -- 小工具函数 ------------------------------------------------------------
-def _log_existence(path: str, container: list):
-    if os.path.exists(path):
-        container.append(path)
-        print(f"✅ 检测到音频文件: {path}")
-    else:
-        print(f"⚠️ 音频文件路径无效或文件不存在: {path}")
@@ -0,0 +1,375 @@
+"""模型调用路由：一个逻辑模型可配置多个 OpenAI 兼容端点，按实时延迟与健康状况选择
+
+每个端点维护 EWMA 延迟（流式调用取首 token 延迟）、EWMA 错误率与进行中的请求数，
+每次调用选择得分最低（最快且健康）的端点。连续失败或错误率过高时熔断该端点，冷却后放行一个探测请求。
+可重试的错误（连接错误、超时、429、5xx）按带抖动的指数退避换端点重试；
+延迟敏感的调用可开启对冲：首个请求在 hedge_after 秒内未完成时向次优端点再发一个，取先完成的结果。
+
+路由配置来自 LLM_ROUTES（JSON 字符串）或 LLM_ROUTES_PATH（JSON 文件），格式为
+    {"逻辑模型名": [{"name": "siliconflow", "base_url": "...", "api_key_env": "SILICONFLOW_API_KEY",
+                   "model": "该端点上的模型名（可选）"}, ...]}
+未配置的模型沿用 resolve_provider 的单端点规则。
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import httpx
+
+from utilities.metrics import get_metrics
+
+
+@dataclass
+class Endpoint:
+    """一个 OpenAI 兼容端点；name 同时用作连接池、并发信号量与健康统计的键"""
+    name: str
+    base_url: str
+    model: str
+    api_key_env: Optional[str] = None
+    api_key: Optional[str] = None
+
+    def resolve_api_key(self) -> Optional[str]:
+        return self.api_key or (os.getenv(self.api_key_env) if self.api_key_env else None)
+
+
+@dataclass
+class EndpointHealth:
+    """端点的滚动统计与熔断状态（由 ProviderRouter 的锁保护）"""
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    samples: int = 0
+    consecutive_failures: int = 0
+    inflight: int = 0
+    state: str = "closed"           # closed / open / half_open
+    opened_at: float = 0.0
+    probing: bool = False           # half_open 时是否已有探测请求在进行
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "samples": self.samples,
+            "consecutive_failures": self.consecutive_failures,
+            "inflight": self.inflight,
+            "state": self.state,
+        }
+
+
+@dataclass
+class Attempt:
+    """一次尝试：调用方在收到首 token 时调用 mark_first_token，路由以此作为该端点的延迟样本"""
+    endpoint: Endpoint
+    number: int
+    hedge: bool = False
+    start: float = field(default_factory=time.perf_counter)
+    first_token: Optional[float] = None
+
+    def mark_first_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.start
+
+
+def is_retryable(error: BaseException) -> bool:
+    """连接错误、超时、限流与服务端错误可以换端点重试；其余（参数错误、鉴权失败等）直接抛出"""
+    if isinstance(error, (httpx.TransportError, TimeoutError)):
+        return True
+    # openai 在首次创建客户端时才导入；尚未导入说明错误不可能来自 openai
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return False
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class ProviderRouter:
+    """按逻辑模型在多个端点之间路由、重试、熔断与对冲（线程安全）"""
+
+    def __init__(self, routes: Optional[Dict[str, List[Endpoint]]] = None, max_attempts: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 failure_threshold: Optional[int] = None, error_rate_threshold: Optional[float] = None,
+                 cooldown: Optional[float] = None, ewma_alpha: Optional[float] = None):
+        self.routes = routes if routes is not None else load_routes()
+        self.max_attempts = max_attempts or int(os.getenv("LLM_ROUTER_MAX_ATTEMPTS", "3"))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv("LLM_ROUTER_BACKOFF_BASE", "0.2"))
+        self.backoff_max = backoff_max or float(os.getenv("LLM_ROUTER_BACKOFF_MAX", "5"))
+        self.failure_threshold = failure_threshold or int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "5"))
+        self.error_rate_threshold = error_rate_threshold or float(os.getenv("LLM_ROUTER_ERROR_RATE", "0.5"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("LLM_ROUTER_COOLDOWN", "30"))
+        self.ewma_alpha = ewma_alpha or float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+        self.min_samples = 10  # 错误率熔断至少需要的样本数
+        self._health: Dict[str, EndpointHealth] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # -- 端点选择 ----------------------------------------------------------
+    def endpoints(self, model_name: str) -> List[Endpoint]:
+        configured = self.routes.get(model_name)
+        if configured:
+            return configured
+        # 未配置路由的模型：按 resolve_provider 的规则得到单个端点（每次调用时读取环境变量）
+        from utilities.modelRelated import resolve_provider
+
+        provider, base_url, api_key = resolve_provider(model_name)
+        return [Endpoint(name=provider, base_url=base_url, model=model_name, api_key=api_key)]
+
+    def select(self, model_name: str, exclude: Sequence[str] = (), strict: bool = False) -> Optional[Endpoint]:
+        """选择得分最低的可用端点并占用一个进行中名额
+
+        exclude 中的端点仅在没有其他选择时使用；strict 为真时不使用它们，没有其他可用端点则返回 None。
+        """
+        candidates = self.endpoints(model_name)
+        now = time.monotonic()
+        with self._lock:
+            available = [endpoint for endpoint in candidates if self._available(endpoint.name, now)]
+            preferred = [endpoint for endpoint in available if endpoint.name not in exclude]
+            if strict and not preferred:
+                return None
+            preferred = preferred or available
+            if not preferred:
+                # 全部熔断：选冷却最早结束的端点，宁可尝试也不直接失败
+                preferred = [min(candidates, key=lambda endpoint: self._health_of(endpoint.name).opened_at)]
+            known = [h.latency for h in (self._health_of(e.name) for e in candidates) if h.latency is not None]
+            prior = min(known) if known else 1.0
+            endpoint = min(preferred, key=lambda endpoint: self._score(endpoint.name, prior))
+            health = self._health_of(endpoint.name)
+            health.inflight += 1
+            if health.state == "half_open":
+                health.probing = True
+            return endpoint
+
+    def _health_of(self, name: str) -> EndpointHealth:
+        health = self._health.get(name)
+        if health is None:
+            health = self._health[name] = EndpointHealth()
+        return health
+
+    def _available(self, name: str, now: float) -> bool:
+        health = self._health_of(name)
+        if health.state == "open" and now - health.opened_at >= self.cooldown:
+            health.state = "half_open"
+            health.probing = False
+        if health.state == "half_open":
+            return not health.probing
+        return health.state == "closed"
+
+    def _score(self, name: str, prior: float) -> float:
+        """延迟越低、进行中请求越少、错误率越低得分越低；没有样本的端点按当前最快端点估计"""
+        health = self._health_of(name)
+        latency = health.latency if health.latency is not None else prior
+        return latency * (1 + health.inflight) * (1 + 4 * health.error_rate)
+
+    # -- 结果记录 ----------------------------------------------------------
+    def record_success(self, attempt: Attempt):
+        latency = attempt.first_token if attempt.first_token is not None else time.perf_counter() - attempt.start
+        with self._lock:
+            health = self._health_of(attempt.endpoint.name)
+            health.inflight -= 1
+            health.latency = latency if health.latency is None else \
+                health.latency + self.ewma_alpha * (latency - health.latency)
+            health.error_rate *= 1 - self.ewma_alpha
+            health.samples += 1
+            health.consecutive_failures = 0
+            if health.state != "closed":
+                print(f"✅ 端点 {attempt.endpoint.name} 恢复，关闭熔断")
+            health.state, health.probing = "closed", False
+        get_metrics().inc("llm_router_attempts_total", help="路由尝试次数", endpoint=attempt.endpoint.name, outcome="ok")
+
+    def record_failure(self, attempt: Attempt, error: BaseException):
+        """记录失败；只有可重试的错误（端点自身的问题）计入错误率与熔断"""
+        retryable = is_retryable(error)
+        cancelled = isinstance(error, asyncio.CancelledError)
+        with self._lock:
+            health = self._health_of(attempt.endpoint.name)
+            health.inflight -= 1
+            if health.state == "half_open":
+                health.probing = False
+            if retryable:
+                health.error_rate += self.ewma_alpha * (1 - health.error_rate)
+                health.samples += 1
+                health.consecutive_failures += 1
+                if health.state == "half_open" or health.consecutive_failures >= self.failure_threshold or (
+                        health.samples >= self.min_samples and health.error_rate >= self.error_rate_threshold):
+                    if health.state != "open":
+                        print(f"⚡ 端点 {attempt.endpoint.name} 熔断 {self.cooldown:.0f} 秒（错误: {error}）")
+                        get_metrics().inc("llm_router_circuit_open_total", help="端点熔断次数",
+                                          endpoint=attempt.endpoint.name)
+                    health.state, health.opened_at = "open", time.monotonic()
+        outcome = "cancelled" if cancelled else ("retryable_error" if retryable else "error")
+        get_metrics().inc("llm_router_attempts_total", help="路由尝试次数", endpoint=attempt.endpoint.name, outcome=outcome)
+
+    def backoff(self, attempt_number: int) -> float:
+        """full jitter 指数退避：在 [0, min(上限, 基数 * 2^n)] 中均匀取值"""
+        return self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt_number - 1)))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: health.to_dict() for name, health in self._health.items()}
+
+    def reset(self):
+        with self._lock:
+            self._health.clear()
+
+    # -- 同步调用 ----------------------------------------------------------
+    def call(self, model_name: str, fn: Callable[[Attempt], Any], can_retry: Optional[Callable[[], bool]] = None,
+             hedge_after: Optional[float] = None) -> Any:
+        """fn(attempt) 发起一次请求；失败时在 can_retry() 为真（例如尚未输出任何 token）时换端点重试"""
+        failed: List[str] = []
+        for number in range(1, self.max_attempts + 1):
+            try:
+                attempt = Attempt(self.select(model_name, exclude=failed), number)
+                if hedge_after is not None:
+                    return self._call_hedged(model_name, fn, attempt, hedge_after, failed)
+                return self._call_once(fn, attempt, failed)
+            except Exception as e:
+                if number == self.max_attempts or not is_retryable(e) or (can_retry is not None and not can_retry()):
+                    raise
+                delay = self.backoff(number)
+                print(f"🔁 模型调用失败，{delay:.2f} 秒后换端点重试（第 {number + 1} 次）: {e}")
+                time.sleep(delay)
+
+    def _call_once(self, fn: Callable[[Attempt], Any], attempt: Attempt, failed: List[str]) -> Any:
+        try:
+            result = fn(attempt)
+        except BaseException as e:
+            self.record_failure(attempt, e)
+            failed.append(attempt.endpoint.name)
+            raise
+        self.record_success(attempt)
+        return result
+
+    def _call_hedged(self, model_name: str, fn: Callable[[Attempt], Any], attempt: Attempt, hedge_after: float,
+                     failed: List[str]) -> Any:
+        """同步对冲：请求在线程中发出；落后的请求无法取消，完成后只用于更新统计"""
+        executor = self._get_executor()
+        primary = executor.submit(self._call_once, fn, attempt, failed)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        endpoint = self.select(model_name, exclude=failed + [attempt.endpoint.name], strict=True)
+        if endpoint is None:  # 没有其他可用端点，不对同一端点重复发送
+            return primary.result()
+        secondary = executor.submit(self._call_once, fn, Attempt(endpoint, attempt.number, hedge=True), failed)
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._count_hedge("secondary_won" if future is secondary else "primary_won")
+                    return future.result()
+                error = future.exception()
+        self._count_hedge("all_failed")
+        raise error
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_ROUTER_HEDGE_THREADS", "16")),
+                                                    thread_name_prefix="llm-hedge")
+            return self._executor
+
+    # -- 异步调用 ----------------------------------------------------------
+    async def acall(self, model_name: str, fn: Callable[[Attempt], Awaitable[Any]],
+                    can_retry: Optional[Callable[[], bool]] = None, hedge_after: Optional[float] = None) -> Any:
+        """call 的异步版本；对冲时落后的请求会被取消"""
+        failed: List[str] = []
+        for number in range(1, self.max_attempts + 1):
+            try:
+                attempt = Attempt(self.select(model_name, exclude=failed), number)
+                if hedge_after is not None:
+                    return await self._acall_hedged(model_name, fn, attempt, hedge_after, failed)
+                return await self._acall_once(fn, attempt, failed)
+            except Exception as e:
+                if number == self.max_attempts or not is_retryable(e) or (can_retry is not None and not can_retry()):
+                    raise
+                delay = self.backoff(number)
+                print(f"🔁 模型调用失败，{delay:.2f} 秒后换端点重试（第 {number + 1} 次）: {e}")
+                await asyncio.sleep(delay)
+
+    async def _acall_once(self, fn: Callable[[Attempt], Awaitable[Any]], attempt: Attempt, failed: List[str]) -> Any:
+        try:
+            result = await fn(attempt)
+        except BaseException as e:
+            self.record_failure(attempt, e)
+            failed.append(attempt.endpoint.name)
+            raise
+        self.record_success(attempt)
+        return result
+
+    async def _acall_hedged(self, model_name: str, fn: Callable[[Attempt], Awaitable[Any]], attempt: Attempt,
+                            hedge_after: float, failed: List[str]) -> Any:
+        primary = asyncio.ensure_future(self._acall_once(fn, attempt, failed))
+        try:
+            done, _ = await asyncio.wait([primary], timeout=hedge_after)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+        endpoint = self.select(model_name, exclude=failed + [attempt.endpoint.name], strict=True)
+        if endpoint is None:  # 没有其他可用端点，不对同一端点重复发送
+            return await primary
+        secondary = asyncio.ensure_future(self._acall_once(fn, Attempt(endpoint, attempt.number, hedge=True), failed))
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count_hedge("secondary_won" if task is secondary else "primary_won")
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        self._count_hedge("all_failed")
+        raise error
+
+    def _count_hedge(self, outcome: str):
+        get_metrics().inc("llm_router_hedges_total", help="对冲请求次数", outcome=outcome)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def load_routes() -> Dict[str, List[Endpoint]]:
+    """从 LLM_ROUTES / LLM_ROUTES_PATH 读取路由配置；未指定端点模型名时沿用逻辑模型名"""
+    raw = os.getenv("LLM_ROUTES")
+    if not raw and os.getenv("LLM_ROUTES_PATH"):
+        with open(os.environ["LLM_ROUTES_PATH"], encoding="utf-8") as f:
+            raw = f.read()
+    if not raw:
+        return {}
+    routes = {}
+    for model_name, endpoints in json.loads(raw).items():
+        routes[model_name] = [Endpoint(name=item["name"], base_url=item["base_url"], model=item.get("model", model_name),
+                                       api_key_env=item.get("api_key_env"), api_key=item.get("api_key"))
+                              for item in endpoints]
+    return routes
+
+
+_provider_router: Optional[ProviderRouter] = None
+_provider_router_lock = threading.Lock()
+
+
+def get_provider_router() -> ProviderRouter:
+    """返回进程内共享的路由器，各端点的健康统计在所有调用之间共享"""
+    global _provider_router
+    if _provider_router is None:
+        with _provider_router_lock:
+            if _provider_router is None:
+                _provider_router = ProviderRouter()
+    return _provider_router
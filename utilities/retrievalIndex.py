@@ -0,0 +1,392 @@
+"""会议转写与附件的本地检索索引：追问时只把与问题最相关的片段放进提示词
+
+- BM25：英文和数字按词切分，中文按相邻两字（单字成段时保留单字）切分。倒排表随片段增量追加，
+  IDF 与平均长度在查询时按当前文档数计算，转写片段流式到达时即可检索，无需重建
+- 稠密向量（可选，RETRIEVAL_EMBEDDING_MODEL）：本地 CPU 向量模型的结果存放在 NumPy 矩阵中，
+  规模较小时暴力内积，超过 RETRIEVAL_IVF_THRESHOLD 后训练 IVF（k-means 粗聚类），查询只扫描最近的若干个簇。
+  向量在查询时批量补算，流式写入不为每个片段单独调用模型
+- 两路结果用倒数排名融合（RRF）合并
+每个片段附带来源文件、时间戳（附件为页码或行号）和说话人，拼入提示词时按来源和时间排序。
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from utilities.audioTranscription import format_timestamp
+from utilities.batchValidation import estimate_tokens
+
+RRF_K = 60
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*|[㐀-䶿一-鿿豈-﫿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """英文/数字按词，中文按二元组切分"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if run[0] < "\u3400" or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class Passage:
+    text: str
+    source: str                     # 音频文件或附件路径
+    kind: str = "transcript"        # transcript / document
+    start: float = 0.0              # 转写片段：秒；附件：起始页码或行号
+    end: float = 0.0
+    speaker: Optional[str] = None
+    location: str = ""              # 附件分块的位置描述（工作表、页码范围）
+
+    def label(self) -> str:
+        name = Path(self.source).name
+        if self.kind == "document":
+            return f"[附件 {name} {self.location}]"
+        speaker = f" {self.speaker}" if self.speaker else ""
+        return f"[{name} {format_timestamp(self.start)}-{format_timestamp(self.end)}{speaker}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class RetrievalHit:
+    passage: Passage
+    score: float
+    doc_id: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.passage.to_dict(), "score": round(self.score, 4)}
+
+
+# -- BM25 ---------------------------------------------------------------------
+class BM25Index:
+    """增量 BM25：每个词的倒排表是两个可追加的整型数组（文档号、词频），查询时用 NumPy 批量计分"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = array("i")
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, tokens: Sequence[str]) -> int:
+        doc_id = len(self._lengths)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("i"), array("i"))
+            postings[0].append(doc_id)
+            postings[1].append(count)
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+        return doc_id
+
+    def scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """返回全部文档的 BM25 分数（未出现任何查询词的文档为 0）"""
+        n = len(self._lengths)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / n))
+        weights: Dict[str, int] = {}
+        for token in query_tokens:
+            weights[token] = weights.get(token, 0) + 1
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings[0], dtype=np.int32)
+            tf = np.frombuffer(postings[1], dtype=np.int32).astype(np.float32)
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += weight * idf * tf * (self.k1 + 1) / (tf + norm[docs])
+            del docs, tf   # 释放对数组缓冲区的引用，之后才能继续追加
+        del lengths
+        return scores
+
+
+# -- 稠密向量 -------------------------------------------------------------------
+class HashingEmbedder:
+    """不依赖模型的哈希向量：把 tokenize 的结果按 crc32 散列到固定维度并做 L2 归一化
+
+    只捕捉字面重合，语义召回需要真正的向量模型；用于没有安装模型的环境中验证稠密检索与 IVF 的流程和开销。
+    """
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or int(os.getenv("RETRIEVAL_HASH_DIM", "256"))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = zlib.crc32(token.encode("utf-8"))
+                vectors[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-6)
+
+
+class SentenceTransformerEmbedder:
+    """本地 sentence-transformers 模型（CPU），首次使用时才加载"""
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), batch_size=self.batch_size,
+                                            normalize_embeddings=True), dtype=np.float32)
+
+
+class DenseIndex:
+    """归一化向量的内积检索：矩阵按倍增扩容；行数超过 ivf_threshold 后训练 IVF 粗聚类，查询扫描 n_probe 个簇"""
+
+    def __init__(self, dim: int, ivf_threshold: Optional[int] = None, n_probe: Optional[int] = None):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold or int(os.getenv("RETRIEVAL_IVF_THRESHOLD", "20000"))
+        self.n_probe = n_probe or int(os.getenv("RETRIEVAL_IVF_PROBES", "8"))
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[array] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vectors: np.ndarray) -> None:
+        if not len(vectors):
+            return
+        needed = self._size + len(vectors)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix), 256), self.dim), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size:needed] = vectors
+        if self._centroids is not None:
+            self._assign(np.arange(self._size, needed))
+        self._size = needed
+        # 达到阈值时训练；此后规模每增长到 4 倍重新训练一次，簇的数量随之增加
+        if self._size >= self.ivf_threshold and self._size >= 4 * self._trained_size:
+            self._train()
+
+    def _assign(self, rows: np.ndarray) -> None:
+        nearest = np.argmax(self._matrix[rows] @ self._centroids.T, axis=1)
+        for row, cluster in zip(rows.tolist(), nearest.tolist()):
+            self._lists[cluster].append(row)
+
+    def _train(self, iterations: int = 10) -> None:
+        n_lists = max(1, int(math.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        sample_rows = rng.choice(self._size, size=min(self._size, 64 * n_lists), replace=False)
+        sample = self._matrix[sample_rows]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = sample[nearest == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(float(np.linalg.norm(centroid)), 1e-6)
+        self._centroids = centroids
+        self._lists = [array("i") for _ in range(n_lists)]
+        for start in range(0, self._size, 8192):
+            self._assign(np.arange(start, min(start + 8192, self._size)))
+        self._trained_size = self._size
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._size:
+            return []
+        if self._centroids is None:
+            candidates = None
+            scores = self._matrix[:self._size] @ vector
+        else:
+            probes = np.argsort(-(self._centroids @ vector))[:self.n_probe]
+            candidates = np.concatenate([np.frombuffer(self._lists[c], dtype=np.int32) for c in probes])
+            scores = self._matrix[candidates] @ vector
+        top = _top_k(scores, k)
+        rows = top if candidates is None else candidates[top]
+        return [(int(row), float(scores[i])) for row, i in zip(rows, top)]
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的 k 个下标（降序）"""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+_embedder = None
+_embedder_loaded = False
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """按 RETRIEVAL_EMBEDDING_MODEL 返回共享的向量模型：未设置时为 None（只用 BM25），"hashing" 为哈希向量"""
+    global _embedder, _embedder_loaded
+    if not _embedder_loaded:
+        with _embedder_lock:
+            if not _embedder_loaded:
+                model_name = os.getenv("RETRIEVAL_EMBEDDING_MODEL", "")
+                if model_name == "hashing":
+                    _embedder = HashingEmbedder()
+                elif model_name:
+                    try:
+                        _embedder = SentenceTransformerEmbedder(model_name)
+                    except Exception as e:
+                        print(f"⚠️ 向量模型 {model_name} 加载失败，只使用 BM25 检索: {e}")
+                _embedder_loaded = True
+    return _embedder
+
+
+# -- 检索索引 -------------------------------------------------------------------
+class RetrievalIndex:
+    """一个会话的检索索引：转写片段按 (来源, 起止时间) 去重，附件按缓存键去重"""
+
+    def __init__(self, embedder=None):
+        self.passages: List[Passage] = []
+        self.bm25 = BM25Index()
+        self.embedder = embedder
+        self.dense = DenseIndex(embedder.dim) if embedder is not None else None
+        self._segment_ids: Dict[Tuple[str, float, float], int] = {}
+        self.documents: Dict[str, int] = {}   # 已索引附件的缓存键 -> 分块数
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def _add(self, passage: Passage) -> int:
+        self.passages.append(passage)
+        return self.bm25.add(tokenize(passage.text))
+
+    def add_transcript_segment(self, segment: Dict[str, Any], source: str) -> bool:
+        """索引一个转写片段；已索引过的片段只更新说话人（说话人分离在转写之后完成）"""
+        key = (str(source), float(segment["start"]), float(segment["end"]))
+        with self._lock:
+            doc_id = self._segment_ids.get(key)
+            if doc_id is not None:
+                if segment.get("speaker"):
+                    self.passages[doc_id].speaker = segment["speaker"]
+                return False
+            self._segment_ids[key] = self._add(Passage(segment["text"], str(source), "transcript", key[1], key[2],
+                                                       segment.get("speaker")))
+            return True
+
+    def add_document(self, attachment: Dict[str, Any]) -> int:
+        """从附件分块缓存中逐块读入并索引，返回新增的分块数"""
+        from utilities.documentIngestion import get_document_cache
+
+        cache_key = attachment["cache_key"]
+        with self._lock:
+            if cache_key in self.documents:
+                return 0
+            count = 0
+            for chunk in get_document_cache().iter_chunks(cache_key):
+                self._add(Passage(chunk.text, attachment["file_path"], "document", chunk.start, chunk.end,
+                                  location=chunk.location))
+                count += 1
+            self.documents[cache_key] = count
+            return count
+
+    def sync(self, segments: Iterable[Tuple[Dict[str, Any], str]], attachments: Iterable[Dict[str, Any]] = ()) -> int:
+        """让索引与图状态一致（进程重启后重建、补上说话人），返回新增的条目数"""
+        added = sum(self.add_transcript_segment(segment, source) for segment, source in segments)
+        return added + sum(self.add_document(attachment) for attachment in attachments)
+
+    def _embed_pending(self, batch_size: int = 64) -> None:
+        while len(self.dense) < len(self.passages):
+            start = len(self.dense)
+            texts = [p.text for p in self.passages[start:start + batch_size]]
+            self.dense.add(self.embedder.embed(texts))
+
+    def search(self, query: str, k: Optional[int] = None) -> List[RetrievalHit]:
+        k = k or int(os.getenv("RETRIEVAL_TOP_K", "8"))
+        with self._lock:
+            if not self.passages:
+                return []
+            bm25_scores = self.bm25.scores(tokenize(query))
+            candidates = [(int(i), float(bm25_scores[i])) for i in _top_k(bm25_scores, k) if bm25_scores[i] > 0]
+            if self.dense is not None:
+                self._embed_pending()
+                dense = self.dense.search(self.embedder.embed([query])[0], k)
+                fused: Dict[int, float] = {}
+                for ranking in (candidates, dense):
+                    for rank, (doc_id, _) in enumerate(ranking):
+                        fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+                candidates = sorted(fused.items(), key=lambda item: -item[1])[:k]
+            return [RetrievalHit(self.passages[doc_id], score, doc_id) for doc_id, score in candidates]
+
+
+def build_context(hits: Sequence[RetrievalHit], max_tokens: Optional[int] = None) -> str:
+    """把检索结果渲染为提示词中的参考资料：先按相关度截到 token 预算内，再按来源和时间排序"""
+    max_tokens = max_tokens or int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "2000"))
+    kept, used = [], 0
+    for hit in hits:
+        line = f"{hit.passage.label()} {hit.passage.text}"
+        tokens = estimate_tokens(line)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append((hit, line))
+        used += tokens
+    kept.sort(key=lambda item: (item[0].passage.kind, item[0].passage.source, item[0].passage.start))
+    return "\n".join(line for _, line in kept)
+
+
+class RetrievalIndexRegistry:
+    """按会话保存检索索引，只保留最近使用的 max_sessions 个（被淘汰的会话在下次问答时从图状态重建）"""
+
+    def __init__(self, max_sessions: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("RETRIEVAL_MAX_SESSIONS", "16"))
+        self._indexes: "OrderedDict[str, RetrievalIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> RetrievalIndex:
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is None:
+                index = self._indexes[session_id] = RetrievalIndex(get_embedder())
+                while len(self._indexes) > self.max_sessions:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(session_id)
+            return index
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(session_id, None)
+
+
+_retrieval_registry: Optional[RetrievalIndexRegistry] = None
+_retrieval_registry_lock = threading.Lock()
+
+
+def get_retrieval_index(session_id: str) -> RetrievalIndex:
+    """返回会话的检索索引（进程内共享的注册表）"""
+    global _retrieval_registry
+    if _retrieval_registry is None:
+        with _retrieval_registry_lock:
+            if _retrieval_registry is None:
+                _retrieval_registry = RetrievalIndexRegistry()
+    return _retrieval_registry.get(session_id)
@@ -0,0 +1,396 @@
+"""本地说话人分离：向量化 MFCC 特征 + 在线聚类 + 与转写时间戳对齐
+
+音频按块流式输入（SpeakerDiarizer.feed），只保留不足一个窗口的尾部采样点，内存占用与音频时长无关：
+- 每块一次性分帧（滑动窗口视图）、FFT、梅尔滤波、DCT，得到全部帧的 MFCC
+- 以 window_seconds 为窗、hop_seconds 为步长，用前缀和一次算出每个窗口的 MFCC 均值与标准差作为说话人向量
+- 能量过低的窗口视为静音，不参与聚类
+- 在线聚类：按运行中的均值/方差归一化后与各说话人中心比较余弦相似度，超过阈值归入该说话人，否则新建
+结束时（finalize）合并过于相近的中心，并把所有窗口重新分配给最近的中心（每个窗口只存一个 38 维向量）。
+align_speakers 按重叠时长把说话人标签分配给转写片段。
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import os
+import time
+
+import numpy as np
+
+from utilities.audioIO import PCMHandle, as_float32, attach_pcm, release_pages
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.025
+FRAME_HOP_SECONDS = 0.010
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 20
+
+
+def mel_filterbank(sample_rate: int = SAMPLE_RATE, n_fft: int = N_FFT, n_mels: int = N_MELS,
+                   fmin: float = 20.0, fmax: Optional[float] = None) -> np.ndarray:
+    """三角梅尔滤波器组，形状 (n_mels, n_fft // 2 + 1)"""
+    fmax = fmax or sample_rate / 2
+
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + np.asarray(hz) / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (np.asarray(mel) / 2595.0) - 1.0)
+
+    hz_points = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    lower, center, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (bins[None, :] - lower) / (center - lower)
+    falling = (upper - bins[None, :]) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def dct_matrix(n_mfcc: int = N_MFCC, n_mels: int = N_MELS) -> np.ndarray:
+    """正交 DCT-II 矩阵，形状 (n_mels, n_mfcc)"""
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)
+    matrix = np.cos(np.pi / n_mels * (n[:, None] + 0.5) * k[None, :]) * np.sqrt(2.0 / n_mels)
+    matrix[:, 0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+class MFCCExtractor:
+    """向量化 MFCC：预加重 → 分帧加窗 → |FFT|² → 梅尔滤波 → log → DCT"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, n_mfcc: int = N_MFCC):
+        self.sample_rate = sample_rate
+        self.frame_length = int(FRAME_SECONDS * sample_rate)
+        self.hop_length = int(FRAME_HOP_SECONDS * sample_rate)
+        self.window = np.hamming(self.frame_length).astype(np.float32)
+        self.mel = mel_filterbank(sample_rate).T.copy()     # (bins, mels)
+        self.dct = dct_matrix(n_mfcc)
+
+    def frame_count(self, sample_count: int) -> int:
+        if sample_count < self.frame_length:
+            return 0
+        return 1 + (sample_count - self.frame_length) // self.hop_length
+
+    def compute(self, samples: np.ndarray):
+        """返回 (mfcc[帧, n_mfcc], rms[帧])"""
+        count = self.frame_count(len(samples))
+        if count == 0:
+            return np.zeros((0, self.dct.shape[1]), np.float32), np.zeros(0, np.float32)
+        samples = np.asarray(samples, dtype=np.float32)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.frame_length)[::self.hop_length][:count]
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        emphasized = frames[:, 1:] - 0.97 * frames[:, :-1]
+        spectrum = np.fft.rfft(emphasized * self.window[1:], n=N_FFT, axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        log_mel = np.log(power @ self.mel + 1e-8)
+        return log_mel @ self.dct, rms
+
+
+@dataclass
+class _RunningStats:
+    """说话人向量的运行均值与方差"""
+    count: int = 0
+    mean: Optional[np.ndarray] = None
+    m2: Optional[np.ndarray] = None
+
+    def update(self, vectors: np.ndarray):
+        """合并一批向量的统计量（Chan 等人的并行合并公式）"""
+        if len(vectors) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float64)
+        batch_count, batch_mean = len(vectors), vectors.mean(axis=0)
+        batch_m2 = np.square(vectors - batch_mean).sum(axis=0)
+        if self.mean is None:
+            self.count, self.mean, self.m2 = batch_count, batch_mean, batch_m2
+            return
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_count / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
+
+    def standardize(self, vectors: np.ndarray) -> np.ndarray:
+        """去均值后除以标准差的平方根：只部分拉平各维尺度，避免只有两三位说话人时把噪声维度放大到与区分维度一样"""
+        std = np.sqrt(self.m2 / max(1, self.count - 1))
+        return (vectors - self.mean) / np.sqrt(std + 1e-6)
+
+
+@dataclass
+class SpeakerTurn:
+    start: float
+    end: float
+    speaker: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"start": self.start, "end": self.end, "speaker": self.speaker}
+
+
+@dataclass
+class _Cluster:
+    total: np.ndarray
+    count: int = 0
+
+    @property
+    def centroid(self) -> np.ndarray:
+        return self.total / self.count
+
+
+class SpeakerDiarizer:
+    """流式说话人分离：feed 逐块输入 PCM，finalize 返回说话人轮次"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, window_seconds: float = 1.5, hop_seconds: float = 0.75,
+                 threshold: Optional[float] = None, merge_threshold: Optional[float] = None,
+                 max_speakers: Optional[int] = None, silence_rms: float = 0.01, warmup_windows: int = 20,
+                 min_cluster_fraction: float = 0.05):
+        self.sample_rate = sample_rate
+        self.extractor = MFCCExtractor(sample_rate)
+        self.window_frames = int(round((window_seconds - FRAME_SECONDS) / FRAME_HOP_SECONDS)) + 1
+        self.hop_frames = int(round(hop_seconds / FRAME_HOP_SECONDS))
+        self.hop_samples = self.hop_frames * self.extractor.hop_length
+        self.window_seconds = window_seconds
+        self.hop_seconds = self.hop_frames * FRAME_HOP_SECONDS
+        self.threshold = threshold if threshold is not None else float(os.getenv("DIARIZATION_THRESHOLD", "0.35"))
+        self.merge_threshold = merge_threshold if merge_threshold is not None else float(os.getenv("DIARIZATION_MERGE_THRESHOLD", "0.6"))
+        self.max_speakers = max_speakers or int(os.getenv("DIARIZATION_MAX_SPEAKERS", "8"))
+        self.silence_rms = silence_rms
+        self.warmup_windows = warmup_windows
+        self.min_cluster_fraction = min_cluster_fraction
+
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._offset_windows = 0           # 已处理的窗口数（含静音窗口）
+        self._time_offset = 0.0            # 多个文件连续输入时，当前文件在全局时间轴上的起点
+        self._stats = _RunningStats()
+        self._clusters: List[_Cluster] = []
+        self._pending: List[int] = []      # 预热阶段尚未聚类的窗口
+        self._embeddings: List[np.ndarray] = []
+        self._window_starts: List[float] = []
+        self._labels: List[int] = []
+        self.processed_seconds = 0.0
+        self.elapsed_seconds = 0.0
+
+    # -- 特征 -----------------------------------------------------------------
+    def feed(self, samples: np.ndarray) -> None:
+        """输入下一块 PCM（与上一块在时间上连续）"""
+        start_time = time.perf_counter()
+        self.processed_seconds += len(samples) / self.sample_rate
+        buffer = np.concatenate([self._carry, np.asarray(samples, dtype=np.float32)]) if len(self._carry) else \
+            np.asarray(samples, dtype=np.float32)
+        frame_count = self.extractor.frame_count(len(buffer))
+        window_count = 0 if frame_count < self.window_frames else 1 + (frame_count - self.window_frames) // self.hop_frames
+        if window_count:
+            # 只计算这些窗口覆盖的帧
+            used_samples = (window_count - 1) * self.hop_samples + (self.window_frames - 1) * self.extractor.hop_length \
+                + self.extractor.frame_length
+            mfcc, rms = self.extractor.compute(buffer[:used_samples])
+            self._add_windows(mfcc, rms, window_count)
+            buffer = buffer[window_count * self.hop_samples:]
+        self._carry = buffer.copy()
+        self.elapsed_seconds += time.perf_counter() - start_time
+
+    def _add_windows(self, mfcc: np.ndarray, rms: np.ndarray, window_count: int) -> None:
+        # 只统计有声帧：窗口中夹杂的停顿不应改变说话人向量
+        voiced_frames = rms > self.silence_rms
+        features = mfcc[:, 1:].astype(np.float64) * voiced_frames[:, None]   # 去掉与音量相关的 c0
+        prefix = np.vstack([np.zeros((1, features.shape[1])), np.cumsum(features, axis=0)])
+        prefix_sq = np.vstack([np.zeros((1, features.shape[1])), np.cumsum(features ** 2, axis=0)])
+        voiced_prefix = np.concatenate([[0], np.cumsum(voiced_frames)])
+        starts = np.arange(window_count) * self.hop_frames
+        ends = starts + self.window_frames
+        voiced_count = voiced_prefix[ends] - voiced_prefix[starts]
+        denominator = np.maximum(voiced_count, 1)[:, None]
+        mean = (prefix[ends] - prefix[starts]) / denominator
+        std = np.sqrt(np.maximum((prefix_sq[ends] - prefix_sq[starts]) / denominator - mean ** 2, 0.0))
+        embeddings = np.hstack([mean, std]).astype(np.float32)
+        voiced = voiced_count >= self.window_frames // 2
+        # 夹着停顿的窗口常常横跨两人的发言，只在最后重新分配时标注，不参与建立说话人中心
+        clean = voiced_count >= int(self.window_frames * 0.8)
+
+        for i in np.flatnonzero(voiced):
+            index = len(self._embeddings)
+            self._embeddings.append(embeddings[i])
+            self._window_starts.append(float(self._time_offset + (self._offset_windows + i) * self.hop_seconds))
+            self._labels.append(-1)
+            if clean[i]:
+                self._pending.append(index)
+        self._stats.update(embeddings[clean])
+        self._offset_windows += window_count
+        if self._stats.count >= self.warmup_windows:
+            self._assign_pending()
+
+    # -- 聚类 -----------------------------------------------------------------
+    def _assign_pending(self) -> None:
+        for index in self._pending:
+            vector = self._stats.standardize(self._embeddings[index])
+            vector /= np.linalg.norm(vector) + 1e-9
+            best, similarity = self._nearest(vector)
+            if best is None or (similarity < self.threshold and len(self._clusters) < self.max_speakers):
+                self._clusters.append(_Cluster(total=np.zeros_like(vector)))
+                best = len(self._clusters) - 1
+            cluster = self._clusters[best]
+            cluster.total += vector
+            cluster.count += 1
+            self._labels[index] = best
+        self._pending = []
+
+    def _nearest(self, vector: np.ndarray):
+        if not self._clusters:
+            return None, -1.0
+        centroids = np.array([cluster.centroid for cluster in self._clusters])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-9
+        similarities = centroids @ vector
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+    @property
+    def time_offset(self) -> float:
+        """当前文件在全局时间轴上的起点（秒）"""
+        return self._time_offset
+
+    def next_file(self, duration: Optional[float] = None) -> None:
+        """多个音频文件属于同一场会议时，在文件之间调用：说话人中心保留，时间轴按文件时长顺延"""
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._time_offset = self.processed_seconds if duration is None else self._time_offset + duration
+        self._offset_windows = 0
+
+    def finalize(self) -> List[SpeakerTurn]:
+        """合并相近的说话人，把所有窗口重新分配给最近的中心，返回按时间排序的说话人轮次"""
+        start_time = time.perf_counter()
+        self._assign_pending()
+        if not self._embeddings:
+            return []
+        vectors = self._stats.standardize(np.array(self._embeddings))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
+        labels = np.array(self._labels)
+
+        # 中心只由干净窗口决定（在线阶段已聚类的窗口），夹着停顿的窗口最后再分配
+        clean = vectors[labels >= 0]
+        if len(clean) == 0:  # 没有足够干净的窗口（很短的音频）时视为一位说话人
+            clean = vectors
+        centroids = self._refine_centroids(clean, [clean[labels[labels >= 0] == k].mean(axis=0)
+                                                   for k in range(len(self._clusters)) if np.any(labels == k)]
+                                           or [clean.mean(axis=0)])
+        labels = np.argmax(vectors @ _normalize(np.array(centroids)).T, axis=1)
+
+        # 按首次出现的顺序编号：说话人1、说话人2……
+        order = {}
+        for label in labels:
+            order.setdefault(int(label), len(order))
+        turns: List[SpeakerTurn] = []
+        for window_start, label in zip(self._window_starts, labels.tolist()):
+            speaker = f"说话人{order[int(label)] + 1}"
+            window_end = window_start + self.window_seconds
+            if turns and turns[-1].speaker == speaker and window_start <= turns[-1].end:
+                turns[-1].end = window_end
+            else:
+                if turns and window_start < turns[-1].end:
+                    turns[-1].end = window_start + (self.window_seconds - self.hop_seconds) / 2
+                    window_start = turns[-1].end
+                turns.append(SpeakerTurn(window_start, window_end, speaker))
+        self.elapsed_seconds += time.perf_counter() - start_time
+        return turns
+
+    def _refine_centroids(self, vectors: np.ndarray, centroids: List[np.ndarray]) -> List[np.ndarray]:
+        """k-means 迭代修正在线阶段因先后顺序造成的误分，合并过于相近的中心，去掉过小的簇"""
+        min_size = max(1, int(self.min_cluster_fraction * len(vectors)))
+        while True:
+            for _ in range(5):
+                assigned = np.argmax(vectors @ _normalize(np.array(centroids)).T, axis=1)
+                centroids = [vectors[assigned == k].mean(axis=0) for k in range(len(centroids)) if np.any(assigned == k)]
+            if len(centroids) == 1:
+                return centroids
+            normalized = _normalize(np.array(centroids))
+            similarities = normalized @ normalized.T
+            np.fill_diagonal(similarities, -1.0)
+            a, b = np.unravel_index(int(np.argmax(similarities)), similarities.shape)
+            sizes = np.bincount(np.argmax(vectors @ normalized.T, axis=1), minlength=len(centroids))
+            if similarities[a, b] >= self.merge_threshold:
+                centroids[a] = (centroids[a] * sizes[a] + centroids[b] * sizes[b]) / max(1, sizes[a] + sizes[b])
+                centroids.pop(b)
+            elif sizes.min() < min_size:
+                centroids.pop(int(np.argmin(sizes)))
+            else:
+                return centroids
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.elapsed_seconds / max(self.processed_seconds, 1e-9)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-9)
+
+
+def diarize_blocks(blocks: Iterable[np.ndarray], sample_rate: int = SAMPLE_RATE, **options) -> List[SpeakerTurn]:
+    """对按块产出的 PCM 做说话人分离"""
+    diarizer = SpeakerDiarizer(sample_rate, **options)
+    for block in blocks:
+        diarizer.feed(block)
+    return diarizer.finalize()
+
+
+def diarize_samples(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, block_seconds: float = 60.0,
+                    **options) -> List[SpeakerTurn]:
+    """对已解码的 PCM 做说话人分离，按块处理（块是原数组的视图）"""
+    block = int(block_seconds * sample_rate)
+    return diarize_blocks((samples[i:i + block] for i in range(0, len(samples), block)), sample_rate, **options)
+
+
+@dataclass
+class DiarizationResult:
+    turns: List[SpeakerTurn]
+    offsets: List[float]          # 各文件在全局时间轴上的起点（秒）
+    elapsed_seconds: float
+    real_time_factor: float
+
+
+def diarize_handles(handles: Sequence[PCMHandle], block_seconds: float = 60.0, **options) -> DiarizationResult:
+    """对同一场会议的多个 PCM 句柄做说话人分离（说话人编号在文件之间保持一致）
+
+    只接收句柄，可以作为工作池任务在子进程中运行：PCM 由子进程自行映射，按块读取并释放页面。
+    """
+    diarizer = SpeakerDiarizer(handles[0].sample_rate if handles else SAMPLE_RATE, **options)
+    offsets = []
+    for i, handle in enumerate(handles):
+        if i:
+            diarizer.next_file()
+        offsets.append(diarizer.time_offset)
+        with attach_pcm(handle) as samples:
+            block = int(block_seconds * handle.sample_rate)
+            for start in range(0, len(samples), block):
+                view = samples[start:start + block]
+                diarizer.feed(as_float32(view))
+                release_pages(view)
+    turns = diarizer.finalize()
+    return DiarizationResult(turns, offsets, diarizer.elapsed_seconds, diarizer.real_time_factor)
+
+
+def align_speakers(segments: Sequence[Dict[str, Any]], turns: Sequence[SpeakerTurn]) -> List[Optional[str]]:
+    """为每个转写片段选出重叠时长最长的说话人，没有重叠时取时间上最近的轮次"""
+    if not turns:
+        return [None] * len(segments)
+    turn_starts = np.array([turn.start for turn in turns])
+    turn_ends = np.array([turn.end for turn in turns])
+    speakers = [turn.speaker for turn in turns]
+    labels: List[Optional[str]] = []
+    for segment in segments:
+        start, end = float(segment["start"]), float(segment["end"])
+        # 轮次按时间排序且互不重叠，只需查看与片段相交的那一段
+        first = max(0, int(np.searchsorted(turn_ends, start, side="right")))
+        last = int(np.searchsorted(turn_starts, end, side="left"))
+        if first < last:
+            overlaps = np.minimum(turn_ends[first:last], end) - np.maximum(turn_starts[first:last], start)
+            totals: Dict[str, float] = {}
+            for offset, overlap in enumerate(overlaps):
+                totals[speakers[first + offset]] = totals.get(speakers[first + offset], 0.0) + float(overlap)
+            labels.append(max(totals, key=totals.get))
+        else:
+            midpoint = (start + end) / 2
+            nearest = int(np.argmin(np.minimum(np.abs(turn_starts - midpoint), np.abs(turn_ends - midpoint))))
+            labels.append(speakers[nearest])
+    return labels
+
+
+def speaker_durations(turns: Sequence[SpeakerTurn]) -> Dict[str, float]:
+    """每位说话人的总发言时长（秒）"""
+    durations: Dict[str, float] = {}
+    for turn in turns:
+        durations[turn.speaker] = durations.get(turn.speaker, 0.0) + turn.end - turn.start
+    return durations
@@ -0,0 +1,141 @@
+"""转写片段的增量分析：滚动摘要与逐段待办事项提取
+
+片段一到达就处理：待办事项用本地规则逐段提取（不调用模型），
+摘要在累计到足够内容后调用模型，基于上一版摘要增量更新，因此第一份摘要在几秒内即可给出。
+分析器的全部状态可以通过 to_state / from_state 存入图状态，跨节点和检查点继续使用。
+"""
+from typing import Any, Callable, Dict, List, Optional
+import os
+import re
+import time
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from utilities.modelRelated import invoke_model
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "Pro/deepseek-ai/DeepSeek-V3")
+
+ROLLING_SUMMARY_PROMPT = """
+你是一位专业的会议记录员。下面给出截至目前的会议摘要，以及之后新转写的会议内容（带时间戳）。
+请在原摘要的基础上整合新内容，输出更新后的完整会议摘要：
+- 保留已有的要点，补充新的议题、结论和决定
+- 使用简洁的中文要点列表，不超过 15 条
+- 只输出摘要本身，不添加任何解释
+"""
+
+# 常见的待办/分工表达，用于逐段快速提取待办事项
+_ACTION_PATTERNS = [
+    re.compile(r"(?:请|让|由)(?P<owner>[\u4e00-\u9fffA-Za-z]{1,6}?)(?:来|去)?(?:负责|跟进|处理|完成|准备|整理|确认|安排)"),
+    re.compile(r"(?P<owner>[\u4e00-\u9fffA-Za-z]{1,4}?)(?:来|去)?负责"),
+    re.compile(r"(?:需要|要在|务必|截止|之前完成|下周|明天|待办|跟进|action item|todo|follow up)", re.IGNORECASE),
+]
+
+
+def extract_action_items(segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """用本地规则从单个片段中提取待办事项"""
+    text = segment["text"]
+    owner = None
+    matched = False
+    for pattern in _ACTION_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            matched = True
+            owner = owner or match.groupdict().get("owner")
+    if not matched:
+        return []
+    return [{"text": text, "owner": owner, "start": segment["start"], "end": segment["end"]}]
+
+
+class IncrementalTranscriptAnalyzer:
+    """逐段消费转写片段，维护滚动摘要与待办事项列表"""
+
+    def __init__(self, summarize: Optional[Callable[[str, str], str]] = None,
+                 summary_interval_seconds: float = 300.0, first_summary_chars: int = 200):
+        self.summarize = summarize or summarize_incrementally
+        self.summary_interval_seconds = summary_interval_seconds
+        self.first_summary_chars = first_summary_chars
+        self.rolling_summary = ""
+        self.action_items: List[Dict[str, Any]] = []
+        self.pending_segments: List[Dict[str, Any]] = []
+        self.summarized_until = 0.0
+        self.attempted_until = 0.0   # 最近一次调用摘要模型时覆盖到的时间（失败时大于 summarized_until）
+        self.metrics: Dict[str, float] = {}
+        self._start_time = time.time()
+
+    def feed(self, segment: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一个新片段，返回本次产生的更新（新的待办事项、更新后的摘要）"""
+        self.metrics.setdefault("time_to_first_segment", time.time() - self._start_time)
+        update: Dict[str, Any] = {}
+
+        action_items = extract_action_items(segment)
+        if action_items:
+            self.action_items.extend(action_items)
+            update["action_items"] = action_items
+
+        self.pending_segments.append(segment)
+        if self._should_summarize() and self._update_summary() is not None:
+            update["rolling_summary"] = self.rolling_summary
+        return update
+
+    def finalize(self) -> Dict[str, Any]:
+        """把剩余片段并入摘要，返回最终结果"""
+        if self.pending_segments:
+            self._update_summary()
+        self.metrics["total_seconds"] = time.time() - self._start_time
+        return {"rolling_summary": self.rolling_summary, "action_items": self.action_items, "metrics": self.metrics}
+
+    def _should_summarize(self) -> bool:
+        pending_seconds = self.pending_segments[-1]["end"] - self.summarized_until
+        if self.attempted_until > self.summarized_until and \
+                self.pending_segments[-1]["end"] - self.attempted_until < self.summary_interval_seconds:
+            return False   # 上次调用失败，等到下一个间隔再带上累积的片段重试
+        if not self.rolling_summary:
+            return sum(len(s["text"]) for s in self.pending_segments) >= self.first_summary_chars
+        return pending_seconds >= self.summary_interval_seconds
+
+    def _update_summary(self) -> Optional[str]:
+        """把待处理片段并入摘要；模型调用失败时保留待处理片段、记录失败次数并返回 None，不影响转写"""
+        new_content = "\n".join(f"[{s['start']:.0f}s] {s['text']}" for s in self.pending_segments)
+        self.attempted_until = self.pending_segments[-1]["end"]
+        try:
+            self.rolling_summary = self.summarize(self.rolling_summary, new_content)
+        except Exception as e:
+            print(f"❌ 更新滚动摘要失败，稍后重试: {e}")
+            self.metrics["summary_failures"] = self.metrics.get("summary_failures", 0) + 1
+            return None
+        self.summarized_until = self.pending_segments[-1]["end"]
+        self.pending_segments = []
+        self.metrics.setdefault("time_to_first_summary", time.time() - self._start_time)
+        return self.rolling_summary
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "rolling_summary": self.rolling_summary,
+            "action_items": self.action_items,
+            "pending_segments": self.pending_segments,
+            "summarized_until": self.summarized_until,
+            "attempted_until": self.attempted_until,
+            "metrics": self.metrics,
+            "started_at": self._start_time,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], **kwargs) -> "IncrementalTranscriptAnalyzer":
+        analyzer = cls(**kwargs)
+        analyzer.rolling_summary = state.get("rolling_summary", "")
+        analyzer.action_items = list(state.get("action_items", []))
+        analyzer.pending_segments = list(state.get("pending_segments", []))
+        analyzer.summarized_until = state.get("summarized_until", 0.0)
+        analyzer.attempted_until = state.get("attempted_until", analyzer.summarized_until)
+        analyzer.metrics = dict(state.get("metrics", {}))
+        analyzer._start_time = state.get("started_at", analyzer._start_time)
+        return analyzer
+
+
+def summarize_incrementally(previous_summary: str, new_content: str) -> str:
+    """调用模型，把新内容整合进已有摘要"""
+    human_message = f"【目前的会议摘要】\n{previous_summary or '（暂无）'}\n\n【新转写的会议内容】\n{new_content}"
+    return invoke_model(
+        model_name=SUMMARY_MODEL,
+        messages=[SystemMessage(content=ROLLING_SUMMARY_PROMPT), HumanMessage(content=human_message)],
+    )
@@ -0,0 +1,242 @@
+"""按音频内容摘要缓存转写结果（SQLite）
+
+键为 (音频摘要, 后端, 模型, 分块参数)。每个分块的结果单独保存（zlib 压缩的 JSON），
+中途失败的转写再次运行时只需转写尚未完成的分块。总大小超过上限时按最近访问时间淘汰整条转写。
+
+命令行:
+    python -m utilities.transcriptCache stats
+    python -m utilities.transcriptCache list
+    python -m utilities.transcriptCache prune --max-bytes 500000000 --older-than-days 30
+    python -m utilities.transcriptCache clear
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    cache_key TEXT PRIMARY KEY,
+    audio_digest TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total_chunks INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    cache_key TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    start REAL NOT NULL,
+    "end" REAL NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (cache_key, chunk_index)
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_last_access ON transcripts(last_access);
+"""
+
+
+class TranscriptCache:
+    """持久化的分块转写缓存（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or os.getenv("TRANSCRIPT_CACHE_PATH", "conversations/.cache/transcripts.sqlite3"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(1 << 30)))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(audio_digest: str, backend: str, model: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([audio_digest, backend, model, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def begin(self, cache_key: str, audio_digest: str, backend: str, model: str,
+              params: Dict[str, Any], total_chunks: int = 0):
+        """登记一次转写（已存在时只刷新访问时间）"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO transcripts (cache_key, audio_digest, backend, model, params, total_chunks, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(cache_key) DO UPDATE SET last_access = excluded.last_access",
+                (cache_key, audio_digest, backend, model, json.dumps(params, sort_keys=True), total_chunks, now, now),
+            )
+
+    def set_total_chunks(self, cache_key: str, total_chunks: int):
+        with self._lock:
+            self._conn.execute("UPDATE transcripts SET total_chunks = ? WHERE cache_key = ?", (total_chunks, cache_key))
+
+    def is_complete(self, cache_key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT completed FROM transcripts WHERE cache_key = ?", (cache_key,)).fetchone()
+        return bool(row and row[0])
+
+    def get_chunks(self, cache_key: str) -> Dict[int, Dict[str, Any]]:
+        """返回已完成的分块 {chunk_index: {"start", "end", "results"}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT chunk_index, start, "end", payload FROM chunks WHERE cache_key = ? ORDER BY chunk_index',
+                (cache_key,),
+            ).fetchall()
+            if rows:
+                self._conn.execute("UPDATE transcripts SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+        return {
+            index: {"start": start, "end": end, "results": json.loads(zlib.decompress(payload))}
+            for index, start, end, payload in rows
+        }
+
+    def put_chunk(self, cache_key: str, chunk_index: int, start: float, end: float, results: List[Dict[str, Any]]):
+        payload = zlib.compress(json.dumps(results, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO chunks (cache_key, chunk_index, start, "end", payload, size) VALUES (?, ?, ?, ?, ?, ?)',
+                (cache_key, chunk_index, start, end, payload, len(payload)),
+            )
+
+    def mark_complete(self, cache_key: str):
+        with self._lock:
+            self._conn.execute("UPDATE transcripts SET completed = 1, last_access = ? WHERE cache_key = ?",
+                               (time.time(), cache_key))
+        self.evict()
+
+    # -- 淘汰与维护 ---------------------------------------------------------
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """按最近访问时间淘汰整条转写，直到总大小不超过 max_bytes，返回淘汰条数"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        evicted = 0
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            rows = self._conn.execute(
+                "SELECT t.cache_key, COALESCE(SUM(c.size), 0) FROM transcripts t "
+                "LEFT JOIN chunks c ON c.cache_key = t.cache_key GROUP BY t.cache_key ORDER BY t.last_access"
+            ).fetchall()
+            for cache_key, size in rows:
+                if total <= max_bytes:
+                    break
+                self._delete(cache_key)
+                total -= size
+                evicted += 1
+        return evicted
+
+    def prune(self, max_bytes: Optional[int] = None, older_than_days: Optional[float] = None) -> int:
+        """删除超过指定天数未访问的转写，再按大小上限淘汰"""
+        removed = 0
+        if older_than_days is not None:
+            cutoff = time.time() - older_than_days * 86400
+            with self._lock:
+                keys = [row[0] for row in self._conn.execute(
+                    "SELECT cache_key FROM transcripts WHERE last_access < ?", (cutoff,))]
+                for cache_key in keys:
+                    self._delete(cache_key)
+            removed += len(keys)
+        removed += self.evict(max_bytes)
+        with self._lock:
+            self._conn.execute("VACUUM")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM transcripts")
+            self._conn.execute("VACUUM")
+
+    def _delete(self, cache_key: str):
+        """删除一条转写（调用方需持有锁）"""
+        self._conn.execute("DELETE FROM chunks WHERE cache_key = ?", (cache_key,))
+        self._conn.execute("DELETE FROM transcripts WHERE cache_key = ?", (cache_key,))
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.cache_key, t.audio_digest, t.backend, t.model, t.total_chunks, t.completed, t.last_access, "
+                "COUNT(c.chunk_index), COALESCE(SUM(c.size), 0) FROM transcripts t "
+                "LEFT JOIN chunks c ON c.cache_key = t.cache_key GROUP BY t.cache_key ORDER BY t.last_access DESC"
+            ).fetchall()
+        keys = ("cache_key", "audio_digest", "backend", "model", "total_chunks", "completed", "last_access",
+                "cached_chunks", "bytes")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.list_entries()
+        return {
+            "path": str(self.path),
+            "entries": len(entries),
+            "completed": sum(1 for e in entries if e["completed"]),
+            "partial": sum(1 for e in entries if not e["completed"]),
+            "bytes": sum(e["bytes"] for e in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_transcript_cache: Optional[TranscriptCache] = None
+_transcript_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """返回进程内共享的转写缓存"""
+    global _transcript_cache
+    if _transcript_cache is None:
+        with _transcript_cache_lock:
+            if _transcript_cache is None:
+                _transcript_cache = TranscriptCache()
+    return _transcript_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查看与清理转写缓存")
+    parser.add_argument("--path", help="缓存数据库路径（默认 TRANSCRIPT_CACHE_PATH）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="显示缓存统计")
+    subparsers.add_parser("list", help="列出缓存条目")
+    prune_parser = subparsers.add_parser("prune", help="按大小与访问时间清理")
+    prune_parser.add_argument("--max-bytes", type=int)
+    prune_parser.add_argument("--older-than-days", type=float)
+    subparsers.add_parser("clear", help="清空缓存")
+    args = parser.parse_args(argv)
+
+    cache = TranscriptCache(args.path)
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"📦 {stats['path']}")
+        print(f"   条目={stats['entries']} (完成={stats['completed']}, 部分={stats['partial']})  "
+              f"大小={stats['bytes']:,} / {stats['max_bytes']:,} 字节")
+    elif args.command == "list":
+        for entry in cache.list_entries():
+            status = "✅" if entry["completed"] else "⏳"
+            accessed = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_access"]))
+            print(f"{status} {entry['cache_key'][:12]}  音频={entry['audio_digest'][:12]}  {entry['backend']}/{entry['model']}  "
+                  f"分块={entry['cached_chunks']}/{entry['total_chunks']}  {entry['bytes']:,}字节  最近访问={accessed}")
+    elif args.command == "prune":
+        removed = cache.prune(args.max_bytes, args.older_than_days)
+        print(f"🧹 已清理 {removed} 条转写")
+    elif args.command == "clear":
+        cache.clear()
+        print("🧹 缓存已清空")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""[Valid]/[Invalid] 输入验证结果的两级缓存
+
+第一级：本地预分类，空输入、纯标点、纯表情与已知测试文本直接判定为 [Invalid]，不调用模型。
+第二级：精确匹配的 LRU 缓存，键为 (提示词模板版本, 上一轮 AI 回复, 用户输入) 的哈希，带 TTL 与容量上限。
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+
+
+# 提示词中明确列出的测试/调试输入（按归一化后的形式比较）
+KNOWN_TEST_INPUTS = {
+    "123", "1234", "12345", "123456",
+    "test", "testing", "test123", "asdf", "qwer",
+    "测试", "测试一下", "测试测试", "测一下", "试试", "试一下",
+    "哈啊啊啊", "啊啊啊", "哈哈哈",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def pre_classify_input(user_input: str) -> Optional[str]:
+    """本地预分类，能确定为无效输入时返回 "[Invalid]"，否则返回 None 交给模型判断"""
+    if not user_input or not user_input.strip():
+        return "[Invalid]"
+
+    # 去掉空白、标点、符号（含表情）以及零宽连接符/变体选择符等格式字符
+    meaningful = "".join(
+        char for char in _WHITESPACE_RE.sub("", user_input)
+        if unicodedata.category(char)[0] not in ("P", "S", "C", "M")
+    )
+    if not meaningful:
+        return "[Invalid]"
+
+    if meaningful.lower() in KNOWN_TEST_INPUTS:
+        return "[Invalid]"
+    return None
+
+
+class ValidationCache:
+    """精确匹配的验证结果缓存（线程安全）
+
+    命中时累计节省的模型调用次数与延迟（按该条结果首次调用模型时的耗时计），
+    用于在回放生产对话时评估缓存收益。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = max_size or int(os.getenv("VALIDATION_CACHE_MAX_SIZE", "4096"))
+        self.ttl = ttl or float(os.getenv("VALIDATION_CACHE_TTL", "3600"))
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "precheck_hits": 0,
+            "exact_hits": 0,
+            "misses": 0,
+            "model_calls": 0,
+            "expired": 0,
+            "evictions": 0,
+            "model_latency_seconds": 0.0,
+            "saved_latency_seconds": 0.0,
+        }
+
+    @staticmethod
+    def make_key(template_version: str, previous_ai_content: str, user_input: str) -> str:
+        payload = "\x00".join((template_version, previous_ai_content or "", user_input.strip()))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，未命中或已过期时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            label, created_at, latency = entry
+            if now - created_at > self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            self._stats["saved_latency_seconds"] += latency
+            return label
+
+    def put(self, key: str, label: str, latency: float = 0.0):
+        """写入模型给出的验证结果，latency 为这次模型调用的耗时"""
+        with self._lock:
+            self._entries[key] = (label, time.monotonic(), latency)
+            self._entries.move_to_end(key)
+            self._stats["model_calls"] += 1
+            self._stats["model_latency_seconds"] += latency
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def record_precheck_hit(self):
+        """记录一次本地预分类命中，节省的延迟按平均模型调用耗时估算"""
+        with self._lock:
+            self._stats["precheck_hits"] += 1
+            self._stats["saved_latency_seconds"] += self._average_model_latency()
+
+    def _average_model_latency(self) -> float:
+        calls = self._stats["model_calls"]
+        return self._stats["model_latency_seconds"] / calls if calls else 0.0
+
+    def get_stats(self) -> Dict[str, float]:
+        """返回命中/未命中计数及节省的模型调用与延迟"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["precheck_hits"] + stats["exact_hits"] + stats["misses"]
+        stats["model_calls_avoided"] = stats["precheck_hits"] + stats["exact_hits"]
+        stats["hit_rate"] = stats["model_calls_avoided"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_validation_cache: Optional[ValidationCache] = None
+_validation_cache_lock = threading.Lock()
+
+
+def get_validation_cache() -> ValidationCache:
+    """返回进程内共享的验证缓存"""
+    global _validation_cache
+    if _validation_cache is None:
+        with _validation_cache_lock:
+            if _validation_cache is None:
+                _validation_cache = ValidationCache()
+    return _validation_cache
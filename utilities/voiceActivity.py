@@ -0,0 +1,109 @@
+"""基于能量与过零率的语音活动检测（VAD），在转写前跳过静音
+
+逐帧计算 RMS 能量与过零率（向量化，按块处理，内存映射的输入算完即释放页面）：
+- 能量阈值随录音自适应：取能量分布的低分位数作为底噪（不超过 VAD_MAX_NOISE_FLOOR_DBFS），高于底噪 energy_ratio 倍的帧判为语音
+- 几乎没有真正静音（持续 min_gap 秒以上接近底噪的停顿不足 VAD_MIN_SILENCE_FRACTION）的录音，低分位数落在语音里，
+  这时整段音频都作为语音返回（对该文件关闭 VAD），避免较轻的远场说话人被当成静音跳过
+- 能量略高于底噪（low_energy_ratio 倍）且过零率高的帧同样判为语音，保留 s/sh/f 等清辅音
+- 语音段前后各补 padding 秒，间隔短于 min_gap 的相邻段合并，短于 min_speech 的孤立段丢弃
+- pack_regions 再把间隔较短的相邻语音段拼成接近分块上限的区间，避免每个短语音段单独占用一次后端请求
+返回的语音段以原始时间轴上的采样点表示，转写后的时间戳无需再换算。
+"""
+from typing import List, Optional, Tuple
+import os
+
+import numpy as np
+
+from utilities.audioIO import release_pages
+
+
+def frame_features(samples: np.ndarray, sample_rate: int, frame_seconds: float = 0.03,
+                   block_frames: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+    """按帧返回 (RMS 能量, 过零率)，末尾不足一帧的部分丢弃"""
+    frame_length = max(2, int(sample_rate * frame_seconds))
+    frame_count = len(samples) // frame_length
+    energy = np.empty(frame_count, dtype=np.float32)
+    zero_crossing = np.empty(frame_count, dtype=np.float32)
+    for first in range(0, frame_count, block_frames):
+        last = min(frame_count, first + block_frames)
+        view = samples[first * frame_length:last * frame_length]
+        frames = np.asarray(view, dtype=np.float32).reshape(last - first, frame_length)
+        energy[first:last] = np.sqrt(np.mean(np.square(frames), axis=1))
+        signs = np.signbit(frames)
+        zero_crossing[first:last] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_length - 1)
+        release_pages(view)
+    return energy, zero_crossing
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int, frame_seconds: float = 0.03,
+                  energy_ratio: Optional[float] = None, low_energy_ratio: float = 2.0,
+                  zero_crossing_threshold: float = 0.25, min_energy: float = 1e-4,
+                  padding: Optional[float] = None, min_gap: Optional[float] = None,
+                  min_speech: float = 0.2, max_noise_floor_dbfs: Optional[float] = None,
+                  min_silence_fraction: Optional[float] = None) -> List[Tuple[int, int]]:
+    """返回语音段 [(起始采样点, 结束采样点)]，按时间排序且互不重叠"""
+    energy_ratio = energy_ratio or float(os.getenv("VAD_ENERGY_RATIO", "4.0"))
+    if max_noise_floor_dbfs is None:
+        max_noise_floor_dbfs = float(os.getenv("VAD_MAX_NOISE_FLOOR_DBFS", "-50"))
+    if min_silence_fraction is None:
+        min_silence_fraction = float(os.getenv("VAD_MIN_SILENCE_FRACTION", "0.05"))
+    padding = float(os.getenv("VAD_PADDING", "0.3")) if padding is None else padding
+    min_gap = float(os.getenv("VAD_MIN_GAP", "1.0")) if min_gap is None else min_gap
+
+    energy, zero_crossing = frame_features(samples, sample_rate, frame_seconds)
+    if len(energy) == 0:
+        return []
+    frame_length = max(2, int(sample_rate * frame_seconds))
+    noise_floor = max(min(float(np.percentile(energy, 10)), 10 ** (max_noise_floor_dbfs / 20)), min_energy)
+    quiet_runs = _run_lengths(energy <= noise_floor * low_energy_ratio)
+    if quiet_runs[quiet_runs * frame_seconds >= min_gap].sum() < min_silence_fraction * len(energy):
+        return [(0, len(samples))]
+    speech = (energy > noise_floor * energy_ratio) | \
+        ((energy > noise_floor * low_energy_ratio) & (zero_crossing > zero_crossing_threshold))
+    if not speech.any():
+        return []
+
+    # 连续语音帧的起止（帧下标），向量化求边界
+    edges = np.diff(np.concatenate([[0], speech.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    pad_frames = int(round(padding / frame_seconds))
+    starts = np.maximum(starts - pad_frames, 0)
+    ends = np.minimum(ends + pad_frames, len(speech))
+    # 合并间隔短于 min_gap 的相邻段（补边后重叠的段间隔为负，同样合并）
+    keep = np.concatenate([[True], (starts[1:] - ends[:-1]) * frame_seconds >= min_gap])
+    merged_starts = starts[keep]
+    merged_ends = np.maximum.reduceat(ends, np.flatnonzero(keep))
+    # 长度含前后补边，孤立的短噪声（如敲击声）补边后仍不足 min_speech + 2 × padding
+    long_enough = (merged_ends - merged_starts) * frame_seconds >= min_speech + 2 * padding
+    total = len(samples)
+    return [(int(start) * frame_length, min(total, int(end) * frame_length))
+            for start, end in zip(merged_starts[long_enough], merged_ends[long_enough])]
+
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    """布尔序列中每段连续 True 的长度（帧数）"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def speech_fraction(segments: List[Tuple[int, int]], total_samples: int) -> float:
+    """语音段占全部音频的比例"""
+    return sum(end - start for start, end in segments) / max(1, total_samples)
+
+
+def pack_regions(regions: List[Tuple[int, int]], sample_rate: int, max_seconds: float,
+                 max_gap: Optional[float] = None) -> List[Tuple[int, int]]:
+    """把相邻的短语音段合并为不超过 max_seconds 的区间，减少送往后端的请求数
+
+    只合并间隔不超过 max_gap 秒的相邻段（被合并的静音会一起送入后端），长静音始终跳过。
+    """
+    max_gap = float(os.getenv("VAD_PACK_GAP", "3.0")) if max_gap is None else max_gap
+    limit, gap_limit = int(max_seconds * sample_rate), int(max_gap * sample_rate)
+    packed: List[Tuple[int, int]] = []
+    for start, end in regions:
+        if packed and start - packed[-1][1] <= gap_limit and end - packed[-1][0] <= limit:
+            packed[-1] = (packed[-1][0], end)
+        else:
+            packed.append((start, end))
+    return packed
@@ -0,0 +1,103 @@
+"""CPU 密集的音频处理阶段（解码、VAD、切分、特征计算）使用的工作池
+
+LangGraph 节点在线程中运行，纯 Python/NumPy 的音频处理会被 GIL 串行化，因此默认使用进程池：
+- 任务参数与返回值只包含路径、PCMHandle、切分点等小对象，PCM 本身经临时文件或共享内存在进程间共享（见 audioIO）
+- 同时在途的任务数不超过 max_pending，submit 在达到上限时阻塞；imap 按消费进度补充任务，
+  上游（解码）最多领先下游（转写）max_pending 个任务，不会把整批文件一次解码完堆在磁盘和内存里
+- 工作进程数取 AUDIO_WORKERS（默认 CPU 核数），AUDIO_WORKER_KIND=thread 时退化为线程池（调试或无法创建子进程的环境）
+子进程用 spawn 方式启动，不继承父进程中的线程、数据库连接与事件循环。
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from multiprocessing import get_context, resource_tracker
+from typing import Any, Callable, Iterable, Iterator, Optional
+import os
+import threading
+
+
+class AudioWorkerPool:
+    """带背压的工作池：submit 在在途任务达到 max_pending 时阻塞，imap 按顺序产出结果"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 kind: Optional[str] = None):
+        self.max_workers = max_workers or int(os.getenv("AUDIO_WORKERS", "0")) or os.cpu_count() or 1
+        self.max_pending = max_pending or int(os.getenv("AUDIO_WORKER_QUEUE", "0")) or 2 * self.max_workers
+        self.kind = kind or os.getenv("AUDIO_WORKER_KIND", "process")
+        if self.kind not in ("process", "thread"):
+            raise ValueError(f"不支持的工作池类型: {self.kind}")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        """首次提交任务时才启动工作进程"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        # 子进程与父进程共用同一个资源跟踪进程，子进程退出时不会误删父进程创建的共享内存
+                        resource_tracker.ensure_running()
+                        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=get_context("spawn"))
+                    else:
+                        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="audio-worker")
+        return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """提交一个任务；在途任务已达 max_pending 时阻塞，直到有任务完成"""
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def imap(self, fn: Callable, iterable: Iterable[Any]) -> Iterator[Any]:
+        """对每个元素（参数元组）调用 fn(*args)，按输入顺序产出结果
+
+        只预先提交 max_pending 个任务，消费方每取走一个结果再补充一个；消费方提前退出时取消尚未开始的任务。
+        """
+        items = iter(iterable)
+        window: deque = deque()
+        try:
+            for args in items:
+                window.append(self.submit(fn, *args))
+                if len(window) >= self.max_pending:
+                    break
+            while window:
+                result = window.popleft().result()
+                for args in items:
+                    window.append(self.submit(fn, *args))
+                    break
+                yield result
+        finally:
+            for future in window:
+                future.cancel()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    def __enter__(self) -> "AudioWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+
+_audio_worker_pool: Optional[AudioWorkerPool] = None
+_audio_worker_pool_lock = threading.Lock()
+
+
+def get_audio_worker_pool() -> AudioWorkerPool:
+    """返回进程内共享的音频工作池"""
+    global _audio_worker_pool
+    if _audio_worker_pool is None:
+        with _audio_worker_pool_lock:
+            if _audio_worker_pool is None:
+                _audio_worker_pool = AudioWorkerPool()
+    return _audio_worker_pool